@@ -19,22 +19,28 @@ Storage model for state information:
     * Job ID
  * last touched information for group
  * last touched information for policy
+ * standby servers of the warm pool, and the jobs building them
 """
+from collections import OrderedDict
+from copy import deepcopy
 from datetime import datetime
 from decimal import Decimal, ROUND_UP
 from functools import partial
+import hashlib
 import iso8601
 import json
 
 from twisted.internet import defer
 from twisted.internet.task import deferLater
+from twisted.python.failure import Failure
 
+from otter.deletion import get_deletion_queue
 from otter.log import audit
 from otter.models.interface import NoSuchScalingGroupError
 from otter.supervisor import get_supervisor
 from otter.json_schema.group_schemas import MAX_ENTITIES
 from otter.util.deferredutils import unwrap_first_error
-from otter.util.timestamp import from_timestamp
+from otter.util.timestamp import datetime_to_epoch
 
 
 # Amount of time spaced between starting delete jobs when scaling down
@@ -123,16 +129,24 @@ def obey_config_change(log, transaction_id, config, scaling_group, state):
     delta = calculate_delta(bound_log, state, config, {'change': 0})
 
     if delta == 0:
-        return defer.succeed(state)
+        return maintain_warm_pool(bound_log, transaction_id, config, scaling_group,
+                                  state)
     elif delta > 0:
         deferred = scaling_group.view_launch_config()
-        deferred.addCallback(partial(execute_launch_config, bound_log,
-                                     transaction_id, state,
-                                     scaling_group=scaling_group, delta=delta))
+
+        def scale_up(launch):
+            d = execute_launch_config(bound_log, transaction_id, state, launch,
+                                      scaling_group=scaling_group, delta=delta)
+            return d.addCallback(lambda _: maintain_warm_pool(
+                bound_log, transaction_id, config, scaling_group, state, launch))
+
+        deferred.addCallback(scale_up)
     else:
         # delta < 0 (scale down)
         deferred = exec_scale_down(bound_log, transaction_id, state,
                                    scaling_group, -delta)
+        deferred.addCallback(lambda _: maintain_warm_pool(
+            bound_log, transaction_id, config, scaling_group, state))
 
     deferred.addCallback(_do_convergence_audit_log, bound_log, delta, state)
     return deferred
@@ -143,7 +157,8 @@ def maybe_execute_scaling_policy(
         transaction_id,
         scaling_group,
         state,
-        policy_id, version=None):
+        policy_id, version=None,
+        config=None, launch=None, policy=None):
     """
     Checks whether and how much a scaling policy can be executed.
 
@@ -154,6 +169,12 @@ def maybe_execute_scaling_policy(
         state
     :param policy_id: the policy id to execute
     :param version: the policy version to check before executing
+    :param dict config: the scaling group config, along with `launch` and
+        `policy` if they were read with the state by
+        :meth:`IScalingGroup.modify_state_for_policy`
+    :param dict launch: the launch config
+    :param dict policy: the policy to execute. If not given, the policy and the
+        configs are read from `scaling_group`
 
     :return: a ``Deferred`` that fires with the updated
         :class:`otter.models.interface.GroupState` if successful
@@ -168,9 +189,6 @@ def maybe_execute_scaling_policy(
     bound_log = log.bind(scaling_group_id=scaling_group.uuid, policy_id=policy_id)
     bound_log.msg("beginning to execute scaling policy")
 
-    # make sure that the policy (and the group) exists before doing anything else
-    deferred = scaling_group.get_policy(policy_id, version)
-
     def _do_get_configs(policy):
         deferred = defer.gatherResults([
             scaling_group.view_config(),
@@ -178,7 +196,12 @@ def maybe_execute_scaling_policy(
         ])
         return deferred.addCallback(lambda results: results + [policy])
 
-    deferred.addCallbacks(_do_get_configs, unwrap_first_error)
+    if policy is None:
+        # make sure that the policy (and the group) exists before doing anything else
+        deferred = scaling_group.get_policy(policy_id, version)
+        deferred.addCallbacks(_do_get_configs, unwrap_first_error)
+    else:
+        deferred = defer.succeed([config, launch, policy])
 
     def _do_maybe_execute(config_launch_policy):
         """
@@ -204,6 +227,9 @@ def maybe_execute_scaling_policy(
                 execute_bound_log.msg("cooldowns checked, executing launch configs")
                 d = execute_launch_config(execute_bound_log, transaction_id, state,
                                           launch, scaling_group, delta)
+                d.addCallback(lambda _: maintain_warm_pool(
+                    execute_bound_log, transaction_id, config, scaling_group, state,
+                    launch))
             else:
                 # delta < 0 (scale down event)
                 execute_bound_log.msg("cooldowns checked, Scaling down")
@@ -221,6 +247,200 @@ def maybe_execute_scaling_policy(
     return deferred.addCallback(_do_maybe_execute)
 
 
+class CooldownCache(object):
+    """
+    Remembers when groups and their policies were last executed, and their
+    cooldowns, as read by the latest executions while holding the group's lock.
+    It is used to reject executions that clearly cannot pass the cooldowns
+    without taking the lock. Entries are trusted for `ttl` seconds, and an
+    execution is rejected only if a cooldown has more than `margin` seconds left,
+    so that executions close to the end of a cooldown still go through the
+    locked check.
+
+    Touched times only move forward, so an entry can only understate a cooldown
+    unless a cooldown is made shorter, which is then noticed within `ttl` seconds.
+    At most `max_groups` groups are remembered, the least recently updated ones
+    being forgotten first.
+    """
+
+    def __init__(self, ttl=10, margin=2, max_groups=10000, clock=None):
+        """
+        :param clock: An instance of IReactorTime provider that defaults to reactor
+            if not provided
+        """
+        if clock is None:  # pragma: no cover
+            from twisted.internet import reactor
+            clock = reactor
+        self.ttl = ttl
+        self.margin = margin
+        self.max_groups = max_groups
+        self.clock = clock
+        # (tenant ID, group ID) -> (time cached, group cooldown end,
+        # {policy ID: policy cooldown end}), in order of update
+        self._groups = OrderedDict()
+
+    def update(self, scaling_group, state, config, policy, policy_id):
+        """
+        Remember the end of the cooldowns of `scaling_group` and its policy from
+        `state`, `config` and `policy` read while holding the group's lock
+        """
+        now = self.clock.seconds()
+        key = (scaling_group.tenant_id, scaling_group.uuid)
+        _, _, policies = self._groups.pop(key, (None, None, {}))
+        policies = dict((pid, end) for pid, end in policies.iteritems() if end > now)
+        policies[policy_id] = _cooldown_end(state.get_touched_epoch(policy_id),
+                                            policy['cooldown'])
+        self._groups[key] = (now, _cooldown_end(state.get_touched_epoch(), config['cooldown']),
+                             policies)
+        while len(self._groups) > self.max_groups:
+            self._groups.popitem(last=False)
+
+    def rejects(self, scaling_group, policy_id):
+        """
+        :return: True if executing the policy certainly fails because of a group
+            or policy cooldown, False if it may pass
+        """
+        key = (scaling_group.tenant_id, scaling_group.uuid)
+        now = self.clock.seconds()
+        if key not in self._groups:
+            return False
+        cached, group_end, policies = self._groups[key]
+        if now - cached > self.ttl:
+            del self._groups[key]
+            return False
+        return max(group_end, policies.get(policy_id, 0)) - now > self.margin
+
+
+def _cooldown_end(touched, cooldown):
+    """
+    Return the time in seconds since epoch at which a cooldown of `cooldown`
+    seconds after `touched` seconds since epoch ends, or 0 if never touched
+    """
+    if touched is None:
+        return 0
+    return touched + cooldown
+
+
+class ExecutionCoalescer(object):
+    """
+    Attaches executions of a policy requested while another execution of the same
+    policy is waiting for or holding the group's lock to that execution, instead of
+    each of them taking the lock and reading the group's state.
+
+    An attached execution gets the outcome of the execution in progress only if
+    the group or the policy read by that execution has a cooldown, since then
+    executing the policy again right after it would fail on the cooldown anyway.
+    Otherwise, it executes the policy itself once that execution is done. Only
+    executions checking the same policy version are coalesced, since an
+    execution of a stale version must fail even if another one succeeds.
+    """
+
+    def __init__(self):
+        # (tenant ID, group ID, policy ID, version) -> (Deferreds of attached
+        # executions, cooldowns read by the execution in progress)
+        self._executions = {}
+
+    def execute(self, log, scaling_group, policy_id, modifier, version=None):
+        """
+        Call ``scaling_group.modify_state_for_policy(modifier, policy_id, version)``
+        unless the policy is already being executed with the same `version`
+
+        :param modifier: a modifier like :func:`maybe_execute_scaling_policy`
+        :param version: the policy version the modifier checks, if any
+        :return: Deferred that fires with the outcome of the execution, whether it
+            was started by this call or an earlier one
+        """
+        key = (scaling_group.tenant_id, scaling_group.uuid, policy_id, version)
+        if key in self._executions:
+            attached, cooldowns = self._executions[key]
+            d = defer.Deferred()
+            attached.append(d)
+
+            def coalesce(result):
+                if any(cooldowns):
+                    log.bind(scaling_group_id=scaling_group.uuid, policy_id=policy_id).msg(
+                        "policy executed while waiting, coalescing with it")
+                    return result
+                return self.execute(log, scaling_group, policy_id, modifier, version)
+
+            return d.addBoth(coalesce)
+
+        attached, cooldowns = self._executions[key] = ([], [])
+
+        def note_cooldowns(group, state, config, launch, policy):
+            cooldowns.extend([config['cooldown'], policy['cooldown']])
+            return modifier(group, state, config=config, launch=launch, policy=policy)
+
+        def finished(result):
+            del self._executions[key]
+            for d in attached:
+                if isinstance(result, Failure):
+                    d.errback(result)
+                else:
+                    d.callback(result)
+            return result
+
+        d = defer.maybeDeferred(scaling_group.modify_state_for_policy, note_cooldowns,
+                                policy_id, version)
+        return d.addBoth(finished)
+
+
+def modify_state_unless_cooling_down(log, scaling_group, policy_id, modifier, version=None,
+                                     coalesce=False, reject_cached=True):
+    """
+    Call ``scaling_group.modify_state_for_policy(modifier, policy_id, version)`` to
+    execute the policy, unless the :class:`CooldownCache` knows the policy cannot be
+    executed yet, in which case the execution is rejected without taking the
+    group's lock. Once the state changed by an executed policy is saved, its
+    cooldowns are remembered in the cache. If `coalesce` and there is an
+    :class:`ExecutionCoalescer`, an execution of a policy already being executed
+    may get the outcome of that execution. Only callers that do not report the
+    outcome, like webhooks, should coalesce.
+
+    :param modifier: a modifier like :func:`maybe_execute_scaling_policy`, which is
+        given the group config, launch config and policy read with the state, and
+        fails unless it executes the policy
+    :param bool reject_cached: Whether to reject the execution if the cache knows
+        the policy cannot be executed yet. Callers that must tell a deleted policy
+        or a stale version apart from a policy cooling down, like the scheduler,
+        check the policy first instead
+
+    :return: Deferred that fires like ``modify_state_for_policy`` or fails with
+        :class:`CannotExecutePolicyError`
+    """
+    cooldown_cache = get_cooldown_cache()
+    if (reject_cached and cooldown_cache is not None and
+            cooldown_cache.rejects(scaling_group, policy_id)):
+        log.bind(scaling_group_id=scaling_group.uuid, policy_id=policy_id).msg(
+            "cooldown not reached as of last execution, rejecting without lock")
+        return defer.fail(CannotExecutePolicyError(
+            scaling_group.tenant_id, scaling_group.uuid, policy_id,
+            "Cooldowns not met."))
+
+    executed = []
+    if cooldown_cache is not None:
+        def execute(group, state, config, launch, policy):
+            d = defer.maybeDeferred(modifier, group, state, config=config,
+                                    launch=launch, policy=policy)
+            return d.addCallback(
+                lambda new_state: executed.append((new_state, config, policy)) or new_state)
+    else:
+        execute = modifier
+
+    def remember_cooldowns(result):
+        if executed:
+            new_state, config, policy = executed[0]
+            cooldown_cache.update(scaling_group, new_state, config, policy, policy_id)
+        return result
+
+    execution_coalescer = get_execution_coalescer()
+    if coalesce and execution_coalescer is not None:
+        d = execution_coalescer.execute(log, scaling_group, policy_id, execute, version)
+    else:
+        d = scaling_group.modify_state_for_policy(execute, policy_id, version)
+    return d.addCallback(remember_cooldowns)
+
+
 def check_cooldowns(log, state, config, policy, policy_id):
     """
     Check the global cooldowns (when was the last time any policy was executed?)
@@ -235,18 +455,18 @@ def check_cooldowns(log, state, config, policy, policy_id):
 
     :return: C{int}
     """
-    this_now = datetime.now(iso8601.iso8601.UTC)
+    this_now = datetime_to_epoch(datetime.now(iso8601.iso8601.UTC))
 
     timestamp_and_cooldowns = [
-        (state.policy_touched.get(policy_id), policy['cooldown'], 'policy'),
-        (state.group_touched, config['cooldown'], 'group'),
+        (state.get_touched_epoch(policy_id), policy['cooldown'], 'policy'),
+        (state.get_touched_epoch(), config['cooldown'], 'group'),
     ]
 
     for last_time, cooldown, cooldown_type in timestamp_and_cooldowns:
         if last_time is not None:
-            delta = this_now - from_timestamp(last_time)
-            if delta.total_seconds() < cooldown:
-                log.bind(time_since_last_touched=delta.total_seconds(),
+            delta = this_now - last_time
+            if delta < cooldown:
+                log.bind(time_since_last_touched=delta,
                          cooldown_type=cooldown_type,
                          cooldown_seconds=cooldown).msg("cooldown not reached")
                 return False
@@ -304,9 +524,7 @@ def find_pending_jobs_to_cancel(log, state, delta):
     if delta >= len(state.pending):  # don't bother sorting - return everything
         return state.pending.keys()
 
-    sorted_jobs = sorted(state.pending.items(), key=lambda (_id, s): from_timestamp(s['created']),
-                         reverse=True)
-    return [job_id for job_id, _job_info in sorted_jobs[:delta]]
+    return state.get_newest_pending(delta)
 
 
 def find_servers_to_evict(log, state, delta):
@@ -319,14 +537,17 @@ def find_servers_to_evict(log, state, delta):
         return state.active.values()
 
     # return delta number of oldest server
-    sorted_servers = sorted(state.active.values(), key=lambda s: from_timestamp(s['created']))
-    return sorted_servers[:delta]
+    return [state.active[server_id] for server_id in state.get_oldest_active(delta)]
 
 
 def delete_active_servers(log, transaction_id, scaling_group,
                           delta, state, clock=None):
     """
-    Start deleting active servers jobs
+    Start deleting active servers jobs. If there is a server deletion queue, the
+    servers are queued to be deleted instead.
+
+    :return: Deferred that fires with None once the servers are queued to be
+        deleted, or None if there is no deletion queue
     """
 
     # find servers to evict
@@ -336,12 +557,29 @@ def delete_active_servers(log, transaction_id, scaling_group,
     for server in servers_to_evict:
         state.remove_active(server['id'])
 
+    return _delete_servers(log, transaction_id, scaling_group, servers_to_evict, clock)
+
+
+def _delete_servers(log, transaction_id, scaling_group, servers, clock=None):
+    """
+    Start deleting jobs for `servers` that are no longer in the group's state, or
+    queue them to be deleted if there is a server deletion queue.
+
+    :return: Deferred that fires with None once the servers are queued to be
+        deleted, or None if there is no deletion queue
+    """
+    deletion_queue = get_deletion_queue()
+    if deletion_queue is not None:
+        return deletion_queue.add_server_deletions(
+            log, transaction_id, scaling_group.tenant_id, scaling_group.uuid,
+            servers)
+
     # then start deleting those servers
     if not clock:
         from twisted.internet import reactor
         clock = reactor
     supervisor = get_supervisor()
-    for i, server_info in enumerate(servers_to_evict):
+    for i, server_info in enumerate(servers):
         job = _DeleteJob(log, transaction_id, scaling_group, server_info, supervisor)
         d = deferLater(clock, i * DELETE_WAIT_INTERVAL, job.start)
         supervisor.deferred_pool.add(d)
@@ -361,8 +599,10 @@ def exec_scale_down(log, transaction_id, state, scaling_group, delta):
     # delete active servers if pending jobs are not enough
     remaining = delta - len(jobs_to_cancel)
     if remaining > 0:
-        delete_active_servers(log, transaction_id,
-                              scaling_group, remaining, state)
+        d = delete_active_servers(log, transaction_id,
+                                  scaling_group, remaining, state)
+        if d is not None:
+            return d
 
     return defer.succeed(None)
 
@@ -405,6 +645,104 @@ class _DeleteJob(object):
         self.log.err(failure, 'Server deletion job failed')
 
 
+class CompletionCoalescer(object):
+    """
+    Coalesces the state changes of jobs of a group that complete close together
+    into a single ``modify_state`` call, so that many servers becoming active at
+    once do not take the group's lock and rewrite its state one by one.
+
+    Changes of a group are gathered for `window` seconds after the first one, or
+    until there are `max_batch` of them, and then applied in order in one
+    ``modify_state``. Each change is applied to a copy of the state, so a change
+    that raises an error fails alone, leaving none of its mutations behind, while
+    the others are still saved.
+    """
+
+    def __init__(self, window=1, max_batch=100, clock=None):
+        """
+        :param float window: seconds to gather changes of a group for
+        :param int max_batch: maximum number of changes applied together
+        :param clock: An instance of IReactorTime provider that defaults to reactor
+            if not provided
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self.clock = clock
+        # (tenant ID, group ID) -> (delayed flush call, group, list of
+        # (modifier, Deferred))
+        self._batches = {}
+
+    def _reactor(self):
+        """
+        Return the clock to delay flushing changes with
+        """
+        if self.clock is None:
+            from twisted.internet import reactor
+            return reactor
+        return self.clock
+
+    def modify_state(self, scaling_group, modifier):
+        """
+        Apply `modifier` to the state of `scaling_group` along with other changes
+        of the group. Like :meth:`IScalingGroup.modify_state`, `modifier` is called
+        with the group and its state and returns the new state.
+
+        :return: Deferred that fires with None once the change is saved
+        """
+        key = (scaling_group.tenant_id, scaling_group.uuid)
+        if key not in self._batches:
+            call = self._reactor().callLater(self.window, self._flush, key)
+            self._batches[key] = (call, scaling_group, [])
+        call, _, changes = self._batches[key]
+        d = defer.Deferred()
+        changes.append((modifier, d))
+        if len(changes) >= self.max_batch:
+            call.cancel()
+            self._flush(key)
+        return d
+
+    def _flush(self, key):
+        """
+        Apply gathered changes of the group with `key` in one ``modify_state``
+        """
+        _, scaling_group, changes = self._batches.pop(key)
+        failures = {}
+
+        def apply_changes(group, state):
+            failures.clear()
+            for i, (modifier, _) in enumerate(changes):
+                try:
+                    state = modifier(group, deepcopy(state))
+                except Exception:
+                    failures[i] = Failure()
+            return state
+
+        def saved(result):
+            for i, (_, d) in enumerate(changes):
+                if i in failures:
+                    d.errback(failures[i])
+                elif isinstance(result, Failure):
+                    d.errback(result)
+                else:
+                    d.callback(None)
+
+        scaling_group.modify_state(apply_changes).addBoth(saved)
+
+
+def _modify_job_state(supervisor, scaling_group, modifier):
+    """
+    Modify state of `scaling_group` on completion of a job, coalesced with other
+    completions if there is a :class:`CompletionCoalescer`. The supervisor does not
+    stop until coalesced changes are saved.
+    """
+    coalescer = get_completion_coalescer()
+    if coalescer is None:
+        return scaling_group.modify_state(modifier)
+    d = coalescer.modify_state(scaling_group, modifier)
+    supervisor.deferred_pool.add(d)
+    return d
+
+
 class _Job(object):
     """
     Private class representing a server creation job.  This calls the supervisor
@@ -433,6 +771,36 @@ class _Job(object):
         deferred.addCallback(self.job_started)
         return deferred
 
+    def promote(self, launch_config, server):
+        """
+        Kick off a job by calling the supervisor to put a standby server built
+        from the launch config into service.
+        """
+        self.log = self.log.bind(standby_server_id=server['id'])
+        deferred = self.supervisor.execute_promote_server(
+            self.log, self.transaction_id, self.scaling_group, launch_config, server)
+        deferred.addCallback(self.job_started)
+        return deferred
+
+    def _is_pending(self, state):
+        """
+        Return whether the job is still wanted in `state`
+        """
+        return self.job_id in state.pending
+
+    def _remove_job(self, state):
+        """
+        Remove the job from `state`
+        """
+        state.remove_job(self.job_id)
+
+    def _add_server(self, log, state, result):
+        """
+        Add the server built by the job to `state`
+        """
+        state.add_active(result['id'], result)
+        audit(log).msg("Server is active.", event_type="server.active")
+
     def _job_failed(self, f):
         """
         Job has failed. Remove the job, if it exists, and log the error.
@@ -442,11 +810,11 @@ class _Job(object):
         def handle_failure(group, state):
             # if it is not in pending, then the job was probably deleted before
             # it got a chance to fail.
-            if self.job_id in state.pending:
-                state.remove_job(self.job_id)
+            if self._is_pending(state):
+                self._remove_job(state)
             return state
 
-        d = self.scaling_group.modify_state(handle_failure)
+        d = _modify_job_state(self.supervisor, self.scaling_group, handle_failure)
 
         def ignore_error_if_group_deleted(f):
             f.trap(NoSuchScalingGroupError)
@@ -465,7 +833,7 @@ class _Job(object):
         log = self.log.bind(server_id=server_id)
 
         def handle_success(group, state):
-            if self.job_id not in state.pending:
+            if not self._is_pending(state):
                 # server was slated to be deleted when it completed building.
                 # So, deleting it now
                 audit(log).msg(
@@ -477,12 +845,11 @@ class _Job(object):
                                  self.scaling_group, result, self.supervisor)
                 job.start()
             else:
-                state.remove_job(self.job_id)
-                state.add_active(result['id'], result)
-                audit(log).msg("Server is active.", event_type="server.active")
+                self._remove_job(state)
+                self._add_server(log, state, result)
             return state
 
-        d = self.scaling_group.modify_state(handle_success)
+        d = _modify_job_state(self.supervisor, self.scaling_group, handle_success)
 
         def delete_if_group_deleted(f):
             f.trap(NoSuchScalingGroupError)
@@ -515,9 +882,149 @@ class _Job(object):
         return self.job_id
 
 
+class _StandbyJob(_Job):
+    """
+    Private class representing a job building a standby server for the warm pool
+    of a group.  The server is built from the launch config without its load
+    balancers, and kept in the group's ``standby`` state.
+    """
+    def __init__(self, log, transaction_id, scaling_group, supervisor, config):
+        """
+        :param str config: the key of the launch config, see :func:`standby_key`
+        """
+        super(_StandbyJob, self).__init__(log, transaction_id, scaling_group, supervisor)
+        self.log = self.log.bind(system='otter.job.standby')
+        self.config = config
+
+    def start(self, launch_config):
+        """
+        Kick off a job by calling the supervisor with the launch config without
+        its load balancers.
+        """
+        return super(_StandbyJob, self).start({
+            'type': launch_config['type'],
+            'args': {'server': launch_config['args']['server']}})
+
+    def _is_pending(self, state):
+        """
+        Return whether the standby server is still wanted in `state`
+        """
+        return self.job_id in state.standby_pending
+
+    def _remove_job(self, state):
+        """
+        Remove the job from the standby jobs of `state`
+        """
+        state.remove_standby_job(self.job_id)
+
+    def _add_server(self, log, state, result):
+        """
+        Add the built server to the warm pool in `state`
+        """
+        result['config'] = self.config
+        state.add_standby(result['id'], result)
+        get_standby_failures().succeeded(self.scaling_group)
+        log.msg("Standby server is built.")
+
+    def _job_failed(self, f):
+        """
+        Job has failed. Remove the job, and later start building another standby
+        server if the warm pool is still short of one, unless the standby jobs of
+        the group keep failing. See :class:`StandbyFailures`.
+        """
+        d = super(_StandbyJob, self)._job_failed(f)
+        failures = get_standby_failures()
+        delay = failures.failed(self.scaling_group)
+        if delay is None:
+            self.log.msg("Standby servers keep failing to build. Not building "
+                         "another one until the warm pool is maintained again.")
+            return d
+        self.log.msg("Building another standby server in {delay} seconds.",
+                     delay=delay)
+        refilled = deferLater(failures.clock, delay, self._refill)
+        refilled.addErrback(self.log.err, 'Could not maintain the warm pool')
+        return d
+
+    def _refill(self):
+        """
+        Maintain the warm pool of the group, building the missing standby servers
+        """
+        d = self.scaling_group.modify_state(
+            partial(obey_warm_pool_change, self.log, self.transaction_id))
+
+        def ignore_error_if_group_deleted(f):
+            f.trap(NoSuchScalingGroupError)
+
+        return d.addErrback(ignore_error_if_group_deleted)
+
+
+class StandbyFailures(object):
+    """
+    Counts the standby jobs of each group that failed in a row, so that a launch
+    config that cannot be built does not keep building servers. After a failed
+    standby job, the warm pool is maintained again after `delay` seconds, doubled
+    with each failure in a row up to `max_delay`. After `max_failures` failures
+    in a row, it is only maintained again by a policy execution or a change of
+    the group. The count of a group is reset once one of its standby servers is
+    built. At most `max_groups` groups are counted, the least recently failed
+    ones being forgotten first.
+    """
+
+    def __init__(self, delay=30, max_delay=1800, max_failures=10, max_groups=10000,
+                 clock=None):
+        """
+        :param clock: An instance of IReactorTime provider that defaults to reactor
+            if not provided
+        """
+        if clock is None:  # pragma: no cover
+            from twisted.internet import reactor
+            clock = reactor
+        self.delay = delay
+        self.max_delay = max_delay
+        self.max_failures = max_failures
+        self.max_groups = max_groups
+        self.clock = clock
+        # (tenant ID, group ID) -> failures in a row, in order of last failure
+        self._groups = OrderedDict()
+
+    def failed(self, scaling_group):
+        """
+        Count a failed standby job of `scaling_group`
+
+        :return: seconds to wait before maintaining the warm pool again, or None
+            if it should not be maintained again after this failure
+        """
+        key = (scaling_group.tenant_id, scaling_group.uuid)
+        failures = self._groups.pop(key, 0) + 1
+        self._groups[key] = failures
+        while len(self._groups) > self.max_groups:
+            self._groups.popitem(last=False)
+        if failures > self.max_failures:
+            return None
+        return min(self.delay * 2 ** (failures - 1), self.max_delay)
+
+    def succeeded(self, scaling_group):
+        """
+        Reset the count of `scaling_group` once one of its standby servers is built
+        """
+        self._groups.pop((scaling_group.tenant_id, scaling_group.uuid), None)
+
+
+def standby_key(launch_config):
+    """
+    Return a key identifying the servers built from `launch_config`, ignoring its
+    load balancers, so that standby servers built from an outdated launch config
+    are not used.
+    """
+    return hashlib.sha1(json.dumps(launch_config['args']['server'],
+                                   sort_keys=True)).hexdigest()
+
+
 def execute_launch_config(log, transaction_id, state, launch, scaling_group, delta):
     """
-    Execute a launch config some number of times.
+    Execute a launch config some number of times.  Standby servers of the warm
+    pool built from the launch config are put into service first, and new
+    servers are only launched for the rest.
 
     :return: Deferred
     """
@@ -533,14 +1040,180 @@ def execute_launch_config(log, transaction_id, state, launch, scaling_group, del
             state.add_job(job_id)
 
     if delta > 0:
-        log.msg("Launching some servers.")
         supervisor = get_supervisor()
+        standby = []
+        if len(state.standby) > 0:
+            standby = state.take_standby(standby_key(launch), delta)
+            log.msg("Promoting standby servers.", num_servers=len(standby))
+        log.msg("Launching some servers.")
         deferreds = [
+            _Job(log, transaction_id, scaling_group, supervisor).promote(launch, server)
+            for server in standby
+        ] + [
             _Job(log, transaction_id, scaling_group, supervisor).start(launch)
-            for i in range(delta)
+            for i in range(delta - len(standby))
         ]
 
     pendings_deferred = defer.gatherResults(deferreds, consumeErrors=True)
     pendings_deferred.addCallback(_update_state)
     pendings_deferred.addErrback(unwrap_first_error)
     return pendings_deferred
+
+
+def maintain_warm_pool(log, transaction_id, config, scaling_group, state, launch=None):
+    """
+    Keep ``config['warmPoolSize']`` standby servers built from the launch config
+    of the group: start building the missing ones, and delete (or cancel the jobs
+    building) the ones beyond that number or built from another launch config.
+
+    :param log: A twiggy bound log for logging
+    :param str transaction_id: the transaction id
+    :param dict config: the scaling group config
+    :param scaling_group: an IScalingGroup provider
+    :param state: a :class:`otter.models.interface.GroupState` representing the
+        state
+    :param dict launch: the launch config of the group, read from the group if
+        not given and needed
+
+    :return: a ``Deferred`` that fires with `state` once the jobs are started
+    """
+    size = config.get('warmPoolSize', 0)
+    if size == 0 and len(state.standby) + len(state.standby_pending) == 0:
+        return defer.succeed(state)
+    if launch is None:
+        d = scaling_group.view_launch_config()
+        return d.addCallback(lambda launch: maintain_warm_pool(
+            log, transaction_id, config, scaling_group, state, launch))
+
+    log = log.bind(warm_pool_size=size)
+    key = standby_key(launch)
+
+    # jobs whose servers are no longer wanted are removed from the state, and
+    # their servers deleted once built
+    for job_id, info in state.standby_pending.items():
+        if info['config'] != key:
+            state.remove_standby_job(job_id)
+    excess = len(state.standby_pending) - max(size - len(state.standby), 0)
+    for job_id in state.standby_pending.keys()[:max(excess, 0)]:
+        state.remove_standby_job(job_id)
+
+    servers = [info for info in state.standby.values() if info['config'] != key]
+    for server in servers:
+        state.remove_standby(server['id'])
+    excess = len(state.standby) - size
+    if excess > 0:
+        servers.extend(state.take_standby(key, excess))
+
+    deferreds = []
+    if servers:
+        log.msg("Deleting standby servers.", num_servers=len(servers))
+        deleted = _delete_servers(log, transaction_id, scaling_group, servers)
+        if deleted is not None:
+            deferreds.append(deleted)
+
+    missing = size - len(state.standby) - len(state.standby_pending)
+    if missing > 0:
+        log.msg("Building standby servers.", num_servers=missing)
+        supervisor = get_supervisor()
+        for i in range(missing):
+            job = _StandbyJob(log, transaction_id, scaling_group, supervisor, key)
+            deferreds.append(job.start(launch).addCallback(state.add_standby_job, key))
+
+    d = defer.gatherResults(deferreds, consumeErrors=True)
+    d.addCallback(lambda _: state)
+    return d.addErrback(unwrap_first_error)
+
+
+def obey_warm_pool_change(log, transaction_id, scaling_group, state, launch=None):
+    """
+    Read the config of `scaling_group` and maintain its warm pool with
+    :func:`maintain_warm_pool`, after a change that may leave the warm pool short
+    of standby servers or with outdated ones, such as a failed standby job or a
+    new launch config.
+
+    :param dict launch: the launch config of the group, read from the group if
+        not given and needed
+
+    :return: a ``Deferred`` that fires with `state` once the jobs are started
+    """
+    d = scaling_group.view_config()
+    return d.addCallback(lambda config: maintain_warm_pool(
+        log, transaction_id, config, scaling_group, state, launch))
+
+
+_completion_coalescer = None
+
+
+def get_completion_coalescer():
+    """
+    Get the current :class:`CompletionCoalescer`, or None if state changes of
+    completed jobs are not coalesced.
+    """
+    return _completion_coalescer
+
+
+def set_completion_coalescer(coalescer):
+    """
+    Set the current :class:`CompletionCoalescer`.
+    """
+    global _completion_coalescer
+    _completion_coalescer = coalescer
+
+
+_standby_failures = None
+
+
+def get_standby_failures():
+    """
+    Get the current :class:`StandbyFailures`, creating one on first use.
+    """
+    global _standby_failures
+    if _standby_failures is None:
+        _standby_failures = StandbyFailures()
+    return _standby_failures
+
+
+def set_standby_failures(standby_failures):
+    """
+    Set the current :class:`StandbyFailures`.
+    """
+    global _standby_failures
+    _standby_failures = standby_failures
+
+
+_cooldown_cache = None
+
+
+def get_cooldown_cache():
+    """
+    Get the current :class:`CooldownCache`, or None if policy executions are
+    always checked with the group's lock held.
+    """
+    return _cooldown_cache
+
+
+def set_cooldown_cache(cooldown_cache):
+    """
+    Set the current :class:`CooldownCache`.
+    """
+    global _cooldown_cache
+    _cooldown_cache = cooldown_cache
+
+
+_execution_coalescer = None
+
+
+def get_execution_coalescer():
+    """
+    Get the current :class:`ExecutionCoalescer`, or None if every execution
+    modifies the group's state.
+    """
+    return _execution_coalescer
+
+
+def set_execution_coalescer(execution_coalescer):
+    """
+    Set the current :class:`ExecutionCoalescer`.
+    """
+    global _execution_coalescer
+    _execution_coalescer = execution_coalescer
@@ -0,0 +1,82 @@
+"""
+Repairing the counts of groups, policies and webhooks against which limits are
+checked, since they can drift from the rows they count.
+"""
+
+from twisted.application.internet import TimerService
+from twisted.internet import defer
+
+from otter.log import log as otter_log
+
+
+# ZooKeeper path of the lock taken while repairing counts
+REPAIR_LOCK_PATH = '/counts_repair'
+
+
+class CountsRepairService(TimerService):
+    """
+    Service that periodically counts the groups, policies and webhooks of every
+    tenant again with
+    :meth:`otter.models.cass.CassScalingGroupCollection.repair_counts`, one tenant
+    after another. A repair corrects counts by adding the difference, so only one
+    node repairs at a time: a node skips its repair if another holds the lock.
+    """
+
+    def __init__(self, store, kz_client, interval, page_size=100):
+        """
+        :param store: a :class:`otter.models.cass.CassScalingGroupCollection`
+            counting resources
+        :param kz_client: a `TxKazooClient` to take the lock with
+        :param int interval: seconds between each repair
+        :param int page_size: number of groups read at a time to find the tenants
+        """
+        TimerService.__init__(self, interval, self.repair)
+        self.store = store
+        self.kz_client = kz_client
+        self.page_size = page_size
+        self.log = otter_log.bind(system='otter.counts')
+
+    def repair(self):
+        """
+        Repair the counts of every tenant, unless another node is repairing them
+
+        :return: Deferred that fires with None once repaired
+        """
+        lock = self.kz_client.Lock(REPAIR_LOCK_PATH)
+
+        def acquired(got_lock):
+            if not got_lock:
+                self.log.msg('Counts are being repaired by another node')
+                return
+            d = self._repair_after(None)
+            return d.addBoth(
+                lambda result: defer.maybeDeferred(lock.release).addCallback(lambda _: result))
+
+        d = lock.acquire(blocking=False)
+        d.addCallback(acquired)
+        d.addErrback(self.log.err, 'Could not repair counts')
+        return d
+
+    def _repair_after(self, marker):
+        """
+        Repair the counts of the tenants after `marker`, a page at a time
+        """
+        d = self.store.list_tenants(marker, self.page_size)
+
+        def repair_page(tenants):
+            if not tenants:
+                return
+            d = defer.succeed(None)
+            for tenant_id in tenants:
+                d.addCallback(lambda _, tenant_id=tenant_id: self._repair_tenant(tenant_id))
+            return d.addCallback(lambda _: self._repair_after(tenants[-1]))
+
+        return d.addCallback(repair_page)
+
+    def _repair_tenant(self, tenant_id):
+        """
+        Repair the counts of `tenant_id`, logging a failure
+        """
+        log = self.log.bind(tenant_id=tenant_id)
+        d = self.store.repair_counts(log, tenant_id)
+        return d.addErrback(log.err, 'Could not repair counts of tenant')
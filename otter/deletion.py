@@ -0,0 +1,143 @@
+"""
+Deleting servers from a durable queue, so that a scale down finishes quickly and
+the servers it evicted are still deleted if otter restarts meanwhile.
+"""
+
+import sys
+from datetime import datetime
+from functools import partial
+
+from twisted.application.internet import TimerService
+
+from otter.log import audit, log as otter_log
+from otter.util.deferredutils import FairLimiter
+
+
+class DeletionService(TimerService):
+    """
+    Service that periodically claims queued server deletions from an
+    :class:`otter.models.interface.IServerDeletionQueue` and deletes the servers
+    through the supervisor. A deletion is removed from the queue only after its
+    server is deleted, so a deletion that fails, or that was claimed by a node that
+    stopped, is claimed again after its lease expires.
+    """
+
+    def __init__(self, store, supervisor, interval, batchsize=100, lease=600,
+                 limiter=None, lb_limit=None, clock=None):
+        """
+        :param store: an `IServerDeletionQueue` that is also an
+            `IScalingGroupCollection`
+        :param supervisor: an `ISupervisor` provider deleting the servers
+        :param int interval: seconds between each claim of deletions
+        :param int batchsize: maximum number of deletions in progress at a time
+        :param int lease: seconds for which deletions are claimed. It must be longer
+            than deleting a batch of servers
+        :param limiter: Optional :class:`otter.util.deferredutils.FairLimiter`
+            through which the deletions are run, keyed by tenant ID
+        :param int lb_limit: If given, maximum number of deletions removing nodes
+            from the same load balancer at a time
+        :param clock: An instance of IReactorTime provider that defaults to reactor
+            if not provided
+        """
+        TimerService.__init__(self, interval, self.claim_deletions)
+        self.store = store
+        self.supervisor = supervisor
+        self.batchsize = batchsize
+        self.lease = lease
+        self.limiter = limiter
+        self.lb_limiter = None
+        if lb_limit:
+            # load balancers are taken in order while holding the previous ones, so
+            # only the number per load balancer is bounded to not deadlock
+            self.lb_limiter = FairLimiter(sys.maxint, key_limit=lb_limit, clock=clock)
+        self.clock = clock
+        # (tenant ID, server ID) of deletions in progress
+        self.in_progress = set()
+        self.log = otter_log.bind(system='otter.deletion')
+
+    def claim_deletions(self):
+        """
+        Claim as many deletions as there is room for and start them
+
+        :return: Deferred that fires with None after deletions are claimed
+        """
+        size = self.batchsize - len(self.in_progress)
+        if size <= 0:
+            return
+        d = self.store.claim_server_deletions(datetime.utcnow(), size, self.lease)
+        d.addCallback(self._start_deletions)
+        d.addErrback(self.log.err, 'Could not claim server deletions')
+        return d
+
+    def _start_deletions(self, deletions):
+        """
+        Start deleting servers of claimed `deletions` that are not already being
+        deleted
+        """
+        for deletion in deletions:
+            key = (deletion['tenantId'], deletion['serverId'])
+            if key in self.in_progress:
+                continue
+            self.in_progress.add(key)
+            d = self._run_limited(deletion, partial(self._delete, deletion))
+            d.addBoth(self._finished, key)
+            self.supervisor.deferred_pool.add(d)
+
+    def _run_limited(self, deletion, f):
+        """
+        Call `f` within the bounds of deletions per tenant and per load balancer
+        """
+        lb_ids = sorted(set(str(lb_id) for lb_id, _ in deletion['server'].get('lb_info') or []))
+        if self.lb_limiter is not None:
+            for lb_id in reversed(lb_ids):
+                f = partial(self.lb_limiter.run, lb_id, f)
+        if self.limiter is not None:
+            return self.limiter.run(deletion['tenantId'], f)
+        return f()
+
+    def _delete(self, deletion):
+        """
+        Delete the server of `deletion` and remove it from the queue
+        """
+        log = self.log.bind(tenant_id=deletion['tenantId'],
+                            scaling_group_id=deletion['groupId'],
+                            server_id=deletion['serverId'],
+                            transaction_id=deletion['transactionId'])
+        group = self.store.get_scaling_group(log, deletion['tenantId'],
+                                             deletion['groupId'])
+        log.msg('Started server deletion job')
+        d = self.supervisor.execute_delete_server(
+            log, deletion['transactionId'], group, deletion['server'])
+        d.addCallback(lambda _: self.store.delete_server_deletions([deletion]))
+        d.addCallback(lambda _: audit(log).msg('Server deleted.',
+                                               event_type="server.delete"))
+        # Logging this as err since failing to delete a server will cost money to
+        # customers. It is tried again once its claim expires
+        d.addErrback(log.err, 'Server deletion job failed')
+        return d
+
+    def _finished(self, result, key):
+        """
+        Deletion of `key` is no longer in progress
+        """
+        self.in_progress.discard(key)
+        return result
+
+
+_deletion_queue = None
+
+
+def get_deletion_queue():
+    """
+    Get the current server deletion queue, or None if servers are deleted without
+    a queue.
+    """
+    return _deletion_queue
+
+
+def set_deletion_queue(deletion_queue):
+    """
+    Set the current server deletion queue.
+    """
+    global _deletion_queue
+    _deletion_queue = deletion_queue
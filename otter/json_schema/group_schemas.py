@@ -220,6 +220,16 @@ config = {
             "maximum": MAX_ENTITIES,
             "default": None
         },
+        "warmPoolSize": {
+            "type": "integer",
+            "description": ("Number of standby servers to keep built from the "
+                            "launch config, off the load balancers, so that "
+                            "scaling up can use them instead of waiting for new "
+                            "servers to build.  They do not count towards the "
+                            "capacity of the group.  Defaults to 0."),
+            "minimum": 0,
+            "maximum": MAX_ENTITIES
+        },
         "metadata": metadata
     },
     "additionalProperties": False,
@@ -17,6 +17,8 @@ from otter.json_schema import group_schemas
 group_config = deepcopy(group_schemas.config)
 for property_name in group_config['properties']:
     group_config['properties'][property_name]['required'] = True
+# except for the warm pool, which groups without one need not mention
+group_config['properties']['warmPoolSize']['required'] = False
 
 
 _id = {
@@ -1,6 +1,8 @@
 """
 Cassandra implementation of the store for the front-end scaling groups engine
 """
+import calendar
+import hashlib
 import time
 import itertools
 import uuid
@@ -9,30 +11,47 @@ import functools
 from zope.interface import implementer
 
 from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
 from jsonschema import ValidationError
 from otter.models.interface import (
     GroupState, GroupNotEmptyError, IScalingGroup,
     IScalingGroupCollection, NoSuchScalingGroupError, NoSuchPolicyError,
     NoSuchWebhookError, UnrecognizedCapabilityError,
     IScalingScheduleCollection, IAdmin, ScalingGroupOverLimitError,
-    WebhooksOverLimitError, PoliciesOverLimitError)
+    WebhooksOverLimitError, PoliciesOverLimitError, IServerDeletionQueue)
 from otter.util.cqlbatch import Batch
 from otter.util.hashkey import generate_capability, generate_key_str
 from otter.util import timestamp
 from otter.util.config import config_value
-from otter.util.deferredutils import with_lock, timeout_deferred
+from otter.util.deferredutils import with_lock, timeout_deferred, unwrap_first_error
 from otter.scheduler import next_cron_occurrence
 
 from silverberg.client import ConsistencyLevel
 
 import json
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
+from kazoo.exceptions import BadVersionError, NodeExistsError, NoNodeError
 from kazoo.protocol.states import KazooState
 
 
 LOCK_PATH = '/locks'
 
+# ZooKeeper path under which claims of scheduled events are created
+CLAIM_PATH = '/scheduler_claims'
+
+# Number of due events read for each event to claim, so that events at the start of
+# a bucket that are claimed by others can be skipped
+CLAIM_READ_AHEAD = 4
+
+# ZooKeeper path under which claims of queued server deletions are created
+DELETION_CLAIM_PATH = '/deletion_claims'
+
+# Number of partitions of the queue of server deletions. Changing it would lose the
+# queued deletions whose partition changes
+DELETION_SHARDS = 16
+
 
 def serialize_json_data(data, ver):
     """
@@ -71,11 +90,23 @@ _cql_insert_policy = (
     'INSERT INTO {cf}("tenantId", "groupId", "policyId", data, version) '
     'VALUES (:tenantId, :groupId, :{name}policyId, :{name}data, :{name}version)')
 _cql_insert_group_state = ('INSERT INTO {cf}("tenantId", "groupId", active, pending, "groupTouched", '
-                           '"policyTouched", paused, desired) VALUES(:tenantId, :groupId, :active, '
-                           ':pending, :groupTouched, :policyTouched, :paused, :desired)')
+                           '"policyTouched", paused, desired, standby) VALUES(:tenantId, :groupId, '
+                           ':active, :pending, :groupTouched, :policyTouched, :paused, :desired, '
+                           ':standby)')
 _cql_view_group_state = ('SELECT "tenantId", "groupId", group_config, active, pending, "groupTouched", '
-                         '"policyTouched", paused, desired, created_at FROM {cf} WHERE '
+                         '"policyTouched", paused, desired, standby, created_at FROM {cf} WHERE '
                          '"tenantId" = :tenantId AND "groupId" = :groupId;')
+_cql_view_execution_bundle = ('SELECT "tenantId", "groupId", group_config, launch_config, active, '
+                              'pending, "groupTouched", "policyTouched", paused, desired, standby, '
+                              'created_at, WRITETIME(group_config), WRITETIME(launch_config) '
+                              'FROM {cf} WHERE "tenantId" = :tenantId AND "groupId" = :groupId;')
+_cql_view_execution_state = ('SELECT "tenantId", "groupId", active, pending, "groupTouched", '
+                             '"policyTouched", paused, desired, standby, created_at, '
+                             'WRITETIME(group_config), WRITETIME(launch_config) '
+                             'FROM {cf} WHERE "tenantId" = :tenantId AND "groupId" = :groupId;')
+_cql_view_configs = ('SELECT group_config, launch_config, created_at, WRITETIME(group_config), '
+                     'WRITETIME(launch_config) FROM {cf} WHERE "tenantId" = :tenantId AND '
+                     '"groupId" = :groupId;')
 
 # --- Event related queries
 _cql_insert_group_event = (
@@ -95,6 +126,81 @@ _cql_fetch_batch_of_events = (
 _cql_delete_bucket_event = ('DELETE FROM {cf} WHERE bucket = :bucket '
                             'AND trigger = :{name}trigger AND "policyId" = :{name}policyId;')
 _cql_oldest_event = 'SELECT * from {cf} WHERE bucket=:bucket LIMIT 1;'
+_cql_oldest_event_after = (
+    'SELECT * from {cf} WHERE bucket=:bucket AND trigger > :after LIMIT 1;')
+_cql_fetch_events_at_trigger_after = (
+    'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version FROM {cf} '
+    'WHERE bucket = :bucket AND trigger = :trigger AND "policyId" > :policyId '
+    'LIMIT :size;')
+_cql_fetch_due_events_after = (
+    'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version FROM {cf} '
+    'WHERE bucket = :bucket AND trigger > :trigger AND trigger <= :now LIMIT :size;')
+_cql_fetch_bucket_events = (
+    'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version FROM {cf} '
+    'WHERE bucket = :bucket LIMIT :size;')
+
+# --- Time sharded event related queries
+_cql_insert_sharded_group_event = (
+    'INSERT INTO {cf}(bucket, shard, "tenantId", "groupId", "policyId", trigger, version) '
+    'VALUES (:{name}bucket, :{name}shard, :tenantId, :groupId, :{name}policyId, '
+    ':{name}trigger, :{name}version)')
+_cql_insert_sharded_group_event_with_cron = (
+    'INSERT INTO {cf}(bucket, shard, "tenantId", "groupId", "policyId", trigger, cron, '
+    'version) '
+    'VALUES (:{name}bucket, :{name}shard, :tenantId, :groupId, :{name}policyId, '
+    ':{name}trigger, :{name}cron, :{name}version)')
+_cql_insert_sharded_cron_event = (
+    'INSERT INTO {cf}(bucket, shard, "tenantId", "groupId", "policyId", trigger, cron, '
+    'version) '
+    'VALUES (:{name}bucket, :{name}shard, :{name}tenantId, :{name}groupId, '
+    ':{name}policyId, :{name}trigger, :{name}cron, :{name}version);')
+_cql_fetch_batch_of_sharded_events = (
+    'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version FROM {cf} '
+    'WHERE bucket = :bucket AND shard = :shard AND trigger <= :now LIMIT :size;')
+_cql_fetch_shard_events = (
+    'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version FROM {cf} '
+    'WHERE bucket = :bucket AND shard = :shard LIMIT :size;')
+_cql_delete_sharded_bucket_event = (
+    'DELETE FROM {cf} WHERE bucket = :bucket AND shard = :{name}shard '
+    'AND trigger = :{name}trigger AND "policyId" = :{name}policyId;')
+_cql_oldest_sharded_event = (
+    'SELECT * from {cf} WHERE bucket=:bucket AND shard=:shard LIMIT 1;')
+_cql_oldest_sharded_event_after = (
+    'SELECT * from {cf} WHERE bucket=:bucket AND shard=:shard AND trigger > :after '
+    'LIMIT 1;')
+_cql_fetch_sharded_events_at_trigger_after = (
+    'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version FROM {cf} '
+    'WHERE bucket = :bucket AND shard = :shard AND trigger = :trigger '
+    'AND "policyId" > :policyId LIMIT :size;')
+_cql_fetch_sharded_due_events_after = (
+    'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version FROM {cf} '
+    'WHERE bucket = :bucket AND shard = :shard AND trigger > :trigger '
+    'AND trigger <= :now LIMIT :size;')
+_cql_insert_event_shard = (
+    'INSERT INTO {cf}(bucket, shard) VALUES (:{name}bucket, :{name}shard);')
+_cql_list_event_shards = 'SELECT shard FROM {cf} WHERE bucket = :bucket;'
+_cql_list_event_shards_until = (
+    'SELECT shard FROM {cf} WHERE bucket = :bucket AND shard <= :until;')
+_cql_delete_event_shard = 'DELETE FROM {cf} WHERE bucket = :bucket AND shard = :shard;'
+
+# --- Server deletion queue related queries
+_cql_insert_server_deletion = (
+    'INSERT INTO {cf}(shard, "tenantId", "serverId", "groupId", "transactionId", server, '
+    'created) VALUES (:{name}shard, :tenantId, :{name}serverId, :groupId, :transactionId, '
+    ':{name}server, :created)')
+_cql_fetch_server_deletions = (
+    'SELECT "tenantId", "serverId", "groupId", "transactionId", server FROM {cf} '
+    'WHERE shard = :shard LIMIT :size;')
+_cql_fetch_server_deletions_of_tenant_after = (
+    'SELECT "tenantId", "serverId", "groupId", "transactionId", server FROM {cf} '
+    'WHERE shard = :shard AND "tenantId" = :tenantId AND "serverId" > :serverId '
+    'LIMIT :size;')
+_cql_fetch_server_deletions_after = (
+    'SELECT "tenantId", "serverId", "groupId", "transactionId", server FROM {cf} '
+    'WHERE shard = :shard AND "tenantId" > :tenantId LIMIT :size;')
+_cql_delete_server_deletion = ('DELETE FROM {cf} WHERE shard = :{name}shard '
+                               'AND "tenantId" = :{name}tenantId '
+                               'AND "serverId" = :{name}serverId;')
 
 _cql_insert_webhook = (
     'INSERT INTO {cf}("tenantId", "groupId", "policyId", "webhookId", data, capability, '
@@ -112,7 +218,7 @@ _cql_delete_one_webhook = ('DELETE FROM {cf} WHERE "tenantId" = :tenantId AND '
                            '"groupId" = :groupId AND "policyId" = :policyId AND '
                            '"webhookId" = :webhookId')
 _cql_list_states = ('SELECT "tenantId", "groupId", group_config, active, pending, "groupTouched", '
-                    '"policyTouched", paused, desired, created_at FROM {cf} WHERE '
+                    '"policyTouched", paused, desired, standby, created_at FROM {cf} WHERE '
                     '"tenantId" = :tenantId;')
 _cql_list_policy = ('SELECT "policyId", data FROM {cf} WHERE '
                     '"tenantId" = :tenantId AND "groupId" = :groupId;')
@@ -122,8 +228,18 @@ _cql_list_webhook = ('SELECT "webhookId", data, capability FROM {cf} '
 _cql_list_all_in_group = ('SELECT * FROM {cf} WHERE "tenantId" = :tenantId '
                           'AND "groupId" = :groupId {order_by};')
 
-_cql_find_webhook_token = ('SELECT "tenantId", "groupId", "policyId" FROM {cf} WHERE '
-                           '"webhookKey" = :webhookKey;')
+_cql_find_webhook_token = ('SELECT "tenantId", "groupId", "policyId", "webhookId" FROM {cf} '
+                           'WHERE "webhookKey" = :webhookKey;')
+_cql_list_webhook_keys_in_group = ('SELECT "webhookKey" FROM {cf} WHERE "tenantId" = :tenantId '
+                                   'AND "groupId" = :groupId;')
+_cql_list_webhook_keys_in_policy = ('SELECT "webhookKey" FROM {cf} WHERE "tenantId" = :tenantId '
+                                    'AND "groupId" = :groupId AND "policyId" = :policyId;')
+_cql_insert_webhook_key = (
+    'INSERT INTO {cf}("webhookKey", "tenantId", "groupId", "policyId", "webhookId") '
+    'VALUES (:{name}Key, :tenantId, :groupId, :policyId, :{name}Id)')
+_cql_view_webhook_key = ('SELECT "tenantId", "groupId", "policyId" FROM {cf} WHERE '
+                         '"webhookKey" = :webhookKey;')
+_cql_delete_webhook_key = 'DELETE FROM {cf} WHERE "webhookKey" = :{name}Key'
 
 _cql_count_for_tenant = ('SELECT COUNT(*) FROM {cf} WHERE "tenantId" = :tenantId;')
 _cql_count_for_policy = ('SELECT COUNT(*) FROM {cf} WHERE '
@@ -133,6 +249,20 @@ _cql_count_for_group = ('SELECT COUNT(*) FROM {cf} WHERE "tenantId" = :tenantId
                         'AND "groupId" = :groupId;')
 _cql_count_all = ('SELECT COUNT(*) FROM {cf};')
 
+_cql_add_count = ('UPDATE {cf} SET {column} = {column} + :{name} WHERE "tenantId" = :tenantId '
+                  'AND "groupId" = :{name}groupId AND "policyId" = :{name}policyId')
+_cql_add_total = ('UPDATE {cf} SET {column} = {column} + :{name} WHERE "tenantId" = \'\' '
+                  'AND "groupId" = \'\' AND "policyId" = \'\'')
+_cql_view_counts = ('SELECT groups, policies, webhooks FROM {cf} WHERE "tenantId" = :tenantId '
+                    'AND "groupId" = :groupId AND "policyId" = :policyId;')
+_cql_list_counts = ('SELECT "groupId", "policyId", groups, policies, webhooks FROM {cf} '
+                    'WHERE "tenantId" = :tenantId;')
+_cql_list_group_ids = 'SELECT "groupId", created_at FROM {cf} WHERE "tenantId" = :tenantId;'
+_cql_list_policy_ids = 'SELECT "groupId", "policyId" FROM {cf} WHERE "tenantId" = :tenantId;'
+_cql_list_tenants = 'SELECT "tenantId" FROM {cf} LIMIT :limit;'
+_cql_list_tenants_after = ('SELECT "tenantId" FROM {cf} WHERE token("tenantId") > '
+                           'token(:tenantId) LIMIT :limit;')
+
 # seems to be pretty quick no matter the consistency - unfortunately this only checks
 # connectability to cassandra, and not whether the otter keyspace is correct, etc.
 _cql_health_check = ('SELECT now() FROM system.local;')
@@ -204,7 +334,11 @@ def _paginated_list(tenant_id, group_id=None, policy_id=None, limit=100,
 # Store consistency levels
 _consistency_levels = {'event': {'fetch': ConsistencyLevel.QUORUM,
                                  'insert': ConsistencyLevel.ONE,
-                                 'delete': ConsistencyLevel.QUORUM},
+                                 'delete': ConsistencyLevel.QUORUM,
+                                 'move': ConsistencyLevel.QUORUM},
+                       'deletion': {'insert': ConsistencyLevel.QUORUM,
+                                    'fetch': ConsistencyLevel.QUORUM,
+                                    'delete': ConsistencyLevel.QUORUM},
                        'group': {'create': ConsistencyLevel.QUORUM},
                        'state': {'update': ConsistencyLevel.QUORUM}}
 
@@ -233,7 +367,322 @@ def get_consistency_level(operation, resource):
         return ConsistencyLevel.ONE
 
 
-def _build_policies(policies, policies_table, event_table, queries, data, buckets):
+class CapabilityCache(object):
+    """
+    Remembers the tenant, group and policy of up to `size` recently executed
+    webhooks by their capability hash, for `ttl` seconds each, so that executing
+    a webhook again does not read Cassandra. The least recently used hash is
+    dropped when more than `size` are cached.
+
+    Deleting a webhook, policy or group invalidates their hashes here, but not in
+    the caches of other nodes, which forget them within `ttl` seconds. Executing
+    the webhook of a deleted policy or group on another node meanwhile fails since
+    the policy is read, but a deleted webhook of an existing policy keeps
+    executing it there for up to `ttl` seconds. That revocation latency is capped
+    at `MAX_TTL` seconds, and the cache is only used if configured.
+    """
+
+    MAX_TTL = 60
+
+    def __init__(self, size=10000, ttl=60, clock=None):
+        """
+        :param float ttl: seconds hashes are kept for, at most `MAX_TTL`
+        :param clock: An instance of IReactorTime provider that defaults to reactor
+            if not provided
+        """
+        self.size = size
+        self.ttl = min(ttl, self.MAX_TTL)
+        self.clock = clock or reactor
+        # capability hash -> (time cached, (tenant ID, group ID, policy ID))
+        self._hashes = OrderedDict()
+
+    def get(self, capability_hash):
+        """
+        :return: (tenant ID, group ID, policy ID) of the webhook with
+            `capability_hash`, or None if it is not cached
+        """
+        entry = self._hashes.pop(capability_hash, None)
+        if entry is None:
+            return None
+        cached, info = entry
+        if self.clock.seconds() - cached > self.ttl:
+            return None
+        self._hashes[capability_hash] = entry
+        return info
+
+    def set(self, capability_hash, info):
+        """
+        Remember `info`, the (tenant ID, group ID, policy ID) of the webhook with
+        `capability_hash`
+        """
+        self._hashes.pop(capability_hash, None)
+        self._hashes[capability_hash] = (self.clock.seconds(), info)
+        while len(self._hashes) > self.size:
+            self._hashes.popitem(last=False)
+
+    def invalidate(self, capability_hashes):
+        """
+        Forget the webhooks with `capability_hashes`
+        """
+        for capability_hash in capability_hashes:
+            self._hashes.pop(capability_hash, None)
+
+    def __len__(self):
+        """
+        :return: number of cached hashes, including the expired ones not yet dropped
+        """
+        return len(self._hashes)
+
+
+class ConfigCache(object):
+    """
+    Remembers the group configs, launch configs and policies of up to `size`
+    recently read groups and policies, for `ttl` seconds each, so that reading
+    them again does not read Cassandra. The least recently used entry is dropped
+    when more than `size` are cached.
+
+    Changing a group or policy through :class:`CachingScalingGroup` invalidates
+    its entries here, but not in the caches of other nodes: they read the change
+    within `ttl` seconds, or as soon as they execute a policy of the group. An
+    execution reads the write times of the configs along with the state, and
+    uses the configs cached here only if they were cached with those write times.
+    A policy is cached along with its version, and read again if another version
+    is asked for.
+
+    :ivar int hits: number of reads answered from the cache
+    :ivar int misses: number of reads that were not
+    :ivar int generation: changed by every invalidation, so that values read
+        before it are not cached
+    """
+
+    def __init__(self, size=10000, ttl=30, clock=None):
+        """
+        :param clock: An instance of IReactorTime provider that defaults to reactor
+            if not provided
+        """
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock or reactor
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        # (tenant ID, group ID, kind, policy ID) -> (time cached, version, JSON)
+        self._entries = OrderedDict()
+
+    def get(self, key, version=None):
+        """
+        :return: a copy of the value cached for `key`, or None if it is not
+            cached, has expired or is not of `version` if given
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            cached, cached_version, data = entry
+            if (self.clock.seconds() - cached <= self.ttl and
+                    (version is None or version == cached_version)):
+                self._entries[key] = entry
+                self.hits += 1
+                return json.loads(data)
+        self.misses += 1
+        return None
+
+    def set(self, key, value, version=None, generation=None):
+        """
+        Remember `value` for `key`, unless entries were invalidated since
+        `generation`, when it was read
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (self.clock.seconds(), version, json.dumps(value))
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Forget the value of `key`
+        """
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def invalidate_group(self, tenant_id, group_id):
+        """
+        Forget the configs and policies of a group
+        """
+        self.generation += 1
+        for key in [key for key in self._entries if key[:2] == (tenant_id, group_id)]:
+            del self._entries[key]
+
+    def get_metrics(self):
+        """
+        Return the hits, misses and number of entries in the format of
+        :meth:`otter.models.interface.IAdmin.get_metrics`
+        """
+        now = int(self.clock.seconds())
+        values = {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+        return [{'id': 'otter.metrics.config_cache.' + key, 'value': value, 'time': now}
+                for key, value in sorted(values.iteritems())]
+
+    def __contains__(self, key):
+        """
+        :return: True if a value of any version that has not expired is cached
+            for `key`. Neither a hit nor a miss is counted.
+        """
+        entry = self._entries.get(key)
+        return entry is not None and self.clock.seconds() - entry[0] <= self.ttl
+
+    def __len__(self):
+        """
+        :return: number of cached entries, including the expired ones not yet dropped
+        """
+        return len(self._entries)
+
+
+class ResourceCounts(object):
+    """
+    Counts of the groups, policies and webhooks of tenants, of the policies of
+    groups and of the webhooks of policies, kept in a counter table by the
+    operations creating and deleting them. Limits can then be checked by reading
+    one row instead of counting the rows of a tenant, group or policy.
+
+    A count is updated after the change it counts, and counter updates are not
+    idempotent, so counts can drift from the rows they count.
+    :meth:`CassScalingGroupCollection.repair_counts` counts the rows again and
+    corrects them.
+
+    The counts of a tenant are in the row with empty group and policy IDs, the
+    count of the policies of a group in the row with its group ID and an empty
+    policy ID, and the count of the webhooks of a policy in its row. The totals
+    of all tenants are in the row with empty tenant, group and policy IDs, which
+    is changed along with the counts of a tenant.
+
+    :ivar bool limits: Whether limits are checked against these counts instead
+        of counting rows
+    """
+
+    def __init__(self, limits=False, table='resource_counts'):
+        self.limits = limits
+        self.table = table
+
+    def view(self, connection, tenant_id, group_id='', policy_id=''):
+        """
+        :return: Deferred firing with ``dict`` of the ``groups``, ``policies``
+            and ``webhooks`` counts of the tenant, or of the group or policy if
+            given, or the totals of all tenants if `tenant_id` is empty. Missing
+            counts are 0
+        """
+        d = connection.execute(_cql_view_counts.format(cf=self.table),
+                               {'tenantId': tenant_id, 'groupId': group_id,
+                                'policyId': policy_id},
+                               get_consistency_level('view', 'count'))
+        return d.addCallback(
+            lambda rows: {column: (rows[0][column] if rows else None) or 0
+                          for column in ('groups', 'policies', 'webhooks')})
+
+    def add(self, connection, log, tenant_id, changes):
+        """
+        Add `changes` to the counts of `tenant_id`.
+
+        :param changes: ``list`` of (group ID, policy ID, column, number to add).
+            Empty group and policy IDs are the counts of the tenant, or of the
+            group.
+        :return: Deferred firing with None once added. A failure is logged and
+            not propagated since the counted change is already done
+        """
+        queries, data = [], {'tenantId': tenant_id}
+        for i, (group_id, policy_id, column, number) in enumerate(changes):
+            if not number:
+                continue
+            name = 'count{0}'.format(i)
+            queries.append(_cql_add_count.format(cf=self.table, name=name, column=column))
+            if not group_id and not policy_id:
+                queries.append(_cql_add_total.format(cf=self.table, name=name,
+                                                     column=column))
+            data[name] = number
+            data[name + 'groupId'] = group_id
+            data[name + 'policyId'] = policy_id
+        if not queries:
+            return defer.succeed(None)
+        b = Batch(queries, data, get_consistency_level('update', 'count'), counter=True)
+        d = b.execute(connection)
+        d.addCallback(lambda _: None)
+        return d.addErrback(log.err, 'Could not update resource counts')
+
+    def remove(self, connection, log, tenant_id, group_id, policy_id=None):
+        """
+        Remove the counts of group `group_id`, and of its policies, or only the
+        counts of its policy `policy_id` if given
+
+        :return: Deferred firing with None once removed. A failure is logged and
+            not propagated
+        """
+        params = {'tenantId': tenant_id, 'groupId': group_id}
+        if policy_id is None:
+            query = _cql_delete_all_in_group.format(cf=self.table, name='')
+        else:
+            query = _cql_delete_all_in_policy.format(cf=self.table)
+            params['policyId'] = policy_id
+        d = connection.execute(query, params, get_consistency_level('delete', 'count'))
+        d.addCallback(lambda _: None)
+        return d.addErrback(log.err, 'Could not remove resource counts')
+
+
+def _count_for_limit(connection, resource_counts, column, query, params, consistency):
+    """
+    Count the rows of the tenant, group or policy in `params` with `query`, or
+    read their `column` count in `resource_counts` if limits are checked against
+    them
+
+    :return: Deferred firing with the count
+    """
+    if resource_counts is not None and resource_counts.limits:
+        d = resource_counts.view(connection, params['tenantId'],
+                                 params.get('groupId', ''), params.get('policyId', ''))
+        return d.addCallback(lambda counts: counts[column])
+    d = connection.execute(query, params, consistency)
+    return d.addCallback(lambda rows: rows[0]['count'])
+
+
+class EventShards(object):
+    """
+    Time shards of the scheduled events. When events are sharded, each bucket is
+    split in partitions of `interval` seconds of trigger time, so that fetching
+    due events does not read through the tombstones of all the events ever executed
+    from the bucket. Shards that may have events are recorded in `table`, and
+    shards in the past are dropped from it once they are drained.
+    """
+
+    def __init__(self, interval, table='scaling_schedule_shards'):
+        """
+        :param int interval: Length of a shard in seconds
+        :param str table: Table recording the shards of each bucket
+        """
+        self.interval = interval
+        self.table = table
+
+    def shard(self, trigger):
+        """
+        Return start time of the shard containing `trigger` as naive UTC `datetime`
+        """
+        seconds = calendar.timegm(trigger.utctimetuple())
+        return datetime.utcfromtimestamp(seconds - seconds % self.interval)
+
+    def is_past(self, shard, now):
+        """
+        Is the whole `shard` before `now`? No events are due to be added to it then
+        """
+        return shard + timedelta(seconds=self.interval) <= now
+
+    def add(self, queries, data, name, trigger):
+        """
+        Set shard of event named `name` with `trigger` in `data` and record the shard.
+        The event's bucket must be in `data` too.
+        """
+        data[name + 'shard'] = self.shard(trigger)
+        queries.append(_cql_insert_event_shard.format(cf=self.table, name=name))
+
+
+def _build_policies(policies, policies_table, event_table, queries, data, buckets,
+                    event_shards=None):
     """
     Because inserting many values into a table with compound keys with one
     insert statement is hard. This builds a bunch of insert statements and a
@@ -252,6 +701,8 @@ def _build_policies(policies, policies_table, event_table, queries, data, bucket
         addition to the query to execute the query
     :type data: ``dict``
 
+    :param event_shards: :class:`EventShards` if events are time sharded
+
     :returns: a ``list`` of the created policies along with their generated IDs
     """
     outpolicies = []
@@ -260,8 +711,7 @@ def _build_policies(policies, policies_table, event_table, queries, data, bucket
         for i, policy in enumerate(policies):
             polname = "policy{}".format(i)
             polId = generate_key_str('policy')
-            queries.append(_cql_insert_policy.format(cf=policies_table,
-                                                     name=polname))
+            queries.append(_cql_insert_policy.format(cf=policies_table, name=polname))
 
             data[polname + 'data'] = serialize_json_data(policy, 1)
             data[polname + 'policyId'] = polId
@@ -269,7 +719,7 @@ def _build_policies(policies, policies_table, event_table, queries, data, bucket
 
             if policy.get("type") == 'schedule':
                 _build_schedule_policy(policy, event_table, queries,
-                                       data, polname, buckets)
+                                       data, polname, buckets, event_shards)
 
             outpolicies.append(policy.copy())
             outpolicies[-1]['id'] = polId
@@ -277,24 +727,52 @@ def _build_policies(policies, policies_table, event_table, queries, data, bucket
     return outpolicies
 
 
-def _build_schedule_policy(policy, event_table, queries, data, polname, buckets):
+def _build_schedule_policy(policy, event_table, queries, data, polname, buckets,
+                           event_shards=None):
     """
-    Build schedule-type policy
+    Build schedule-type policy, in time sharded event table if `event_shards` is given
     """
     data[polname + 'bucket'] = buckets.next()
     if 'at' in policy["args"]:
-        queries.append(_cql_insert_group_event.format(cf=event_table, name=polname))
+        insert = (_cql_insert_group_event if event_shards is None
+                  else _cql_insert_sharded_group_event)
+        queries.append(insert.format(cf=event_table, name=polname))
         at_time = timestamp.from_timestamp(policy["args"]["at"])
         data[polname + "trigger"] = at_time
     elif 'cron' in policy["args"]:
-        queries.append(
-            _cql_insert_group_event_with_cron.format(cf=event_table, name=polname))
+        insert = (_cql_insert_group_event_with_cron if event_shards is None
+                  else _cql_insert_sharded_group_event_with_cron)
+        queries.append(insert.format(cf=event_table, name=polname))
         cron = policy["args"]["cron"]
         data[polname + "trigger"] = next_cron_occurrence(cron)
         data[polname + 'cron'] = cron
+    else:
+        return
+    if event_shards is not None:
+        event_shards.add(queries, data, polname, data[polname + 'trigger'])
+
+
+def _deletion_shard(tenant_id, server_id):
+    """
+    Return shard of the queue of server deletions that the deletion of server
+    `server_id` of tenant `tenant_id` is in
+    """
+    return int(hashlib.md5('{}/{}'.format(tenant_id, server_id)).hexdigest(), 16) % DELETION_SHARDS
 
 
-def _build_webhooks(bare_webhooks, webhooks_table, queries, cql_parameters):
+def _notify_events(result, listener, data, names):
+    """
+    Call `listener`, if any, with list of (bucket, trigger) of the events named
+    `names` that were inserted with `data` and return `result`
+    """
+    events = [(data[name + 'bucket'], data[name + 'trigger'])
+              for name in names if name + 'trigger' in data]
+    if listener is not None and events:
+        listener(events)
+    return result
+
+
+def _build_webhooks(bare_webhooks, webhooks_table, keys_table, queries, cql_parameters):
     """
     Because inserting many values into a table with compound keys with one
     insert statement is hard. This builds a bunch of insert statements and a
@@ -307,6 +785,9 @@ def _build_webhooks(bare_webhooks, webhooks_table, queries, cql_parameters):
     :param webhooks_table: the name of the webhooks table
     :type webhooks_table: ``str``
 
+    :param keys_table: the name of the table of webhooks by capability hash
+    :type keys_table: ``str``
+
     :param queries: a list of existing CQL queries to add to
     :type queries: ``list`` of ``str``
 
@@ -321,8 +802,8 @@ def _build_webhooks(bare_webhooks, webhooks_table, queries, cql_parameters):
     for i, webhook in enumerate(bare_webhooks):
         name = "webhook{0}".format(i)
         webhook_id = generate_key_str('webhook')
-        queries.append(_cql_insert_webhook.format(cf=webhooks_table,
-                                                  name=name))
+        queries.append(_cql_insert_webhook.format(cf=webhooks_table, name=name))
+        queries.append(_cql_insert_webhook_key.format(cf=keys_table, name=name))
 
         # generate the real data that will be stored, which includes the webhook
         # token, the capability stuff, and metadata by default
@@ -341,6 +822,18 @@ def _build_webhooks(bare_webhooks, webhooks_table, queries, cql_parameters):
     return output
 
 
+def _build_webhook_key_deletes(capability_hashes, keys_table, queries, cql_parameters):
+    """
+    Build the statements deleting the webhooks with `capability_hashes` from
+    the table of webhooks by capability hash, adding them to `queries` and
+    their parameters to `cql_parameters`
+    """
+    for i, capability_hash in enumerate(capability_hashes):
+        name = "key{0}".format(i)
+        queries.append(_cql_delete_webhook_key.format(cf=keys_table, name=name))
+        cql_parameters['{0}Key'.format(name)] = capability_hash
+
+
 def _assemble_webhook_from_row(row, include_id=False):
     """
     Builds a webhook as per :data:`otter.json_schema.model_schemas.webhook`
@@ -379,20 +872,30 @@ def _jsonloads_data(raw_data):
     return data
 
 
-def _unmarshal_state(state_dict):
+def _unmarshal_state(state_dict, name=None):
     desired_capacity = state_dict['desired']
     if desired_capacity is None:
         desired_capacity = 0
 
+    # groups that never had a warm pool have no standby column
+    standby = {'servers': {}, 'pending': {}}
+    if state_dict.get('standby') is not None:
+        standby = _jsonloads_data(state_dict['standby'])
+
+    # the name is given when the group config was not read along with the state
+    if name is None:
+        name = _jsonloads_data(state_dict["group_config"])["name"]
+
     return GroupState(
-        state_dict["tenantId"], state_dict["groupId"],
-        _jsonloads_data(state_dict["group_config"])["name"],
+        state_dict["tenantId"], state_dict["groupId"], name,
         _jsonloads_data(state_dict["active"]),
         _jsonloads_data(state_dict["pending"]),
         state_dict["groupTouched"],
         _jsonloads_data(state_dict["policyTouched"]),
         bool(ord(state_dict["paused"])),
-        desired=desired_capacity
+        desired=desired_capacity,
+        standby=standby['servers'],
+        standby_pending=standby['pending']
     )
 
 
@@ -477,9 +980,19 @@ class CassScalingGroup(object):
     Also, because deletes are done as tombstones rather than actually deleting,
     deletes are also updates and hence a read must be performed before deletes.
     """
-    def __init__(self, log, tenant_id, uuid, connection, buckets, kz_client):
+    def __init__(self, log, tenant_id, uuid, connection, buckets, kz_client,
+                 event_shards=None, capability_cache=None, resource_counts=None,
+                 event_listener=None):
         """
         Creates a CassScalingGroup object.
+
+        :param event_shards: :class:`EventShards` if events are time sharded
+        :param capability_cache: :class:`CapabilityCache` in which the hashes of
+            deleted webhooks are invalidated, if any
+        :param resource_counts: :class:`ResourceCounts` if groups, policies and
+            webhooks are counted
+        :param event_listener: Callable called with list of (bucket, trigger) of
+            the scheduled events added by this group, if any
         """
         self.log = log.bind(system=self.__class__.__name__,
                             tenant_id=tenant_id,
@@ -494,7 +1007,13 @@ class CassScalingGroup(object):
         self.policies_table = "scaling_policies"
         self.state_table = "group_state"
         self.webhooks_table = "policy_webhooks"
-        self.event_table = "scaling_schedule_v2"
+        self.webhook_keys_table = "webhook_keys"
+        self.capability_cache = capability_cache
+        self.resource_counts = resource_counts
+        self.event_shards = event_shards
+        self.event_listener = event_listener
+        self.event_table = ("scaling_schedule_v2" if event_shards is None
+                            else "scaling_schedule_v3")
 
     def view_manifest(self, with_webhooks=False):
         """
@@ -583,9 +1102,82 @@ class CassScalingGroup(object):
 
         return d.addCallback(_unmarshal_state)
 
-    def modify_state(self, modifier_callable, *args, **kwargs):
+    def view_execution_bundle(self, policy_id, version=None, consistency=None):
         """
-        see :meth:`otter.models.interface.IScalingGroup.modify_state`
+        see :meth:`otter.models.interface.IScalingGroup.view_execution_bundle`
+
+        The state and both configs are read from the group's row in one query,
+        along with the policy.
+        """
+        if consistency is None:
+            consistency = get_consistency_level('view', 'partial')
+
+        d = self._view_execution_bundle(policy_id, version, consistency)
+        return d.addCallback(lambda bundle: bundle[:4])
+
+    def _view_execution_bundle(self, policy_id, version, consistency, cached_configs=None):
+        """
+        Read the execution bundle of `policy_id`, along with the write times of
+        the group config and launch config.
+
+        :param cached_configs: callable taking the write times of the group config
+            and launch config, and returning the configs cached with those write
+            times, or None if they are not cached. If given, the state is read
+            without the configs, which are read on their own only when it returns
+            None.
+
+        :return: Deferred that fires with the state, group config, launch config,
+            policy and the write times of both configs
+        """
+        if cached_configs is None:
+            query = _cql_view_execution_bundle
+        else:
+            query = _cql_view_execution_state
+        del_query = _cql_delete_all_in_group.format(cf=self.group_table, name='')
+
+        def _view(query):
+            return verified_view(self.connection, query.format(cf=self.group_table),
+                                 del_query,
+                                 {"tenantId": self.tenant_id,
+                                  "groupId": self.uuid},
+                                 consistency,
+                                 NoSuchScalingGroupError(self.tenant_id, self.uuid), self.log)
+
+        def _bundle(group, policy, configs):
+            writetimes = (configs['writetime(group_config)'],
+                          configs['writetime(launch_config)'])
+            config = _jsonloads_data(configs['group_config'])
+            launch = _jsonloads_data(configs['launch_config'])
+            return (_unmarshal_state(group, config['name']), config, launch, policy,
+                    writetimes)
+
+        def _assemble(((group_ok, group), (policy_ok, policy))):
+            # a missing group takes precedence over a missing policy
+            if not group_ok:
+                return group
+            if not policy_ok:
+                return policy
+            if cached_configs is None:
+                return _bundle(group, policy, group)
+            writetimes = (group['writetime(group_config)'],
+                          group['writetime(launch_config)'])
+            configs = cached_configs(*writetimes)
+            if configs is None:
+                # only the configs are read again: the state and policy are current
+                d = _view(_cql_view_configs)
+                return d.addCallback(lambda configs: _bundle(group, policy, configs))
+            config, launch = configs
+            return (_unmarshal_state(group, config['name']), config, launch, policy,
+                    writetimes)
+
+        d = defer.DeferredList([_view(query), self.get_policy(policy_id, version)],
+                               consumeErrors=True)
+        return d.addCallback(_assemble)
+
+    def _modify_state(self, read_and_modify):
+        """
+        Call `read_and_modify` with the consistency level to read the state with,
+        while holding the group's lock, and save the state its Deferred fires with
         """
         log = self.log.bind(system='CassScalingGroup.modify_state')
         consistency = get_consistency_level('update', 'state')
@@ -601,14 +1193,15 @@ class CassScalingGroup(object):
                 'paused': new_state.paused,
                 'desired': new_state.desired,
                 'groupTouched': new_state.group_touched,
-                'policyTouched': serialize_json_data(new_state.policy_touched, 1)
+                'policyTouched': serialize_json_data(new_state.policy_touched, 1),
+                'standby': serialize_json_data({'servers': new_state.standby,
+                                                'pending': new_state.standby_pending}, 1)
             }
             return self.connection.execute(_cql_insert_group_state.format(cf=self.group_table),
                                            params, consistency)
 
         def _modify_state():
-            d = self.view_state(consistency)
-            d.addCallback(lambda state: modifier_callable(self, state, *args, **kwargs))
+            d = read_and_modify(consistency)
             return d.addCallback(_write_state)
 
         lock = self.kz_client.Lock(LOCK_PATH + '/' + self.uuid)
@@ -616,6 +1209,28 @@ class CassScalingGroup(object):
         # TODO: Better way to get reactor instead of importing?
         return with_lock(reactor, lock, log.bind(category='locking'), _modify_state)
 
+    def modify_state(self, modifier_callable, *args, **kwargs):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.modify_state`
+        """
+        def _read_and_modify(consistency):
+            d = self.view_state(consistency)
+            return d.addCallback(
+                lambda state: modifier_callable(self, state, *args, **kwargs))
+
+        return self._modify_state(_read_and_modify)
+
+    def modify_state_for_policy(self, modifier_callable, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.modify_state_for_policy`
+        """
+        def _read_and_modify(consistency):
+            d = self.view_execution_bundle(policy_id, version, consistency)
+            return d.addCallback(lambda (state, config, launch, policy): modifier_callable(
+                self, state, config=config, launch=launch, policy=policy))
+
+        return self._modify_state(_read_and_modify)
+
     def update_config(self, data):
         """
         see :meth:`otter.models.interface.IScalingGroup.update_config`
@@ -629,7 +1244,8 @@ class CassScalingGroup(object):
             b = Batch(queries, {"tenantId": self.tenant_id,
                                 "groupId": self.uuid,
                                 "scaling": serialize_json_data(data, 1)},
-                      consistency=get_consistency_level('update', 'partial'))
+                      consistency=get_consistency_level('update', 'partial'),
+                      fixed=True)
             return b.execute(self.connection)
 
         d = self.view_config()
@@ -649,7 +1265,8 @@ class CassScalingGroup(object):
             b = Batch(queries, {"tenantId": self.tenant_id,
                                 "groupId": self.uuid,
                                 "launch": serialize_json_data(data, 1)},
-                      consistency=get_consistency_level('update', 'partial'))
+                      consistency=get_consistency_level('update', 'partial'),
+                      fixed=True)
             d = b.execute(self.connection)
             return d
 
@@ -720,7 +1337,8 @@ class CassScalingGroup(object):
         self.log.bind(policies=data).msg("Creating policies")
 
         def _do_limits_check(lastRev):
-            d = self.connection.execute(
+            d = _count_for_limit(
+                self.connection, self.resource_counts, 'policies',
                 _cql_count_for_group.format(cf=self.policies_table),
                 {"tenantId": self.tenant_id,
                  "groupId": self.uuid},
@@ -729,7 +1347,6 @@ class CassScalingGroup(object):
 
         def _check_limit(curr_policies):
             max_policies = config_value('limits.absolute.maxPoliciesPerGroup')
-            curr_policies = curr_policies[0]['count']
             if curr_policies + len(data) > max_policies:
                 raise PoliciesOverLimitError(
                     curr_policies=curr_policies,
@@ -745,11 +1362,16 @@ class CassScalingGroup(object):
 
             outpolicies = _build_policies(data, self.policies_table,
                                           self.event_table, queries, cqldata,
-                                          self.buckets)
+                                          self.buckets, self.event_shards)
 
             b = Batch(queries, cqldata,
                       consistency=get_consistency_level('create', 'policy'))
             d = b.execute(self.connection)
+            d.addCallback(_notify_events, self.event_listener, cqldata,
+                          ['policy{}'.format(i) for i in range(len(data))])
+            d.addCallback(lambda _: self._add_counts([
+                ('', '', 'policies', len(outpolicies)),
+                (self.uuid, '', 'policies', len(outpolicies))]))
             return d.addCallback(lambda _: outpolicies)
 
         d = self.view_config()
@@ -773,14 +1395,16 @@ class CassScalingGroup(object):
                     raise ValidationError("Cannot change type of a scaling policy")
                 if lastRev["type"] == 'schedule':
                     _build_schedule_policy(data, self.event_table, queries,
-                                           cqldata, '', self.buckets)
+                                           cqldata, '', self.buckets, self.event_shards)
 
         def _do_update_policy(_):
-            queries.append(_cql_insert_policy.format(cf=self.policies_table, name=""))
+            queries.append(_cql_insert_policy.format(cf=self.policies_table, name=''))
             cqldata['data'] = serialize_json_data(data, 1)
             b = Batch(queries, cqldata,
-                      consistency=get_consistency_level('update', 'policy'))
-            return b.execute(self.connection)
+                      consistency=get_consistency_level('update', 'policy'),
+                      fixed=True)
+            d = b.execute(self.connection)
+            return d.addCallback(_notify_events, self.event_listener, cqldata, [''])
 
         d = self.get_policy(policy_id)
         d.addCallback(_do_update_schedule)
@@ -793,20 +1417,73 @@ class CassScalingGroup(object):
         """
         self.log.bind(policy_id=policy_id).msg("Deleting policy")
 
-        def _do_delete(_):
+        params = {"tenantId": self.tenant_id,
+                  "groupId": self.uuid,
+                  "policyId": policy_id}
+
+        def _list_keys(_):
+            return self._list_webhook_keys(_cql_list_webhook_keys_in_policy, params)
+
+        def _do_delete(capability_hashes):
             queries = [
                 _cql_delete_all_in_policy.format(cf=self.policies_table),
                 _cql_delete_all_in_policy.format(cf=self.webhooks_table)]
-            b = Batch(queries, {"tenantId": self.tenant_id,
-                                "groupId": self.uuid,
-                                "policyId": policy_id},
+            cql_params = params.copy()
+            _build_webhook_key_deletes(capability_hashes, self.webhook_keys_table,
+                                       queries, cql_params)
+            b = Batch(queries, cql_params,
                       consistency=get_consistency_level('delete', 'policy'))
-            return b.execute(self.connection)
+            d = b.execute(self.connection)
+            d.addCallback(self._invalidate_capabilities, capability_hashes)
+            d.addCallback(lambda _: self._add_counts([
+                ('', '', 'policies', -1),
+                ('', '', 'webhooks', -len(capability_hashes)),
+                (self.uuid, '', 'policies', -1)]))
+            return d.addCallback(lambda _: self._remove_counts(policy_id))
 
         d = self.get_policy(policy_id)
+        d.addCallback(_list_keys)
         d.addCallback(_do_delete)
         return d
 
+    def _list_webhook_keys(self, query, params):
+        """
+        Return Deferred firing with the capability hashes of the webhooks listed
+        by `query` with `params`
+        """
+        d = self.connection.execute(query.format(cf=self.webhooks_table), params,
+                                    get_consistency_level('list', 'webhook'))
+        return d.addCallback(lambda rows: [row['webhookKey'] for row in rows])
+
+    def _add_counts(self, changes):
+        """
+        Add `changes` to the counts of the tenant if they are kept. See
+        :meth:`ResourceCounts.add`
+        """
+        if self.resource_counts is None:
+            return defer.succeed(None)
+        return self.resource_counts.add(self.connection, self.log, self.tenant_id,
+                                        changes)
+
+    def _remove_counts(self, policy_id=None):
+        """
+        Remove the counts of the group, or of its policy `policy_id` if given,
+        if they are kept. See :meth:`ResourceCounts.remove`
+        """
+        if self.resource_counts is None:
+            return defer.succeed(None)
+        return self.resource_counts.remove(self.connection, self.log, self.tenant_id,
+                                           self.uuid, policy_id)
+
+    def _invalidate_capabilities(self, result, capability_hashes):
+        """
+        Forget `capability_hashes` in the capability cache if any, and return
+        `result`
+        """
+        if self.capability_cache is not None:
+            self.capability_cache.invalidate(capability_hashes)
+        return result
+
     def _naive_list_all_webhooks(self):
         """
         List all webhooks of a group. Does not check if group exists and
@@ -865,7 +1542,6 @@ class CassScalingGroup(object):
 
         def _check_limit(curr_webhooks):
             max_webhooks = config_value('limits.absolute.maxWebhooksPerPolicy')
-            curr_webhooks = curr_webhooks[0]['count']
             if curr_webhooks + len(data) > max_webhooks:
                 raise WebhooksOverLimitError(
                     curr_webhooks=curr_webhooks,
@@ -876,7 +1552,8 @@ class CassScalingGroup(object):
                     policy_id=policy_id)
 
         def _do_limits_check(lastRev):
-            d = self.connection.execute(
+            d = _count_for_limit(
+                self.connection, self.resource_counts, 'webhooks',
                 _cql_count_for_policy.format(cf=self.webhooks_table),
                 main_params,
                 get_consistency_level('count', 'webhook'))
@@ -887,12 +1564,15 @@ class CassScalingGroup(object):
         def _do_create(lastRev):
             queries = []
             cql_params = main_params.copy()
-            output = _build_webhooks(data, self.webhooks_table, queries,
-                                     cql_params)
+            output = _build_webhooks(data, self.webhooks_table, self.webhook_keys_table,
+                                     queries, cql_params)
 
             b = Batch(queries, cql_params,
                       consistency=get_consistency_level('create', 'webhook'))
             d = b.execute(self.connection)
+            d.addCallback(lambda _: self._add_counts([
+                ('', '', 'webhooks', len(output)),
+                (self.uuid, policy_id, 'webhooks', len(output))]))
             return d.addCallback(lambda _: output)
 
         d.addCallback(_do_create)
@@ -947,15 +1627,22 @@ class CassScalingGroup(object):
         self.log.bind(policy_id=policy_id, webhook_id=webhook_id).msg("Deleting webhook")
 
         def _do_delete(lastRev):
-            query = _cql_delete_one_webhook.format(cf=self.webhooks_table)
-
-            d = self.connection.execute(query,
-                                        {"tenantId": self.tenant_id,
-                                         "groupId": self.uuid,
-                                         "policyId": policy_id,
-                                         "webhookId": webhook_id},
-                                        get_consistency_level('delete', 'webhook'))
-            return d
+            capability_hashes = [lastRev['capability']['hash']]
+            queries = [_cql_delete_one_webhook.format(cf=self.webhooks_table)]
+            params = {"tenantId": self.tenant_id,
+                      "groupId": self.uuid,
+                      "policyId": policy_id,
+                      "webhookId": webhook_id}
+            _build_webhook_key_deletes(capability_hashes, self.webhook_keys_table,
+                                       queries, params)
+            b = Batch(queries, params,
+                      consistency=get_consistency_level('delete', 'webhook'),
+                      fixed=True)
+            d = b.execute(self.connection)
+            d.addCallback(self._invalidate_capabilities, capability_hashes)
+            return d.addCallback(lambda _: self._add_counts([
+                ('', '', 'webhooks', -1),
+                (self.uuid, policy_id, 'webhooks', -1)]))
 
         return self.get_webhook(policy_id, webhook_id).addCallback(_do_delete)
 
@@ -965,27 +1652,45 @@ class CassScalingGroup(object):
         """
         log = self.log.bind(system='CassScalingGroup.delete_group')
 
+        params = {
+            'tenantId': self.tenant_id,
+            'groupId': self.uuid
+        }
+
         # Events can only be deleted by policy id, since that and trigger are
         # the only parts of the compound key
-        def _delete_everything(policies):
-            params = {
-                'tenantId': self.tenant_id,
-                'groupId': self.uuid
-            }
+        def _delete_everything(capability_hashes):
             queries = [
                 _cql_delete_all_in_group.format(cf=table, name='') for table in
                 (self.group_table, self.policies_table, self.webhooks_table)]
+            cql_params = params.copy()
+            _build_webhook_key_deletes(capability_hashes, self.webhook_keys_table,
+                                       queries, cql_params)
 
-            b = Batch(queries, params,
+            b = Batch(queries, cql_params,
                       consistency=get_consistency_level('delete', 'group'))
 
-            return b.execute(self.connection)
+            d = b.execute(self.connection)
+            d.addCallback(self._invalidate_capabilities, capability_hashes)
+            return d.addCallback(_uncount, len(capability_hashes))
+
+        def _uncount(_, webhooks):
+            if self.resource_counts is None:
+                return
+            d = self.resource_counts.view(self.connection, self.tenant_id, self.uuid)
+            d.addCallback(lambda counts: self._add_counts([
+                ('', '', 'groups', -1),
+                ('', '', 'policies', -counts['policies']),
+                ('', '', 'webhooks', -webhooks)]))
+            d.addErrback(self.log.err, 'Could not update resource counts')
+            return d.addCallback(lambda _: self._remove_counts())
 
         def _maybe_delete(state):
-            if len(state.active) + len(state.pending) > 0:
+            if (len(state.active) + len(state.pending) + len(state.standby) +
+                    len(state.standby_pending)) > 0:
                 raise GroupNotEmptyError(self.tenant_id, self.uuid)
 
-            d = self._naive_list_policies()
+            d = self._list_webhook_keys(_cql_list_webhook_keys_in_group, params)
             d.addCallback(_delete_everything)
             return d
 
@@ -999,7 +1704,168 @@ class CassScalingGroup(object):
         return with_lock(reactor, lock, log.bind(category='locking'), _delete_group)
 
 
-@implementer(IScalingGroupCollection, IScalingScheduleCollection)
+@implementer(IScalingGroup)
+class CachingScalingGroup(object):
+    """
+    Scaling group reading the group config, launch config and policies of the
+    :class:`CassScalingGroup` it wraps from a :class:`ConfigCache` when they are
+    cached, and invalidating them there once it changes or deletes them. Its other
+    methods and attributes are those of the wrapped group.
+
+    Only reads made through this group are cached: the wrapped group still reads
+    Cassandra to check that the group or a policy exists before changing it.
+    """
+
+    def __init__(self, group, cache):
+        """
+        :param group: the :class:`CassScalingGroup` to wrap
+        :param cache: the :class:`ConfigCache` to read from
+        """
+        self.group = group
+        self.cache = cache
+
+    def __getattr__(self, name):
+        """
+        Get the attribute of the wrapped group
+        """
+        return getattr(self.group, name)
+
+    def _key(self, kind, policy_id=None):
+        """
+        Return the key of the `kind` of entry of the group, or of its policy
+        """
+        return (self.group.tenant_id, self.group.uuid, kind, policy_id)
+
+    def _read_through(self, key, read, version=None):
+        """
+        Return the value cached for `key`, or call `read` and cache the value its
+        Deferred fires with
+        """
+        value = self.cache.get(key, version)
+        if value is not None:
+            return defer.succeed(value)
+        generation = self.cache.generation
+
+        def _cache(value):
+            self.cache.set(key, value, version, generation)
+            return value
+
+        return read().addCallback(_cache)
+
+    def _invalidate(self, result, key=None):
+        """
+        Invalidate `key`, or all the entries of the group if not given, and
+        return `result`
+        """
+        if key is None:
+            self.cache.invalidate_group(self.group.tenant_id, self.group.uuid)
+        else:
+            self.cache.invalidate(key)
+        return result
+
+    def view_config(self):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_config`
+        """
+        return self._read_through(self._key('config'), self.group.view_config)
+
+    def view_launch_config(self):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_launch_config`
+        """
+        return self._read_through(self._key('launch'), self.group.view_launch_config)
+
+    def get_policy(self, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.get_policy`
+        """
+        return self._read_through(
+            self._key('policy', policy_id),
+            functools.partial(self.group.get_policy, policy_id, version), version)
+
+    def modify_state(self, modifier_callable, *args, **kwargs):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.modify_state`
+        """
+        return self.group.modify_state(
+            lambda _, state, *a, **kw: modifier_callable(self, state, *a, **kw),
+            *args, **kwargs)
+
+    def modify_state_for_policy(self, modifier_callable, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.modify_state_for_policy`
+
+        The state and the policy are read from Cassandra along with the write
+        times of the configs. The configs are taken from the cache if they were
+        cached with those write times, and read on their own otherwise. If they
+        are not cached at all, they are read along with the state instead. The
+        configs and the policy then replace those cached.
+        """
+        config_key = self._key('config')
+        launch_key = self._key('launch')
+
+        def _cached_configs(config_writetime, launch_writetime):
+            config = self.cache.get(config_key, config_writetime)
+            launch = self.cache.get(launch_key, launch_writetime)
+            if config is None or launch is None:
+                return None
+            return config, launch
+
+        def _read_and_modify(consistency):
+            generation = self.cache.generation
+            cached_configs = None
+            if config_key in self.cache and launch_key in self.cache:
+                cached_configs = _cached_configs
+            d = self.group._view_execution_bundle(policy_id, version, consistency,
+                                                  cached_configs)
+
+            def _modify((state, config, launch, policy, (config_time, launch_time))):
+                self.cache.set(config_key, config, config_time, generation)
+                self.cache.set(launch_key, launch, launch_time, generation)
+                self.cache.set(self._key('policy', policy_id), policy, version, generation)
+                return modifier_callable(self, state, config=config, launch=launch,
+                                         policy=policy)
+
+            return d.addCallback(_modify)
+
+        return self.group._modify_state(_read_and_modify)
+
+    def update_config(self, data):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.update_config`
+        """
+        d = self.group.update_config(data)
+        return d.addBoth(self._invalidate, self._key('config'))
+
+    def update_launch_config(self, data):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.update_launch_config`
+        """
+        d = self.group.update_launch_config(data)
+        return d.addBoth(self._invalidate, self._key('launch'))
+
+    def update_policy(self, policy_id, data):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.update_policy`
+        """
+        d = self.group.update_policy(policy_id, data)
+        return d.addBoth(self._invalidate, self._key('policy', policy_id))
+
+    def delete_policy(self, policy_id):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.delete_policy`
+        """
+        d = self.group.delete_policy(policy_id)
+        return d.addBoth(self._invalidate, self._key('policy', policy_id))
+
+    def delete_group(self):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.delete_group`
+        """
+        return self.group.delete_group().addBoth(self._invalidate)
+
+
+@implementer(IScalingGroupCollection, IScalingScheduleCollection, IServerDeletionQueue)
 class CassScalingGroupCollection:
     """
     .. autointerface:: otter.models.interface.IScalingGroupCollection
@@ -1032,23 +1898,59 @@ class CassScalingGroupCollection:
     Also, because deletes are done as tombstones rather than actually deleting,
     deletes are also updates and hence a read must be performed before deletes.
     """
-    def __init__(self, connection):
+    def __init__(self, connection, event_shard_interval=None, capability_cache=None,
+                 webhook_index_fallback=True, resource_counts=None, config_cache=None):
         """
         Init
 
         :param connection: Thrift connection to use
 
-        :param cflist: Column family list
+        :param event_shard_interval: If given, scheduled events are stored in time
+            shards of this many seconds. See :class:`EventShards`. Events stored
+            before are moved to their shards when their bucket is first read
+
+        :param capability_cache: If given, a :class:`CapabilityCache` remembering
+            the webhooks found by :meth:`webhook_info_by_hash`
+
+        :param bool webhook_index_fallback: Whether webhooks not found by their
+            capability hash in the webhook_keys table are looked up through the
+            index of policy_webhooks, for webhooks created before that table
+
+        :param resource_counts: If given, :class:`ResourceCounts` in which groups,
+            policies and webhooks are counted
+
+        :param config_cache: If given, a :class:`ConfigCache` from which the groups
+            got from :meth:`get_scaling_group` read their configs and policies
         """
         self.connection = connection
         self.group_table = "scaling_group"
         self.launch_table = "launch_config"
         self.policies_table = "scaling_policies"
         self.webhooks_table = "policy_webhooks"
+        self.webhook_keys_table = "webhook_keys"
+        self.capability_cache = capability_cache
+        self.webhook_index_fallback = webhook_index_fallback
+        self.resource_counts = resource_counts
+        self.config_cache = config_cache
         self.state_table = "group_state"
+        self.deletion_table = "server_deletions"
+        # shard from which the next claim of server deletions starts and
+        # shard -> (tenant ID, server ID) of the last deletion read from it
+        self._deletion_shard = 0
+        self._deletion_cursors = {}
+        self.event_shards = None
         self.event_table = "scaling_schedule_v2"
+        if event_shard_interval:
+            self.event_shards = EventShards(event_shard_interval)
+            self.event_table = "scaling_schedule_v3"
+        # events written before events were sharded, moved to their shards
+        # by _move_unsharded_events
+        self.unsharded_event_table = "scaling_schedule_v2"
+        self._unsharded_moved = set()
+        self._unsharded_moving = {}
         self.buckets = None
         self.kz_client = None
+        self.event_listener = None
 
     def set_scheduler_buckets(self, buckets):
         """
@@ -1056,6 +1958,13 @@ class CassScalingGroupCollection:
         """
         self.buckets = itertools.cycle(buckets)
 
+    def set_event_listener(self, listener):
+        """
+        Set callable called with list of (bucket, trigger) of the scheduled events
+        added through this collection or its groups, after they are written
+        """
+        self.event_listener = listener
+
     def create_scaling_group(self, log, tenant_id, config, launch, policies=None):
         """
         see :meth:`otter.models.interface.IScalingGroupCollection.create_scaling_group`
@@ -1065,12 +1974,13 @@ class CassScalingGroupCollection:
 
         # obey limits
         max_groups = config_value('limits.absolute.maxGroups')
-        d = self.connection.execute(_cql_count_for_tenant.format(
-            cf="scaling_group"), {'tenantId': tenant_id},
-            get_consistency_level('list', 'group'))
+        d = _count_for_limit(self.connection, self.resource_counts, 'groups',
+                             _cql_count_for_tenant.format(cf="scaling_group"),
+                             {'tenantId': tenant_id},
+                             get_consistency_level('list', 'group'))
 
         def check_groups(cur_groups, max_groups):
-            if cur_groups[0]['count'] >= max_groups:
+            if cur_groups >= max_groups:
                 log.msg('client has reached maxGroups limit')
                 raise ScalingGroupOverLimitError(tenant_id, max_groups)
 
@@ -1105,12 +2015,21 @@ class CassScalingGroupCollection:
                 desired=data['desired']
             )
             outpolicies = _build_policies(policies, self.policies_table,
-                                          self.event_table, queries, data, self.buckets)
+                                          self.event_table, queries, data, self.buckets,
+                                          self.event_shards)
 
             b = Batch(queries, data,
                       consistency=get_consistency_level('create', 'group'))
 
             bd = b.execute(self.connection)
+            bd.addCallback(_notify_events, self.event_listener, data,
+                           ['policy{}'.format(i) for i in range(len(policies or []))])
+            if self.resource_counts is not None:
+                bd.addCallback(lambda _: self.resource_counts.add(
+                    self.connection, log, tenant_id,
+                    [('', '', 'groups', 1),
+                     ('', '', 'policies', len(outpolicies)),
+                     (scaling_group_id, '', 'policies', len(outpolicies))]))
             bd.addCallback(lambda _: {
                 'groupConfiguration': config,
                 'launchConfiguration': launch,
@@ -1171,33 +2090,456 @@ class CassScalingGroupCollection:
         """
         see :meth:`otter.models.interface.IScalingGroupCollection.get_scaling_group`
         """
-        return CassScalingGroup(log, tenant_id, scaling_group_id,
-                                self.connection, self.buckets, self.kz_client)
+        group = CassScalingGroup(log, tenant_id, scaling_group_id,
+                                 self.connection, self.buckets, self.kz_client,
+                                 event_shards=self.event_shards,
+                                 capability_cache=self.capability_cache,
+                                 resource_counts=self.resource_counts,
+                                 event_listener=self.event_listener)
+        if self.config_cache is not None:
+            return CachingScalingGroup(group, self.config_cache)
+        return group
 
     def fetch_and_delete(self, bucket, now, size=100):
         """
         Fetch events to be occurring now or before in a bucket
         and delete them after fetching
         """
-        def delete_events(events):
+        d = self._fetch_due_events(bucket, now, size)
+        return d.addCallback(
+            lambda events: self._delete_events(bucket, events).addCallback(lambda _: events))
+
+    def _fetch_due_events(self, bucket, now, size):
+        """
+        Return Deferred firing with up to `size` events of `bucket` occurring now or
+        before, oldest shard first if events are sharded
+        """
+        if self.event_shards is None:
+            return self.connection.execute(
+                _cql_fetch_batch_of_events.format(cf=self.event_table),
+                {"size": size, "now": now, "bucket": bucket},
+                get_consistency_level('fetch', 'event'))
+        d = self._move_unsharded_events(bucket)
+        d.addCallback(lambda _: self._list_shards(bucket, until=now))
+        return d.addCallback(self._collect_sharded_events, bucket, size,
+                             _cql_fetch_batch_of_sharded_events, {'now': now},
+                             lambda shard: self.event_shards.is_past(shard, now))
+
+    def _delete_events(self, bucket, events):
+        """
+        Delete `events` from `bucket` in one batch
+        """
+        if not events:
+            return defer.succeed(None)
+        data = {'bucket': bucket}
+        queries = [self._delete_event_query('event{}'.format(i), data, event)
+                   for i, event in enumerate(events)]
+        b = Batch(queries, data, get_consistency_level('delete', 'event'))
+        return b.execute(self.connection)
+
+    def _delete_event_query(self, name, data, event):
+        """
+        Return query deleting `event` named `name` from its bucket, setting its key
+        in `data`
+        """
+        data[name + 'policyId'] = event['policyId']
+        data[name + 'trigger'] = event['trigger']
+        if self.event_shards is None:
+            return _cql_delete_bucket_event.format(cf=self.event_table, name=name)
+        data[name + 'shard'] = self.event_shards.shard(event['trigger'])
+        return _cql_delete_sharded_bucket_event.format(cf=self.event_table, name=name)
+
+    def claim_events(self, bucket, now, size=100, lease=60):
+        """
+        see :meth:`otter.models.interface.IScalingScheduleCollection.claim_events`
+
+        Each event is claimed by creating an ephemeral node in ZooKeeper, whose
+        creation fails if the event is already claimed. The node holds the time at
+        which the claim expires. Due events are read `size * CLAIM_READ_AHEAD` at a
+        time, each page after the last event of the previous one, and claimed until
+        enough are claimed or there are no more due events. So events claimed by
+        others at the head of the bucket do not hide the ones after them.
+        """
+        claim_path = functools.partial(self._claim_path, bucket)
+        page_size = size * CLAIM_READ_AHEAD
+        claimed = []
+
+        def claim_page(candidates):
+            d = self._claim_candidates(candidates, claim_path, now, size - len(claimed),
+                                       lease)
+            return d.addCallback(claimed_page, candidates)
+
+        def claimed_page(owned, candidates):
+            claimed.extend(owned)
+            if len(claimed) >= size or len(candidates) < page_size:
+                return claimed
+            d = self._fetch_due_events_after(bucket, now, page_size, candidates[-1])
+            return d.addCallback(claim_page)
+
+        return self._fetch_due_events(bucket, now, page_size).addCallback(claim_page)
+
+    def _fetch_due_events_after(self, bucket, now, size, last):
+        """
+        Return Deferred firing with up to `size` events of `bucket` occurring now or
+        before that come after `last` event in the order of the events, i.e. by
+        trigger and then by policy ID
+        """
+        fetched = []
+        params = {'bucket': bucket, 'now': now, 'trigger': last['trigger'],
+                  'policyId': last['policyId']}
+        if self.event_shards is None:
+            queries = [_cql_fetch_events_at_trigger_after, _cql_fetch_due_events_after]
+        else:
+            params['shard'] = self.event_shards.shard(last['trigger'])
+            queries = [_cql_fetch_sharded_events_at_trigger_after,
+                       _cql_fetch_sharded_due_events_after]
+
+        def fetch(queries):
+            if not queries or len(fetched) >= size:
+                return
+            d = self.connection.execute(
+                queries[0].format(cf=self.event_table),
+                dict(params, size=size - len(fetched)),
+                get_consistency_level('fetch', 'event'))
+            d.addCallback(fetched.extend)
+            return d.addCallback(lambda _: fetch(queries[1:]))
+
+        def fetch_later_shards(_):
+            if len(fetched) >= size:
+                return
+            d = self._list_shards(bucket, until=now)
+            d.addCallback(lambda shards: self._collect_sharded_events(
+                [shard for shard in shards if shard > params['shard']], bucket,
+                size - len(fetched), _cql_fetch_batch_of_sharded_events, {'now': now},
+                lambda shard: self.event_shards.is_past(shard, now)))
+            return d.addCallback(fetched.extend)
+
+        d = fetch(queries)
+        if self.event_shards is not None:
+            d.addCallback(fetch_later_shards)
+        return d.addCallback(lambda _: fetched)
+
+    def _claim_candidates(self, candidates, claim_path, now, size, lease):
+        """
+        Claim up to `size` of `candidates`, `size` at a time until enough are claimed
+        or there are no more candidates
+
+        :param claim_path: callable returning the claim node path of a candidate
+        :return: Deferred that fires with list of claimed candidates
+        """
+        now_seconds = calendar.timegm(now.utctimetuple())
+
+        def claim(candidates, claimed):
+            needed = size - len(claimed)
+            if needed <= 0 or not candidates:
+                return claimed
+            batch, rest = candidates[:needed], candidates[needed:]
+            d = defer.gatherResults(
+                [self._claim(claim_path(candidate), now_seconds, lease)
+                 for candidate in batch],
+                consumeErrors=True)
+            d.addErrback(unwrap_first_error)
+            d.addCallback(lambda owned: claim(
+                rest, claimed + [candidate for candidate, ok in zip(batch, owned) if ok]))
+            return d
+
+        return claim(candidates, [])
+
+    def _claim_path(self, bucket, event):
+        """
+        Return ZooKeeper path of claim of `event` in `bucket`
+        """
+        return '{}/{}/{}-{}'.format(CLAIM_PATH, bucket, event['policyId'],
+                                    calendar.timegm(event['trigger'].utctimetuple()))
+
+    def _claim(self, path, now_seconds, lease):
+        """
+        Claim the item whose claim node is at `path` unless it is claimed by someone
+        else whose claim has not expired. An expired claim is deleted only if it is
+        the one that was read, so that only one of the nodes finding it expired takes
+        it over.
+
+        :return: Deferred that fires with True if item is claimed, False otherwise
+        """
+        def create():
+            d = self.kz_client.create(path, str(now_seconds + lease), ephemeral=True,
+                                      makepath=True)
+            return d.addCallback(lambda _: True)
+
+        def take_over_expired(result):
+            expires, stat = result
+            if int(expires) > now_seconds:
+                return False
+            return self.kz_client.delete(path, stat.version).addCallback(lambda _: create())
+
+        def claimed_by_other(failure):
+            failure.trap(NodeExistsError)
+            return self.kz_client.get(path).addCallback(take_over_expired)
+
+        d = create()
+        d.addErrback(claimed_by_other)
+        # claim changed by someone else meanwhile
+        d.addErrback(lambda f: f.trap(NodeExistsError, NoNodeError, BadVersionError) and False)
+        return d
+
+    def delete_claimed_events(self, bucket, events):
+        """
+        see :meth:`otter.models.interface.IScalingScheduleCollection.delete_claimed_events`
+        """
+        d = self._delete_events(bucket, events)
+        return d.addCallback(lambda _: self._release_claims(
+            [self._claim_path(bucket, event) for event in events]))
+
+    def _release_claims(self, paths):
+        """
+        Delete the claim nodes at `paths`. Claims are ephemeral, so any one that
+        could not be deleted goes away with the session at the latest
+        """
+        deferreds = [self.kz_client.delete(path) for path in paths]
+        for d in deferreds:
+            d.addErrback(lambda f: f.trap(NoNodeError) and None)
+        d = defer.gatherResults(deferreds, consumeErrors=True)
+        return d.addCallbacks(lambda _: None, unwrap_first_error)
+
+    def add_server_deletions(self, log, transaction_id, tenant_id, group_id, servers):
+        """
+        see :meth:`otter.models.interface.IServerDeletionQueue.add_server_deletions`
+        """
+        if not servers:
+            return defer.succeed(None)
+        data = {'tenantId': tenant_id, 'groupId': group_id,
+                'transactionId': transaction_id, 'created': datetime.utcnow()}
+        queries = []
+        for i, server in enumerate(servers):
+            name = 'server{}'.format(i)
+            data[name + 'shard'] = _deletion_shard(tenant_id, server['id'])
+            data[name + 'serverId'] = server['id']
+            data[name + 'server'] = json.dumps(server)
+            queries.append(_cql_insert_server_deletion.format(cf=self.deletion_table, name=name))
+        log.bind(tenant_id=tenant_id, scaling_group_id=group_id).msg(
+            'Queueing server deletions', server_ids=[server['id'] for server in servers])
+        b = Batch(queries, data, get_consistency_level('insert', 'deletion'))
+        return b.execute(self.connection).addCallback(lambda _: None)
+
+    def _deletion_claim_path(self, deletion):
+        """
+        Return ZooKeeper path of claim of queued server `deletion`
+        """
+        return '{}/{}-{}'.format(DELETION_CLAIM_PATH, deletion['tenantId'],
+                                 deletion['serverId'])
+
+    def claim_server_deletions(self, now, size=100, lease=600):
+        """
+        see :meth:`otter.models.interface.IServerDeletionQueue.claim_server_deletions`
+
+        Deletions are claimed like scheduled events in :meth:`claim_events`, one
+        shard of the queue after another until enough are claimed. Each claim starts
+        from the shard after the one the previous claim started from, and each shard
+        is read on from after the last deletion read from it before, wrapping around
+        once it is read to the end. So deletions that keep failing or are claimed by
+        others do not hide the ones after them.
+
+        Without ZooKeeper nothing is claimed, since every node would then delete the
+        same servers.
+        """
+        if self.kz_client is None:
+            return defer.succeed([])
+        start = self._deletion_shard
+        self._deletion_shard = (start + 1) % DELETION_SHARDS
+        claimed = []
+
+        def claim(shards):
+            if not shards or len(claimed) >= size:
+                return claimed
+            d = self._fetch_server_deletions(shards[0], (size - len(claimed)) * CLAIM_READ_AHEAD)
+            d.addCallback(self._claim_candidates, self._deletion_claim_path, now,
+                          size - len(claimed), lease)
+            d.addCallback(claimed.extend)
+            return d.addCallback(lambda _: claim(shards[1:]))
+
+        return claim([(start + i) % DELETION_SHARDS for i in range(DELETION_SHARDS)])
+
+    def _fetch_server_deletions(self, shard, size):
+        """
+        Return Deferred firing with up to `size` deletions of `shard` after the last
+        one read from it, or from its start if it was read to the end
+        """
+        fetched = []
+        cursor = self._deletion_cursors.pop(shard, None)
+        if cursor is None:
+            queries = [_cql_fetch_server_deletions]
+            params = {'shard': shard}
+        else:
+            queries = [_cql_fetch_server_deletions_of_tenant_after,
+                       _cql_fetch_server_deletions_after]
+            params = {'shard': shard, 'tenantId': cursor[0], 'serverId': cursor[1]}
+
+        def fetch(queries):
+            if not queries or len(fetched) >= size:
+                return
+            d = self.connection.execute(
+                queries[0].format(cf=self.deletion_table),
+                dict(params, size=size - len(fetched)),
+                get_consistency_level('fetch', 'deletion'))
+            d.addCallback(fetched.extend)
+            return d.addCallback(lambda _: fetch(queries[1:]))
+
+        def fetched_all(_):
+            if len(fetched) >= size:
+                self._deletion_cursors[shard] = (fetched[-1]['tenantId'],
+                                                 fetched[-1]['serverId'])
+            return [dict(row, server=json.loads(row['server'])) for row in fetched]
+
+        return fetch(queries).addCallback(fetched_all)
+
+    def delete_server_deletions(self, deletions):
+        """
+        see :meth:`otter.models.interface.IServerDeletionQueue.delete_server_deletions`
+        """
+        if not deletions:
+            return defer.succeed(None)
+        data = {}
+        queries = []
+        for i, deletion in enumerate(deletions):
+            name = 'deletion{}'.format(i)
+            data[name + 'shard'] = _deletion_shard(deletion['tenantId'], deletion['serverId'])
+            data[name + 'tenantId'] = deletion['tenantId']
+            data[name + 'serverId'] = deletion['serverId']
+            queries.append(_cql_delete_server_deletion.format(cf=self.deletion_table, name=name))
+        b = Batch(queries, data, get_consistency_level('delete', 'deletion'))
+        d = b.execute(self.connection)
+        if self.kz_client is None:
+            return d.addCallback(lambda _: None)
+        return d.addCallback(lambda _: self._release_claims(
+            [self._deletion_claim_path(deletion) for deletion in deletions]))
+
+    def _add_event(self, queries, data, name, event):
+        """
+        Add queries inserting `event` as event named `name` to next bucket
+        """
+        data[name + 'bucket'] = self.buckets.next()
+        data.update({name + key: event[key] for key in event})
+        if self.event_shards is None:
+            queries.append(_cql_insert_cron_event.format(cf=self.event_table, name=name))
+        else:
+            queries.append(_cql_insert_sharded_cron_event.format(cf=self.event_table, name=name))
+            self.event_shards.add(queries, data, name, event['trigger'])
+
+    def _move_unsharded_events(self, bucket, size=100):
+        """
+        Move the events of `bucket` written to the unsharded event table before
+        events were sharded to their shards, keeping them in `bucket`. Nothing adds
+        events to the unsharded table once events are sharded, so this reads it
+        only until the bucket is empty there, once per bucket, before the events
+        of the bucket are first read.
+
+        :return: Deferred that fires with None once `bucket` has no unsharded events
+        """
+        if bucket in self._unsharded_moved:
+            return defer.succeed(None)
+        waiting = self._unsharded_moving.get(bucket)
+        if waiting is not None:
+            d = defer.Deferred()
+            waiting.append(d)
+            return d
+
+        def fetch(_=None):
+            d = self.connection.execute(
+                _cql_fetch_bucket_events.format(cf=self.unsharded_event_table),
+                {'bucket': bucket, 'size': size}, get_consistency_level('fetch', 'event'))
+            return d.addCallback(move)
+
+        def move(events):
             if not events:
-                return events
-            data = {'bucket': bucket}
-            queries = []
-            for i, event in enumerate(events):
-                event_name = 'event{}'.format(i)
-                queries.append(
-                    _cql_delete_bucket_event.format(cf=self.event_table,
-                                                    name=event_name))
-                data[event_name + 'policyId'] = event['policyId']
-                data[event_name + 'trigger'] = event['trigger']
-            b = Batch(queries, data, get_consistency_level('delete', 'event'))
-            return b.execute(self.connection).addCallback(lambda _: events)
-
-        d = self.connection.execute(_cql_fetch_batch_of_events.format(cf=self.event_table),
-                                    {"size": size, "now": now, "bucket": bucket},
+                return
+            queries, data = [], {'bucket': bucket}
+            names = ['event{}'.format(i) for i in range(len(events))]
+            for name, event in zip(names, events):
+                data[name + 'bucket'] = bucket
+                data.update({name + key: event[key] for key in event})
+                queries.append(_cql_insert_sharded_cron_event.format(cf=self.event_table,
+                                                                     name=name))
+                self.event_shards.add(queries, data, name, event['trigger'])
+                queries.append(_cql_delete_bucket_event.format(
+                    cf=self.unsharded_event_table, name=name))
+            b = Batch(queries, data, get_consistency_level('move', 'event'))
+            d = b.execute(self.connection)
+            d.addCallback(_notify_events, self.event_listener, data, names)
+            if len(events) == size:
+                d.addCallback(fetch)
+            return d
+
+        def moved(result):
+            waiting = self._unsharded_moving.pop(bucket)
+            if not isinstance(result, Failure):
+                self._unsharded_moved.add(bucket)
+            for d in waiting:
+                d.callback(result)
+            return result
+
+        self._unsharded_moving[bucket] = []
+        return fetch().addBoth(moved)
+
+    def _list_shards(self, bucket, until=None):
+        """
+        Return Deferred firing with sorted list of shards of `bucket` that may have
+        events, only the ones starting at or before `until` if given
+        """
+        if until is None:
+            query, data = _cql_list_event_shards, {'bucket': bucket}
+        else:
+            query, data = _cql_list_event_shards_until, {'bucket': bucket, 'until': until}
+        d = self.connection.execute(query.format(cf=self.event_shards.table), data,
                                     get_consistency_level('fetch', 'event'))
-        return d.addCallback(delete_events)
+        return d.addCallback(lambda rows: sorted(row['shard'] for row in rows))
+
+    def _collect_sharded_events(self, shards, bucket, size, query, params, can_drop):
+        """
+        Fetch up to `size` events of `bucket` with `query` from `shards`, one shard
+        after another. An empty shard is dropped if `can_drop` returns True for it.
+
+        :return: Deferred firing with list of events
+        """
+        collected = []
+
+        def collect(remaining):
+            if not remaining or len(collected) >= size:
+                return collected
+            shard = remaining[0]
+            data = dict(params, bucket=bucket, shard=shard, size=size - len(collected))
+            d = self.connection.execute(query.format(cf=self.event_table), data,
+                                        get_consistency_level('fetch', 'event'))
+
+            def fetched(events):
+                collected.extend(events)
+                if not events and can_drop(shard):
+                    return self._drop_shard(bucket, shard)
+
+            d.addCallback(fetched)
+            return d.addCallback(lambda _: collect(remaining[1:]))
+
+        return collect(shards)
+
+    def _drop_shard(self, bucket, shard):
+        """
+        Remove drained `shard` from shards of `bucket`. The shard is checked again
+        after removing it and recorded back if an event was added to it meanwhile.
+        """
+        data = {'bucket': bucket, 'shard': shard}
+        d = self.connection.execute(
+            _cql_delete_event_shard.format(cf=self.event_shards.table), data,
+            get_consistency_level('delete', 'event'))
+        d.addCallback(lambda _: self.connection.execute(
+            _cql_oldest_sharded_event.format(cf=self.event_table), data,
+            get_consistency_level('fetch', 'event')))
+
+        def record_again(events):
+            if events:
+                return self.connection.execute(
+                    _cql_insert_event_shard.format(cf=self.event_shards.table, name=''),
+                    data, get_consistency_level('insert', 'event'))
+
+        return d.addCallback(record_again)
 
     def add_cron_events(self, cron_events):
         """
@@ -1205,47 +2547,188 @@ class CassScalingGroupCollection:
         """
         queries, data = list(), dict()
         for i, event in enumerate(cron_events):
-            event_name = 'event{}'.format(i)
-            queries.append(_cql_insert_cron_event.format(cf=self.event_table,
-                                                         name=event_name))
-            data[event_name + 'bucket'] = self.buckets.next()
-            data.update({event_name + key: event[key] for key in event})
+            self._add_event(queries, data, 'event{}'.format(i), event)
         b = Batch(queries, data, get_consistency_level('insert', 'event'))
-        return b.execute(self.connection)
+        return b.execute(self.connection).addCallback(
+            _notify_events, self.event_listener, data,
+            ['event{}'.format(i) for i in range(len(cron_events))])
+
+    def move_events(self, bucket, size=100, lease=None):
+        """
+        see :meth:`otter.models.interface.IScalingScheduleCollection.move_events`
+
+        With a lease, the fetched events are claimed like in :meth:`claim_events`
+        before moving them and their claims are released after they are moved.
+        """
+        claim_path = functools.partial(self._claim_path, bucket)
+
+        def claim(events):
+            if lease is None or not events:
+                return events
+            return self._claim_candidates(events, claim_path, datetime.utcnow(),
+                                          len(events), lease)
+
+        def release(_, events):
+            if lease is None:
+                return
+            return self._release_claims([claim_path(event) for event in events])
+
+        def move(events):
+            if not events:
+                return 0
+            queries, data = [], {'bucket': bucket}
+            for i, event in enumerate(events):
+                event_name = 'event{}'.format(i)
+                # the event stays in the same shard since that depends only on trigger
+                self._add_event(queries, data, event_name, event)
+                queries.append(self._delete_event_query(event_name, data, event))
+            b = Batch(queries, data, get_consistency_level('move', 'event'))
+            d = b.execute(self.connection)
+            d.addCallback(_notify_events, self.event_listener, data,
+                          ['event{}'.format(i) for i in range(len(events))])
+            d.addCallback(release, events)
+            return d.addCallback(lambda _: len(events))
+
+        if self.event_shards is None:
+            d = self.connection.execute(_cql_fetch_bucket_events.format(cf=self.event_table),
+                                        {'bucket': bucket, 'size': size},
+                                        get_consistency_level('fetch', 'event'))
+        else:
+            # nothing is added to a bucket whose events are moved, so any drained
+            # shard can be dropped
+            d = self._move_unsharded_events(bucket)
+            d.addCallback(lambda _: self._list_shards(bucket))
+            d.addCallback(self._collect_sharded_events, bucket, size,
+                          _cql_fetch_shard_events, {}, lambda shard: True)
+        return d.addCallback(claim).addCallback(move)
 
-    def get_oldest_event(self, bucket):
+    def get_oldest_event(self, bucket, after=None):
         """
         see :meth:`otter.models.interface.IScalingScheduleCollection.get_oldest_event`
         """
-        d = self.connection.execute(_cql_oldest_event.format(cf=self.event_table),
-                                    {'bucket': bucket},
+        if self.event_shards is not None:
+            d = self._move_unsharded_events(bucket)
+            d.addCallback(lambda _: self._list_shards(bucket))
+            if after is not None:
+                d.addCallback(lambda shards: [shard for shard in shards
+                                              if not self.event_shards.is_past(shard, after)])
+            return d.addCallback(self._oldest_sharded_event, bucket, after)
+        if after is None:
+            query, params = _cql_oldest_event, {'bucket': bucket}
+        else:
+            query, params = _cql_oldest_event_after, {'bucket': bucket, 'after': after}
+        d = self.connection.execute(query.format(cf=self.event_table), params,
                                     get_consistency_level('check', 'event'))
         d.addCallback(lambda r: r[0] if len(r) > 0 else None)
         return d
 
+    def _oldest_sharded_event(self, shards, bucket, after=None):
+        """
+        Return Deferred firing with oldest event, triggering after `after` if given,
+        in the first of `shards` that has one
+        """
+        if not shards:
+            return None
+        if after is None:
+            query, params = _cql_oldest_sharded_event, {'bucket': bucket, 'shard': shards[0]}
+        else:
+            query, params = (_cql_oldest_sharded_event_after,
+                             {'bucket': bucket, 'shard': shards[0], 'after': after})
+        d = self.connection.execute(query.format(cf=self.event_table), params,
+                                    get_consistency_level('check', 'event'))
+        return d.addCallback(
+            lambda r: r[0] if len(r) > 0 else self._oldest_sharded_event(shards[1:], bucket,
+                                                                         after))
+
     def webhook_info_by_hash(self, log, capability_hash):
         """
         see :meth:`otter.models.interface.IScalingGroupCollection.webhook_info_by_hash`
         """
-        def _do_webhook_lookup(webhook_rec):
-            res = webhook_rec
-            if len(res) == 0:
+        if self.capability_cache is not None:
+            info = self.capability_cache.get(capability_hash)
+            if info is not None:
+                return defer.succeed(info)
+
+        params = {"webhookKey": capability_hash}
+
+        def _found(info):
+            if self.capability_cache is not None:
+                self.capability_cache.set(capability_hash, info)
+            return info
+
+        def _search_index():
+            query = _cql_find_webhook_token.format(cf=self.webhooks_table)
+            d = self.connection.execute(query, params,
+                                        get_consistency_level('list', 'group'))
+            return d.addCallback(_add_key)
+
+        def _add_key(rows):
+            # the webhook was created before the webhook_keys table
+            if len(rows) == 0:
                 raise UnrecognizedCapabilityError(capability_hash, 1)
-            res = res[0]
-            return (res['tenantId'], res['groupId'], res['policyId'])
+            row = rows[0]
+            log.msg('Adding webhook to webhook_keys', tenant_id=row['tenantId'],
+                    scaling_group_id=row['groupId'], policy_id=row['policyId'],
+                    webhook_id=row['webhookId'])
+            query = _cql_insert_webhook_key.format(cf=self.webhook_keys_table, name='webhook')
+            d = self.connection.execute(query,
+                                        {"tenantId": row['tenantId'],
+                                         "groupId": row['groupId'],
+                                         "policyId": row['policyId'],
+                                         "webhookId": row['webhookId'],
+                                         "webhookKey": capability_hash},
+                                        get_consistency_level('create', 'webhook'))
+            return d.addCallback(_check_webhook, row)
+
+        def _check_webhook(_, row):
+            # the webhook may have been deleted, along with its key, after the
+            # index was read: read it again so that its key is not resurrected
+            query = _cql_view_webhook.format(cf=self.webhooks_table)
+            d = self.connection.execute(query,
+                                        {"tenantId": row['tenantId'],
+                                         "groupId": row['groupId'],
+                                         "policyId": row['policyId'],
+                                         "webhookId": row['webhookId']},
+                                        get_consistency_level('view', 'webhook'))
+            return d.addCallback(_key_added, row)
+
+        def _key_added(webhooks, row):
+            if len(webhooks) > 0:
+                return (row['tenantId'], row['groupId'], row['policyId'])
+            log.msg('Webhook deleted while adding it to webhook_keys',
+                    tenant_id=row['tenantId'], scaling_group_id=row['groupId'],
+                    policy_id=row['policyId'], webhook_id=row['webhookId'])
+            query = _cql_delete_webhook_key.format(cf=self.webhook_keys_table, name='webhook')
+            d = self.connection.execute(query, {"webhookKey": capability_hash},
+                                        get_consistency_level('delete', 'webhook'))
 
-        query = _cql_find_webhook_token.format(cf=self.webhooks_table)
-        d = self.connection.execute(query,
-                                    {"webhookKey": capability_hash},
-                                    get_consistency_level('list', 'group'))
+            def _unrecognized(_):
+                raise UnrecognizedCapabilityError(capability_hash, 1)
+
+            return d.addCallback(_unrecognized)
+
+        def _do_webhook_lookup(rows):
+            if len(rows) == 0:
+                if self.webhook_index_fallback:
+                    return _search_index()
+                raise UnrecognizedCapabilityError(capability_hash, 1)
+            row = rows[0]
+            return (row['tenantId'], row['groupId'], row['policyId'])
+
+        query = _cql_view_webhook_key.format(cf=self.webhook_keys_table)
+        d = self.connection.execute(query, params,
+                                    get_consistency_level('view', 'webhook'))
         d.addCallback(_do_webhook_lookup)
-        return d
+        return d.addCallback(_found)
 
     def get_counts(self, log, tenant_id):
         """
         see :meth:`otter.models.interface.IScalingGroupCollection.get_counts`
         """
 
+        if self.resource_counts is not None and self.resource_counts.limits:
+            return self.resource_counts.view(self.connection, tenant_id)
+
         fields = ['scaling_group', 'scaling_policies', 'policy_webhooks']
         deferred = [self.connection.execute(_cql_count_for_tenant.format(cf=field),
                                             {'tenantId': tenant_id},
@@ -1258,6 +2741,131 @@ class CassScalingGroupCollection:
             ('groups', 'policies', 'webhooks'), results)))
         return d
 
+    def list_tenants(self, marker=None, limit=100):
+        """
+        List the tenants that have scaling groups, in token order.
+
+        :param marker: the last tenant of the previous page, if any
+        :param int limit: the number of groups read
+        :return: Deferred firing with ``list`` of tenant IDs of up to `limit`
+            groups after `marker`. It is empty after the last tenant.
+        """
+        params = {'limit': limit}
+        if marker is None:
+            query = _cql_list_tenants
+        else:
+            query = _cql_list_tenants_after
+            params['tenantId'] = marker
+        d = self.connection.execute(query.format(cf=self.group_table), params,
+                                    get_consistency_level('list', 'group'))
+
+        def _distinct(rows):
+            tenants = []
+            for row in rows:
+                if not tenants or tenants[-1] != row['tenantId']:
+                    tenants.append(row['tenantId'])
+            return tenants
+
+        return d.addCallback(_distinct)
+
+    def repair_counts(self, log, tenant_id):
+        """
+        Count the groups, policies and webhooks of `tenant_id` again, and correct
+        their counts in :class:`ResourceCounts`. The counts of groups and
+        policies that no longer exist are removed, once their rows are read again
+        and still not found, since a group or policy created while the tables are
+        listed can be counted without being listed. A count changed by another
+        node during the repair is corrected by the next one.
+
+        :return: Deferred firing with the number of counts corrected or removed
+        """
+        params = {'tenantId': tenant_id}
+        queries = [(_cql_list_group_ids, self.group_table),
+                   (_cql_list_policy_ids, self.policies_table),
+                   (_cql_list_policy_ids, self.webhooks_table),
+                   (_cql_list_counts, self.resource_counts.table)]
+        d = defer.gatherResults(
+            [self.connection.execute(query.format(cf=table), params,
+                                     get_consistency_level('list', 'count'))
+             for query, table in queries],
+            consumeErrors=True)
+        d.addErrback(unwrap_first_error)
+
+        def _correct((groups, policies, webhooks, counted)):
+            # groups whose rows are resurrected by a late write have no created_at
+            group_ids = set(row['groupId'] for row in groups if row['created_at'])
+            policy_ids = set((row['groupId'], row['policyId']) for row in policies)
+            counts = {('', '', 'groups'): len(group_ids),
+                      ('', '', 'policies'): len(policies),
+                      ('', '', 'webhooks'): len(webhooks)}
+            for row in policies:
+                key = (row['groupId'], '', 'policies')
+                counts[key] = counts.get(key, 0) + 1
+            for row in webhooks:
+                key = (row['groupId'], row['policyId'], 'webhooks')
+                counts[key] = counts.get(key, 0) + 1
+
+            def _exists(group_id, policy_id):
+                if not group_id:
+                    return True
+                if not policy_id:
+                    return group_id in group_ids
+                return group_id in group_ids and (group_id, policy_id) in policy_ids
+
+            changes, removed = [], []
+            for row in counted:
+                group_id, policy_id = row['groupId'], row['policyId']
+                if not _exists(group_id, policy_id):
+                    # the counts of a group are removed with those of its policies
+                    key = ((group_id, None) if group_id not in group_ids
+                           else (group_id, policy_id))
+                    if key not in removed:
+                        removed.append(key)
+                    continue
+                for column in ('groups', 'policies', 'webhooks'):
+                    count = counts.pop((group_id, policy_id, column), 0)
+                    if count != (row[column] or 0):
+                        changes.append((group_id, policy_id, column,
+                                        count - (row[column] or 0)))
+            changes.extend((group_id, policy_id, column, count)
+                           for (group_id, policy_id, column), count in sorted(counts.iteritems())
+                           if count and _exists(group_id, policy_id))
+
+            d = defer.gatherResults([_still_missing(group_id, policy_id)
+                                     for group_id, policy_id in removed],
+                                    consumeErrors=True)
+            d.addErrback(unwrap_first_error)
+            return d.addCallback(
+                lambda missing: _write(changes, [key for key, gone in zip(removed, missing)
+                                                 if gone]))
+
+        def _still_missing(group_id, policy_id):
+            if policy_id is None:
+                query = _cql_view.format(cf=self.group_table, column='"groupId"')
+                params = {'tenantId': tenant_id, 'groupId': group_id}
+                consistency = get_consistency_level('view', 'group')
+            else:
+                query = _cql_view_policy.format(cf=self.policies_table)
+                params = {'tenantId': tenant_id, 'groupId': group_id, 'policyId': policy_id}
+                consistency = get_consistency_level('view', 'policy')
+            d = self.connection.execute(query, params, consistency)
+            return d.addCallback(
+                lambda rows: not rows or (policy_id is None and not rows[0]['created_at']))
+
+        def _write(changes, removed):
+            if not changes and not removed:
+                return 0
+            log.msg('Repairing resource counts', tenant_id=tenant_id,
+                    changes=changes, removed=removed)
+            ds = [self.resource_counts.add(self.connection, log, tenant_id, changes)]
+            ds.extend(self.resource_counts.remove(self.connection, log, tenant_id,
+                                                  group_id, policy_id)
+                      for group_id, policy_id in removed)
+            d = defer.gatherResults(ds, consumeErrors=True)
+            return d.addCallback(lambda _: len(changes) + len(removed))
+
+        return d.addCallback(_correct)
+
     def health_check(self, clock=None):
         """
         see :meth:`otter.models.interface.IScalingGroupCollection.health_check`
@@ -1311,37 +2919,99 @@ class CassAdmin(object):
     .. autointerface:: otter.models.interface.IAdmin
     """
 
-    def __init__(self, connection):
+    def __init__(self, connection, resource_counts=None, cached=False, config_cache=None):
+        """
+        :param resource_counts: :class:`ResourceCounts` to read the totals from
+            instead of counting every row, if counts are kept
+        :param bool cached: Whether metrics are served from the snapshot taken by
+            the last :meth:`refresh_metrics`, instead of taken by every call
+        :param config_cache: :class:`ConfigCache` whose metrics are added, if any
+        """
         self.connection = connection
+        self.resource_counts = resource_counts
+        self.cached = cached
+        self.config_cache = config_cache
+        # (``dict`` of counts by label, time taken) of the last refresh
+        self.snapshot = None
+        self._refreshing = None
 
-    def get_metrics(self, log):
+    def _take_snapshot(self):
         """
-        see :meth:`otter.models.interface.IAdmin.get_metrics`
+        Count the groups, policies and webhooks of all tenants, reading their
+        totals in :class:`ResourceCounts` if counts are kept, or counting the rows
+        of every table otherwise. Concurrent calls share the same count.
+
+        :return: Deferred firing with the snapshot taken
         """
-        def _get_metric(table, label):
-            """
-            Execute a CQL statement and return a formatted result
-            """
-            def _format_result(result, label):
-                """
-                :param result: Result from metric collection
-                :param label: Label for the metric
-
-                :return: dict of metric label, value and time
-                """
-                return dict(
-                    id="otter.metrics.{0}".format(label),
-                    value=result[0]['count'],
-                    time=int(time.time()))
-
-            dc = self.connection.execute(_cql_count_all.format(cf=table), {},
+        if self._refreshing is not None:
+            d = defer.Deferred()
+            self._refreshing.append(d)
+            return d
+
+        if self.resource_counts is not None:
+            d = self.resource_counts.view(self.connection, '')
+        else:
+            labels = ['groups', 'policies', 'webhooks']
+            tables = ['scaling_group', 'scaling_policies', 'policy_webhooks']
+            d = defer.gatherResults(
+                [self.connection.execute(_cql_count_all.format(cf=table), {},
                                          get_consistency_level('count', 'group'))
-            dc.addCallback(_format_result, label)
-            return dc
+                 for table in tables],
+                consumeErrors=True)
+            d.addErrback(unwrap_first_error)
+            d.addCallback(lambda results: dict(
+                (label, rows[0]['count']) for label, rows in zip(labels, results)))
+
+        def _taken(result):
+            waiting, self._refreshing = self._refreshing, None
+            if not isinstance(result, Failure):
+                self.snapshot = (result, time.time())
+                result = self.snapshot
+            for waiter in waiting:
+                waiter.callback(result)
+            return result
+
+        self._refreshing = []
+        return d.addBoth(_taken)
 
-        tables = ['scaling_group', 'scaling_policies', 'policy_webhooks']
-        labels = ['groups', 'policies', 'webhooks']
-        mapping = zip(tables, labels)
+    def refresh_metrics(self, log):
+        """
+        Take a new snapshot of the metrics, logging a failure to take it
+
+        :return: Deferred firing with None once taken
+        """
+        d = self._take_snapshot()
+        d.addCallback(lambda _: None)
+        return d.addErrback(log.err, 'Could not refresh metrics')
 
-        deferreds = [_get_metric(table, label) for table, label in mapping]
-        return defer.gatherResults(deferreds, consumeErrors=True)
+    def get_metrics(self, log):
+        """
+        see :meth:`otter.models.interface.IAdmin.get_metrics`
+
+        The time of the counts is when they were taken, and the metric
+        ``otter.metrics.snapshot_age`` is how many seconds ago that was. When
+        cached, the counts are never taken by this call: they are left out until
+        :meth:`refresh_metrics` takes the first snapshot.
+        """
+        if not self.cached:
+            d = self._take_snapshot()
+        elif self.snapshot is not None:
+            d = defer.succeed(self.snapshot)
+        else:
+            d = defer.succeed(None)
+
+        def _format(snapshot):
+            metrics = []
+            if snapshot is not None:
+                counts, taken = snapshot
+                now = time.time()
+                metrics = [dict(id='otter.metrics.{0}'.format(label),
+                                value=counts[label], time=int(taken))
+                           for label in ('groups', 'policies', 'webhooks')]
+                metrics.append(dict(id='otter.metrics.snapshot_age',
+                                    value=int(now - taken), time=int(now)))
+            if self.config_cache is not None:
+                metrics.extend(self.config_cache.get_metrics())
+            return metrics
+
+        return d.addCallback(_format)
@@ -1,11 +1,82 @@
 """
 Interface to be used by the scaling groups engine
 """
+import heapq
+
 from zope.interface import Interface, Attribute
 
 from otter.util import timestamp
 
 
+class _CreationIndex(object):
+    """
+    Creation-ordered index of a mapping of IDs to info dicts that have a
+    ``created`` timestamp.  The timestamps are parsed and the index is built
+    the first time it is used, after which it is kept up to date as IDs are
+    added and removed, so getting the first ``count`` IDs takes
+    O(count log n).  Removed IDs are only dropped from the heap when they get
+    to the top.
+
+    :ivar dict entries: the mapping of ID to info that is indexed
+    :ivar bool newest_first: whether the most recently created IDs come first
+    """
+    __slots__ = ('entries', 'newest_first', '_epochs', '_heap')
+
+    def __init__(self, entries, newest_first=False):
+        self.entries = entries
+        self.newest_first = newest_first
+        self._epochs = None
+        self._heap = None
+
+    def _key(self, entry_id):
+        epoch = self._epochs[entry_id]
+        return (-epoch if self.newest_first else epoch, entry_id)
+
+    def _build(self):
+        self._epochs = dict((entry_id, timestamp.to_epoch(info['created']))
+                            for entry_id, info in self.entries.iteritems())
+        self._heap = [self._key(entry_id) for entry_id in self._epochs]
+        heapq.heapify(self._heap)
+
+    def add(self, entry_id):
+        """
+        Index ``entry_id`` that was just added to the entries
+        """
+        if self._heap is None:
+            return
+        self._epochs[entry_id] = timestamp.to_epoch(self.entries[entry_id]['created'])
+        if len(self._heap) >= 2 * len(self._epochs):
+            self._build()
+        else:
+            heapq.heappush(self._heap, self._key(entry_id))
+
+    def remove(self, entry_id):
+        """
+        Forget ``entry_id`` that was just removed from the entries
+        """
+        if self._epochs is not None:
+            del self._epochs[entry_id]
+
+    def first(self, count):
+        """
+        :return: ``list`` of up to ``count`` IDs in creation order
+        """
+        if self._heap is None:
+            self._build()
+        popped = []
+        ids = []
+        while self._heap and len(ids) < count:
+            key = heapq.heappop(self._heap)
+            entry_id = key[1]
+            if entry_id in self._epochs and self._key(entry_id) == key:
+                popped.append(key)
+                if entry_id not in ids:
+                    ids.append(entry_id)
+        for key in popped:
+            heapq.heappush(self._heap, key)
+        return ids
+
+
 class GroupState(object):
     """
     Object that represents the state
@@ -27,11 +98,33 @@ class GroupState(object):
         last time any policy was executed on the group.  Could be None.
     :ivar callable now: callable that returns a ``str`` timestamp - used for
         testing purposes.  Defaults to :func:`timestamp.now`
+    :ivar dict standby: the mapping of the ids of the servers of the warm pool,
+        built but not on any load balancer nor counted in the capacity, and
+        their info, which includes the ``config`` key of the launch config
+        they were built from
+    :ivar dict standby_pending: the mapping of the ids of the jobs building
+        servers for the warm pool and their info
+
+    ``active``, ``pending`` and ``policy_touched`` are kept in their stored
+    format, but the times in them are parsed at most once and ``active`` and
+    ``pending`` are indexed by creation time.  The indexes and parsed times
+    are only kept up to date by the methods of this class, so modify the
+    dictionaries through them (or assign new ones).
 
     TODO: ``remove_active``, ``pause`` and ``resume`` ?
     """
+    __slots__ = ('tenant_id', 'group_id', 'group_name', 'desired', 'paused', 'now',
+                 '_active', '_pending', '_policy_touched', '_group_touched',
+                 '_touched_epochs', 'standby', 'standby_pending')
+
+    _attributes = (
+        'tenant_id', 'group_id', 'group_name', 'desired', 'active',
+        'pending', 'group_touched', 'policy_touched', 'paused', 'standby',
+        'standby_pending')
+
     def __init__(self, tenant_id, group_id, group_name, active, pending, group_touched,
-                 policy_touched, paused, desired=0, now=timestamp.now):
+                 policy_touched, paused, desired=0, now=timestamp.now, standby=None,
+                 standby_pending=None):
         self.tenant_id = tenant_id
         self.group_id = group_id
         self.group_name = group_name
@@ -41,15 +134,43 @@ class GroupState(object):
         self.paused = paused
         self.policy_touched = policy_touched
         self.group_touched = group_touched
-
-        if self.group_touched is None:
-            self.group_touched = timestamp.MIN
+        self.standby = {} if standby is None else standby
+        self.standby_pending = {} if standby_pending is None else standby_pending
 
         self.now = now
 
-        self._attributes = (
-            'tenant_id', 'group_id', 'group_name', 'desired', 'active',
-            'pending', 'group_touched', 'policy_touched', 'paused')
+    def _set_active(self, active):
+        """
+        Replace the active servers and their index
+        """
+        self._active = _CreationIndex(active)
+
+    def _set_pending(self, pending):
+        """
+        Replace the pending jobs and their index
+        """
+        self._pending = _CreationIndex(pending, newest_first=True)
+
+    def _set_policy_touched(self, policy_touched):
+        """
+        Replace the policy touched times and forget their parsed times
+        """
+        self._policy_touched = policy_touched
+        self._touched_epochs = {}
+
+    def _set_group_touched(self, group_touched):
+        """
+        Replace the group touched time (MIN if None) and forget its parsed time
+        """
+        if group_touched is None:
+            group_touched = timestamp.MIN
+        self._group_touched = group_touched
+        self._touched_epochs.pop(None, None)
+
+    active = property(lambda self: self._active.entries, _set_active)
+    pending = property(lambda self: self._pending.entries, _set_pending)
+    policy_touched = property(lambda self: self._policy_touched, _set_policy_touched)
+    group_touched = property(lambda self: self._group_touched, _set_group_touched)
 
     def __eq__(self, other):
         """
@@ -84,6 +205,7 @@ class GroupState(object):
         """
         assert job_id in self.pending, "Job doesn't exist: {0}".format(job_id)
         del self.pending[job_id]
+        self._pending.remove(job_id)
 
     def add_job(self, job_id):
         """
@@ -96,6 +218,7 @@ class GroupState(object):
         """
         assert job_id not in self.pending, "Job exists: {0}".format(job_id)
         self.pending[job_id] = {'created': self.now()}
+        self._pending.add(job_id)
 
     def add_active(self, server_id, server_info):
         """
@@ -111,6 +234,7 @@ class GroupState(object):
         assert server_id not in self.active, "Server already exists: {}".format(server_id)
         server_info.setdefault('created', self.now())
         self.active[server_id] = server_info
+        self._active.add(server_id)
 
     def remove_active(self, server_id):
         """
@@ -121,6 +245,97 @@ class GroupState(object):
         """
         assert server_id in self.active, "Server does not exists: {}".format(server_id)
         del self.active[server_id]
+        self._active.remove(server_id)
+
+    def add_standby_job(self, job_id, config):
+        """
+        Adds a job building a server for the warm pool.
+
+        :param str job_id: the id of the job
+        :param str config: the key of the launch config the server is built from
+        :raises: :class:`AssertionError` if the job already exists
+        """
+        assert job_id not in self.standby_pending, "Job exists: {0}".format(job_id)
+        self.standby_pending[job_id] = {'created': self.now(), 'config': config}
+
+    def remove_standby_job(self, job_id):
+        """
+        Removes a job building a server for the warm pool.
+
+        :param str job_id: the id of the job
+        :raises: :class:`AssertionError` if the job doesn't exist
+        """
+        assert job_id in self.standby_pending, "Job doesn't exist: {0}".format(job_id)
+        del self.standby_pending[job_id]
+
+    def add_standby(self, server_id, server_info):
+        """
+        Adds a built server to the warm pool.  Adds a creation time if there
+        isn't one.
+
+        :param str server_id: the id of the server
+        :param dict server_info: the server info, like that of active servers
+            plus the ``config`` key of the launch config it was built from
+        :raises: :class:`AssertionError` if the server id already exists
+        """
+        assert server_id not in self.standby, "Server already exists: {}".format(server_id)
+        server_info.setdefault('created', self.now())
+        self.standby[server_id] = server_info
+
+    def remove_standby(self, server_id):
+        """
+        Removes a server from the warm pool.
+
+        :param str server_id: the id of the server
+        :raises: :class:`AssertionError` if the server id does not exist
+        """
+        assert server_id in self.standby, "Server does not exists: {}".format(server_id)
+        del self.standby[server_id]
+
+    def take_standby(self, config, count):
+        """
+        Removes up to ``count`` servers built from the launch config with key
+        ``config`` from the warm pool, oldest first.
+
+        :returns: ``list`` of the info of the removed servers
+        """
+        servers = sorted((info for info in self.standby.itervalues()
+                          if info.get('config') == config),
+                         key=lambda info: timestamp.to_epoch(info['created']))[:count]
+        for info in servers:
+            del self.standby[info['id']]
+        return servers
+
+    def get_oldest_active(self, count):
+        """
+        :param int count: the number of servers to return
+        :returns: ``list`` of the ids of the ``count`` oldest active servers,
+            oldest first
+        """
+        return self._active.first(count)
+
+    def get_newest_pending(self, count):
+        """
+        :param int count: the number of jobs to return
+        :returns: ``list`` of the ids of the ``count`` most recently created
+            pending jobs, newest first
+        """
+        return self._pending.first(count)
+
+    def get_touched_epoch(self, policy_id=None):
+        """
+        :param str policy_id: the id of the policy, or None for the group
+        :returns: the last time, in seconds since the epoch, the policy (or any
+            policy of the group) was executed, or None if it never was
+        """
+        if policy_id not in self._touched_epochs:
+            if policy_id is None:
+                touched = self.group_touched
+            else:
+                touched = self.policy_touched.get(policy_id)
+            self._touched_epochs[policy_id] = (
+                None if touched is None else timestamp.to_epoch(touched))
+        return self._touched_epochs[policy_id]
 
     def mark_executed(self, policy_id):
         """
@@ -131,6 +346,7 @@ class GroupState(object):
         :returns: None
         """
         self.policy_touched[policy_id] = self.group_touched = self.now()
+        self._touched_epochs.pop(policy_id, None)
 
     def get_capacity(self):
         """
@@ -360,6 +576,47 @@ class IScalingGroup(Interface):
             with this uuid) does not exist
         """
 
+    def view_execution_bundle(policy_id, version=None):
+        """
+        Reads everything needed to execute a scaling policy at once: the state,
+        the config and the launch config of the group, and the policy.
+
+        :param policy_id: the uuid of the policy
+        :type policy_id: ``str``
+
+        :param version: version of policy to check as Type-1 UUID
+        :type version: ``UUID``
+
+        :return: a :class:`twisted.internet.defer.Deferred` that fires with a
+            ``tuple`` of the :class:`GroupState`, the group config, the launch
+            config and the policy, as returned by :meth:`view_state`,
+            :meth:`view_config`, :meth:`view_launch_config` and
+            :meth:`get_policy`
+
+        :raises: :class:`NoSuchScalingGroupError` if this scaling group (one
+            with this uuid) does not exist
+        :raises: :class:`NoSuchPolicyError` if the policy id does not exist
+        """
+
+    def modify_state_for_policy(modifier_callable, policy_id, version=None):
+        """
+        Updates the scaling group state like :meth:`modify_state`, for executing
+        the given policy.  The state is read along with the group config, the
+        launch config and the policy, as by :meth:`view_execution_bundle`.
+
+        :param modifier_callable: a ``callable`` that takes as first two
+            arguments the :class:`IScalingGroup`, a :class:`GroupState`, and
+            the group config, launch config and policy as ``config``,
+            ``launch`` and ``policy`` keyword arguments, and returns a
+            :class:`GroupState`.
+
+        :return: a :class:`twisted.internet.defer.Deferred` that fires with None
+
+        :raises: :class:`NoSuchScalingGroupError` if this scaling group (one
+            with this uuid) does not exist
+        :raises: :class:`NoSuchPolicyError` if the policy id does not exist
+        """
+
     def create_policies(data):
         """
         Create a set of new scaling policies.
@@ -575,6 +832,45 @@ class IScalingScheduleCollection(Interface):
         :return: Deferred that fires with list of dict representing a row
         """
 
+    def claim_events(bucket, now, size=100, lease=60):
+        """
+        Claim a batch of scheduled events in a bucket occurring now or before that
+        are not claimed by others. Unlike :meth:`fetch_and_delete`, the events are
+        not deleted: they must be deleted with :meth:`delete_claimed_events` once
+        they are executed. Others skip the claimed events until the claim is
+        deleted or `lease` seconds have passed, so the events of a bucket can be
+        claimed by many nodes at once, and the events of a node that died while
+        executing them are claimed by others after the lease expires.
+
+        :param bucket: bucket whose events are to be claimed
+        :type param: ``int``
+
+        :param now: the current time
+        :type now: ``datetime``
+
+        :param size: maximum number of events to claim
+        :type size: ``int``
+
+        :param lease: seconds after which the claim expires
+        :type lease: ``int``
+
+        :return: Deferred that fires with list of dict representing a row
+        """
+
+    def delete_claimed_events(bucket, events):
+        """
+        Delete events claimed with :meth:`claim_events` and release their claims
+
+        :param bucket: bucket the events were claimed from
+        :type param: ``int``
+
+        :param events: list of claimed events (dict) as returned by
+            :meth:`claim_events`
+        :type events: ``list``
+
+        :return: Deferred that fires with None
+        """
+
     def add_cron_events(cron_events):
         """
         Add cron events equally distributed among the buckets
@@ -585,14 +881,89 @@ class IScalingScheduleCollection(Interface):
         :return: None
         """
 
-    def get_oldest_event(bucket):
+    def move_events(bucket, size=100, lease=None):
+        """
+        Move a batch of events, due or not, from the bucket to the buckets currently
+        used to add events, equally distributed among them. Used to empty buckets
+        that are no longer used after changing number of buckets
+
+        :param bucket: bucket whose events are to be moved
+        :type param: ``int``
+
+        :param size: maximum number of events to fetch for moving
+        :type size: ``int``
+
+        :param lease: If given, events are claimed as in :meth:`claim_events` for
+            this many seconds while being moved. Events claimed by others are not
+            moved since they may be being executed
+        :type lease: ``int``
+
+        :return: Deferred that fires with number of events moved
+        """
+
+    def get_oldest_event(bucket, after=None):
         """
         Get oldest event from the bucket
 
         :param bucket: oldest event from this bucket
         :type param: ``int``
 
-        :return: Deferred that fires with dict of oldest event
+        :param after: If given, get oldest event triggering after this time
+        :type after: ``datetime``
+
+        :return: Deferred that fires with dict of oldest event or None if there is
+            no such event
+        """
+
+
+class IServerDeletionQueue(Interface):
+    """
+    A durable queue of servers to be deleted, so that deletions are not lost if the
+    process deleting them stops
+    """
+
+    def add_server_deletions(log, transaction_id, tenant_id, group_id, servers):
+        """
+        Queue deletion of servers of a scaling group
+
+        :param log: bound logger
+        :param str transaction_id: transaction ID of the scale down
+        :param str tenant_id: tenant ID of the group
+        :param str group_id: ID of the group the servers belonged to
+        :param list servers: server info (dict) of the active state, each containing
+            at least ``id`` and ``lb_info``
+
+        :return: Deferred that fires with None once the deletions are queued
+        """
+
+    def claim_server_deletions(now, size=100, lease=600):
+        """
+        Claim a batch of queued server deletions that are not claimed by others.
+        Like :meth:`IScalingScheduleCollection.claim_events`, others skip claimed
+        deletions until they are deleted with :meth:`delete_server_deletions` or
+        `lease` seconds have passed, so deletions left behind by a node that stopped
+        are picked up by others.
+
+        :param now: the current time
+        :type now: ``datetime``
+
+        :param int size: maximum number of deletions to claim
+        :param int lease: seconds after which the claim expires
+
+        :return: Deferred that fires with list of dicts with ``tenantId``,
+            ``groupId``, ``serverId``, ``transactionId`` and ``server`` (the server
+            info given to :meth:`add_server_deletions`)
+        """
+
+    def delete_server_deletions(deletions):
+        """
+        Remove deletions claimed with :meth:`claim_server_deletions` from the queue
+        once the servers are deleted, and release their claims
+
+        :param list deletions: deletions (dict) as returned by
+            :meth:`claim_server_deletions`
+
+        :return: Deferred that fires with None
         """
 
 
@@ -736,5 +1107,7 @@ class IAdmin(Interface):
             }
 
         :return: a :class:`twisted.internet.defer.Deferred` containing current
-            count of tenants policies, webhooks and groups as ``dict``
+            count of tenants policies, webhooks and groups as ``dict``. The counts
+            may come from a snapshot taken earlier, whose age is then included,
+            and are left out if no snapshot was taken yet
         """
@@ -2,7 +2,9 @@
 Mock (in memory) implementation of the store for the front-end scaling groups
 engine
 """
-from collections import defaultdict
+from calendar import timegm
+from collections import defaultdict, OrderedDict
+from copy import deepcopy
 from uuid import uuid4
 
 from zope.interface import implementer
@@ -14,7 +16,7 @@ from otter.models.interface import (
     NoSuchScalingGroupError, NoSuchPolicyError, NoSuchWebhookError,
     UnrecognizedCapabilityError, IScalingScheduleCollection,
     IAdmin, ScalingGroupOverLimitError, WebhooksOverLimitError,
-    PoliciesOverLimitError)
+    PoliciesOverLimitError, IServerDeletionQueue)
 from otter.util.hashkey import generate_capability
 from otter.util.config import config_value
 
@@ -166,18 +168,39 @@ class MockScalingGroup:
             return defer.fail(self.error)
         return defer.succeed(self.state)
 
+    def view_execution_bundle(self, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_execution_bundle`
+        """
+        d = self.get_policy(policy_id, version)
+        return d.addCallback(lambda policy: (self.state, self.config.copy(),
+                                             self.launch.copy(), policy))
+
+    def _assign_state(self, new_state):
+        """
+        Replace the state with `new_state` returned by a modifier
+        """
+        assert (new_state.tenant_id == self.tenant_id and
+                new_state.group_id == self.uuid)
+        self.state = new_state
+
     def modify_state(self, modifier_callable, *args, **kwargs):
         """
         see :meth:`otter.models.interface.IScalingGroup.modify_state`
         """
-        def assign_state(new_state):
-            assert (new_state.tenant_id == self.tenant_id and
-                    new_state.group_id == self.uuid)
-            self.state = new_state
-
         d = self.view_state()
         d.addCallback(lambda state: modifier_callable(self, state, *args, **kwargs))
-        d.addCallback(assign_state)
+        d.addCallback(self._assign_state)
+        return d
+
+    def modify_state_for_policy(self, modifier_callable, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.modify_state_for_policy`
+        """
+        d = self.view_execution_bundle(policy_id, version)
+        d.addCallback(lambda (state, config, launch, policy): modifier_callable(
+            self, state, config=config, launch=launch, policy=policy))
+        d.addCallback(self._assign_state)
         return d
 
     def update_config(self, data, partial_update=False):
@@ -400,7 +423,8 @@ class MockScalingGroup:
         if self.error is not None:
             return defer.fail(self.error)
 
-        if len(self.state.pending) + len(self.state.active) > 0:
+        if (len(self.state.pending) + len(self.state.active) + len(self.state.standby) +
+                len(self.state.standby_pending)) > 0:
             return defer.fail(GroupNotEmptyError(self.tenant_id, self.uuid))
 
         collection = self._collection
@@ -410,7 +434,7 @@ class MockScalingGroup:
         return defer.succeed(None)
 
 
-@implementer(IScalingGroupCollection, IScalingScheduleCollection)
+@implementer(IScalingGroupCollection, IScalingScheduleCollection, IServerDeletionQueue)
 class MockScalingGroupCollection:
     """
     .. autointerface:: otter.models.interface.IScalingGroupCollection
@@ -422,6 +446,10 @@ class MockScalingGroupCollection:
         # If all authorization passes, and the user doesn't exist in the store,
         # then they must be a valid new user.  Just create an account for them.
         self.data = defaultdict(dict)
+        # (tenant ID, server ID) -> queued deletion, in the order queued
+        self.deletions = OrderedDict()
+        # (tenant ID, server ID) -> time in seconds at which claim of deletion expires
+        self.deletion_claims = {}
 
     def create_scaling_group(self, log, tenant, config, launch, policies=None):
         """
@@ -465,18 +493,70 @@ class MockScalingGroupCollection:
         """
         return defer.succeed([])
 
+    def claim_events(self, bucket, now, size=100, lease=60):
+        """
+        see :meth:`otter.models.interface.IScalingScheduleCollection.claim_events`
+        """
+        return defer.succeed([])
+
+    def delete_claimed_events(self, bucket, events):
+        """
+        see :meth:`otter.models.interface.IScalingScheduleCollection.delete_claimed_events`
+        """
+        return defer.succeed(None)
+
     def add_cron_events(self, events):
         """
         see :meth:`otter.models.interface.IScalingScheduleCollection.update_delete_events`
         """
         return defer.succeed(None)
 
-    def get_oldest_event(self, bucket):
+    def move_events(self, bucket, size=100, lease=None):
+        """
+        see :meth:`otter.models.interface.IScalingScheduleCollection.move_events`
+        """
+        return defer.succeed(0)
+
+    def get_oldest_event(self, bucket, after=None):
         """
         see :meth:`otter.models.interface.IScalingScheduleCollection.get_oldest_event`
         """
         return defer.succeed(None)
 
+    def add_server_deletions(self, log, transaction_id, tenant_id, group_id, servers):
+        """
+        see :meth:`otter.models.interface.IServerDeletionQueue.add_server_deletions`
+        """
+        for server in servers:
+            self.deletions[(tenant_id, server['id'])] = {
+                'tenantId': tenant_id, 'groupId': group_id, 'serverId': server['id'],
+                'transactionId': transaction_id, 'server': deepcopy(server)}
+        return defer.succeed(None)
+
+    def claim_server_deletions(self, now, size=100, lease=600):
+        """
+        see :meth:`otter.models.interface.IServerDeletionQueue.claim_server_deletions`
+        """
+        now_seconds = timegm(now.utctimetuple())
+        claimed = []
+        for key, deletion in self.deletions.iteritems():
+            if len(claimed) == size:
+                break
+            if self.deletion_claims.get(key, now_seconds) <= now_seconds:
+                self.deletion_claims[key] = now_seconds + lease
+                claimed.append(deepcopy(deletion))
+        return defer.succeed(claimed)
+
+    def delete_server_deletions(self, deletions):
+        """
+        see :meth:`otter.models.interface.IServerDeletionQueue.delete_server_deletions`
+        """
+        for deletion in deletions:
+            key = (deletion['tenantId'], deletion['serverId'])
+            self.deletions.pop(key, None)
+            self.deletion_claims.pop(key, None)
+        return defer.succeed(None)
+
     def webhook_info_by_hash(self, log, capability_hash):
         """
         see :meth:`otter.models.interface.IScalingGroupCollection.webhook_info_by_hash`
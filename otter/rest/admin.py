@@ -11,11 +11,18 @@ class OtterAdmin(object):
     """
     app = OtterApp()
 
-    def __init__(self, store):
+    def __init__(self, store, scheduler_metrics=None, supervisor=None):
         """
         Initialize OtterAdmin.
+
+        :param scheduler_metrics: Optional :class:`otter.scheduler.SchedulerMetrics`
+            to report along with the store metrics
+        :param supervisor: Optional :class:`otter.supervisor.SupervisorService`
+            whose metrics are reported along with the store metrics
         """
         self.store = store
+        self.scheduler_metrics = scheduler_metrics
+        self.supervisor = supervisor
 
     @app.route('/', methods=['GET'])
     def root(self, request):
@@ -29,4 +36,5 @@ class OtterAdmin(object):
         """
         Routes related to metrics are delegated to OtterMetrics.
         """
-        return OtterMetrics(self.store).app.resource()
+        return OtterMetrics(self.store, self.scheduler_metrics,
+                            self.supervisor).app.resource()
@@ -224,7 +224,13 @@ class OtterLaunch(object):
         Nova should validate the image before saving the new config.
         Users may have an invalid configuration based on dependencies.
         """
+        def _do_obey_warm_pool_change(_):
+            return rec.modify_state(
+                partial(controller.obey_warm_pool_change, self.log,
+                        transaction_id(request), launch=data))
+
         rec = self.store.get_scaling_group(self.log, self.tenant_id, self.group_id)
         deferred = get_supervisor().validate_launch_config(self.log, self.tenant_id, data)
         deferred.addCallback(lambda _: rec.update_launch_config(data))
+        deferred.addCallback(_do_obey_warm_pool_change)
         return deferred
@@ -16,12 +16,16 @@ class OtterMetrics(object):
     """
     app = OtterApp()
 
-    def __init__(self, store):
+    def __init__(self, store, scheduler_metrics=None, supervisor=None):
         """
-        Initialize OtterMetrics with a data store and log.
+        Initialize OtterMetrics with a data store and log, and optionally
+        :class:`otter.scheduler.SchedulerMetrics` of the scheduler and the
+        :class:`otter.supervisor.SupervisorService` running in this process.
         """
         self.log = log.bind(system='otter.rest.metrics')
         self.store = store
+        self.scheduler_metrics = scheduler_metrics
+        self.supervisor = supervisor
 
     @app.route('/', methods=['GET'])
     @with_transaction_id()
@@ -29,7 +33,8 @@ class OtterMetrics(object):
     @succeeds_with(200)
     def list_metrics(self, request):
         """
-        Get a list of metrics from cassandra.
+        Get a list of metrics from cassandra, followed by scheduler metrics if the
+        scheduler runs in this process and by supervisor metrics.
 
         Example response::
 
@@ -49,5 +54,10 @@ class OtterMetrics(object):
             }
         """
         deferred = self.store.get_metrics(self.log)
+        if self.scheduler_metrics is not None:
+            deferred.addCallback(
+                lambda metrics: metrics + self.scheduler_metrics.get_metrics())
+        if self.supervisor is not None:
+            deferred.addCallback(lambda metrics: metrics + self.supervisor.get_metrics())
         deferred.addCallback(lambda metrics: json.dumps({'metrics': metrics}))
         return deferred
@@ -18,6 +18,7 @@ from otter.rest.otterapp import OtterApp
 from otter.rest.webhooks import OtterWebhooks
 from otter.util.http import get_autoscale_links, transaction_id, get_policies_links
 from otter import controller
+from otter.controller import modify_state_unless_cooling_down
 from jsonschema import ValidationError
 
 
@@ -370,9 +371,10 @@ class OtterPolicy(object):
             {}
         """
         group = self.store.get_scaling_group(self.log, self.tenant_id, self.scaling_group_id)
-        d = group.modify_state(partial(controller.maybe_execute_scaling_policy,
-                                       self.log, transaction_id(request),
-                                       policy_id=self.policy_id))
+        d = modify_state_unless_cooling_down(
+            self.log, group, self.policy_id,
+            partial(controller.maybe_execute_scaling_policy,
+                    self.log, transaction_id(request), policy_id=self.policy_id))
         d.addCallback(lambda _: "{}")  # Return value TBD
         return d
 
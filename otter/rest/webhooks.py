@@ -24,7 +24,7 @@ from otter.models.interface import (
     NoSuchScalingGroupError
 )
 
-from otter.controller import CannotExecutePolicyError
+from otter.controller import CannotExecutePolicyError, modify_state_unless_cooling_down
 from otter import controller
 
 
@@ -369,9 +369,11 @@ class OtterExecute(object):
                                       policy_id=policy_id)
             logl[0] = bound_log
             group = self.store.get_scaling_group(bound_log, tenant_id, group_id)
-            return group.modify_state(partial(controller.maybe_execute_scaling_policy,
-                                              bound_log, transaction_id(request),
-                                              policy_id=policy_id))
+            return modify_state_unless_cooling_down(
+                bound_log, group, policy_id,
+                partial(controller.maybe_execute_scaling_policy,
+                        bound_log, transaction_id(request), policy_id=policy_id),
+                coalesce=True)
 
         d.addCallback(execute_policy)
         d.addErrback(log_informational_webhook_failure)
@@ -4,15 +4,22 @@ is right all the time and is probably what caused your regular clock to get brok
 in the first place.
 """
 
-from datetime import datetime
+from collections import OrderedDict
+from bisect import bisect_left
+from calendar import timegm
+from copy import copy, deepcopy
+from datetime import datetime, timedelta
 from functools import partial
+from time import mktime
 from croniter import croniter
 
 from twisted.internet import defer
+from twisted.python.failure import Failure
 from twisted.application.internet import TimerService
 
 from otter.util.hashkey import generate_transaction_id
-from otter.controller import maybe_execute_scaling_policy, CannotExecutePolicyError
+from otter.controller import (
+    maybe_execute_scaling_policy, CannotExecutePolicyError, modify_state_unless_cooling_down)
 from otter.log import log as otter_log
 from otter.models.interface import NoSuchPolicyError, NoSuchScalingGroupError
 from otter.util.deferredutils import ignore_and_log
@@ -24,7 +31,9 @@ class SchedulerService(TimerService):
     """
 
     def __init__(self, batchsize, interval, store, kz_client,
-                 zk_partition_path, time_boundary, buckets, clock=None, threshold=60):
+                 zk_partition_path, time_boundary, buckets, clock=None, threshold=60,
+                 event_driven=False, prefetch=0, limiter=None, metrics=None,
+                 partitioner=None, retired_buckets=(), lease=None):
         """
         Initialize the scheduler service
 
@@ -35,8 +44,31 @@ class SchedulerService(TimerService):
         :param zk_partition_path: Partiton path used by kz_client to partition the buckets
         :param time_boundary: Time to wait for partition to become stable
         :param clock: An instance of IReactorTime provider that defaults to reactor if not provided
+        :param bool event_driven: If True, each iteration only re-seeds the earliest
+            trigger of every owned bucket and a timer is armed to check a bucket exactly
+            when its earliest event is due. Otherwise, every owned bucket is checked on
+            each iteration
+        :param int prefetch: Number of batches to fetch ahead while a batch is being
+            processed. See :func:`check_events_in_bucket`
+        :param limiter: Optional :class:`otter.util.deferredutils.FairLimiter`
+            through which all events are executed, keyed by tenant ID
+        :param metrics: Optional :class:`SchedulerMetrics` to record performance in
+        :param partitioner: Callable taking partition path, `set` and `time_boundary`
+            keyword arguments like `kz_client.SetPartitioner`, which is the default,
+            that returns the partition of buckets to use. See
+            :class:`otter.util.partitioner.ConsistentHashPartitioner`
+        :param retired_buckets: Buckets in `buckets` that are no longer used to add
+            events after number of buckets was reduced. Their events are still
+            executed, and then the remaining ones are moved to the other buckets
+        :param lease: If given, events are claimed for this many seconds and deleted
+            only after they are executed, instead of being deleted when fetched. Since
+            claimed events are skipped by others, buckets owned by other nodes whose
+            oldest event is late by more than `threshold` seconds are also checked
+            after the owned buckets, at most once every `threshold` seconds unless
+            they were lagging. The lease must be longer than executing a batch
         """
         TimerService.__init__(self, interval, self.check_events, batchsize)
+        self.batchsize = batchsize
         self.store = store
         self.clock = clock
         self.kz_client = kz_client
@@ -45,15 +77,38 @@ class SchedulerService(TimerService):
         self.time_boundary = time_boundary
         self.kz_partition = None
         self.threshold = threshold
+        self.event_driven = event_driven
+        self.prefetch = prefetch
+        self.limiter = limiter
+        self.metrics = metrics
+        self.partitioner = partitioner
+        self.retired_buckets = set(retired_buckets)
+        self.lease = lease
+        # bucket -> (earliest trigger, IDelayedCall) of armed wakeups
+        self.wakeups = {}
+        # buckets whose events are being checked by a wakeup
+        self.draining = set()
+        # bucket -> time it was last checked by a wakeup, with a lease. The due
+        # events left in it are claimed by others
+        self.checked = {}
+        # bucket -> time before which a bucket owned by others cannot be lagging,
+        # with a lease. Its oldest event is not read again until then
+        self.lagging_checks = {}
         self.log = otter_log.bind(system='otter.scheduler')
 
+    def new_partition(self):
+        """
+        Return new partition of the buckets
+        """
+        partitioner = self.partitioner or self.kz_client.SetPartitioner
+        return partitioner(self.zk_partition_path, set=set(self.buckets),
+                           time_boundary=self.time_boundary)
+
     def startService(self):
         """
         Start this service. This will start buckets partitioning
         """
-        self.kz_partition = self.kz_client.SetPartitioner(
-            self.zk_partition_path, set=set(self.buckets),
-            time_boundary=self.time_boundary)
+        self.kz_partition = self.new_partition()
         TimerService.startService(self)
 
     def stopService(self):
@@ -61,6 +116,7 @@ class SchedulerService(TimerService):
         Stop this service. This will release buckets partitions it holds
         """
         TimerService.stopService(self)
+        self.cancel_wakeups()
         if self.kz_partition.acquired:
             return self.kz_partition.finish()
 
@@ -85,8 +141,10 @@ class SchedulerService(TimerService):
                     event['version'] = str(event['version'])
                     event['trigger'] = str(event['trigger'])
                     old_events.append(event)
-            return (not bool(old_events), {'old_events': old_events,
-                                           'buckets': list(self.kz_partition)})
+            info = {'old_events': old_events, 'buckets': list(self.kz_partition)}
+            if self.limiter is not None:
+                info['execution'] = self.limiter.stats()
+            return (not bool(old_events), info)
 
         d = defer.gatherResults(
             [self.store.get_oldest_event(bucket) for bucket in self.kz_partition],
@@ -106,19 +164,18 @@ class SchedulerService(TimerService):
             return self.kz_partition.release_set()
         if self.kz_partition.failed:
             self.log.msg('Partition failed. Starting new')
-            self.kz_partition = self.kz_client.SetPartitioner(
-                self.zk_partition_path, set=set(self.buckets),
-                time_boundary=self.time_boundary)
+            self.kz_partition = self.new_partition()
             return
         if not self.kz_partition.acquired:
             self.log.err('Unknown state {}. This cannot happen. Starting new'.format(
                 self.kz_partition.state))
             self.kz_partition.finish()
-            self.kz_partition = self.kz_client.SetPartitioner(
-                self.zk_partition_path, set=set(self.buckets),
-                time_boundary=self.time_boundary)
+            self.kz_partition = self.new_partition()
             return
 
+        if self.metrics is not None:
+            self.metrics.start_tick()
+
         buckets = list(self.kz_partition)
         utcnow = datetime.utcnow()
         log = self.log.bind(scheduler_run_id=generate_transaction_id(), utcnow=utcnow)
@@ -126,12 +183,399 @@ class SchedulerService(TimerService):
         # it'll be useful to debug partitioning problems (at least in initial deployment)
         log.msg('Got buckets {buckets}', buckets=buckets)
 
-        return defer.gatherResults(
-            [check_events_in_bucket(
-                log, self.store, bucket, utcnow, batchsize) for bucket in buckets])
+        if self.event_driven:
+            d = self.track_buckets(log, buckets, batchsize)
+            retired = [bucket for bucket in buckets
+                       if bucket in self.retired_buckets and bucket not in self.draining]
+            if retired:
+                d = defer.gatherResults(
+                    [d] + [self.move_retired_events(log, bucket, batchsize)
+                           for bucket in retired])
+                d.addCallback(lambda _: None)
+        else:
+            d = defer.gatherResults([self.check_bucket(log, bucket, utcnow, batchsize)
+                                     for bucket in buckets])
+        if self.lease is not None:
+            d.addCallback(lambda _: self.help_lagging_buckets(log, buckets, utcnow,
+                                                              batchsize))
+        return d
+
+    def check_bucket(self, log, bucket, utcnow, batchsize):
+        """
+        Check events in owned `bucket` and move the remaining ones if it is retired
+        """
+        d = check_events_in_bucket(
+            log, self.store, bucket, utcnow, batchsize, prefetch=self.prefetch,
+            limiter=self.limiter, metrics=self.metrics, lease=self.lease)
+        if bucket in self.retired_buckets:
+            d.addCallback(lambda _: self.move_retired_events(log, bucket, batchsize))
+        return d
+
+    def help_lagging_buckets(self, log, owned, utcnow, batchsize):
+        """
+        Check events in the buckets not in `owned` whose oldest event is late by more
+        than `threshold` seconds. Used only with a lease, since the events are then
+        claimed without conflicting with the node owning the bucket.
+
+        A bucket that is not lagging is not read again until its oldest event, or
+        any event added since it was read, could be late by more than `threshold`
+        seconds.
+
+        :return: Deferred that fires with None after the buckets are checked
+        """
+        threshold = timedelta(seconds=self.threshold)
+
+        def check_if_lagging(event, bucket):
+            if event is None or utcnow - event['trigger'] <= threshold:
+                oldest = utcnow if event is None else min(event['trigger'], utcnow)
+                self.lagging_checks[bucket] = oldest + threshold
+                return
+            log.msg('Helping lagging bucket {bucket}', bucket=bucket)
+            return check_events_in_bucket(
+                log, self.store, bucket, utcnow, batchsize, limiter=self.limiter,
+                metrics=self.metrics, lease=self.lease)
+
+        deferreds = []
+        for bucket in self.buckets:
+            if bucket in owned or utcnow < self.lagging_checks.get(bucket, utcnow):
+                continue
+            d = self.store.get_oldest_event(bucket)
+            d.addCallback(check_if_lagging, bucket)
+            d.addErrback(log.err, 'Could not check lagging bucket {bucket}', bucket=bucket)
+            deferreds.append(d)
+        return defer.gatherResults(deferreds).addCallback(lambda _: None)
+
+    def move_retired_events(self, log, bucket, batchsize):
+        """
+        Move all the events in retired `bucket` to the buckets in use. Nothing else
+        reads the bucket meanwhile since it is owned by this node and is marked as
+        draining. With a lease, events claimed by other nodes helping with the bucket
+        are left to them and the events after them are moved on a later iteration.
+
+        :return: Deferred that fires with None after the bucket is empty
+        """
+        log = log.bind(bucket=bucket)
+        self.draining.add(bucket)
+        moved = []
+
+        def move(num_events):
+            moved.append(num_events)
+            if num_events == batchsize:
+                return self.store.move_events(bucket, batchsize,
+                                              lease=self.lease).addCallback(move)
+            if sum(moved):
+                log.msg('Moved {num_events} events from retired bucket',
+                        num_events=sum(moved))
+
+        d = self.store.move_events(bucket, batchsize, lease=self.lease).addCallback(move)
+        d.addErrback(log.err, 'Could not move events from retired bucket')
+        return d.addBoth(lambda _: self.draining.discard(bucket))
+
+    def _reactor(self):
+        """
+        Return the clock to arm wakeups with
+        """
+        if self.clock is None:
+            from twisted.internet import reactor
+            return reactor
+        return self.clock
+
+    def track_buckets(self, log, buckets, batchsize):
+        """
+        Seed the earliest trigger of each of the given buckets from its oldest event
+        and arm a wakeup for it. Wakeups of buckets not in `buckets` are cancelled.
+        Buckets currently being drained are skipped since they are seeded again once
+        drained.
+
+        :return: Deferred that fires with None after all the buckets are seeded
+        """
+        for bucket in set(self.wakeups) - set(buckets):
+            self.wakeups.pop(bucket)[1].cancel()
+        for bucket in set(self.checked) - set(buckets):
+            del self.checked[bucket]
+        deferreds = [self.seed_bucket(log, bucket, batchsize)
+                     for bucket in buckets if bucket not in self.draining]
+        return defer.gatherResults(deferreds).addCallback(lambda _: None)
+
+    def seed_bucket(self, log, bucket, batchsize):
+        """
+        Arm a wakeup for `bucket` at the trigger of its oldest event, if any.
+
+        With a lease, the due events left in a bucket after a wakeup checked it are
+        claimed by others. If the oldest event is one of them, the wakeup is armed
+        at the oldest event after the check instead, or when the claims expire if
+        that is earlier, rather than checking the bucket again right away.
+
+        :return: Deferred that fires with None after the bucket is seeded
+        """
+        checked = self.checked.get(bucket)
+
+        def seed(event):
+            if event is None or checked is None or event['trigger'] > checked:
+                if self.checked.get(bucket) == checked:
+                    self.checked.pop(bucket, None)
+                if event is not None:
+                    self.arm_wakeup(log, bucket, event['trigger'], batchsize)
+                return
+            self.arm_wakeup(log, bucket, checked + timedelta(seconds=self.lease), batchsize)
+            return self.store.get_oldest_event(bucket, after=checked).addCallback(seed_after)
+
+        def seed_after(event):
+            if event is not None:
+                self.arm_wakeup(log, bucket, event['trigger'], batchsize)
+
+        d = self.store.get_oldest_event(bucket)
+        d.addCallback(seed)
+        return d.addErrback(log.err, 'Could not seed bucket {bucket}', bucket=bucket)
+
+    def events_added(self, events):
+        """
+        Arm wakeups of the owned buckets for scheduled events added by this node, so
+        that an event earlier than the wakeup already armed for its bucket is not
+        checked late. Events added by other nodes are seeded on the next iteration.
+
+        :param events: list of (bucket, trigger) of the added events
+        """
+        if (not self.event_driven or not self.running or self.kz_partition is None or
+                not self.kz_partition.acquired):
+            return
+        owned = set(self.kz_partition)
+        for bucket, trigger in events:
+            if bucket in owned:
+                self.arm_wakeup(self.log, bucket, trigger, self.batchsize)
+
+    def arm_wakeup(self, log, bucket, trigger, batchsize):
+        """
+        Arm a wakeup to check events in `bucket` at `trigger` unless a wakeup at
+        the same time or earlier is already armed
+
+        :param bucket: The bucket to check
+        :param datetime trigger: Time at which the earliest event in bucket occurs
+        """
+        if bucket in self.draining:
+            return
+        current = self.wakeups.get(bucket)
+        if current is not None:
+            if current[0] <= trigger:
+                return
+            current[1].cancel()
+        delay = max((trigger - datetime.utcnow()).total_seconds(), 0)
+        call = self._reactor().callLater(delay, self._wakeup, bucket, batchsize)
+        self.wakeups[bucket] = (trigger, call)
+
+    def cancel_wakeups(self):
+        """
+        Cancel all armed wakeups
+        """
+        for _, call in self.wakeups.values():
+            call.cancel()
+        self.wakeups = {}
+
+    def _wakeup(self, bucket, batchsize):
+        """
+        Check events in `bucket` that are due now and then seed it again. Cron
+        events added to other owned buckets while processing arm their wakeups
+        through :meth:`events_added`
+        """
+        del self.wakeups[bucket]
+        if not self.kz_partition.acquired or bucket not in list(self.kz_partition):
+            return
+        if bucket in self.draining:
+            # retired bucket whose events are being moved
+            return
+
+        utcnow = datetime.utcnow()
+        log = self.log.bind(scheduler_run_id=generate_transaction_id(), utcnow=utcnow)
+        self.draining.add(bucket)
+
+        def drained(_):
+            self.draining.discard(bucket)
+            if self.lease is not None:
+                self.checked[bucket] = utcnow
+            if (self.running and self.kz_partition.acquired and
+                    bucket in list(self.kz_partition)):
+                return self.seed_bucket(log, bucket, batchsize)
+
+        d = check_events_in_bucket(log, self.store, bucket, utcnow, batchsize,
+                                   prefetch=self.prefetch, limiter=self.limiter,
+                                   metrics=self.metrics, lease=self.lease)
+        return d.addCallback(drained)
+
+
+class Histogram(object):
+    """
+    Counts observed values in buckets with given upper bounds, along with the number,
+    sum and maximum of all the values
+    """
+
+    def __init__(self, bounds):
+        """
+        :param bounds: sorted upper bounds of the buckets. Values larger than the last
+            one are counted in an extra unbounded bucket
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        """
+        Add `value` to the histogram
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        """
+        :return: `dict` of cumulative bucket counts keyed on 'le_<bound>' along with
+            'count', 'sum' and 'max'
+        """
+        result = {'count': self.count, 'sum': self.sum, 'max': self.max}
+        total = 0
+        for bound, count in zip(self.bounds + ['inf'], self.counts):
+            total += count
+            result['le_{}'.format(bound)] = total
+        return result
+
+
+class SchedulerMetrics(object):
+    """
+    Performance metrics of the scheduler: trigger lag of executed events per bucket,
+    events fetched and executed, batch fetch latency, time waited for group locks and
+    number of policies that could not be executed or were dropped since they were
+    deleted. All times are in seconds.
+
+    :ivar dict lag: bucket -> `Histogram` of execution time minus trigger time
+    :ivar fetch_latency: `Histogram` of time taken to fetch a batch of events
+    :ivar lock_wait: `Histogram` of time between asking to modify the group state and
+        the modification starting, i.e. mostly waiting for the group lock
+    :ivar dict counts: Total number of events 'fetched', policies 'executed', policies
+        that could not be executed as 'cannot_execute' and events 'dropped' since
+        their policy or group were deleted
+    :ivar dict last_tick: 'fetched' and 'executed' counts of last scheduler tick
+    """
+
+    LAG_BOUNDS = [1, 5, 10, 30, 60, 300, 900]
+    LATENCY_BOUNDS = [0.01, 0.05, 0.1, 0.5, 1, 5]
+
+    def __init__(self, clock=None):
+        """
+        :param clock: IReactorTime provider. Defaults to reactor
+        """
+        self.clock = clock
+        self.lag = {}
+        self.fetch_latency = Histogram(self.LATENCY_BOUNDS)
+        self.lock_wait = Histogram(self.LATENCY_BOUNDS)
+        self.counts = dict.fromkeys(['fetched', 'executed', 'cannot_execute', 'dropped'], 0)
+        self.last_tick = {'fetched': 0, 'executed': 0}
+        self._tick_start = dict(self.last_tick)
+
+    def seconds(self):
+        """
+        Return current time in seconds since epoch
+        """
+        if self.clock is None:
+            from twisted.internet import reactor
+            return reactor.seconds()
+        return self.clock.seconds()
+
+    def start_tick(self):
+        """
+        Start a new tick. Counts since previous call are available in `last_tick`
+        """
+        for key in self.last_tick:
+            self.last_tick[key] = self.counts[key] - self._tick_start[key]
+            self._tick_start[key] = self.counts[key]
+
+    def fetched(self, num_events, latency):
+        """
+        Record fetching `num_events` events that took `latency` seconds
+        """
+        self.counts['fetched'] += num_events
+        self.fetch_latency.observe(latency)
+
+    def executing(self, event):
+        """
+        Record trigger lag of `event` that is being executed now
+        """
+        trigger = timegm(event['trigger'].utctimetuple())
+        if event['bucket'] not in self.lag:
+            self.lag[event['bucket']] = Histogram(self.LAG_BOUNDS)
+        self.lag[event['bucket']].observe(max(self.seconds() - trigger, 0))
+
+    def policy_done(self, result):
+        """
+        Record result of executing a policy, which is returned as is so that this can
+        be added as callback and errback
+
+        :param result: result of :func:`otter.controller.maybe_execute_scaling_policy`
+        """
+        if not isinstance(result, Failure):
+            self.counts['executed'] += 1
+        elif result.check(CannotExecutePolicyError):
+            self.counts['cannot_execute'] += 1
+        return result
+
+    def get_metrics(self):
+        """
+        Return the metrics in the format of :meth:`otter.models.interface.IAdmin.get_metrics`
+        """
+        now = int(self.seconds())
+        values = {'fetch_latency.' + key: value
+                  for key, value in self.fetch_latency.as_dict().iteritems()}
+        values.update({'lock_wait.' + key: value
+                       for key, value in self.lock_wait.as_dict().iteritems()})
+        for bucket, histogram in self.lag.iteritems():
+            values.update({'lag.{}.{}'.format(bucket, key): value
+                           for key, value in histogram.as_dict().iteritems()})
+        values.update(self.counts)
+        values.update({'last_tick.' + key: value for key, value in self.last_tick.iteritems()})
+        return [{'id': 'otter.metrics.scheduler.' + key, 'value': value, 'time': now}
+                for key, value in sorted(values.iteritems())]
+
+
+def _fetch_events(store, bucket, now, batchsize, metrics, lease=None):
+    """
+    Fetch and delete a batch of events in `bucket`, or claim them if `lease` is given,
+    recording it in `metrics` if given
+    """
+    if lease is None:
+        fetch = partial(store.fetch_and_delete, bucket, now, batchsize)
+    else:
+        fetch = partial(store.claim_events, bucket, now, batchsize, lease=lease)
+    if metrics is None:
+        return fetch()
+
+    start = metrics.seconds()
+
+    def fetched(events):
+        metrics.fetched(len(events), metrics.seconds() - start)
+        return events
+
+    return fetch().addCallback(fetched)
 
 
-def check_events_in_bucket(log, store, bucket, now, batchsize):
+def _process_fetched(events, store, log, bucket, limiter, metrics, lease):
+    """
+    Process fetched `events` with :func:`process_events`. Claimed events, i.e. if
+    `lease` is given, are deleted after they are processed.
+    """
+    if lease is None or not events:
+        return process_events(events, store, log, limiter=limiter, metrics=metrics)
+
+    # copied since processing changes trigger of cron events to their next occurrence
+    claimed = [event.copy() for event in events]
+    d = defer.maybeDeferred(process_events, events, store, log, limiter=limiter,
+                            metrics=metrics)
+    return d.addCallback(lambda num_events: store.delete_claimed_events(
+        bucket, claimed).addCallback(lambda _: num_events))
+
+
+def check_events_in_bucket(log, store, bucket, now, batchsize, prefetch=0,
+                           limiter=None, metrics=None, lease=None):
     """
     Retrieves events in the given bucket that occur before or at now,
     in batches of batchsize, for processing
@@ -141,19 +585,33 @@ def check_events_in_bucket(log, store, bucket, now, batchsize):
     :param bucket: Bucket to check events in
     :param now: Time before which events are checked
     :param batchsize: Number of events to check at a time
+    :param int prefetch: If more than 0, batches are fetched while the previous batch
+        is being processed, keeping at most this many fetched batches waiting to be
+        processed. Otherwise a batch is fetched only after the previous one is processed
+    :param limiter: Optional :class:`otter.util.deferredutils.FairLimiter` to
+        execute events with
+    :param metrics: Optional :class:`SchedulerMetrics` to record fetching and
+        execution in
+    :param lease: If given, events are claimed for this many seconds instead of
+        being deleted when fetched, and are deleted after they are processed. See
+        :meth:`otter.models.interface.IScalingScheduleCollection.claim_events`
 
     :return: a deferred that fires with None
     """
 
     log = log.bind(bucket=bucket)
 
+    if prefetch > 0:
+        return _check_events_pipelined(log, store, bucket, now, batchsize, prefetch,
+                                       limiter, metrics, lease)
+
     def check_for_more(num_events):
         if num_events == batchsize:
             return _do_check()
 
     def _do_check():
-        d = store.fetch_and_delete(bucket, now, batchsize)
-        d.addCallback(process_events, store, log)
+        d = _fetch_events(store, bucket, now, batchsize, metrics, lease)
+        d.addCallback(_process_fetched, store, log, bucket, limiter, metrics, lease)
         d.addCallback(check_for_more)
         d.addErrback(log.err)
         return d
@@ -161,13 +619,70 @@ def check_events_in_bucket(log, store, bucket, now, batchsize):
     return _do_check()
 
 
-def process_events(events, store, log):
+def _check_events_pipelined(log, store, bucket, now, batchsize, prefetch, limiter,
+                            metrics, lease=None):
+    """
+    Like :func:`check_events_in_bucket` but fetches the next batch while the current
+    one is being processed. Fetches are still done one after another since a fetch
+    must delete its events before the next one reads the bucket.
+
+    Fetched events are already deleted from the store, or claimed, so all fetched
+    batches are processed even if processing one of them fails. No more batches are
+    fetched after a failure though.
+    """
+    batches = defer.DeferredQueue()
+    slots = defer.DeferredSemaphore(prefetch + 1)
+    failed = []
+
+    def fetch(_):
+        if failed:
+            return batches.put(None)
+        d = _fetch_events(store, bucket, now, batchsize, metrics, lease)
+        d.addCallbacks(fetched, fetch_failed)
+
+    def fetched(events):
+        batches.put(events)
+        if len(events) == batchsize:
+            slots.acquire().addCallback(fetch)
+        else:
+            batches.put(None)
+
+    def fetch_failed(failure):
+        log.err(failure)
+        batches.put(None)
+
+    def process_failed(failure):
+        failed.append(failure)
+        log.err(failure)
+
+    def process(events):
+        if events is None:
+            return
+        d = defer.maybeDeferred(_process_fetched, events, store, log, bucket, limiter,
+                                metrics, lease)
+        d.addErrback(process_failed)
+        d.addCallback(lambda _: slots.release())
+        d.addCallback(lambda _: batches.get().addCallback(process))
+        return d
+
+    slots.acquire().addCallback(fetch)
+    return batches.get().addCallback(process)
+
+
+def process_events(events, store, log, limiter=None, metrics=None):
     """
     Executes all the events and adds the next occurrence of each event to the buckets
 
+    Events of the same scaling group are executed together with
+    :func:`execute_group_events` so that the group is locked only once.
+
     :param events: list of event dict to process
     :param store: `IScalingGroupCollection` provider
     :param log: A bound log for logging
+    :param limiter: Optional :class:`otter.util.deferredutils.FairLimiter` to
+        execute events of each group with, keyed by tenant ID. If not given, all
+        events are executed at once
+    :param metrics: Optional :class:`SchedulerMetrics` to record execution in
 
     :return: a `Deferred` that fires with number of events processed
     """
@@ -178,20 +693,88 @@ def process_events(events, store, log):
 
     deleted_policy_ids = set()
 
-    deferreds = [
-        execute_event(store, log, event, deleted_policy_ids)
-        for event in events
-    ]
+    group_events = OrderedDict()
+    for event in events:
+        group_events.setdefault((event['tenantId'], event['groupId']), []).append(event)
+
+    def execute(same_group_events):
+        if len(same_group_events) == 1:
+            return execute_event(store, log, same_group_events[0], deleted_policy_ids,
+                                 metrics=metrics)
+        return execute_group_events(store, log, same_group_events, deleted_policy_ids,
+                                    metrics=metrics)
+
+    def count_dropped(_):
+        metrics.counts['dropped'] += sum(
+            1 for event in events if event['policyId'] in deleted_policy_ids)
+
+    if limiter is None:
+        deferreds = [execute(evs) for evs in group_events.itervalues()]
+    else:
+        deferreds = [limiter.run(tenant_id, execute, evs)
+                     for (tenant_id, _), evs in group_events.iteritems()]
     d = defer.gatherResults(deferreds, consumeErrors=True)
+    if metrics is not None:
+        d.addCallback(count_dropped)
     d.addCallback(lambda _: add_cron_events(store, log, events, deleted_policy_ids))
     return d.addCallback(lambda _: len(events))
 
 
-def next_cron_occurrence(cron):
+# Maximum number of parsed cron entries kept by `parse_cron`
+CRON_CACHE_SIZE = 1024
+
+_cron_cache = OrderedDict()
+
+
+def parse_cron(cron):
+    """
+    Return parsed `croniter` of given cron entry. Parsed entries are cached, least
+    recently used first out, since most policies share only a few cron entries.
+    The returned object must not be iterated; copy it instead.
+    """
+    try:
+        parsed = _cron_cache.pop(cron)
+    except KeyError:
+        parsed = croniter(cron)
+        if len(_cron_cache) >= CRON_CACHE_SIZE:
+            _cron_cache.popitem(last=False)
+    _cron_cache[cron] = parsed
+    return parsed
+
+
+def next_cron_occurrence(cron, start_time=None):
     """
-    Return next occurence of given cron entry
+    Return next occurence of given cron entry after `start_time`, which defaults to
+    now
     """
-    return croniter(cron, start_time=datetime.utcnow()).get_next(ret_type=datetime)
+    itr = copy(parse_cron(cron))
+    itr.cur = mktime((start_time or datetime.utcnow()).timetuple())
+    return itr.get_next(ret_type=datetime)
+
+
+def next_cron_occurrences(events, now=None):
+    """
+    Return next occurrence of the cron entry of each event, following its trigger
+    time rather than when it was processed so that late processing does not shift the
+    schedule. Occurrences that are not after `now` have been missed and are skipped,
+    i.e. next occurrence after `now` is returned instead. Occurrences are computed
+    once for each distinct cron entry and trigger time.
+
+    :param events: list of event dicts with 'cron' and 'trigger'
+    :param now: `datetime` to compare against, defaults to now
+
+    :return: list of `datetime` in the same order as `events`
+    """
+    now = now or datetime.utcnow()
+    occurrences = {}
+    for event in events:
+        key = (event['cron'], event['trigger'])
+        if key not in occurrences:
+            occurrence = next_cron_occurrence(*key)
+            if occurrence <= now:
+                occurrence = next_cron_occurrence(event['cron'], now)
+            occurrences[key] = occurrence
+    return [occurrences[(event['cron'], event['trigger'])] for event in events]
 
 
 def add_cron_events(store, log, events, deleted_policy_ids):
@@ -210,18 +793,17 @@ def add_cron_events(store, log, events, deleted_policy_ids):
     if not events:
         return
 
-    new_cron_events = []
-    for event in events:
-        if event['cron'] and event['policyId'] not in deleted_policy_ids:
-            event['trigger'] = next_cron_occurrence(event['cron'])
-            new_cron_events.append(event)
+    new_cron_events = [event for event in events
+                       if event['cron'] and event['policyId'] not in deleted_policy_ids]
 
     if new_cron_events:
+        for event, trigger in zip(new_cron_events, next_cron_occurrences(new_cron_events)):
+            event['trigger'] = trigger
         log.msg('Adding {new_cron_events} cron events', new_cron_events=len(new_cron_events))
         return store.add_cron_events(new_cron_events)
 
 
-def execute_event(store, log, event, deleted_policy_ids):
+def execute_event(store, log, event, deleted_policy_ids, metrics=None):
     """
     Execute a single event
 
@@ -230,15 +812,23 @@ def execute_event(store, log, event, deleted_policy_ids):
     :param event: event dict to execute
     :param deleted_policy_ids: Set of policy ids that are deleted. Policy id will be added
                                to this if its scaling group or policy has been deleted
+    :param metrics: Optional :class:`SchedulerMetrics` to record execution in
     :return: a deferred with None. Any error occurred during execution is logged
     """
     tenant_id, group_id, policy_id = event['tenantId'], event['groupId'], event['policyId']
     log = log.bind(tenant_id=tenant_id, scaling_group_id=group_id, policy_id=policy_id)
     log.msg('Scheduler executing policy {policy_id}')
     group = store.get_scaling_group(log, tenant_id, group_id)
-    d = group.modify_state(partial(maybe_execute_scaling_policy,
-                                   log, generate_transaction_id(),
-                                   policy_id=policy_id, version=event['version']))
+    execute = partial(maybe_execute_scaling_policy, log, generate_transaction_id(),
+                      policy_id=policy_id, version=event['version'])
+    if metrics is not None:
+        execute = _measured(execute, metrics, [event])
+    # the policy is checked before cooldowns, so that events of deleted policies
+    # or stale versions are dropped instead of added again
+    d = modify_state_unless_cooling_down(log, group, policy_id, execute,
+                                         version=event['version'], reject_cached=False)
+    if metrics is not None:
+        d.addBoth(metrics.policy_done)
     d.addErrback(ignore_and_log, CannotExecutePolicyError,
                  log, 'Scheduler cannot execute policy {policy_id}')
 
@@ -249,3 +839,106 @@ def execute_event(store, log, event, deleted_policy_ids):
     d.addErrback(collect_deleted_policy)
     d.addErrback(log.err, 'Scheduler failed to execute policy {policy_id}')
     return d
+
+
+def _measured(modifier, metrics, events):
+    """
+    Return a modifier that records time waited for it to be called in
+    `metrics.lock_wait` and trigger lag of `events` before calling `modifier`
+    """
+    requested = metrics.seconds()
+
+    def modify(group, state, **kwargs):
+        metrics.lock_wait.observe(metrics.seconds() - requested)
+        for event in events:
+            metrics.executing(event)
+        return modifier(group, state, **kwargs)
+
+    return modify
+
+
+class _NoPolicyExecuted(Exception):
+    """
+    Raised when none of the policies executed together could be executed so that
+    the group state is not saved
+    """
+
+
+def execute_group_events(store, log, events, deleted_policy_ids, metrics=None):
+    """
+    Execute events of the same scaling group in the order of their trigger time,
+    one after the other, with a single :meth:`IScalingGroup.modify_state`.
+
+    Each policy is executed on the state left by the previously executed ones, so
+    cooldowns and deltas are the same as executing the events one at a time. If a
+    policy fails to execute, the state is left as it was before it. The state is
+    saved only if at least one policy is executed.
+
+    :param store: `IScalingGroupCollection` provider
+    :param log: A bound log for logging
+    :param events: list of event dicts with same tenant ID and group ID
+    :param deleted_policy_ids: Set of policy ids that are deleted. Policy id will be added
+                               to this if its scaling group or policy has been deleted
+    :param metrics: Optional :class:`SchedulerMetrics` to record execution in
+    :return: a deferred with None. Any error occurred during execution is logged
+    """
+    tenant_id, group_id = events[0]['tenantId'], events[0]['groupId']
+    log = log.bind(tenant_id=tenant_id, scaling_group_id=group_id)
+    events = sorted(events, key=lambda event: event['trigger'])
+    group = store.get_scaling_group(log, tenant_id, group_id)
+
+    def execute_policy(state, group, event, executed):
+        policy_id = event['policyId']
+        policy_log = log.bind(policy_id=policy_id)
+        policy_log.msg('Scheduler executing policy {policy_id}')
+        d = maybe_execute_scaling_policy(policy_log, generate_transaction_id(), group,
+                                         deepcopy(state), policy_id=policy_id,
+                                         version=event['version'])
+
+        def policy_executed(new_state):
+            executed.append(policy_id)
+            return new_state
+
+        if metrics is not None:
+            d.addBoth(metrics.policy_done)
+        d.addCallback(policy_executed)
+        d.addErrback(ignore_and_log, CannotExecutePolicyError,
+                     policy_log, 'Scheduler cannot execute policy {policy_id}')
+
+        def collect_deleted_policy(failure):
+            failure.trap(NoSuchPolicyError)
+            deleted_policy_ids.add(policy_id)
+
+        d.addErrback(collect_deleted_policy)
+        d.addErrback(policy_log.err, 'Scheduler failed to execute policy {policy_id}')
+
+        # errbacks above only log, so keep the state before this policy if it failed
+        return d.addCallback(
+            lambda result: result if executed and executed[-1] == policy_id else state)
+
+    def execute_all(group, state):
+        executed = []
+        d = defer.succeed(state)
+        for event in events:
+            d.addCallback(execute_policy, group, event, executed)
+
+        def check_executed(state):
+            if not executed:
+                raise _NoPolicyExecuted()
+            return state
+
+        return d.addCallback(check_executed)
+
+    log.msg('Scheduler executing {num_policies} policies of group',
+            num_policies=len(events))
+    d = group.modify_state(execute_all if metrics is None
+                           else _measured(execute_all, metrics, events))
+    d.addErrback(lambda f: f.trap(_NoPolicyExecuted) and None)
+
+    def collect_deleted_group(failure):
+        failure.trap(NoSuchScalingGroupError)
+        deleted_policy_ids.update(event['policyId'] for event in events)
+
+    d.addErrback(collect_deleted_group)
+    d.addErrback(log.err, 'Scheduler failed to execute policies of group')
+    return d
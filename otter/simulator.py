@@ -0,0 +1,511 @@
+"""
+Offline simulation of how the controller and the scheduler scale groups under a
+given load, to tune cooldowns, batch sizes and concurrency limits without Nova or
+Cassandra.
+
+Groups are kept in a :class:`MockScalingGroupCollection`, whose state is modified
+under a lock and whose reads and writes take a configurable latency. Servers are
+built and deleted by a :class:`FakeSupervisor` with configurable build times and
+failure rate. Time is a :class:`twisted.internet.task.Clock`, which is advanced
+from one scheduled call to the next, so hours of scaling are simulated in seconds.
+"""
+
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from itertools import count
+import random
+
+from zope.interface import implementer
+
+from twisted.internet import defer
+from twisted.internet.task import Clock, LoopingCall, deferLater
+
+from otter import controller, deletion, scheduler, supervisor
+from otter.controller import (
+    CannotExecutePolicyError, CompletionCoalescer, CooldownCache, ExecutionCoalescer,
+    maybe_execute_scaling_policy, modify_state_unless_cooling_down, obey_config_change)
+from otter.deletion import DeletionService
+from otter.log import log as otter_log
+from otter.models.mock import MockScalingGroup, MockScalingGroupCollection
+from otter.scheduler import Histogram, SchedulerMetrics, process_events
+from otter.supervisor import ISupervisor
+from otter.util import timestamp
+from otter.util.deferredutils import DeferredPool, FairLimiter
+from otter.util.hashkey import generate_job_id, generate_transaction_id
+
+
+# modules whose current time is the time of the simulation's clock while it runs
+_TIMED_MODULES = (controller, deletion, scheduler, timestamp)
+
+
+@contextmanager
+def simulated_time(clock):
+    """
+    Context manager making ``datetime.now`` and ``datetime.utcnow`` used by the
+    controller, the scheduler, the deletion service and group states return the
+    time of `clock`
+    """
+    class SimulatedDatetime(datetime):
+        """
+        ``datetime`` whose current time is the time of `clock`
+        """
+        @classmethod
+        def now(cls, tz=None):
+            """
+            see :meth:`datetime.datetime.now`
+            """
+            return cls.fromtimestamp(clock.seconds(), tz)
+
+        @classmethod
+        def utcnow(cls):
+            """
+            see :meth:`datetime.datetime.utcnow`
+            """
+            return cls.utcfromtimestamp(clock.seconds())
+
+    originals = [module.datetime for module in _TIMED_MODULES]
+    for module in _TIMED_MODULES:
+        module.datetime = SimulatedDatetime
+    try:
+        yield
+    finally:
+        for module, original in zip(_TIMED_MODULES, originals):
+            module.datetime = original
+
+
+class SimulationError(Exception):
+    """
+    Error with which servers fail to build in a simulation
+    """
+
+
+class SimulationStats(object):
+    """
+    What a simulation has done so far.
+
+    :ivar calls: ``dict`` of number of calls to the store ('view_config',
+        'view_launch_config', 'view_state', 'get_policy', 'view_execution_bundle'
+        and 'modify_state') and of
+        Nova API calls ('create_server', 'promote_server' and 'delete_server')
+    :ivar lock_wait: `Histogram` of seconds waited for group locks
+    :ivar executions: ``dict`` of number of webhook executions that were
+        'executed', 'rejected' since they could not be executed, 'coalesced' with
+        an execution in progress and given its outcome, or 'failed'
+    :ivar int failed_builds: number of servers that failed to build
+    :ivar capacity: group name -> ``list`` of samples of the capacity of the group
+        over time, each a ``dict`` of 'time', 'desired', 'active' and 'pending'
+    """
+
+    LOCK_WAIT_BOUNDS = [0.01, 0.1, 1, 5, 10, 30, 60]
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.lock_wait = Histogram(self.LOCK_WAIT_BOUNDS)
+        self.executions = dict.fromkeys(['executed', 'rejected', 'coalesced', 'failed'],
+                                        0)
+        self.failed_builds = 0
+        self.capacity = defaultdict(list)
+
+
+class SimulatedScalingGroup(MockScalingGroup):
+    """
+    :class:`MockScalingGroup` whose state is modified under a lock, like the
+    Cassandra scaling group, and whose reads and writes take `latency` seconds.
+    Policies are given as a ``dict`` keyed on their ID.
+    """
+
+    def __init__(self, log, tenant_id, uuid, collection, creation, clock, latency,
+                 stats):
+        MockScalingGroup.__init__(self, log, tenant_id, uuid, collection,
+                                  dict(creation, policies=None))
+        self.policies = dict(creation['policies'] or {})
+        self.clock = clock
+        self.latency = latency
+        self.stats = stats
+        self._lock = defer.DeferredLock()
+
+    def _read(self, method, *args, **kwargs):
+        """
+        Call the `method` of :class:`MockScalingGroup` after the store latency
+        """
+        self.stats.calls[method.__name__] += 1
+        return deferLater(self.clock, self.latency, method, self, *args, **kwargs)
+
+    def view_config(self):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_config`
+        """
+        return self._read(MockScalingGroup.view_config)
+
+    def view_launch_config(self):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_launch_config`
+        """
+        return self._read(MockScalingGroup.view_launch_config)
+
+    def view_state(self):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_state`
+        """
+        return self._read(MockScalingGroup.view_state)
+
+    def get_policy(self, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.get_policy`
+        """
+        return self._read(MockScalingGroup.get_policy, policy_id, version)
+
+    def view_execution_bundle(self, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_execution_bundle`
+
+        The bundle is read with the latency of a single read, and not also
+        counted as a ``get_policy`` call.
+        """
+        self.stats.calls['view_execution_bundle'] += 1
+        d = deferLater(self.clock, self.latency, MockScalingGroup.get_policy, self,
+                       policy_id, version)
+        return d.addCallback(lambda policy: (self.state, self.config.copy(),
+                                             self.launch.copy(), policy))
+
+    def _locked(self, method, *args, **kwargs):
+        """
+        Call the `method` of :class:`MockScalingGroup` modifying the state while
+        holding the group's lock, and wait for the state to be written
+        """
+        requested = self.clock.seconds()
+
+        def locked():
+            self.stats.lock_wait.observe(self.clock.seconds() - requested)
+            self.stats.calls['modify_state'] += 1
+            d = method(self, *args, **kwargs)
+            return d.addCallback(
+                lambda _: deferLater(self.clock, self.latency, lambda: None))
+
+        return self._lock.run(locked)
+
+    def modify_state(self, modifier_callable, *args, **kwargs):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.modify_state`
+        """
+        return self._locked(MockScalingGroup.modify_state, modifier_callable, *args,
+                            **kwargs)
+
+    def modify_state_for_policy(self, modifier_callable, policy_id, version=None):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.modify_state_for_policy`
+        """
+        return self._locked(MockScalingGroup.modify_state_for_policy, modifier_callable,
+                            policy_id, version)
+
+
+@implementer(ISupervisor)
+class FakeSupervisor(object):
+    """
+    Supervisor that builds servers in `build_time` seconds give or take
+    `build_jitter`, failing a `failure_rate` fraction of them, promotes standby
+    servers in `promote_time` seconds and deletes servers in `delete_time` seconds.
+    Creations are run through `launch_limiter` if given, like
+    :class:`otter.supervisor.SupervisorService`.
+    """
+
+    def __init__(self, clock, stats, build_time=60, build_jitter=0, failure_rate=0,
+                 promote_time=5, delete_time=5, launch_limiter=None, seed=None):
+        self.clock = clock
+        self.stats = stats
+        self.build_time = build_time
+        self.build_jitter = build_jitter
+        self.failure_rate = failure_rate
+        self.promote_time = promote_time
+        self.delete_time = delete_time
+        self.launch_limiter = launch_limiter
+        self.random = random.Random(seed)
+        self.deferred_pool = DeferredPool()
+        self._server_ids = count(1)
+
+    def _server(self, server_id, failed):
+        """
+        Return the details of a built server like
+        :meth:`otter.supervisor.SupervisorService.execute_config`, or raise
+        :class:`SimulationError` if it `failed` to build
+        """
+        if failed:
+            self.stats.failed_builds += 1
+            raise SimulationError('Server {0} failed to build'.format(server_id))
+        return {'id': server_id, 'links': [], 'name': server_id, 'lb_info': []}
+
+    def execute_config(self, log, transaction_id, scaling_group, launch_config):
+        """
+        see :meth:`ISupervisor.execute_config`
+        """
+        self.stats.calls['create_server'] += 1
+        build_time = max(self.random.uniform(self.build_time - self.build_jitter,
+                                             self.build_time + self.build_jitter), 0)
+        failed = self.random.random() < self.failure_rate
+        server_id = 'server-{0}'.format(next(self._server_ids))
+        build = partial(deferLater, self.clock, build_time, self._server, server_id,
+                        failed)
+        if self.launch_limiter is None:
+            d = build()
+        else:
+            d = self.launch_limiter.run(scaling_group.tenant_id, build)
+        self.deferred_pool.add(d)
+        return defer.succeed((generate_job_id(scaling_group.uuid), d))
+
+    def execute_promote_server(self, log, transaction_id, scaling_group, launch_config,
+                               server):
+        """
+        see :meth:`ISupervisor.execute_promote_server`
+        """
+        self.stats.calls['promote_server'] += 1
+        d = deferLater(self.clock, self.promote_time, self._server, server['id'], False)
+        self.deferred_pool.add(d)
+        return defer.succeed((generate_job_id(scaling_group.uuid), d))
+
+    def execute_delete_server(self, log, transaction_id, scaling_group, server):
+        """
+        see :meth:`ISupervisor.execute_delete_server`
+        """
+        self.stats.calls['delete_server'] += 1
+        d = deferLater(self.clock, self.delete_time, lambda: None)
+        self.deferred_pool.add(d)
+        return d
+
+
+class Simulation(object):
+    """
+    Simulation of scaling groups receiving a stream of events, which can be
+    scripted or replayed. Each event is a ``dict`` with the time in seconds from
+    the start of the simulation 'at' which it happens, the name of its 'group' and
+    its 'type':
+
+    * 'webhook': a webhook of the 'policy' is executed 'count' (default 1) times
+      at once
+    * 'schedule': the scheduler executes the 'policy'. Scheduled events of the
+      same time are processed together
+    * 'config': the group config is updated with 'config'
+
+    Groups are given as a ``dict`` of group name -> ``dict`` of the group 'config',
+    'launch' config and 'policies' keyed on their name. Their config is obeyed
+    at the start of the simulation, as when they are created.
+
+    The other arguments mirror the settings of otter: 'store_latency' is the
+    seconds a read or write of the store takes, build times, failure rate and
+    'launch_limit' are given to the :class:`FakeSupervisor`, 'cooldown_cache_ttl',
+    'coalesce_executions' and 'completion_window' enable the controller's
+    optimizations and 'scheduler_limit' bounds scheduled executions in progress.
+    Servers are deleted from a queue every 'deletion_interval' seconds.
+    """
+
+    def __init__(self, groups, tenant_id='simulated', sample_interval=10,
+                 store_latency=0.01, build_time=60, build_jitter=0, failure_rate=0,
+                 promote_time=5, delete_time=5, launch_limit=None,
+                 tenant_launch_limit=None, deletion_interval=10, deletion_batchsize=100,
+                 cooldown_cache_ttl=None, cooldown_cache_margin=2,
+                 coalesce_executions=False, completion_window=None,
+                 completion_max_batch=100, scheduler_limit=None, seed=None):
+        self.clock = Clock()
+        self.stats = SimulationStats()
+        self.log = otter_log.bind(system='otter.simulator')
+        self.tenant_id = tenant_id
+        self.sample_interval = sample_interval
+        self.deletion_interval = deletion_interval
+
+        launch_limiter = None
+        if launch_limit:
+            launch_limiter = FairLimiter(launch_limit, key_limit=tenant_launch_limit,
+                                         clock=self.clock)
+        self.supervisor = FakeSupervisor(
+            self.clock, self.stats, build_time=build_time, build_jitter=build_jitter,
+            failure_rate=failure_rate, promote_time=promote_time,
+            delete_time=delete_time, launch_limiter=launch_limiter, seed=seed)
+
+        self.store = MockScalingGroupCollection()
+        self.groups = OrderedDict()
+        for name, group in sorted(groups.iteritems()):
+            self.groups[name] = self.store.data[tenant_id][name] = SimulatedScalingGroup(
+                self.log, tenant_id, name, self.store,
+                {'config': group['config'], 'launch': group.get('launch', {}),
+                 'policies': group.get('policies')},
+                self.clock, store_latency, self.stats)
+
+        self.deletion_service = DeletionService(self.store, self.supervisor,
+                                                deletion_interval,
+                                                batchsize=deletion_batchsize,
+                                                clock=self.clock)
+        self.scheduler_metrics = SchedulerMetrics(self.clock)
+        self.scheduler_limiter = None
+        if scheduler_limit:
+            self.scheduler_limiter = FairLimiter(scheduler_limit, clock=self.clock)
+
+        self.cooldown_cache = None
+        if cooldown_cache_ttl:
+            self.cooldown_cache = CooldownCache(cooldown_cache_ttl, cooldown_cache_margin,
+                                                clock=self.clock)
+        self.execution_coalescer = ExecutionCoalescer() if coalesce_executions else None
+        self.completion_coalescer = None
+        if completion_window:
+            self.completion_coalescer = CompletionCoalescer(
+                completion_window, completion_max_batch, self.clock)
+
+    @contextmanager
+    def _installed(self):
+        """
+        Context manager making the controller use the simulation's supervisor,
+        deletion queue and optimizations
+        """
+        singletons = [
+            (supervisor.get_supervisor, supervisor.set_supervisor, self.supervisor),
+            (deletion.get_deletion_queue, deletion.set_deletion_queue, self.store),
+            (controller.get_cooldown_cache, controller.set_cooldown_cache,
+             self.cooldown_cache),
+            (controller.get_execution_coalescer, controller.set_execution_coalescer,
+             self.execution_coalescer),
+            (controller.get_completion_coalescer, controller.set_completion_coalescer,
+             self.completion_coalescer)]
+        originals = [get() for get, _, _ in singletons]
+        for _, set_, value in singletons:
+            set_(value)
+        try:
+            yield
+        finally:
+            for (_, set_, _), original in zip(singletons, originals):
+                set_(original)
+
+    def _obey_config(self, group):
+        """
+        Obey the current config of `group`, like when it is created or updated
+        """
+        d = group.view_config()
+        d.addCallback(lambda config: group.modify_state(
+            partial(obey_config_change, self.log, generate_transaction_id(), config)))
+        d.addErrback(self.log.err, 'Simulated config change failed')
+        return d
+
+    def _execute_webhook(self, group, policy_id):
+        """
+        Execute policy of `group` like its webhook is
+        """
+        log = self.log.bind(tenant_id=self.tenant_id, scaling_group_id=group.uuid,
+                            policy_id=policy_id)
+        # an execution whose modifier is not called either is rejected by the
+        # cooldown cache or gets the outcome of an execution it is coalesced with
+        cache_rejects = (self.cooldown_cache is not None and
+                         self.cooldown_cache.rejects(group, policy_id))
+        ran = []
+
+        def execute(*args, **kwargs):
+            ran.append(True)
+            return maybe_execute_scaling_policy(
+                log, generate_transaction_id(), *args, policy_id=policy_id, **kwargs)
+
+        d = modify_state_unless_cooling_down(log, group, policy_id, execute,
+                                             coalesce=True)
+
+        def executed(_):
+            self.stats.executions['executed' if ran else 'coalesced'] += 1
+
+        def rejected(failure):
+            failure.trap(CannotExecutePolicyError)
+            self.stats.executions['rejected' if ran or cache_rejects else 'coalesced'] += 1
+
+        def failed(failure):
+            self.stats.executions['failed'] += 1
+            log.err(failure, 'Simulated webhook execution failed')
+
+        return d.addCallbacks(executed, rejected).addErrback(failed)
+
+    def _schedule(self, events):
+        """
+        Process scheduled `events` like the scheduler
+        """
+        now = self.clock.seconds()
+        return process_events(
+            [{'tenantId': self.tenant_id, 'groupId': event['group'],
+              'policyId': event['policy'], 'trigger': datetime.utcfromtimestamp(now),
+              'cron': None, 'version': None, 'bucket': 0} for event in events],
+            self.store, self.log, limiter=self.scheduler_limiter,
+            metrics=self.scheduler_metrics)
+
+    def _fire(self, event):
+        """
+        Make `event` happen
+        """
+        group = self.groups[event['group']]
+        if event['type'] == 'webhook':
+            for i in range(event.get('count', 1)):
+                self._execute_webhook(group, event['policy'])
+        elif event['type'] == 'config':
+            group.update_config(event['config'], partial_update=True)
+            self._obey_config(group)
+        else:
+            raise ValueError('Unknown event type {0!r}'.format(event['type']))
+
+    def _sample(self):
+        """
+        Record current capacity of the groups
+        """
+        for name, group in self.groups.iteritems():
+            self.stats.capacity[name].append({
+                'time': self.clock.seconds(), 'desired': group.state.desired,
+                'active': len(group.state.active),
+                'pending': len(group.state.pending)})
+
+    def _advance(self, until):
+        """
+        Advance the clock to `until`, running every call in between at its time
+        """
+        while self.clock.calls:
+            next_call = min(call.getTime() for call in self.clock.calls)
+            if next_call > until:
+                break
+            self.clock.advance(next_call - self.clock.seconds())
+        self.clock.advance(until - self.clock.seconds())
+
+    def run(self, events, duration):
+        """
+        Simulate `events` for `duration` seconds
+
+        :return: ``dict`` report, see :meth:`report`
+        """
+        schedules = OrderedDict()
+        for event in sorted(events, key=lambda event: event['at']):
+            if event['type'] == 'schedule':
+                schedules.setdefault(event['at'], []).append(event)
+            else:
+                self.clock.callLater(event['at'], self._fire, event)
+        for at, scheduled in schedules.iteritems():
+            self.clock.callLater(at, self._schedule, scheduled)
+        for group in self.groups.itervalues():
+            self.clock.callLater(0, self._obey_config, group)
+
+        loops = [LoopingCall(self._sample),
+                 LoopingCall(self.deletion_service.claim_deletions)]
+        with simulated_time(self.clock), self._installed():
+            for loop, interval in zip(loops, [self.sample_interval,
+                                              self.deletion_interval]):
+                loop.clock = self.clock
+                loop.start(interval)
+            self._advance(duration)
+            for loop in loops:
+                loop.stop()
+        return self.report()
+
+    def report(self):
+        """
+        :return: ``dict`` of the 'capacity' of each group over time, webhook
+            'executions', 'scheduler' execution counts, 'lock_wait' histogram,
+            'api_calls' counts and number of 'failed_builds'. See
+            :class:`SimulationStats`
+        """
+        return {
+            'capacity': dict(self.stats.capacity),
+            'executions': dict(self.stats.executions),
+            'scheduler': dict((key, self.scheduler_metrics.counts[key])
+                              for key in ('executed', 'cannot_execute')),
+            'lock_wait': self.stats.lock_wait.as_dict(),
+            'api_calls': dict(self.stats.calls),
+            'failed_builds': self.stats.failed_builds
+        }
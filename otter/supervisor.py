@@ -2,6 +2,8 @@
 The Otter Supervisor manages a number of workers to execute a launch config.
 """
 
+import json
+
 from twisted.application.service import Service
 from twisted.internet.defer import Deferred, succeed
 
@@ -37,6 +39,23 @@ class ISupervisor(Interface):
         :rtype: ``Deferred``
         """
 
+    def execute_promote_server(log, transaction_id, scaling_group, launch_config,
+                               server):
+        """
+        Puts a standby server of the warm pool into service.
+
+        :param log: Bound logger.
+        :param str transaction_id: Transaction ID.
+        :param IScalingGroup scaling_group: Scaling Group.
+        :param dict launch_config: The launch config for the scaling group.
+        :param dict server: The details of the standby server, built from
+            ``launch_config`` without its load balancers.
+
+        :returns: A deferred that fires with a 2-tuple of job_id and completion
+            deferred, like :meth:`execute_config`
+        :rtype: ``Deferred``
+        """
+
     def execute_delete_server(log, transaction_id, scaling_group, server):
         """
         Executes a single delete server
@@ -67,13 +86,31 @@ class SupervisorService(object, Service):
 
     :ivar DeferredPool deferred_pool: a pool in which to store deferreds that
         should be waited on
+
+    :ivar launch_limiter: Optional :class:`otter.util.deferredutils.FairLimiter`
+        bounding the number of servers being created at a time, in total and per
+        tenant. Creations beyond the bounds are queued and started in order as
+        others complete, so that a large scale up does not exceed the rate limits
+        of Nova.
+
+    :ivar int multi_create_max: Maximum number of servers of the same group and
+        launch config to create with a single Nova request. Launch configs executed
+        in the same reactor iteration are batched up to this many. Each server is
+        still a separate job. Defaults to 1, i.e. no batching.
     """
     name = "supervisor"
 
-    def __init__(self, auth_function, coiterate):
+    def __init__(self, auth_function, coiterate, launch_limiter=None,
+                 multi_create_max=1, clock=None):
         self.auth_function = auth_function
         self.coiterate = coiterate
         self.deferred_pool = DeferredPool()
+        self.launch_limiter = launch_limiter
+        self.multi_create_max = multi_create_max
+        self.clock = clock
+        # (group ID, launch config JSON) -> (delayed launch call, launch config,
+        # list of pending jobs)
+        self._batches = {}
 
     def execute_config(self, log, transaction_id, scaling_group, launch_config):
         """
@@ -89,15 +126,11 @@ class SupervisorService(object, Service):
         assert launch_config['type'] == 'launch_server'
 
         undo = InMemoryUndoStack(self.coiterate)
+        completion_d.addErrback(_rewind_undo, log, undo)
 
-        def when_fails(result):
-            log.msg("Encountered an error, rewinding {worker!r} job undo stack.",
-                    exc=result.value)
-            ud = undo.rewind()
-            ud.addCallback(lambda _: result)
-            return ud
-
-        completion_d.addErrback(when_fails)
+        if self.multi_create_max > 1:
+            self._add_to_batch(log, scaling_group, launch_config, undo, completion_d)
+            return succeed((job_id, completion_d))
 
         log.msg("Authenticating for tenant")
 
@@ -111,24 +144,51 @@ class SupervisorService(object, Service):
                 scaling_group,
                 service_catalog,
                 auth_token,
-                launch_config['args'], undo)
+                launch_config['args'], undo,
+                launch_limiter=self.launch_limiter)
 
         d.addCallback(when_authenticated)
+        d.addCallback(_launch_server_completed, log)
+
+        self.deferred_pool.add(d)
 
-        def when_launch_server_completed(result):
-            # XXX: Something should be done with this data. Currently only enough
-            # to pass to the controller to store in the active state is returned
-            server_details, lb_info = result
-            log.msg("Done executing launch config.",
-                    server_id=server_details['server']['id'])
-            return {
-                'id': server_details['server']['id'],
-                'links': server_details['server']['links'],
-                'name': server_details['server']['name'],
-                'lb_info': lb_info
-            }
-
-        d.addCallback(when_launch_server_completed)
+        d.chainDeferred(completion_d)
+
+        return succeed((job_id, completion_d))
+
+    def execute_promote_server(self, log, transaction_id, scaling_group, launch_config,
+                               server):
+        """
+        see :meth:`ISupervisor.execute_promote_server`
+        """
+        job_id = generate_job_id(scaling_group.uuid)
+        completion_d = Deferred()
+
+        log = log.bind(job_id=job_id,
+                       worker=launch_config['type'],
+                       tenant_id=scaling_group.tenant_id)
+
+        assert launch_config['type'] == 'launch_server'
+
+        undo = InMemoryUndoStack(self.coiterate)
+        completion_d.addErrback(_rewind_undo, log, undo)
+
+        log.msg("Authenticating for tenant")
+
+        d = self.auth_function(scaling_group.tenant_id, log=log)
+
+        def when_authenticated((auth_token, service_catalog)):
+            log.msg("Promoting standby server.", server_id=server['id'])
+            return launch_server_v1.promote_server(
+                log,
+                config_value('region'),
+                scaling_group,
+                service_catalog,
+                auth_token,
+                launch_config['args'], server['id'], undo)
+
+        d.addCallback(when_authenticated)
+        d.addCallback(_launch_server_completed, log)
 
         self.deferred_pool.add(d)
 
@@ -136,6 +196,73 @@ class SupervisorService(object, Service):
 
         return succeed((job_id, completion_d))
 
+    def _reactor(self):
+        """
+        Return the clock to schedule batch launches with
+        """
+        if self.clock is None:
+            from twisted.internet import reactor
+            return reactor
+        return self.clock
+
+    def _add_to_batch(self, log, scaling_group, launch_config, undo, completion_d):
+        """
+        Add a job to the batch of its group and launch config. The batch is launched
+        in the next reactor iteration or once it has ``multi_create_max`` jobs.
+        """
+        key = (scaling_group.uuid, json.dumps(launch_config, sort_keys=True))
+        if key not in self._batches:
+            call = self._reactor().callLater(0, self._launch_batch, key)
+            self._batches[key] = (call, launch_config, [])
+        call, _, jobs = self._batches[key]
+        jobs.append((log, scaling_group, undo, completion_d))
+        if len(jobs) >= self.multi_create_max:
+            call.cancel()
+            self._launch_batch(key)
+        else:
+            log.msg("Batching launch config.", batch_size=len(jobs))
+
+    def _launch_batch(self, key):
+        """
+        Launch the servers of all the jobs in the batch with a single create request
+        and fire each job's completion deferred when its server is launched.
+        """
+        _, launch_config, jobs = self._batches.pop(key)
+        logs, groups, undos, completion_ds = zip(*jobs)
+        scaling_group = groups[0]
+        log = logs[0].bind(batch_size=len(jobs))
+
+        log.msg("Authenticating for tenant")
+        d = self.auth_function(scaling_group.tenant_id, log=log)
+
+        chained = set()
+
+        def when_authenticated((auth_token, service_catalog)):
+            log.msg("Executing launch config for batch.")
+            ds = launch_server_v1.launch_servers(
+                list(logs),
+                config_value('region'),
+                scaling_group,
+                service_catalog,
+                auth_token,
+                launch_config['args'], list(undos),
+                launch_limiter=self.launch_limiter)
+            for job_log, server_d, completion_d in zip(logs, ds, completion_ds):
+                server_d.addCallback(_launch_server_completed, job_log)
+                self.deferred_pool.add(server_d)
+                server_d.chainDeferred(completion_d)
+                chained.add(completion_d)
+
+        def when_fails(failure):
+            # authentication failed or launching could not be started
+            for completion_d in completion_ds:
+                if completion_d not in chained:
+                    completion_d.errback(failure)
+
+        d.addCallback(when_authenticated)
+        d.addErrback(when_fails)
+        self.deferred_pool.add(d)
+
     def execute_delete_server(self, log, transaction_id, scaling_group, server):
         """
         see :meth:`ISupervisor.execute_delete_server`
@@ -180,6 +307,23 @@ class SupervisorService(object, Service):
         log.msg('Authenticating for tenant')
         return d.addCallback(when_authenticated)
 
+    def get_metrics(self):
+        """
+        Return number of servers being created and queued to be created in the
+        format of :meth:`otter.models.interface.IAdmin.get_metrics`. Nothing is
+        returned if creations are not limited.
+        """
+        if self.launch_limiter is None:
+            return []
+        stats = self.launch_limiter.stats()
+        now = int(self.launch_limiter.clock.seconds())
+        values = {'in_flight': stats['running'], 'queued': stats['queued'],
+                  'queued_tenants': stats['queued_keys'], 'avg_wait': stats['avg_wait'],
+                  'max_wait': stats['max_wait']}
+        return [{'id': 'otter.metrics.supervisor.launches.' + key, 'value': value,
+                 'time': now}
+                for key, value in sorted(values.iteritems())]
+
     def stopService(self):
         """
         Returns a deferred that succeeds when the :class:`DeferredPool` is
@@ -189,6 +333,36 @@ class SupervisorService(object, Service):
         return self.deferred_pool.notify_when_empty()
 
 
+def _rewind_undo(failure, log, undo):
+    """
+    Rewind the undo stack of a job that failed with `failure`, and return
+    `failure` once it is rewound.
+    """
+    log.msg("Encountered an error, rewinding {worker!r} job undo stack.",
+            exc=failure.value)
+    ud = undo.rewind()
+    ud.addCallback(lambda _: failure)
+    return ud
+
+
+def _launch_server_completed(result, log):
+    """
+    Return the details of a launched server that are stored in the group's active
+    state, from the result of :func:`launch_server_v1.launch_server`
+    """
+    # XXX: Something should be done with this data. Currently only enough
+    # to pass to the controller to store in the active state is returned
+    server_details, lb_info = result
+    log.msg("Done executing launch config.",
+            server_id=server_details['server']['id'])
+    return {
+        'id': server_details['server']['id'],
+        'links': server_details['server']['links'],
+        'name': server_details['server']['name'],
+        'lb_info': lb_info
+    }
+
+
 _supervisor = None
 
 
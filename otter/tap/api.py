@@ -12,6 +12,7 @@ from twisted.internet.task import coiterate
 
 from twisted.internet.endpoints import clientFromString
 
+from twisted.application.internet import TimerService
 from twisted.application.strports import service
 from twisted.application.service import Service, MultiService
 
@@ -23,11 +24,19 @@ from otter.rest.admin import OtterAdmin
 from otter.rest.application import Otter
 from otter.rest.bobby import set_bobby
 from otter.util.config import set_config_data, config_value
-from otter.models.cass import CassAdmin, CassScalingGroupCollection
+from otter.util.deferredutils import FairLimiter
+from otter.util.partitioner import ConsistentHashPartitioner
+from otter.models.cass import (
+    CassAdmin, CapabilityCache, CassScalingGroupCollection, ConfigCache, ResourceCounts)
 from otter.models.mock import MockAdmin, MockScalingGroupCollection
-from otter.scheduler import SchedulerService
+from otter.scheduler import SchedulerMetrics, SchedulerService
 
 from otter.supervisor import SupervisorService, set_supervisor
+from otter.controller import (
+    CompletionCoalescer, set_completion_coalescer, CooldownCache, set_cooldown_cache,
+    ExecutionCoalescer, set_execution_coalescer)
+from otter.counts import CountsRepairService
+from otter.deletion import DeletionService, set_deletion_queue
 from otter.auth import ImpersonatingAuthenticator
 from otter.auth import RetryingAuthenticator
 from otter.auth import CachingAuthenticator
@@ -190,8 +199,37 @@ def makeService(config):
             seed_endpoints,
             config_value('cassandra.keyspace')), log.bind(system='otter.silverberg'))
 
-        store = CassScalingGroupCollection(cassandra_cluster)
-        admin_store = CassAdmin(cassandra_cluster)
+        capability_cache = None
+        webhook_cache_size = config_value('cassandra.webhook_cache_size')
+        if webhook_cache_size:
+            capability_cache = CapabilityCache(
+                int(webhook_cache_size),
+                float(config_value('cassandra.webhook_cache_ttl') or 60))
+
+        resource_counts = None
+        if config_value('cassandra.resource_counts'):
+            resource_counts = ResourceCounts(
+                limits=bool(config_value('cassandra.resource_counts.limits')))
+
+        config_cache = None
+        config_cache_size = config_value('cassandra.config_cache_size')
+        if config_cache_size:
+            config_cache = ConfigCache(
+                int(config_cache_size),
+                float(config_value('cassandra.config_cache_ttl') or 30))
+
+        store = CassScalingGroupCollection(
+            cassandra_cluster, config_value('cassandra.event_shard_interval'),
+            capability_cache=capability_cache,
+            webhook_index_fallback=not config_value('cassandra.webhook_keys_only'),
+            resource_counts=resource_counts, config_cache=config_cache)
+        metrics_interval = config_value('cassandra.metrics_interval')
+        admin_store = CassAdmin(cassandra_cluster, resource_counts,
+                                cached=bool(metrics_interval), config_cache=config_cache)
+        if metrics_interval:
+            metrics_service = TimerService(int(metrics_interval), admin_store.refresh_metrics,
+                                           log.bind(system='otter.metrics'))
+            metrics_service.setServiceParent(s)
     else:
         store = MockScalingGroupCollection()
         admin_store = MockAdmin()
@@ -224,11 +262,37 @@ def makeService(config):
         'store': getattr(store, 'health_check', None)
     })
 
-    supervisor = SupervisorService(authenticator.authenticate_tenant, coiterate)
+    launch_limiter = None
+    max_launches = config_value('supervisor.launch.max_concurrent')
+    if max_launches:
+        launch_limiter = FairLimiter(
+            int(max_launches),
+            key_limit=config_int('supervisor.launch.max_concurrent_per_tenant'))
+    supervisor = SupervisorService(
+        authenticator.authenticate_tenant, coiterate, launch_limiter=launch_limiter,
+        multi_create_max=int(config_value('supervisor.launch.multi_create_max') or 1))
     supervisor.setServiceParent(s)
 
     set_supervisor(supervisor)
 
+    completion_window = config_value('controller.completion_window')
+    if completion_window:
+        set_completion_coalescer(CompletionCoalescer(
+            float(completion_window),
+            int(config_value('controller.completion_max_batch') or 100)))
+
+    cooldown_cache_ttl = config_value('controller.cooldown_cache_ttl')
+    if cooldown_cache_ttl:
+        set_cooldown_cache(CooldownCache(
+            float(cooldown_cache_ttl),
+            float(config_value('controller.cooldown_cache_margin') or 2),
+            int(config_value('controller.cooldown_cache_groups') or 10000)))
+
+    if config_value('controller.coalesce_executions'):
+        set_execution_coalescer(ExecutionCoalescer())
+
+    setup_deletion_service(s, store, supervisor)
+
     # Setup cassandra cluster to disconnect when otter shuts down
     if 'cassandra_cluster' in locals():
         s.addService(FunctionalService(stop=partial(call_after_supervisor,
@@ -241,10 +305,14 @@ def makeService(config):
     api_service = service(str(config_value('port')), site)
     api_service.setServiceParent(s)
 
+    scheduler_metrics = None
+    if config_value('scheduler') and not config_value('mock'):
+        scheduler_metrics = SchedulerMetrics()
+
     # Setup admin service
     admin_port = config_value('admin')
     if admin_port:
-        admin = OtterAdmin(admin_store)
+        admin = OtterAdmin(admin_store, scheduler_metrics, supervisor)
         admin_site = Site(admin.app.resource())
         admin_site.displayTracebacks = False
         admin_service = service(str(admin_port), admin_site)
@@ -261,7 +329,8 @@ def makeService(config):
 
         def on_client_ready(_):
             # Setup scheduler service after starting
-            scheduler = setup_scheduler(s, store, kz_client)
+            scheduler = setup_scheduler(s, store, kz_client, metrics=scheduler_metrics)
+            setup_counts_repair(s, store, kz_client)
             health_checker.checks['scheduler'] = getattr(
                 scheduler, 'health_check',
                 lambda: (False, 'scheduler health check not implemented'))
@@ -280,20 +349,87 @@ def makeService(config):
     return s
 
 
-def setup_scheduler(parent, store, kz_client):
+def config_int(name):
     """
-    Setup scheduler service
+    Return the value of config `name` as an ``int``, or None if not configured
+    """
+    value = config_value(name)
+    return None if value is None else int(value)
+
+
+def setup_scheduler(parent, store, kz_client, metrics=None):
+    """
+    Setup scheduler service, recording its performance in `metrics` if given
     """
     # Setup scheduler service
     if not config_value('scheduler') or config_value('mock'):
         return
     buckets = range(1, int(config_value('scheduler.buckets')) + 1)
     store.set_scheduler_buckets(buckets)
+    # While resharding to fewer buckets, events in the old buckets beyond the new
+    # count are still checked and then moved to the new ones
+    previous_buckets = int(config_value('scheduler.previous_buckets') or 0)
+    retired_buckets = range(len(buckets) + 1, previous_buckets + 1)
     partition_path = config_value('scheduler.partition.path') or '/scheduler_partition'
     time_boundary = config_value('scheduler.partition.time_boundary') or 15
+    limiter = None
+    max_executions = config_value('scheduler.execution.max_concurrent')
+    if max_executions:
+        limiter = FairLimiter(
+            int(max_executions),
+            key_limit=config_int('scheduler.execution.max_concurrent_per_tenant'))
+    partitioner = None
+    if config_value('scheduler.partition.mode') == 'consistent_hash':
+        partitioner = partial(ConsistentHashPartitioner, kz_client)
+    event_driven = bool(config_value('scheduler.event_driven'))
     scheduler_service = SchedulerService(int(config_value('scheduler.batchsize')),
                                          int(config_value('scheduler.interval')),
                                          store, kz_client, partition_path, time_boundary,
-                                         buckets)
+                                         buckets + retired_buckets,
+                                         event_driven=event_driven,
+                                         prefetch=int(config_value('scheduler.prefetch') or 0),
+                                         limiter=limiter, metrics=metrics,
+                                         partitioner=partitioner,
+                                         retired_buckets=retired_buckets,
+                                         lease=config_value('scheduler.lease'))
+    if event_driven:
+        # wakeups are armed as soon as this node adds an earlier event
+        store.set_event_listener(scheduler_service.events_added)
     scheduler_service.setServiceParent(parent)
     return scheduler_service
+
+
+def setup_counts_repair(parent, store, kz_client):
+    """
+    Setup service repairing the counts of groups, policies and webhooks, if they
+    are kept and their repair is configured
+    """
+    interval = config_value('cassandra.resource_counts.repair_interval')
+    if config_value('mock') or not interval:
+        return
+    repair_service = CountsRepairService(store, kz_client, int(interval))
+    repair_service.setServiceParent(parent)
+    return repair_service
+
+
+def setup_deletion_service(parent, store, supervisor):
+    """
+    Setup service deleting servers from a durable queue, if configured. Scale downs
+    then queue the servers to delete in the store instead of deleting them
+    """
+    if not config_value('deletion'):
+        return
+    limiter = None
+    max_deletions = config_value('deletion.max_concurrent')
+    if max_deletions:
+        limiter = FairLimiter(
+            int(max_deletions),
+            key_limit=config_int('deletion.max_concurrent_per_tenant'))
+    deletion_service = DeletionService(
+        store, supervisor, int(config_value('deletion.interval') or 10),
+        batchsize=int(config_value('deletion.batchsize') or 100),
+        lease=int(config_value('deletion.lease') or 600),
+        limiter=limiter, lb_limit=config_value('deletion.max_concurrent_per_lb'))
+    deletion_service.setServiceParent(parent)
+    set_deletion_queue(store)
+    return deletion_service
@@ -103,7 +103,7 @@ class ScalingGroupConfigTestCase(TestCase):
         Cooldown must be >= 0
         """
         invalid = {
-            'name': ' ',
+            'name': 'name',
             'cooldown': -1,
             'minEntities': 0,
         }
@@ -115,13 +115,28 @@ class ScalingGroupConfigTestCase(TestCase):
         Cooldown must be <= group_schemas.MAX_COOLDOWN
         """
         invalid = {
-            'name': ' ',
+            'name': 'name',
             'cooldown': group_schemas.MAX_COOLDOWN + 1,
             'minEntities': 0,
         }
         self.assertRaisesRegexp(ValidationError, "greater than the maximum",
                                 validate, invalid, group_schemas.config)
 
+    def test_warm_pool_size(self):
+        """
+        The warm pool size is optional, and must be between 0 and MAX_ENTITIES
+        """
+        config = {'name': 'name', 'cooldown': 0, 'minEntities': 0}
+        validate(config, group_schemas.config)
+        config['warmPoolSize'] = 5
+        validate(config, group_schemas.config)
+        for invalid, error_regexp in ((-1, "less than the minimum"),
+                                      (group_schemas.MAX_ENTITIES + 1,
+                                       "greater than the maximum")):
+            config['warmPoolSize'] = invalid
+            self.assertRaisesRegexp(ValidationError, error_regexp,
+                                    validate, config, group_schemas.config)
+
 
 class GeneralLaunchConfigTestCase(TestCase):
     """
@@ -14,13 +14,19 @@ from jsonschema import ValidationError
 from otter.json_schema import group_examples
 
 from otter.models.cass import (
+    CachingScalingGroup,
+    CapabilityCache,
     CassScalingGroup,
     CassScalingGroupCollection,
     CassAdmin,
+    ConfigCache,
+    EventShards,
+    ResourceCounts,
     serialize_json_data,
     get_consistency_level,
     verified_view,
     _assemble_webhook_from_row,
+    _deletion_shard,
     assemble_webhooks_in_policies)
 
 from otter.models.interface import (
@@ -28,7 +34,7 @@ from otter.models.interface import (
     NoSuchWebhookError, UnrecognizedCapabilityError, ScalingGroupOverLimitError,
     WebhooksOverLimitError, PoliciesOverLimitError)
 
-from otter.test.utils import LockMixin, DummyException, mock_log
+from otter.test.utils import LockMixin, DummyException, mock_log, CheckFailure
 from otter.test.models.test_interface import (
     IScalingGroupProviderMixin,
     IScalingGroupCollectionProviderMixin,
@@ -42,6 +48,7 @@ from otter.util.config import set_config_data
 from twisted.internet import defer
 from twisted.internet.task import Clock
 from silverberg.client import ConsistencyLevel
+from kazoo.exceptions import BadVersionError, NodeExistsError, NoNodeError
 from kazoo.protocol.states import KazooState
 
 
@@ -90,6 +97,29 @@ def _cassandrify_data(list_of_dicts):
     return _de_identify(list_of_dicts)
 
 
+def _counter_batch(tenant_id, changes):
+    """
+    Return the CQL and parameters of the counter batch adding `changes`, a
+    ``list`` of (group ID, policy ID, column, number), to the counts of `tenant_id`
+    and to the totals of all tenants
+    """
+    queries, data = [], {'tenantId': tenant_id}
+    for i, (group_id, policy_id, column, number) in enumerate(changes):
+        name = 'count{0}'.format(i)
+        queries.append(
+            'UPDATE resource_counts SET {column} = {column} + :{name} WHERE '
+            '"tenantId" = :tenantId AND "groupId" = :{name}groupId AND '
+            '"policyId" = :{name}policyId'.format(column=column, name=name))
+        if not group_id and not policy_id:
+            queries.append(
+                'UPDATE resource_counts SET {column} = {column} + :{name} WHERE '
+                '"tenantId" = \'\' AND "groupId" = \'\' AND "policyId" = \'\''
+                .format(column=column, name=name))
+        data.update({name: number, name + 'groupId': group_id,
+                     name + 'policyId': policy_id})
+    return ('BEGIN COUNTER BATCH ' + ' '.join(queries) + ' APPLY BATCH;', data)
+
+
 class SerialJsonDataTestCase(TestCase):
     """
     Serializing json data to be put into cassandra should append a version
@@ -421,7 +451,7 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
         d = self.group.view_state()
         r = self.successResultOf(d)
         expectedCql = ('SELECT "tenantId", "groupId", group_config, active, pending, '
-                       '"groupTouched", "policyTouched", paused, desired, created_at '
+                       '"groupTouched", "policyTouched", paused, desired, standby, created_at '
                        'FROM scaling_group '
                        'WHERE "tenantId" = :tenantId AND "groupId" = :groupId;')
         expectedData = {"tenantId": self.tenant_id, "groupId": self.group_id}
@@ -433,6 +463,20 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
                                        {'P': 'R'}, '123', {'PT': 'R'}, False,
                                        desired=10))
 
+    def test_view_state_standby(self):
+        """
+        The warm pool is read from the standby column
+        """
+        cass_response = [
+            {'tenantId': self.tenant_id, 'groupId': self.group_id, 'group_config': '{"name": "a"}',
+             'active': '{}', 'pending': '{}', 'groupTouched': '123',
+             'policyTouched': '{}', 'paused': '\x00', 'created_at': 23, 'desired': 0,
+             'standby': '{"servers": {"s": {"id": "s"}}, "pending": {"j": {}}, "_ver": 1}'}]
+        self.returns = [cass_response]
+        r = self.successResultOf(self.group.view_state())
+        self.assertEqual(r.standby, {'s': {'id': 's'}})
+        self.assertEqual(r.standby_pending, {'j': {}})
+
     def test_view_state_no_desired_capacity(self):
         """
         If there is no desired capacity, it defaults to 0
@@ -487,7 +531,8 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
         d = self.group.view_state()
         self.failureResultOf(d, NoSuchScalingGroupError)
         viewCql = ('SELECT "tenantId", "groupId", group_config, active, pending, '
-                   '"groupTouched", "policyTouched", paused, desired, created_at FROM scaling_group '
+                   '"groupTouched", "policyTouched", paused, desired, standby, created_at '
+                   'FROM scaling_group '
                    'WHERE "tenantId" = :tenantId AND "groupId" = :groupId;')
         delCql = ('DELETE FROM scaling_group '
                   'WHERE "tenantId" = :tenantId AND "groupId" = :groupId')
@@ -530,14 +575,15 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
         self.group.view_state.assert_called_once_with(ConsistencyLevel.TWO)
         expectedCql = (
             'INSERT INTO scaling_group("tenantId", "groupId", active, '
-            'pending, "groupTouched", "policyTouched", paused, desired) VALUES('
+            'pending, "groupTouched", "policyTouched", paused, desired, standby) VALUES('
             ':tenantId, :groupId, :active, :pending, :groupTouched, '
-            ':policyTouched, :paused, :desired)')
+            ':policyTouched, :paused, :desired, :standby)')
         expectedData = {"tenantId": self.tenant_id, "groupId": self.group_id,
                         "active": _S({}), "pending": _S({}),
                         "groupTouched": '0001-01-01T00:00:00Z',
                         "policyTouched": _S({}),
-                        "paused": True, "desired": 5}
+                        "paused": True, "desired": 5,
+                        "standby": _S({'servers': {}, 'pending': {}})}
         self.connection.execute.assert_called_once_with(expectedCql,
                                                         expectedData,
                                                         ConsistencyLevel.TWO)
@@ -633,6 +679,163 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
         self.assertTrue(f.check(AssertionError))
         self.assertEqual(self.connection.execute.call_count, 0)
 
+    def test_view_execution_bundle(self):
+        """
+        ``view_execution_bundle`` reads the state and both configs from the group's
+        row in one query, and the policy alongside it
+        """
+        self.returns = [[
+            {'tenantId': self.tenant_id, 'groupId': self.group_id,
+             'group_config': '{"name": "a"}', 'launch_config': '{"type": "l"}',
+             'active': '{}', 'pending': '{}', 'groupTouched': '123',
+             'policyTouched': '{}', 'paused': '\x00', 'created_at': 23,
+             'desired': 10, 'writetime(group_config)': 1,
+             'writetime(launch_config)': 2}]]
+        self.group.get_policy = mock.Mock(return_value=defer.succeed('policy'))
+
+        d = self.group.view_execution_bundle('pol', 'ver')
+
+        self.assertEqual(
+            self.successResultOf(d),
+            (GroupState(self.tenant_id, self.group_id, 'a', {}, {}, '123', {},
+                        False, desired=10),
+             {'name': 'a'}, {'type': 'l'}, 'policy'))
+        self.group.get_policy.assert_called_once_with('pol', 'ver')
+        expectedCql = ('SELECT "tenantId", "groupId", group_config, launch_config, '
+                       'active, pending, "groupTouched", "policyTouched", paused, '
+                       'desired, standby, created_at, WRITETIME(group_config), '
+                       'WRITETIME(launch_config) FROM scaling_group '
+                       'WHERE "tenantId" = :tenantId AND "groupId" = :groupId;')
+        expectedData = {"tenantId": self.tenant_id, "groupId": self.group_id}
+        self.connection.execute.assert_called_once_with(expectedCql,
+                                                        expectedData,
+                                                        ConsistencyLevel.TWO)
+
+    def test_view_execution_bundle_cached_configs(self):
+        """
+        Given cached configs, the execution bundle reads only the state and the
+        write times of the configs from the group's row, and takes the configs
+        cached with those write times
+        """
+        self.returns = [[
+            {'tenantId': self.tenant_id, 'groupId': self.group_id,
+             'active': '{}', 'pending': '{}', 'groupTouched': '123',
+             'policyTouched': '{}', 'paused': '\x00', 'created_at': 23,
+             'desired': 10, 'writetime(group_config)': 1,
+             'writetime(launch_config)': 2}]]
+        self.group.get_policy = mock.Mock(return_value=defer.succeed('policy'))
+        cached_configs = mock.Mock(return_value=({'name': 'a'}, {'type': 'l'}))
+
+        d = self.group._view_execution_bundle('pol', 'ver', ConsistencyLevel.ONE,
+                                              cached_configs)
+
+        self.assertEqual(
+            self.successResultOf(d),
+            (GroupState(self.tenant_id, self.group_id, 'a', {}, {}, '123', {},
+                        False, desired=10),
+             {'name': 'a'}, {'type': 'l'}, 'policy', (1, 2)))
+        cached_configs.assert_called_once_with(1, 2)
+        expectedCql = ('SELECT "tenantId", "groupId", active, pending, "groupTouched", '
+                       '"policyTouched", paused, desired, standby, created_at, '
+                       'WRITETIME(group_config), WRITETIME(launch_config) FROM '
+                       'scaling_group WHERE "tenantId" = :tenantId AND '
+                       '"groupId" = :groupId;')
+        expectedData = {"tenantId": self.tenant_id, "groupId": self.group_id}
+        self.connection.execute.assert_called_once_with(expectedCql,
+                                                        expectedData,
+                                                        ConsistencyLevel.ONE)
+
+    def test_view_execution_bundle_stale_cached_configs(self):
+        """
+        If no configs are cached with the write times read along with the state,
+        only the configs are read again, with their write times, and the state
+        and policy already read are used
+        """
+        state = {'tenantId': self.tenant_id, 'groupId': self.group_id,
+                 'active': '{}', 'pending': '{}', 'groupTouched': '123',
+                 'policyTouched': '{}', 'paused': '\x00', 'created_at': 23,
+                 'desired': 10, 'writetime(group_config)': 3,
+                 'writetime(launch_config)': 2}
+        self.returns = [[state],
+                        [{'group_config': '{"name": "b"}',
+                          'launch_config': '{"type": "l"}', 'created_at': 23,
+                          'writetime(group_config)': 4,
+                          'writetime(launch_config)': 2}]]
+        self.group.get_policy = mock.Mock(return_value=defer.succeed('policy'))
+        cached_configs = mock.Mock(return_value=None)
+
+        d = self.group._view_execution_bundle('pol', 'ver', ConsistencyLevel.ONE,
+                                              cached_configs)
+
+        self.assertEqual(
+            self.successResultOf(d),
+            (GroupState(self.tenant_id, self.group_id, 'b', {}, {}, '123', {},
+                        False, desired=10),
+             {'name': 'b'}, {'type': 'l'}, 'policy', (4, 2)))
+        cached_configs.assert_called_once_with(3, 2)
+        self.group.get_policy.assert_called_once_with('pol', 'ver')
+        self.assertEqual(self.connection.execute.call_count, 2)
+        expectedCql = ('SELECT group_config, launch_config, created_at, '
+                       'WRITETIME(group_config), WRITETIME(launch_config) FROM '
+                       'scaling_group WHERE "tenantId" = :tenantId AND '
+                       '"groupId" = :groupId;')
+        expectedData = {"tenantId": self.tenant_id, "groupId": self.group_id}
+        self.connection.execute.assert_called_with(expectedCql, expectedData,
+                                                   ConsistencyLevel.ONE)
+
+    def test_view_execution_bundle_no_such_policy(self):
+        """
+        ``view_execution_bundle`` fails with the error of ``get_policy``
+        """
+        self.returns = [[
+            {'tenantId': self.tenant_id, 'groupId': self.group_id,
+             'group_config': '{}', 'launch_config': '{}', 'active': '{}',
+             'pending': '{}', 'groupTouched': None, 'policyTouched': '{}',
+             'paused': '\x00', 'created_at': 23, 'desired': 0}]]
+        self.group.get_policy = mock.Mock(return_value=defer.fail(
+            NoSuchPolicyError(self.tenant_id, self.group_id, 'pol')))
+
+        d = self.group.view_execution_bundle('pol')
+        self.failureResultOf(d, NoSuchPolicyError)
+
+    def test_view_execution_bundle_no_such_group(self):
+        """
+        ``view_execution_bundle`` fails with :class:`NoSuchScalingGroupError` if
+        the group does not exist, even though the policy is not found either
+        """
+        self.returns = [[]]
+        self.group.get_policy = mock.Mock(return_value=defer.fail(
+            NoSuchPolicyError(self.tenant_id, self.group_id, 'pol')))
+
+        d = self.group.view_execution_bundle('pol')
+        self.failureResultOf(d, NoSuchScalingGroupError)
+
+    @mock.patch('otter.models.cass.serialize_json_data',
+                side_effect=lambda *args: _S(args[0]))
+    def test_modify_state_for_policy_succeeds(self, mock_serial):
+        """
+        ``modify_state_for_policy`` reads the execution bundle with the lock's
+        consistency, calls the modifier with it and writes the state the modifier
+        returns to the database
+        """
+        new_state = GroupState(self.tenant_id, self.group_id, 'a', {}, {}, None,
+                               {}, True, desired=5)
+        modifier = mock.Mock(return_value=new_state)
+        self.group.view_execution_bundle = mock.Mock(return_value=defer.succeed(
+            ('state', 'config', 'launch', 'policy')))
+
+        d = self.group.modify_state_for_policy(modifier, 'pol', 'ver')
+
+        self.assertEqual(self.successResultOf(d), None)
+        self.group.view_execution_bundle.assert_called_once_with(
+            'pol', 'ver', ConsistencyLevel.TWO)
+        modifier.assert_called_once_with(self.group, 'state', config='config',
+                                         launch='launch', policy='policy')
+        self.assertEqual(self.connection.execute.call_count, 1)
+        self.assertEqual(self.connection.execute.call_args[0][1]['desired'], 5)
+        self.lock._acquire.assert_called_once_with(timeout=120)
+        self.lock.release.assert_called_once_with()
+
     def test_view_config_no_such_group(self):
         """
         Tests what happens if you try to view a group that doesn't exist.
@@ -1002,27 +1205,48 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
     def test_delete_policy_valid_policy(self, mock_get_policy):
         """
         When you delete a scaling policy, it checks if the policy exists and
-        if it does, deletes the policy and all its associated webhooks.
+        if it does, deletes the policy and all its associated webhooks, and
+        the webhooks from the table of webhooks by capability hash.
         """
+        self.returns = [[{'webhookKey': 'h1'}, {'webhookKey': 'h2'}], None]
         d = self.group.delete_policy('3222')
         # delete returns None
         self.assertIsNone(self.successResultOf(d))
         mock_get_policy.assert_called_once_with('3222')
 
+        expected_list_cql = (
+            'SELECT "webhookKey" FROM policy_webhooks WHERE "tenantId" = :tenantId '
+            'AND "groupId" = :groupId AND "policyId" = :policyId;')
         expected_cql = (
             'BEGIN BATCH '
             'DELETE FROM scaling_policies WHERE "tenantId" = :tenantId AND '
             '"groupId" = :groupId AND "policyId" = :policyId '
             'DELETE FROM policy_webhooks WHERE "tenantId" = :tenantId AND '
             '"groupId" = :groupId AND "policyId" = :policyId '
+            'DELETE FROM webhook_keys WHERE "webhookKey" = :key0Key '
+            'DELETE FROM webhook_keys WHERE "webhookKey" = :key1Key '
             'APPLY BATCH;')
         expected_data = {
             "tenantId": self.group.tenant_id,
             "groupId": self.group.uuid,
             "policyId": "3222"}
 
-        self.connection.execute.assert_called_once_with(
-            expected_cql, expected_data, ConsistencyLevel.TWO)
+        self.assertEqual(
+            self.connection.execute.mock_calls,
+            [mock.call(expected_list_cql, expected_data, ConsistencyLevel.TWO),
+             mock.call(expected_cql, dict(expected_data, key0Key='h1', key1Key='h2'),
+                       ConsistencyLevel.TWO)])
+
+    @mock.patch('otter.models.cass.CassScalingGroup.get_policy',
+                return_value=defer.succeed({}))
+    def test_delete_policy_invalidates_capabilities(self, mock_get_policy):
+        """
+        Deleting a scaling policy forgets its webhooks in the capability cache
+        """
+        self.group.capability_cache = mock.Mock(spec=['invalidate'])
+        self.returns = [[{'webhookKey': 'h1'}], None]
+        self.successResultOf(self.group.delete_policy('3222'))
+        self.group.capability_cache.invalidate.assert_called_once_with(['h1'])
 
     @mock.patch('otter.models.cass.CassScalingGroup.get_policy',
                 return_value=defer.fail(NoSuchPolicyError('t', 'g', 'p')))
@@ -1132,9 +1356,13 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
             'INSERT INTO policy_webhooks("tenantId", "groupId", "policyId", "webhookId", '
             'data, capability, "webhookKey") VALUES (:tenantId, :groupId, :policyId, '
             ':webhook0Id, :webhook0, :webhook0Capability, :webhook0Key) '
+            'INSERT INTO webhook_keys("webhookKey", "tenantId", "groupId", "policyId", '
+            '"webhookId") VALUES (:webhook0Key, :tenantId, :groupId, :policyId, :webhook0Id) '
             'INSERT INTO policy_webhooks("tenantId", "groupId", "policyId", "webhookId", '
             'data, capability, "webhookKey") VALUES (:tenantId, :groupId, :policyId, '
             ':webhook1Id, :webhook1, :webhook1Capability, :webhook1Key) '
+            'INSERT INTO webhook_keys("webhookKey", "tenantId", "groupId", "policyId", '
+            '"webhookId") VALUES (:webhook1Key, :tenantId, :groupId, :policyId, :webhook1Id) '
             'APPLY BATCH;')
 
         # can't test the parameters, because they contain serialized JSON.
@@ -1515,17 +1743,31 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
             None]
         d = self.group.delete_webhook('3444', '4555')
         self.assertIsNone(self.successResultOf(d))  # delete returns None
-        expectedCql = ('DELETE FROM policy_webhooks WHERE '
+        expectedCql = ('BEGIN BATCH '
+                       'DELETE FROM policy_webhooks WHERE '
                        '"tenantId" = :tenantId AND "groupId" = :groupId AND '
-                       '"policyId" = :policyId AND "webhookId" = :webhookId')
+                       '"policyId" = :policyId AND "webhookId" = :webhookId '
+                       'DELETE FROM webhook_keys WHERE "webhookKey" = :key0Key '
+                       'APPLY BATCH;')
         expectedData = {"tenantId": "11111", "groupId": "12345678g",
-                        "policyId": "3444", "webhookId": "4555"}
+                        "policyId": "3444", "webhookId": "4555", "key0Key": "h"}
 
         self.assertEqual(len(self.connection.execute.mock_calls), 2)  # view, delete
         self.connection.execute.assert_called_with(expectedCql,
                                                    expectedData,
                                                    ConsistencyLevel.TWO)
 
+    def test_delete_webhook_invalidates_capability(self):
+        """
+        Deleting a webhook forgets it in the capability cache
+        """
+        self.group.capability_cache = mock.Mock(spec=['invalidate'])
+        self.returns = [
+            _cassandrify_data([{'data': '{}', 'capability': '{"1": "h"}'}]),
+            None]
+        self.successResultOf(self.group.delete_webhook('3444', '4555'))
+        self.group.capability_cache.invalidate.assert_called_once_with(['h'])
+
     def test_delete_non_existant_webhooks(self):
         """
         If you try to delete a scaling policy webhook that doesn't exist,
@@ -1705,58 +1947,55 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
         self.flushLoggedErrors(GroupNotEmptyError)
 
     @mock.patch('otter.models.cass.CassScalingGroup.view_state')
-    @mock.patch('otter.models.cass.CassScalingGroup._naive_list_policies')
-    def test_delete_empty_scaling_group_with_policies(self, mock_naive,
-                                                      mock_view_state):
+    def test_delete_empty_scaling_group_with_webhooks(self, mock_view_state):
         """
         ``delete_group`` deletes config, launch config, state, and the group's
-        policies and webhooks and events if the scaling group is empty.
-        It uses naive list policies to figure out what events to delete.
+        policies and webhooks if the scaling group is empty, and its webhooks
+        from the table of webhooks by capability hash, which it lists first.
         """
         mock_view_state.return_value = defer.succeed(GroupState(
             self.tenant_id, self.group_id, '', {}, {}, None, {}, False))
-        mock_naive.return_value = defer.succeed(
-            [{'id': 'policyA'}, {'id': 'policyB'}])
 
-        self.returns = [None]
+        self.returns = [[{'webhookKey': 'h1'}, {'webhookKey': 'h2'}], None]
         result = self.successResultOf(self.group.delete_group())
         self.assertIsNone(result)  # delete returns None
-        mock_naive.assert_called_once_with()
 
         expected_data = {'tenantId': self.tenant_id,
                          'groupId': self.group_id}
+        expected_list_cql = (
+            'SELECT "webhookKey" FROM policy_webhooks WHERE "tenantId" = :tenantId '
+            'AND "groupId" = :groupId;')
         expected_cql = (
             'BEGIN BATCH '
             'DELETE FROM scaling_group WHERE "tenantId" = :tenantId AND "groupId" = :groupId '
             'DELETE FROM scaling_policies WHERE "tenantId" = :tenantId AND "groupId" = :groupId '
             'DELETE FROM policy_webhooks WHERE "tenantId" = :tenantId AND "groupId" = :groupId '
+            'DELETE FROM webhook_keys WHERE "webhookKey" = :key0Key '
+            'DELETE FROM webhook_keys WHERE "webhookKey" = :key1Key '
             'APPLY BATCH;')
 
-        self.connection.execute.assert_called_once_with(
-            expected_cql, expected_data, ConsistencyLevel.TWO)
+        self.assertEqual(
+            self.connection.execute.mock_calls,
+            [mock.call(expected_list_cql, expected_data, ConsistencyLevel.TWO),
+             mock.call(expected_cql, dict(expected_data, key0Key='h1', key1Key='h2'),
+                       ConsistencyLevel.TWO)])
 
         self.kz_lock.Lock.assert_called_once_with('/locks/' + self.group.uuid)
         self.lock._acquire.assert_called_once_with(timeout=120)
         self.lock.release.assert_called_once_with()
 
     @mock.patch('otter.models.cass.CassScalingGroup.view_state')
-    @mock.patch('otter.models.cass.CassScalingGroup._naive_list_policies')
-    def test_delete_empty_scaling_group_with_zero_policies(self, mock_naive,
-                                                           mock_view_state):
+    def test_delete_empty_scaling_group_without_webhooks(self, mock_view_state):
         """
         ``delete_group`` deletes config, launch config, state, and the group's
-        policies and webhooks but not events if the scaling group is empty but
-        has no policies.
-        It uses naive list policies to figure out what events to delete.
+        policies and webhooks if the scaling group is empty but has no webhooks.
         """
         mock_view_state.return_value = defer.succeed(GroupState(
             self.tenant_id, self.group_id, '', {}, {}, None, {}, False))
-        mock_naive.return_value = defer.succeed({})
 
-        self.returns = [None]
+        self.returns = [[], None]
         result = self.successResultOf(self.group.delete_group())
         self.assertIsNone(result)  # delete returns None
-        mock_naive.assert_called_once_with()
 
         expected_data = {'tenantId': self.tenant_id,
                          'groupId': self.group_id}
@@ -1767,13 +2006,26 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
             'DELETE FROM policy_webhooks WHERE "tenantId" = :tenantId AND "groupId" = :groupId '
             'APPLY BATCH;')
 
-        self.connection.execute.assert_called_once_with(
+        self.connection.execute.assert_called_with(
             expected_cql, expected_data, ConsistencyLevel.TWO)
+        self.assertEqual(len(self.connection.execute.mock_calls), 2)  # list, delete
 
         self.kz_lock.Lock.assert_called_once_with('/locks/' + self.group.uuid)
         self.lock._acquire.assert_called_once_with(timeout=120)
         self.lock.release.assert_called_once_with()
 
+    @mock.patch('otter.models.cass.CassScalingGroup.view_state')
+    def test_delete_group_invalidates_capabilities(self, mock_view_state):
+        """
+        Deleting a group forgets its webhooks in the capability cache
+        """
+        mock_view_state.return_value = defer.succeed(GroupState(
+            self.tenant_id, self.group_id, '', {}, {}, None, {}, False))
+        self.group.capability_cache = mock.Mock(spec=['invalidate'])
+        self.returns = [[{'webhookKey': 'h1'}], None]
+        self.successResultOf(self.group.delete_group())
+        self.group.capability_cache.invalidate.assert_called_once_with(['h1'])
+
     @mock.patch('otter.models.cass.CassScalingGroup.view_state')
     def test_delete_lock_not_acquired(self, mock_view_state):
         """
@@ -1909,6 +2161,21 @@ class CassScalingGroupUpdatePolicyTests(CassScalingGroupTestCase):
         self.connection.execute.assert_called_once_with(
             expected_cql, expected_data, ConsistencyLevel.TWO)
 
+    def test_update_scaling_policy_event_listener(self):
+        """
+        The group's event listener is told about the new event of an updated
+        schedule policy
+        """
+        self.returns = [None]
+        self.group.event_listener = mock.Mock()
+        self.get_policy.return_value = defer.succeed({"type": "schedule",
+                                                      "args": {"at": "2013-07-30T19:03:12Z"}})
+        d = self.group.update_policy('12345678', {"type": "schedule",
+                                                  "args": {"at": "2015-09-20T10:00:12Z"}})
+        self.successResultOf(d)
+        self.group.event_listener.assert_called_once_with(
+            [(2, from_timestamp("2015-09-20T10:00:12Z"))])
+
     def test_update_scaling_policy_cron_schedule_change(self):
         """
         Updating cron-style schedule policy updates respective entry in
@@ -2110,6 +2377,186 @@ class ScalingGroupAddPoliciesTests(CassScalingGroupTestCase):
         pol['id'] = self.mock_key.return_value
         self.assertEqual(result, [pol])
 
+    def test_add_scaling_policies_event_listener(self):
+        """
+        The group's event listener is told about the bucket and trigger of events
+        of the schedule policies added, after they are written
+        """
+        self.returns = [[{'count': 0}], None]
+        self.group.event_listener = mock.Mock()
+        pols = [{'cooldown': 5, 'type': 'schedule', 'name': 'at', 'change': 10,
+                 'args': {'at': '2012-10-20T03:23:45'}},
+                {'cooldown': 5, 'type': 'webhook', 'name': 'w', 'change': 10},
+                {'cooldown': 5, 'type': 'schedule', 'name': 'cron', 'change': 10,
+                 'args': {'cron': '* * * * *'}}]
+        self.group.buckets = iter([2, 3, 4])
+
+        self.successResultOf(self.group.create_policies(pols))
+
+        self.group.event_listener.assert_called_once_with(
+            [(2, from_timestamp('2012-10-20T03:23:45')), (3, 'next_time')])
+
+    def test_add_scaling_policies_event_listener_failed_write(self):
+        """
+        The group's event listener is not called if writing the events fails
+        """
+        self.connection.execute.side_effect = [defer.succeed([{'count': 0}]),
+                                               defer.fail(DummyException())]
+        self.group.event_listener = mock.Mock()
+        pol = {'cooldown': 5, 'type': 'schedule', 'name': 'cron', 'change': 10,
+               'args': {'cron': '* * * * *'}}
+
+        self.failureResultOf(self.group.create_policies([pol]), DummyException)
+
+        self.assertFalse(self.group.event_listener.called)
+
+
+class CassScalingGroupResourceCountsTests(CassScalingGroupTestCase):
+    """
+    Tests for :class:`CassScalingGroup` counting groups, policies and webhooks
+    in :class:`ResourceCounts`
+    """
+
+    def setUp(self):
+        """
+        Group checking limits against resource counts
+        """
+        super(CassScalingGroupResourceCountsTests, self).setUp()
+        self.group.resource_counts = ResourceCounts(limits=True)
+        self.group.view_config = mock.Mock(return_value=defer.succeed({}))
+        self.view_counts = mock.call(
+            'SELECT groups, policies, webhooks FROM resource_counts WHERE '
+            '"tenantId" = :tenantId AND "groupId" = :groupId AND "policyId" = :policyId;',
+            mock.ANY, ConsistencyLevel.TWO)
+
+    def test_create_policies(self):
+        """
+        Creating policies checks the limit against the count of policies of the
+        group, and counts them in the tenant and the group
+        """
+        set_config_data({'limits': {'absolute': {'maxPoliciesPerGroup': 3}}})
+        self.returns = [[{'groups': None, 'policies': 2, 'webhooks': None}], None, None]
+        self.successResultOf(self.group.create_policies([{'b': 'lah'}]))
+        self.assertEqual(self.connection.execute.mock_calls[0], self.view_counts)
+        self.assertEqual(self.connection.execute.mock_calls[0][1][1],
+                         {'tenantId': self.tenant_id, 'groupId': self.group_id,
+                          'policyId': ''})
+        cql, data = _counter_batch(self.tenant_id, [('', '', 'policies', 1),
+                                                    (self.group_id, '', 'policies', 1)])
+        self.connection.execute.assert_called_with(cql, data, ConsistencyLevel.TWO)
+
+    def test_create_policies_over_limit(self):
+        """
+        Creating policies fails if the count of policies of the group is at the
+        limit
+        """
+        set_config_data({'limits': {'absolute': {'maxPoliciesPerGroup': 2}}})
+        self.returns = [[{'groups': None, 'policies': 2, 'webhooks': None}]]
+        self.failureResultOf(self.group.create_policies([{'b': 'lah'}]),
+                             PoliciesOverLimitError)
+        self.assertEqual(len(self.connection.execute.mock_calls), 1)
+
+    @mock.patch('otter.models.cass.CassScalingGroup.get_policy',
+                return_value=defer.succeed({}))
+    def test_create_webhooks(self, mock_get_policy):
+        """
+        Creating webhooks checks the limit against the count of webhooks of the
+        policy, and counts them in the tenant and the policy
+        """
+        self.returns = [[{'groups': None, 'policies': None, 'webhooks': 2}], None, None]
+        self.successResultOf(self.group.create_webhooks('p1', [{'name': 'a'}]))
+        self.assertEqual(self.connection.execute.mock_calls[0], self.view_counts)
+        self.assertEqual(self.connection.execute.mock_calls[0][1][1],
+                         {'tenantId': self.tenant_id, 'groupId': self.group_id,
+                          'policyId': 'p1'})
+        cql, data = _counter_batch(self.tenant_id, [('', '', 'webhooks', 1),
+                                                    (self.group_id, 'p1', 'webhooks', 1)])
+        self.connection.execute.assert_called_with(cql, data, ConsistencyLevel.TWO)
+
+    @mock.patch('otter.models.cass.CassScalingGroup.get_policy',
+                return_value=defer.succeed({}))
+    def test_create_webhooks_over_limit(self, mock_get_policy):
+        """
+        Creating webhooks fails if the count of webhooks of the policy is at the
+        limit
+        """
+        self.returns = [[{'groups': None, 'policies': None, 'webhooks': 1000}]]
+        self.failureResultOf(self.group.create_webhooks('p1', [{'name': 'a'}]),
+                             WebhooksOverLimitError)
+        self.assertEqual(len(self.connection.execute.mock_calls), 1)
+
+    def test_counting_failure_logged(self):
+        """
+        Policies are created even if they could not be counted, and the failure
+        is logged
+        """
+        set_config_data({'limits': {'absolute': {'maxPoliciesPerGroup': 3}}})
+        self.group.log = mock_log()
+        self.connection.execute.side_effect = [
+            defer.succeed([{'groups': None, 'policies': 0, 'webhooks': None}]),
+            defer.succeed(None), defer.fail(DummyException('bad'))]
+        result = self.successResultOf(self.group.create_policies([{'b': 'lah'}]))
+        self.assertEqual(result, [{'b': 'lah', 'id': self.mock_key.return_value}])
+        self.group.log.err.assert_called_once_with(CheckFailure(DummyException),
+                                                   'Could not update resource counts')
+
+    def test_delete_webhook(self):
+        """
+        Deleting a webhook removes it from the counts of the tenant and the policy
+        """
+        self.returns = [
+            _cassandrify_data([{'data': '{}', 'capability': '{"1": "h"}'}]), None, None]
+        self.successResultOf(self.group.delete_webhook('p1', 'w1'))
+        cql, data = _counter_batch(self.tenant_id, [('', '', 'webhooks', -1),
+                                                    (self.group_id, 'p1', 'webhooks', -1)])
+        self.connection.execute.assert_called_with(cql, data, ConsistencyLevel.TWO)
+
+    @mock.patch('otter.models.cass.CassScalingGroup.get_policy',
+                return_value=defer.succeed({}))
+    def test_delete_policy(self, mock_get_policy):
+        """
+        Deleting a policy removes it and its webhooks from the counts of the
+        tenant and the group, and removes its counts
+        """
+        self.returns = [[{'webhookKey': 'h1'}, {'webhookKey': 'h2'}], None, None, None]
+        self.successResultOf(self.group.delete_policy('p1'))
+        cql, data = _counter_batch(self.tenant_id, [('', '', 'policies', -1),
+                                                    ('', '', 'webhooks', -2),
+                                                    (self.group_id, '', 'policies', -1)])
+        self.assertEqual(
+            self.connection.execute.mock_calls[2:],
+            [mock.call(cql, data, ConsistencyLevel.TWO),
+             mock.call('DELETE FROM resource_counts WHERE "tenantId" = :tenantId AND '
+                       '"groupId" = :groupId AND "policyId" = :policyId',
+                       {'tenantId': self.tenant_id, 'groupId': self.group_id,
+                        'policyId': 'p1'}, ConsistencyLevel.TWO)])
+
+    @mock.patch('otter.models.cass.CassScalingGroup.view_state')
+    def test_delete_group(self, mock_view_state):
+        """
+        Deleting a group removes it, its policies and its webhooks from the
+        counts of the tenant, and removes its counts
+        """
+        mock_view_state.return_value = defer.succeed(GroupState(
+            self.tenant_id, self.group_id, '', {}, {}, None, {}, False))
+        self.returns = [[{'webhookKey': 'h1'}], None,
+                        [{'groups': None, 'policies': 3, 'webhooks': None}], None, None]
+        self.assertIsNone(self.successResultOf(self.group.delete_group()))
+        cql, data = _counter_batch(self.tenant_id, [('', '', 'groups', -1),
+                                                    ('', '', 'policies', -3),
+                                                    ('', '', 'webhooks', -1)])
+        self.assertEqual(
+            self.connection.execute.mock_calls[2:],
+            [self.view_counts,
+             mock.call(cql, data, ConsistencyLevel.TWO),
+             mock.call('DELETE FROM resource_counts WHERE "tenantId" = :tenantId AND '
+                       '"groupId" = :groupId',
+                       {'tenantId': self.tenant_id, 'groupId': self.group_id},
+                       ConsistencyLevel.TWO)])
+        self.assertEqual(self.connection.execute.mock_calls[2][1][1],
+                         {'tenantId': self.tenant_id, 'groupId': self.group_id,
+                          'policyId': ''})
+
 
 class CassScalingScheduleCollectionTestCase(IScalingScheduleCollectionProviderMixin,
                                             TestCase):
@@ -2201,6 +2648,78 @@ class CassScalingScheduleCollectionTestCase(IScalingScheduleCollectionProviderMi
         self.connection.execute.assert_called_once_with(
             cql, data, ConsistencyLevel.ONE)
 
+    def test_add_cron_events_event_listener(self):
+        """
+        The collection's event listener is told about the bucket and trigger of the
+        cron events added
+        """
+        self.returns = [None]
+        self.collection.event_listener = mock.Mock()
+        events = [{'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ef',
+                   'trigger': 100, 'cron': 'c1', 'version': 'v1'},
+                  {'tenantId': '1d3', 'groupId': 'gr3', 'policyId': 'ex',
+                   'trigger': 122, 'cron': 'c2', 'version': 'v2'}]
+        self.collection.buckets = iter(range(2, 4))
+
+        self.successResultOf(self.collection.add_cron_events(events))
+
+        self.collection.event_listener.assert_called_once_with([(2, 100), (3, 122)])
+
+    def test_move_events(self):
+        """
+        `move_events` fetches events in bucket, due or not, and inserts them into the
+        buckets in use while deleting them from the bucket in one batch
+        """
+        self.returns = [[{'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ef',
+                          'trigger': 100, 'cron': 'c1', 'version': 'v1'}],
+                        None]
+        self.collection.buckets = iter([3])
+        fetch_cql = ('SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+                     'FROM scaling_schedule_v2 WHERE bucket = :bucket LIMIT :size;')
+        move_cql = (
+            'BEGIN BATCH '
+            'INSERT INTO scaling_schedule_v2(bucket, "tenantId", "groupId", "policyId", '
+            'trigger, cron, version) '
+            'VALUES (:event0bucket, :event0tenantId, :event0groupId, :event0policyId, '
+            ':event0trigger, :event0cron, :event0version); '
+            'DELETE FROM scaling_schedule_v2 WHERE bucket = :bucket '
+            'AND trigger = :event0trigger AND "policyId" = :event0policyId; '
+            'APPLY BATCH;')
+        move_data = {'bucket': 12, 'event0bucket': 3, 'event0tenantId': '1d2',
+                     'event0groupId': 'gr2', 'event0policyId': 'ef', 'event0trigger': 100,
+                     'event0cron': 'c1', 'event0version': 'v1'}
+
+        d = self.collection.move_events(12, 50)
+
+        self.assertEqual(self.successResultOf(d), 1)
+        self.assertEqual(self.connection.execute.mock_calls,
+                         [mock.call(fetch_cql, {'bucket': 12, 'size': 50},
+                                    ConsistencyLevel.QUORUM),
+                          mock.call(move_cql, move_data, ConsistencyLevel.QUORUM)])
+
+    def test_move_events_event_listener(self):
+        """
+        The collection's event listener is told about the buckets the events
+        were moved to
+        """
+        self.returns = [[{'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ef',
+                          'trigger': 100, 'cron': 'c1', 'version': 'v1'}],
+                        None]
+        self.collection.buckets = iter([3])
+        self.collection.event_listener = mock.Mock()
+
+        self.successResultOf(self.collection.move_events(12, 50))
+
+        self.collection.event_listener.assert_called_once_with([(3, 100)])
+
+    def test_move_events_empty(self):
+        """
+        `move_events` does nothing more if bucket is empty
+        """
+        self.returns = [[]]
+        self.assertEqual(self.successResultOf(self.collection.move_events(12)), 0)
+        self.assertEqual(self.connection.execute.call_count, 1)
+
     def test_get_oldest_event(self):
         """
         Tests for `get_oldest_event`
@@ -2226,52 +2745,1297 @@ class CassScalingScheduleCollectionTestCase(IScalingScheduleCollectionProviderMi
 
         self.assertIsNone(self.successResultOf(d))
 
+    def test_get_oldest_event_after(self):
+        """
+        `get_oldest_event` gets the oldest event triggering after given time
+        """
+        events = [{'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ef',
+                   'trigger': 100, 'cron': 'c1', 'version': 'v1'}]
+        self.returns = [events]
+
+        d = self.collection.get_oldest_event(2, after=50)
 
-class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
-                                          TestCase):
+        self.assertEqual(self.successResultOf(d), events[0])
+        self.connection.execute.assert_called_once_with(
+            'SELECT * from scaling_schedule_v2 WHERE bucket=:bucket AND trigger > :after '
+            'LIMIT 1;', {'bucket': 2, 'after': 50}, ConsistencyLevel.ONE)
+
+
+class ClaimEventsTests(TestCase):
     """
-    Tests for :class:`CassScalingGroupCollection`
+    Tests for :meth:`CassScalingGroupCollection.claim_events` and
+    :meth:`CassScalingGroupCollection.delete_claimed_events`
     """
 
     def setUp(self):
-        """ Setup the mocks """
+        """
+        Mock connection returning two due events and kazoo client
+        """
         self.connection = mock.MagicMock(spec=['execute'])
-        set_config_data({'limits': {'absolute': {'maxGroups': 1000}}})
-        self.addCleanup(set_config_data, {})
-
-        self.returns = [[{"count": 0}], None]
+        self.events = [
+            {'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ef',
+             'trigger': datetime(1970, 1, 1, 0, 1, 40), 'cron': None, 'version': 'v1'},
+            {'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ex',
+             'trigger': datetime(1970, 1, 1, 0, 2, 2), 'cron': None, 'version': 'v2'}]
+        self.connection.execute.side_effect = lambda *_: defer.succeed(self.events)
+        self.collection = CassScalingGroupCollection(self.connection)
+        self.kz_client = mock.Mock(spec=['create', 'get', 'delete'])
+        self.collection.kz_client = self.kz_client
+        self.now = datetime(1970, 1, 1, 0, 3, 20)
+        self.claims = {}
 
-        def _responses(*args):
-            result = self.returns.pop(0)
-            if isinstance(result, Exception):
-                return defer.fail(result)
-            return defer.succeed(_de_identify(result))
+        def create(path, value, ephemeral, makepath):
+            if path in self.claims:
+                return defer.fail(NodeExistsError())
+            self.claims[path] = value
+            return defer.succeed(path)
 
-        self.connection.execute.side_effect = _responses
+        self.kz_client.create.side_effect = create
+        self.kz_client.get.side_effect = lambda path: defer.succeed(
+            (self.claims[path], mock.Mock(version=3)))
 
-        self.mock_log = mock_log()
+        def delete(path, version=-1):
+            if self.claims.pop(path, None) is None:
+                return defer.fail(NoNodeError())
+            return defer.succeed(None)
 
-        self.collection = CassScalingGroupCollection(self.connection)
-        self.tenant_id = 'goo1234'
-        self.config = _de_identify({
-            'name': 'blah',
-            'cooldown': 600,
-            'minEntities': 0,
-            'maxEntities': 10,
-            'metadata': {}
-        })
-        self.launch = _de_identify(group_examples.launch_server_config()[0])
+        self.kz_client.delete.side_effect = delete
 
-        self.mock_key = patch(self, 'otter.models.cass.generate_key_str')
-        patch(self, 'otter.models.cass.get_consistency_level',
-              return_value=ConsistencyLevel.TWO)
+    def test_claims_unclaimed(self):
+        """
+        `claim_events` reads ahead of `size` due events and claims the ones not
+        claimed by others with an ephemeral node holding expiry time
+        """
+        self.claims['/scheduler_claims/2/ef-100'] = '250'
 
-        self.uuid = patch(self, 'otter.models.cass.uuid')
-        self.uuid.uuid1.return_value = 'timeuuid'
+        d = self.collection.claim_events(2, self.now, 1, lease=60)
 
-        # 'serializing' something just wraps it with a _S
-        self.mock_serial = patch(self, 'otter.models.cass.serialize_json_data',
-                                 side_effect=lambda *args: _S(args[0]))
+        self.assertEqual(self.successResultOf(d), self.events[1:])
+        self.connection.execute.assert_called_once_with(
+            'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+            'FROM scaling_schedule_v2 WHERE bucket = :bucket AND trigger <= :now '
+            'LIMIT :size;', {'bucket': 2, 'now': self.now, 'size': 4},
+            ConsistencyLevel.QUORUM)
+        self.kz_client.create.assert_called_with(
+            '/scheduler_claims/2/ex-122', '260', ephemeral=True, makepath=True)
+        self.assertFalse(self.kz_client.delete.called)
+
+    def test_pages_past_claimed(self):
+        """
+        If all the events read ahead are claimed by others, `claim_events` reads the
+        due events after the last one read, first those with the same trigger
+        """
+        claimed = [
+            {'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'p{}'.format(i),
+             'trigger': datetime(1970, 1, 1, 0, 1, 40), 'cron': None, 'version': 'v'}
+            for i in range(4)]
+        for event in claimed:
+            self.claims['/scheduler_claims/2/{}-100'.format(event['policyId'])] = '250'
+        self.connection.execute.side_effect = [
+            defer.succeed(claimed), defer.succeed([]), defer.succeed(self.events[1:])]
+
+        d = self.collection.claim_events(2, self.now, 1, lease=60)
+
+        self.assertEqual(self.successResultOf(d), self.events[1:])
+        self.assertEqual(
+            self.connection.execute.mock_calls[1:],
+            [mock.call('SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+                       'FROM scaling_schedule_v2 WHERE bucket = :bucket AND trigger = :trigger '
+                       'AND "policyId" > :policyId LIMIT :size;',
+                       {'bucket': 2, 'now': self.now, 'trigger': claimed[3]['trigger'],
+                        'policyId': 'p3', 'size': 4},
+                       ConsistencyLevel.QUORUM),
+             mock.call('SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+                       'FROM scaling_schedule_v2 WHERE bucket = :bucket AND trigger > :trigger '
+                       'AND trigger <= :now LIMIT :size;',
+                       {'bucket': 2, 'now': self.now, 'trigger': claimed[3]['trigger'],
+                        'policyId': 'p3', 'size': 4},
+                       ConsistencyLevel.QUORUM)])
+        self.assertIn('/scheduler_claims/2/ex-122', self.claims)
+
+    def test_stops_paging_when_enough_claimed(self):
+        """
+        `claim_events` does not read more events once it claimed `size` of them
+        """
+        events = [
+            {'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'p{}'.format(i),
+             'trigger': datetime(1970, 1, 1, 0, 1, 40), 'cron': None, 'version': 'v'}
+            for i in range(4)]
+        self.connection.execute.side_effect = lambda *_: defer.succeed(events)
+
+        d = self.collection.claim_events(2, self.now, 1, lease=60)
+
+        self.assertEqual(self.successResultOf(d), events[:1])
+        self.assertEqual(self.connection.execute.call_count, 1)
+
+    def test_takes_over_expired_claim(self):
+        """
+        An expired claim is deleted with the version read and claimed again
+        """
+        self.claims['/scheduler_claims/2/ef-100'] = '200'
+
+        d = self.collection.claim_events(2, self.now, 2, lease=60)
+
+        self.assertEqual(self.successResultOf(d), self.events)
+        self.kz_client.delete.assert_called_once_with('/scheduler_claims/2/ef-100', 3)
+        self.assertEqual(self.claims['/scheduler_claims/2/ef-100'], '260')
+
+    def test_claim_changed_meanwhile(self):
+        """
+        Event is not claimed if its expired claim is changed or deleted by someone
+        else before it is taken over
+        """
+        self.claims['/scheduler_claims/2/ef-100'] = '200'
+        for error in (BadVersionError(), NoNodeError()):
+            self.kz_client.delete.side_effect = lambda *_: defer.fail(error)
+            d = self.collection.claim_events(2, self.now, 1)
+            self.assertEqual(self.successResultOf(d), self.events[1:])
+            del self.claims['/scheduler_claims/2/ex-122']
+
+    def test_claim_error(self):
+        """
+        Errors other than the event being claimed are propagated
+        """
+        self.kz_client.create.side_effect = lambda *_, **k: defer.fail(ValueError('e'))
+        self.failureResultOf(self.collection.claim_events(2, self.now), ValueError)
+
+    def test_delete_claimed_events(self):
+        """
+        `delete_claimed_events` deletes the events and then their claims, ignoring
+        the ones already gone
+        """
+        self.claims['/scheduler_claims/2/ef-100'] = '200'
+
+        d = self.collection.delete_claimed_events(2, self.events)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.connection.execute.assert_called_once_with(
+            'BEGIN BATCH '
+            'DELETE FROM scaling_schedule_v2 WHERE bucket = :bucket '
+            'AND trigger = :event0trigger AND "policyId" = :event0policyId; '
+            'DELETE FROM scaling_schedule_v2 WHERE bucket = :bucket '
+            'AND trigger = :event1trigger AND "policyId" = :event1policyId; '
+            'APPLY BATCH;',
+            {'bucket': 2, 'event0trigger': self.events[0]['trigger'],
+             'event0policyId': 'ef', 'event1trigger': self.events[1]['trigger'],
+             'event1policyId': 'ex'},
+            ConsistencyLevel.QUORUM)
+        self.assertEqual(self.claims, {})
+
+    def test_move_events_skips_claimed(self):
+        """
+        With a lease, `move_events` claims the events before moving them, skips the
+        ones claimed by others and releases the claims of the moved ones
+        """
+        self.claims['/scheduler_claims/2/ef-100'] = '9999999999'
+        self.collection.buckets = iter([5])
+
+        d = self.collection.move_events(2, 10, lease=60)
+
+        self.assertEqual(self.successResultOf(d), 1)
+        self.assertEqual(self.connection.execute.call_count, 2)
+        cql, data, _ = self.connection.execute.call_args[0]
+        self.assertEqual(
+            cql,
+            'BEGIN BATCH '
+            'INSERT INTO scaling_schedule_v2(bucket, "tenantId", "groupId", "policyId", '
+            'trigger, cron, version) '
+            'VALUES (:event0bucket, :event0tenantId, :event0groupId, :event0policyId, '
+            ':event0trigger, :event0cron, :event0version); '
+            'DELETE FROM scaling_schedule_v2 WHERE bucket = :bucket '
+            'AND trigger = :event0trigger AND "policyId" = :event0policyId; '
+            'APPLY BATCH;')
+        self.assertEqual(data['event0policyId'], 'ex')
+        self.assertEqual(data['event0bucket'], 5)
+        self.assertEqual(self.claims, {'/scheduler_claims/2/ef-100': '9999999999'})
+
+    def test_move_events_all_claimed(self):
+        """
+        With a lease, `move_events` moves nothing if all the events are claimed by
+        others
+        """
+        self.claims['/scheduler_claims/2/ef-100'] = '9999999999'
+        self.claims['/scheduler_claims/2/ex-122'] = '9999999999'
+
+        d = self.collection.move_events(2, 10, lease=60)
+
+        self.assertEqual(self.successResultOf(d), 0)
+        self.assertEqual(self.connection.execute.call_count, 1)
+
+
+class ServerDeletionQueueTests(TestCase):
+    """
+    Tests for the server deletion queue methods of
+    :class:`CassScalingGroupCollection`
+    """
+
+    def setUp(self):
+        """
+        Mock connection returning two queued deletions and kazoo client
+        """
+        self.connection = mock.MagicMock(spec=['execute'])
+        self.rows = [
+            {'tenantId': 't1', 'serverId': 's1', 'groupId': 'g1', 'transactionId': 'tr',
+             'server': '{"id": "s1", "lb_info": []}'},
+            {'tenantId': 't1', 'serverId': 's2', 'groupId': 'g1', 'transactionId': 'tr',
+             'server': '{"id": "s2", "lb_info": []}'}]
+        self.connection.execute.side_effect = lambda *_: defer.succeed(self.rows)
+        self.collection = CassScalingGroupCollection(self.connection)
+        self.kz_client = mock.Mock(spec=['create', 'get', 'delete'])
+        self.kz_client.create.side_effect = lambda path, *a, **kw: defer.succeed(path)
+        self.kz_client.delete.side_effect = lambda path: defer.succeed(None)
+        self.now = datetime(1970, 1, 1, 0, 3, 20)
+        self.deletions = [
+            {'tenantId': 't1', 'serverId': 's{}'.format(i), 'groupId': 'g1',
+             'transactionId': 'tr', 'server': {'id': 's{}'.format(i), 'lb_info': []}}
+            for i in (1, 2)]
+
+    @mock.patch('otter.models.cass.datetime')
+    def test_add_server_deletions(self, mock_dt):
+        """
+        `add_server_deletions` inserts each server in one batch
+        """
+        mock_dt.utcnow.return_value = self.now
+        servers = [{'id': 's1', 'lb_info': []}, {'id': 's2', 'lb_info': [[1, {}]]}]
+
+        d = self.collection.add_server_deletions(mock_log(), 'tr', 't1', 'g1', servers)
+
+        self.assertIsNone(self.successResultOf(d))
+        query = ('INSERT INTO server_deletions(shard, "tenantId", "serverId", "groupId", '
+                 '"transactionId", server, created) VALUES (:{0}shard, :tenantId, '
+                 ':{0}serverId, :groupId, :transactionId, :{0}server, :created)')
+        self.connection.execute.assert_called_once_with(
+            'BEGIN BATCH {} {} APPLY BATCH;'.format(query.format('server0'),
+                                                    query.format('server1')),
+            {'tenantId': 't1', 'groupId': 'g1', 'transactionId': 'tr',
+             'created': self.now, 'server0serverId': 's1',
+             'server0shard': _deletion_shard('t1', 's1'),
+             'server0server': json.dumps(servers[0]), 'server1serverId': 's2',
+             'server1shard': _deletion_shard('t1', 's2'),
+             'server1server': json.dumps(servers[1])},
+            ConsistencyLevel.QUORUM)
+
+    def test_deletion_shard(self):
+        """
+        Deletions are spread among `DELETION_SHARDS` shards by tenant and server ID
+        """
+        shards = set(_deletion_shard('t1', 's{}'.format(i)) for i in range(100))
+        self.assertEqual(shards, set(range(16)))
+        self.assertEqual(_deletion_shard('t1', 's1'), _deletion_shard('t1', 's1'))
+
+    def test_add_no_server_deletions(self):
+        """
+        `add_server_deletions` does nothing when there are no servers
+        """
+        d = self.collection.add_server_deletions(mock_log(), 'tr', 't1', 'g1', [])
+        self.assertIsNone(self.successResultOf(d))
+        self.assertFalse(self.connection.execute.called)
+
+    def fetch_call(self, shard, size):
+        """
+        Return call reading `size` deletions from the start of `shard`
+        """
+        return mock.call(
+            'SELECT "tenantId", "serverId", "groupId", "transactionId", server '
+            'FROM server_deletions WHERE shard = :shard LIMIT :size;',
+            {'shard': shard, 'size': size}, ConsistencyLevel.QUORUM)
+
+    def test_claim_without_zookeeper(self):
+        """
+        Without ZooKeeper, `claim_server_deletions` claims nothing since all the
+        nodes would delete the same servers
+        """
+        d = self.collection.claim_server_deletions(self.now, 1)
+
+        self.assertEqual(self.successResultOf(d), [])
+        self.assertFalse(self.connection.execute.called)
+
+    def test_claim(self):
+        """
+        `claim_server_deletions` claims deletions in ZooKeeper one shard after
+        another, skipping the ones claimed by others
+        """
+        patch(self, 'otter.models.cass.DELETION_SHARDS', new=2)
+        self.collection.kz_client = self.kz_client
+        self.kz_client.create.side_effect = [defer.fail(NodeExistsError()),
+                                             defer.succeed('path')]
+        self.kz_client.get.return_value = defer.succeed(('300', mock.Mock(version=1)))
+        self.connection.execute.side_effect = [defer.succeed(self.rows), defer.succeed([])]
+
+        d = self.collection.claim_server_deletions(self.now, 5, lease=60)
+
+        self.assertEqual(self.successResultOf(d), self.deletions[1:])
+        self.kz_client.create.assert_called_with(
+            '/deletion_claims/t1-s2', '260', ephemeral=True, makepath=True)
+        self.assertEqual(self.connection.execute.mock_calls,
+                         [self.fetch_call(0, 20), self.fetch_call(1, 16)])
+
+    def test_claim_stops_when_enough_claimed(self):
+        """
+        `claim_server_deletions` does not read more shards once it claimed `size`
+        deletions, and the next claim starts from the next shard
+        """
+        patch(self, 'otter.models.cass.DELETION_SHARDS', new=3)
+        self.collection.kz_client = self.kz_client
+
+        d = self.collection.claim_server_deletions(self.now, 2, lease=60)
+        self.assertEqual(self.successResultOf(d), self.deletions)
+        d = self.collection.claim_server_deletions(self.now, 2, lease=60)
+        self.assertEqual(self.successResultOf(d), self.deletions)
+
+        self.assertEqual(self.connection.execute.mock_calls,
+                         [self.fetch_call(0, 8), self.fetch_call(1, 8)])
+
+    def test_claim_reads_on_after_last_read(self):
+        """
+        A shard whose page of deletions was full is read on from after the last
+        deletion read on the next claim, so that deletions that cannot be claimed
+        at its start do not hide the others. It is read from its start again once
+        it is read to its end.
+        """
+        patch(self, 'otter.models.cass.DELETION_SHARDS', new=1)
+        self.collection.kz_client = self.kz_client
+        self.kz_client.create.side_effect = lambda *a, **kw: defer.fail(NodeExistsError())
+        self.kz_client.get.side_effect = lambda path: defer.succeed(
+            ('300', mock.Mock(version=1)))
+        rows = [dict(self.rows[0], serverId='s{}'.format(i)) for i in range(4)]
+        self.connection.execute.side_effect = [
+            defer.succeed(rows), defer.succeed([]), defer.succeed(self.rows[1:]),
+            defer.succeed([])]
+
+        self.assertEqual(
+            self.successResultOf(self.collection.claim_server_deletions(self.now, 1)), [])
+        self.assertEqual(
+            self.successResultOf(self.collection.claim_server_deletions(self.now, 1)), [])
+        self.successResultOf(self.collection.claim_server_deletions(self.now, 1))
+
+        after = {'shard': 0, 'tenantId': 't1', 'serverId': 's3', 'size': 4}
+        self.assertEqual(
+            self.connection.execute.mock_calls,
+            [self.fetch_call(0, 4),
+             mock.call('SELECT "tenantId", "serverId", "groupId", "transactionId", server '
+                       'FROM server_deletions WHERE shard = :shard AND "tenantId" = :tenantId '
+                       'AND "serverId" > :serverId LIMIT :size;', after,
+                       ConsistencyLevel.QUORUM),
+             mock.call('SELECT "tenantId", "serverId", "groupId", "transactionId", server '
+                       'FROM server_deletions WHERE shard = :shard AND "tenantId" > :tenantId '
+                       'LIMIT :size;', after, ConsistencyLevel.QUORUM),
+             self.fetch_call(0, 4)])
+
+    def test_delete_server_deletions(self):
+        """
+        `delete_server_deletions` deletes the deletions and then their claims
+        """
+        self.collection.kz_client = self.kz_client
+
+        d = self.collection.delete_server_deletions(self.deletions)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.connection.execute.assert_called_once_with(
+            'BEGIN BATCH '
+            'DELETE FROM server_deletions WHERE shard = :deletion0shard '
+            'AND "tenantId" = :deletion0tenantId AND "serverId" = :deletion0serverId; '
+            'DELETE FROM server_deletions WHERE shard = :deletion1shard '
+            'AND "tenantId" = :deletion1tenantId AND "serverId" = :deletion1serverId; '
+            'APPLY BATCH;',
+            {'deletion0shard': _deletion_shard('t1', 's1'),
+             'deletion0tenantId': 't1', 'deletion0serverId': 's1',
+             'deletion1shard': _deletion_shard('t1', 's2'),
+             'deletion1tenantId': 't1', 'deletion1serverId': 's2'},
+            ConsistencyLevel.QUORUM)
+        self.assertEqual(self.kz_client.delete.call_args_list,
+                         [mock.call('/deletion_claims/t1-s1'),
+                          mock.call('/deletion_claims/t1-s2')])
+
+    def test_delete_without_zookeeper(self):
+        """
+        Without ZooKeeper, `delete_server_deletions` only deletes the deletions
+        """
+        d = self.collection.delete_server_deletions(self.deletions)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertTrue(self.connection.execute.called)
+
+    def test_delete_nothing(self):
+        """
+        `delete_server_deletions` does nothing when there are no deletions
+        """
+        self.assertIsNone(self.successResultOf(
+            self.collection.delete_server_deletions([])))
+        self.assertFalse(self.connection.execute.called)
+
+
+class CapabilityCacheTests(TestCase):
+    """
+    Tests for :class:`CapabilityCache`
+    """
+
+    def setUp(self):
+        """
+        Cache of 2 hashes kept for 10 seconds
+        """
+        self.clock = Clock()
+        self.cache = CapabilityCache(2, 10, self.clock)
+
+    def test_get(self):
+        """
+        `get` returns the info set for a hash, or None if it is not cached
+        """
+        self.cache.set('h1', ('t', 'g', 'p'))
+        self.assertEqual(self.cache.get('h1'), ('t', 'g', 'p'))
+        self.assertIsNone(self.cache.get('h2'))
+
+    def test_expires(self):
+        """
+        A hash is forgotten `ttl` seconds after it was set
+        """
+        self.cache.set('h1', ('t', 'g', 'p'))
+        self.clock.advance(10)
+        self.assertEqual(self.cache.get('h1'), ('t', 'g', 'p'))
+        self.clock.advance(1)
+        self.assertIsNone(self.cache.get('h1'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_dropped(self):
+        """
+        The least recently used hash is dropped when more than `size` are set
+        """
+        self.cache.set('h1', ('t', 'g', 'p1'))
+        self.cache.set('h2', ('t', 'g', 'p2'))
+        self.cache.get('h1')
+        self.cache.set('h3', ('t', 'g', 'p3'))
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get('h2'))
+        self.assertEqual(self.cache.get('h1'), ('t', 'g', 'p1'))
+        self.assertEqual(self.cache.get('h3'), ('t', 'g', 'p3'))
+
+    def test_invalidate(self):
+        """
+        `invalidate` forgets the given hashes, cached or not
+        """
+        self.cache.set('h1', ('t', 'g', 'p1'))
+        self.cache.set('h2', ('t', 'g', 'p2'))
+        self.cache.invalidate(['h1', 'h3'])
+        self.assertIsNone(self.cache.get('h1'))
+        self.assertEqual(self.cache.get('h2'), ('t', 'g', 'p2'))
+
+    def test_ttl_capped(self):
+        """
+        Hashes are not kept for more than `MAX_TTL` seconds, capping how long a
+        webhook deleted on another node keeps working
+        """
+        cache = CapabilityCache(2, CapabilityCache.MAX_TTL * 10, self.clock)
+        self.assertEqual(cache.ttl, CapabilityCache.MAX_TTL)
+        cache.set('h1', ('t', 'g', 'p'))
+        self.clock.advance(CapabilityCache.MAX_TTL + 1)
+        self.assertIsNone(cache.get('h1'))
+
+
+class ConfigCacheTests(TestCase):
+    """
+    Tests for :class:`ConfigCache`
+    """
+
+    def setUp(self):
+        """
+        Cache of 2 entries kept for 10 seconds
+        """
+        self.clock = Clock()
+        self.cache = ConfigCache(2, 10, self.clock)
+
+    def test_get(self):
+        """
+        `get` returns a copy of the value set for a key, or None if it is not
+        cached, counting hits and misses
+        """
+        self.cache.set('k1', {'a': [1]})
+        value = self.cache.get('k1')
+        self.assertEqual(value, {'a': [1]})
+        value['a'].append(2)
+        self.assertEqual(self.cache.get('k1'), {'a': [1]})
+        self.assertIsNone(self.cache.get('k2'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_version(self):
+        """
+        A value is got for another version than it was set with only if no
+        version is asked for
+        """
+        self.cache.set('k1', {'a': 1}, 'v1')
+        self.assertEqual(self.cache.get('k1'), {'a': 1})
+        self.assertEqual(self.cache.get('k1', 'v1'), {'a': 1})
+        self.assertIsNone(self.cache.get('k1', 'v2'))
+
+    def test_expires(self):
+        """
+        A value is forgotten `ttl` seconds after it was set
+        """
+        self.cache.set('k1', {'a': 1})
+        self.clock.advance(10)
+        self.assertEqual(self.cache.get('k1'), {'a': 1})
+        self.clock.advance(1)
+        self.assertIsNone(self.cache.get('k1'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_contains(self):
+        """
+        A key is in the cache while its value of any version has not expired,
+        without counting hits or misses
+        """
+        self.cache.set('k1', {'a': 1}, 'v1')
+        self.assertIn('k1', self.cache)
+        self.assertNotIn('k2', self.cache)
+        self.clock.advance(11)
+        self.assertNotIn('k1', self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+    def test_least_recently_used_dropped(self):
+        """
+        The least recently used value is dropped when more than `size` are set
+        """
+        self.cache.set('k1', 1)
+        self.cache.set('k2', 2)
+        self.cache.get('k1')
+        self.cache.set('k3', 3)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get('k2'))
+        self.assertEqual(self.cache.get('k1'), 1)
+
+    def test_invalidate(self):
+        """
+        `invalidate` forgets the value of a key, and values read before are not
+        set
+        """
+        generation = self.cache.generation
+        self.cache.set('k1', 1)
+        self.cache.invalidate('k1')
+        self.assertIsNone(self.cache.get('k1'))
+        self.cache.set('k1', 1, generation=generation)
+        self.assertIsNone(self.cache.get('k1'))
+        self.cache.set('k1', 1, generation=self.cache.generation)
+        self.assertEqual(self.cache.get('k1'), 1)
+
+    def test_invalidate_group(self):
+        """
+        `invalidate_group` forgets the values of a group only
+        """
+        self.cache = ConfigCache(10, 10, self.clock)
+        self.cache.set(('t', 'g1', 'config', None), 1)
+        self.cache.set(('t', 'g1', 'policy', 'p'), 2)
+        self.cache.set(('t', 'g2', 'config', None), 3)
+        self.cache.invalidate_group('t', 'g1')
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.get(('t', 'g2', 'config', None)), 3)
+
+    def test_get_metrics(self):
+        """
+        The hits, misses and number of entries are returned as metrics
+        """
+        self.clock.advance(100)
+        self.cache.set('k1', 1)
+        self.cache.get('k1')
+        self.cache.get('k2')
+        self.assertEqual(self.cache.get_metrics(), [
+            {'id': 'otter.metrics.config_cache.entries', 'value': 1, 'time': 100},
+            {'id': 'otter.metrics.config_cache.hits', 'value': 1, 'time': 100},
+            {'id': 'otter.metrics.config_cache.misses', 'value': 1, 'time': 100}])
+
+
+class CachingScalingGroupTests(TestCase):
+    """
+    Tests for :class:`CachingScalingGroup`
+    """
+
+    def setUp(self):
+        """
+        Caching group wrapping a mock group
+        """
+        self.group = mock.Mock(spec=CassScalingGroup, tenant_id='t', uuid='g')
+        self.group.view_config.side_effect = lambda: defer.succeed({'name': 'a'})
+        self.group.view_launch_config.side_effect = lambda: defer.succeed({'type': 'launch'})
+        self.group.get_policy.side_effect = lambda *args: defer.succeed({'change': 1})
+        self.cache = ConfigCache(10, 10, Clock())
+        self.caching = CachingScalingGroup(self.group, self.cache)
+
+    def test_get_scaling_group(self):
+        """
+        Groups got from a collection with a config cache are caching groups
+        """
+        collection = CassScalingGroupCollection(mock.Mock(), config_cache=self.cache)
+        group = collection.get_scaling_group(mock_log(), 't', 'g')
+        self.assertIsInstance(group, CachingScalingGroup)
+        self.assertIsInstance(group.group, CassScalingGroup)
+        self.assertIs(group.cache, self.cache)
+        self.assertEqual((group.tenant_id, group.uuid), ('t', 'g'))
+
+    def test_view_configs_cached(self):
+        """
+        The group config and launch config are read from the group once, and then
+        from the cache
+        """
+        for _ in range(2):
+            self.assertEqual(self.successResultOf(self.caching.view_config()),
+                             {'name': 'a'})
+            self.assertEqual(self.successResultOf(self.caching.view_launch_config()),
+                             {'type': 'launch'})
+        self.group.view_config.assert_called_once_with()
+        self.group.view_launch_config.assert_called_once_with()
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_failure_not_cached(self):
+        """
+        Failing to read is not cached
+        """
+        self.group.view_config.side_effect = (
+            lambda: defer.fail(NoSuchScalingGroupError('t', 'g')))
+        self.failureResultOf(self.caching.view_config(), NoSuchScalingGroupError)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_get_policy_versions(self):
+        """
+        A policy read without a version is got for any version, and read again
+        for a version other than that it was read with
+        """
+        self.successResultOf(self.caching.get_policy('p'))
+        self.successResultOf(self.caching.get_policy('p'))
+        self.successResultOf(self.caching.get_policy('p', 'v1'))
+        self.successResultOf(self.caching.get_policy('p', 'v1'))
+        self.successResultOf(self.caching.get_policy('p'))
+        self.assertEqual(self.group.get_policy.call_args_list,
+                         [mock.call('p', None), mock.call('p', 'v1')])
+
+    def test_read_during_change_not_cached(self):
+        """
+        A value read while it is being changed is not cached
+        """
+        read = defer.Deferred()
+        self.group.view_config.side_effect = lambda: read
+        d = self.caching.view_config()
+        self.group.update_config.return_value = defer.succeed(None)
+        self.successResultOf(self.caching.update_config({'name': 'b'}))
+        read.callback({'name': 'a'})
+        self.assertEqual(self.successResultOf(d), {'name': 'a'})
+        self.assertEqual(len(self.cache), 0)
+
+    def test_changes_invalidate(self):
+        """
+        Updating the configs or a policy, or deleting a policy, invalidates it
+        whether or not it succeeds
+        """
+        self.successResultOf(self.caching.view_config())
+        self.successResultOf(self.caching.view_launch_config())
+        self.successResultOf(self.caching.get_policy('p1'))
+        self.successResultOf(self.caching.get_policy('p2'))
+        self.group.update_config.return_value = defer.succeed(None)
+        self.group.update_launch_config.return_value = defer.fail(DummyException())
+        self.group.update_policy.return_value = defer.succeed(None)
+        self.group.delete_policy.return_value = defer.succeed(None)
+
+        self.successResultOf(self.caching.update_config({'name': 'b'}))
+        self.group.update_config.assert_called_once_with({'name': 'b'})
+        self.failureResultOf(self.caching.update_launch_config({}), DummyException)
+        self.successResultOf(self.caching.update_policy('p1', {'change': 2}))
+        self.group.update_policy.assert_called_once_with('p1', {'change': 2})
+        self.successResultOf(self.caching.delete_policy('p2'))
+        self.group.delete_policy.assert_called_once_with('p2')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_delete_group_invalidates_group(self):
+        """
+        Deleting the group invalidates its configs and policies
+        """
+        self.successResultOf(self.caching.view_config())
+        self.successResultOf(self.caching.get_policy('p1'))
+        self.cache.set(('t', 'other', 'config', None), {})
+        self.group.delete_group.return_value = defer.succeed(None)
+        self.successResultOf(self.caching.delete_group())
+        self.assertEqual(len(self.cache), 1)
+
+    def test_modify_state(self):
+        """
+        The caching group is given to the modifier, with the state and arguments
+        """
+        self.group.modify_state.side_effect = (
+            lambda modifier, *args, **kwargs: defer.succeed(
+                modifier(self.group, 'state', *args, **kwargs)))
+        modifier = mock.Mock(return_value='new state')
+        d = self.caching.modify_state(modifier, 1, a=2)
+        self.assertEqual(self.successResultOf(d), 'new state')
+        modifier.assert_called_once_with(self.caching, 'state', 1, a=2)
+
+    def _execution_bundles(self, *writetimes):
+        """
+        Make the wrapped group modify the state for a policy with its configs
+        written at the given times, one pair per execution, reading them only
+        if the cached ones were not cached with those times
+        """
+        self.group._modify_state.side_effect = lambda read_and_modify: read_and_modify(
+            ConsistencyLevel.TWO)
+        writetimes = list(writetimes)
+
+        def _view(policy_id, version, consistency, cached_configs):
+            config_time, launch_time = writetimes.pop(0)
+            configs = ((cached_configs and cached_configs(config_time, launch_time)) or
+                       ({'name': 'c', 'time': config_time},
+                        {'type': 'l', 'time': launch_time}))
+            return defer.succeed(('state',) + configs +
+                                 ({'change': 3}, (config_time, launch_time)))
+
+        self.group._view_execution_bundle.side_effect = _view
+
+    def test_modify_state_for_policy(self):
+        """
+        The configs and policy read to modify the state for a policy are cached,
+        and given to the modifier with the caching group. Configs not cached at
+        all are read along with the state.
+        """
+        self._execution_bundles((1, 2))
+        modifier = mock.Mock(return_value='new state')
+        d = self.caching.modify_state_for_policy(modifier, 'p', 'v')
+        self.assertEqual(self.successResultOf(d), 'new state')
+        self.group._view_execution_bundle.assert_called_once_with(
+            'p', 'v', ConsistencyLevel.TWO, None)
+        modifier.assert_called_once_with(
+            self.caching, 'state', config={'name': 'c', 'time': 1},
+            launch={'type': 'l', 'time': 2}, policy={'change': 3})
+        self.assertEqual(self.successResultOf(self.caching.view_config()),
+                         {'name': 'c', 'time': 1})
+        self.assertEqual(self.successResultOf(self.caching.view_launch_config()),
+                         {'type': 'l', 'time': 2})
+        self.assertEqual(self.successResultOf(self.caching.get_policy('p', 'v')),
+                         {'change': 3})
+        self.assertFalse(self.group.view_config.called)
+        self.assertFalse(self.group.get_policy.called)
+
+    def test_modify_state_for_policy_configs_from_cache(self):
+        """
+        Executions after the first take the configs from the cache while their
+        write times have not changed, and read them again once they have
+        """
+        self._execution_bundles((1, 2), (1, 2), (1, 5))
+        modifier = mock.Mock(return_value='new state')
+        for _ in range(3):
+            self.successResultOf(self.caching.modify_state_for_policy(modifier, 'p'))
+        self.assertEqual(
+            [(c[1]['config']['time'], c[1]['launch']['time'])
+             for c in modifier.call_args_list],
+            [(1, 2), (1, 2), (1, 5)])
+        # the first execution read the configs along with the state without
+        # looking them up, the second hit both configs, the third only the
+        # group config
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 1))
+
+    def test_modify_state_for_policy_configs_read_elsewhere(self):
+        """
+        Configs cached by reads outside executions are not known to be of the
+        write times of the configs, so executions read the configs again
+        """
+        self.successResultOf(self.caching.view_config())
+        self.successResultOf(self.caching.view_launch_config())
+        self._execution_bundles((1, 2))
+        modifier = mock.Mock(return_value='new state')
+        self.successResultOf(self.caching.modify_state_for_policy(modifier, 'p'))
+        self.assertEqual(modifier.call_args[1]['config'], {'name': 'c', 'time': 1})
+
+    def test_other_attributes(self):
+        """
+        Other methods and attributes are those of the wrapped group
+        """
+        self.group.view_state.return_value = defer.succeed('state')
+        self.assertEqual(self.successResultOf(self.caching.view_state()), 'state')
+        self.assertEqual(self.caching.tenant_id, 't')
+
+
+class ResourceCountsTests(TestCase):
+    """
+    Tests for :class:`ResourceCounts`
+    """
+
+    def setUp(self):
+        """
+        Counts on a mock connection
+        """
+        self.connection = mock.Mock(spec=['execute'])
+        self.connection.execute.return_value = defer.succeed(None)
+        self.log = mock_log()
+        self.counts = ResourceCounts()
+        patch(self, 'otter.models.cass.get_consistency_level',
+              return_value=ConsistencyLevel.TWO)
+
+    def test_view(self):
+        """
+        `view` reads the counts of a tenant, group or policy, missing counts
+        being 0
+        """
+        self.connection.execute.return_value = defer.succeed(
+            [{'groups': None, 'policies': 2, 'webhooks': 5}])
+        d = self.counts.view(self.connection, 't', 'g')
+        self.assertEqual(self.successResultOf(d),
+                         {'groups': 0, 'policies': 2, 'webhooks': 5})
+        self.connection.execute.assert_called_once_with(
+            'SELECT groups, policies, webhooks FROM resource_counts WHERE '
+            '"tenantId" = :tenantId AND "groupId" = :groupId AND "policyId" = :policyId;',
+            {'tenantId': 't', 'groupId': 'g', 'policyId': ''}, ConsistencyLevel.TWO)
+
+    def test_view_no_row(self):
+        """
+        `view` returns 0 counts if there is no row
+        """
+        self.connection.execute.return_value = defer.succeed([])
+        d = self.counts.view(self.connection, 't')
+        self.assertEqual(self.successResultOf(d),
+                         {'groups': 0, 'policies': 0, 'webhooks': 0})
+
+    def test_add(self):
+        """
+        `add` updates the counts in a counter batch, skipping changes of 0
+        """
+        d = self.counts.add(self.connection, self.log, 't',
+                            [('', '', 'groups', 1), ('g', '', 'policies', -2),
+                             ('', '', 'webhooks', 0)])
+        self.assertIsNone(self.successResultOf(d))
+        cql, data = _counter_batch('t', [('', '', 'groups', 1),
+                                         ('g', '', 'policies', -2)])
+        self.connection.execute.assert_called_once_with(cql, data, ConsistencyLevel.TWO)
+
+    def test_add_nothing(self):
+        """
+        `add` does nothing if there is no change
+        """
+        d = self.counts.add(self.connection, self.log, 't', [('', '', 'groups', 0)])
+        self.assertIsNone(self.successResultOf(d))
+        self.assertFalse(self.connection.execute.called)
+
+    def test_add_failure_logged(self):
+        """
+        A failure to update counts is logged and not propagated
+        """
+        self.connection.execute.return_value = defer.fail(DummyException('bad'))
+        d = self.counts.add(self.connection, self.log, 't', [('', '', 'groups', 1)])
+        self.successResultOf(d)
+        self.log.err.assert_called_once_with(CheckFailure(DummyException),
+                                             'Could not update resource counts')
+
+    def test_remove_group(self):
+        """
+        `remove` deletes the counts of a group and its policies
+        """
+        d = self.counts.remove(self.connection, self.log, 't', 'g')
+        self.assertIsNone(self.successResultOf(d))
+        self.connection.execute.assert_called_once_with(
+            'DELETE FROM resource_counts WHERE "tenantId" = :tenantId AND '
+            '"groupId" = :groupId', {'tenantId': 't', 'groupId': 'g'},
+            ConsistencyLevel.TWO)
+
+    def test_remove_policy(self):
+        """
+        `remove` deletes the counts of a policy if given
+        """
+        d = self.counts.remove(self.connection, self.log, 't', 'g', 'p')
+        self.assertIsNone(self.successResultOf(d))
+        self.connection.execute.assert_called_once_with(
+            'DELETE FROM resource_counts WHERE "tenantId" = :tenantId AND '
+            '"groupId" = :groupId AND "policyId" = :policyId',
+            {'tenantId': 't', 'groupId': 'g', 'policyId': 'p'}, ConsistencyLevel.TWO)
+
+
+class EventShardsTests(TestCase):
+    """
+    Tests for :class:`EventShards`
+    """
+
+    def setUp(self):
+        """
+        Hourly shards
+        """
+        self.shards = EventShards(3600)
+
+    def test_shard(self):
+        """
+        Shard of a trigger starts at the interval boundary before it
+        """
+        self.assertEqual(self.shards.shard(datetime(2014, 3, 2, 10, 45, 10)),
+                         datetime(2014, 3, 2, 10, 0, 0))
+        self.assertEqual(self.shards.shard(datetime(2014, 3, 2, 10, 0, 0)),
+                         datetime(2014, 3, 2, 10, 0, 0))
+
+    def test_is_past(self):
+        """
+        Shard is past only when all of it is before now
+        """
+        shard = datetime(2014, 3, 2, 10, 0, 0)
+        self.assertFalse(self.shards.is_past(shard, datetime(2014, 3, 2, 10, 59, 59)))
+        self.assertTrue(self.shards.is_past(shard, datetime(2014, 3, 2, 11, 0, 0)))
+
+    def test_add(self):
+        """
+        `add` sets the event's shard and records it in shards table
+        """
+        queries, data = [], {'ebucket': 2}
+        self.shards.add(queries, data, 'e', datetime(2014, 3, 2, 10, 45, 10))
+        self.assertEqual(queries, ['INSERT INTO scaling_schedule_shards(bucket, shard) '
+                                   'VALUES (:ebucket, :eshard);'])
+        self.assertEqual(data, {'ebucket': 2, 'eshard': datetime(2014, 3, 2, 10, 0, 0)})
+
+
+class ShardedScheduleCollectionTestCase(TestCase):
+    """
+    Tests for :class:`CassScalingGroupCollection` storing events in time shards
+    """
+
+    def setUp(self):
+        """ Setup the mocks """
+        self.connection = mock.MagicMock(spec=['execute'])
+        self.returns = [None]
+
+        def _responses(*args):
+            return defer.succeed(self.returns.pop(0))
+
+        self.connection.execute.side_effect = _responses
+        self.collection = CassScalingGroupCollection(self.connection, 3600)
+        # the buckets used have no events left from before events were sharded
+        self.collection._unsharded_moved.update([2, 12])
+        self.shard1 = datetime(2014, 3, 2, 9, 0, 0)
+        self.shard2 = datetime(2014, 3, 2, 10, 0, 0)
+        self.now = datetime(2014, 3, 2, 10, 30, 0)
+        self.event = {'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ef',
+                      'trigger': datetime(2014, 3, 2, 10, 10, 0), 'cron': 'c1',
+                      'version': 'v1'}
+
+    def fetch_call(self, shard, size, bucket=2):
+        """
+        Return call fetching due events from `shard` of `bucket`
+        """
+        return mock.call(
+            'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+            'FROM scaling_schedule_v3 '
+            'WHERE bucket = :bucket AND shard = :shard AND trigger <= :now LIMIT :size;',
+            {'bucket': bucket, 'shard': shard, 'now': self.now, 'size': size},
+            ConsistencyLevel.QUORUM)
+
+    def test_fetch_and_delete(self):
+        """
+        `fetch_and_delete` reads started shards in order until it has enough events
+        and deletes the events from their shards
+        """
+        self.returns = [[{'shard': self.shard2}, {'shard': self.shard1}],
+                        [], None, [], [self.event], None]
+
+        d = self.collection.fetch_and_delete(2, self.now, 10)
+
+        self.assertEqual(self.successResultOf(d), [self.event])
+        shard1 = {'bucket': 2, 'shard': self.shard1}
+        self.assertEqual(
+            self.connection.execute.mock_calls,
+            [mock.call('SELECT shard FROM scaling_schedule_shards WHERE bucket = :bucket '
+                       'AND shard <= :until;', {'bucket': 2, 'until': self.now},
+                       ConsistencyLevel.QUORUM),
+             self.fetch_call(self.shard1, 10),
+             mock.call('DELETE FROM scaling_schedule_shards WHERE bucket = :bucket '
+                       'AND shard = :shard;', shard1, ConsistencyLevel.QUORUM),
+             mock.call('SELECT * from scaling_schedule_v3 WHERE bucket=:bucket '
+                       'AND shard=:shard LIMIT 1;', shard1, ConsistencyLevel.QUORUM),
+             self.fetch_call(self.shard2, 10),
+             mock.call('BEGIN BATCH DELETE FROM scaling_schedule_v3 WHERE bucket = :bucket '
+                       'AND shard = :event0shard AND trigger = :event0trigger '
+                       'AND "policyId" = :event0policyId; APPLY BATCH;',
+                       {'bucket': 2, 'event0shard': self.shard2,
+                        'event0trigger': self.event['trigger'], 'event0policyId': 'ef'},
+                       ConsistencyLevel.QUORUM)])
+
+    def test_fetch_and_delete_stops_at_size(self):
+        """
+        `fetch_and_delete` does not read more shards once it has `size` events and
+        does not drop the current shard even if it is empty
+        """
+        self.returns = [[{'shard': self.shard1}, {'shard': self.shard2}],
+                        [self.event], None]
+        d = self.collection.fetch_and_delete(2, self.now, 1)
+        self.assertEqual(self.successResultOf(d), [self.event])
+        self.assertEqual(self.connection.execute.mock_calls[1],
+                         self.fetch_call(self.shard1, 1))
+        self.assertEqual(self.connection.execute.call_count, 3)
+
+        self.connection.execute.reset_mock()
+        self.returns = [[{'shard': self.shard2}], []]
+        d = self.collection.fetch_and_delete(2, self.now, 1)
+        self.assertEqual(self.successResultOf(d), [])
+        self.assertEqual(self.connection.execute.call_count, 2)
+
+    def test_drained_shard_recorded_again(self):
+        """
+        A drained shard is recorded again if an event was added to it while it was
+        being dropped
+        """
+        self.returns = [[{'shard': self.shard1}], [], None, [self.event], None]
+        d = self.collection.fetch_and_delete(2, self.now, 10)
+        self.assertEqual(self.successResultOf(d), [])
+        self.connection.execute.assert_called_with(
+            'INSERT INTO scaling_schedule_shards(bucket, shard) VALUES (:bucket, :shard);',
+            {'bucket': 2, 'shard': self.shard1}, ConsistencyLevel.ONE)
+
+    def test_add_cron_events(self):
+        """
+        `add_cron_events` inserts events in their shard and records the shard
+        """
+        self.collection.buckets = iter([3])
+        self.returns = [None]
+        self.successResultOf(self.collection.add_cron_events([self.event]))
+        self.connection.execute.assert_called_once_with(
+            'BEGIN BATCH '
+            'INSERT INTO scaling_schedule_v3(bucket, shard, "tenantId", "groupId", '
+            '"policyId", trigger, cron, version) '
+            'VALUES (:event0bucket, :event0shard, :event0tenantId, :event0groupId, '
+            ':event0policyId, :event0trigger, :event0cron, :event0version); '
+            'INSERT INTO scaling_schedule_shards(bucket, shard) '
+            'VALUES (:event0bucket, :event0shard); '
+            'APPLY BATCH;',
+            {'event0bucket': 3, 'event0shard': self.shard2, 'event0tenantId': '1d2',
+             'event0groupId': 'gr2', 'event0policyId': 'ef',
+             'event0trigger': self.event['trigger'], 'event0cron': 'c1',
+             'event0version': 'v1'},
+            ConsistencyLevel.ONE)
+
+    def test_move_events(self):
+        """
+        `move_events` reads all the shards of the bucket, dropping drained ones, and
+        moves the events to the same shard of buckets in use
+        """
+        self.collection.buckets = iter([3])
+        self.returns = [[{'shard': self.shard1}, {'shard': self.shard2}],
+                        [], None, [], [self.event], None]
+
+        d = self.collection.move_events(12, 50)
+
+        self.assertEqual(self.successResultOf(d), 1)
+        calls = self.connection.execute.mock_calls
+        self.assertEqual(calls[0], mock.call(
+            'SELECT shard FROM scaling_schedule_shards WHERE bucket = :bucket;',
+            {'bucket': 12}, ConsistencyLevel.QUORUM))
+        self.assertEqual(calls[4], mock.call(
+            'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+            'FROM scaling_schedule_v3 WHERE bucket = :bucket AND shard = :shard '
+            'LIMIT :size;', {'bucket': 12, 'shard': self.shard2, 'size': 50},
+            ConsistencyLevel.QUORUM))
+        self.assertEqual(calls[5], mock.call(
+            'BEGIN BATCH '
+            'INSERT INTO scaling_schedule_v3(bucket, shard, "tenantId", "groupId", '
+            '"policyId", trigger, cron, version) '
+            'VALUES (:event0bucket, :event0shard, :event0tenantId, :event0groupId, '
+            ':event0policyId, :event0trigger, :event0cron, :event0version); '
+            'INSERT INTO scaling_schedule_shards(bucket, shard) '
+            'VALUES (:event0bucket, :event0shard); '
+            'DELETE FROM scaling_schedule_v3 WHERE bucket = :bucket '
+            'AND shard = :event0shard AND trigger = :event0trigger '
+            'AND "policyId" = :event0policyId; '
+            'APPLY BATCH;',
+            {'bucket': 12, 'event0bucket': 3, 'event0shard': self.shard2,
+             'event0tenantId': '1d2', 'event0groupId': 'gr2', 'event0policyId': 'ef',
+             'event0trigger': self.event['trigger'], 'event0cron': 'c1',
+             'event0version': 'v1'},
+            ConsistencyLevel.QUORUM))
+
+    def move_unsharded_calls(self, bucket, size=100):
+        """
+        Return calls fetching one event from the unsharded table and moving it
+        to its shard, and fetching the unsharded events left in `bucket`
+        """
+        fetch = mock.call(
+            'SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+            'FROM scaling_schedule_v2 WHERE bucket = :bucket LIMIT :size;',
+            {'bucket': bucket, 'size': size}, ConsistencyLevel.QUORUM)
+        move = mock.call(
+            'BEGIN BATCH '
+            'INSERT INTO scaling_schedule_v3(bucket, shard, "tenantId", "groupId", '
+            '"policyId", trigger, cron, version) '
+            'VALUES (:event0bucket, :event0shard, :event0tenantId, :event0groupId, '
+            ':event0policyId, :event0trigger, :event0cron, :event0version); '
+            'INSERT INTO scaling_schedule_shards(bucket, shard) '
+            'VALUES (:event0bucket, :event0shard); '
+            'DELETE FROM scaling_schedule_v2 WHERE bucket = :bucket '
+            'AND trigger = :event0trigger AND "policyId" = :event0policyId; '
+            'APPLY BATCH;',
+            {'bucket': bucket, 'event0bucket': bucket, 'event0shard': self.shard2,
+             'event0tenantId': '1d2', 'event0groupId': 'gr2', 'event0policyId': 'ef',
+             'event0trigger': self.event['trigger'], 'event0cron': 'c1',
+             'event0version': 'v1'},
+            ConsistencyLevel.QUORUM)
+        return fetch, move
+
+    def test_unsharded_event_still_fires(self):
+        """
+        An event added before events were sharded is moved to its shard in the
+        same bucket when its bucket is first read, and is then fetched from there
+        """
+        unsharded = CassScalingGroupCollection(self.connection)
+        unsharded.buckets = iter([5])
+        self.returns = [None]
+        self.successResultOf(unsharded.add_cron_events([self.event]))
+        self.assertIn('INSERT INTO scaling_schedule_v2',
+                      self.connection.execute.call_args[0][0])
+
+        self.connection.execute.reset_mock()
+        listener = mock.Mock()
+        self.collection.set_event_listener(listener)
+        self.returns = [[self.event], None, [{'shard': self.shard2}], [self.event], None]
+
+        d = self.collection.fetch_and_delete(5, self.now, 10)
+
+        self.assertEqual(self.successResultOf(d), [self.event])
+        fetch, move = self.move_unsharded_calls(5)
+        self.assertEqual(self.connection.execute.mock_calls[:2], [fetch, move])
+        self.assertEqual(self.connection.execute.mock_calls[3],
+                         self.fetch_call(self.shard2, 10, bucket=5))
+        listener.assert_called_once_with([(5, self.event['trigger'])])
+
+        # the bucket is not read in the unsharded table again
+        self.connection.execute.reset_mock()
+        self.returns = [[]]
+        self.successResultOf(self.collection.fetch_and_delete(5, self.now, 10))
+        self.assertEqual(self.connection.execute.call_count, 1)
+
+    def test_move_unsharded_events_pages(self):
+        """
+        Unsharded events are moved a page at a time until a page is not full, and
+        reads of the bucket meanwhile wait for them to be moved
+        """
+        self.returns = [[self.event], None]
+        paused = defer.Deferred()
+        self.connection.execute.side_effect = lambda *args: (
+            defer.succeed(self.returns.pop(0)) if self.returns else paused)
+
+        d1 = self.collection._move_unsharded_events(5, size=1)
+        d2 = self.collection._move_unsharded_events(5, size=1)
+        self.assertNoResult(d1)
+        self.assertNoResult(d2)
+        paused.callback([])
+
+        self.assertIsNone(self.successResultOf(d1))
+        self.assertIsNone(self.successResultOf(d2))
+        fetch, move = self.move_unsharded_calls(5, 1)
+        self.assertEqual(self.connection.execute.mock_calls, [fetch, move, fetch])
+        self.assertIsNone(self.successResultOf(
+            self.collection._move_unsharded_events(5, size=1)))
+        self.assertEqual(self.connection.execute.call_count, 3)
+
+    def test_move_unsharded_events_fails(self):
+        """
+        If moving unsharded events fails, they are moved again on the next read
+        """
+        self.connection.execute.side_effect = None
+        self.connection.execute.return_value = defer.fail(ValueError('bad'))
+        self.failureResultOf(self.collection.get_oldest_event(5), ValueError)
+        self.assertNotIn(5, self.collection._unsharded_moved)
+        self.assertEqual(self.collection._unsharded_moving, {})
+
+    def test_get_oldest_event(self):
+        """
+        `get_oldest_event` returns the first event of the oldest shard having one
+        """
+        self.returns = [[{'shard': self.shard1}, {'shard': self.shard2}],
+                        [], [self.event]]
+        d = self.collection.get_oldest_event(2)
+        self.assertEqual(self.successResultOf(d), self.event)
+        self.connection.execute.assert_called_with(
+            'SELECT * from scaling_schedule_v3 WHERE bucket=:bucket AND shard=:shard '
+            'LIMIT 1;', {'bucket': 2, 'shard': self.shard2}, ConsistencyLevel.ONE)
+
+    def test_get_oldest_event_none(self):
+        """
+        `get_oldest_event` returns None if bucket has no shards
+        """
+        self.returns = [[]]
+        self.assertIsNone(self.successResultOf(self.collection.get_oldest_event(2)))
+
+    def test_get_oldest_event_after(self):
+        """
+        `get_oldest_event` with `after` skips the shards ending by then and gets the
+        first event triggering after it
+        """
+        self.returns = [[{'shard': self.shard1}, {'shard': self.shard2}], [self.event]]
+        after = datetime(2014, 3, 2, 10, 5, 0)
+        d = self.collection.get_oldest_event(2, after=after)
+        self.assertEqual(self.successResultOf(d), self.event)
+        self.connection.execute.assert_called_with(
+            'SELECT * from scaling_schedule_v3 WHERE bucket=:bucket AND shard=:shard '
+            'AND trigger > :after LIMIT 1;',
+            {'bucket': 2, 'shard': self.shard2, 'after': after}, ConsistencyLevel.ONE)
+        self.assertEqual(self.connection.execute.call_count, 2)
+
+    def test_fetch_due_events_after(self):
+        """
+        Due events after an event are read from its shard, first those with its
+        trigger, and then from the later shards
+        """
+        last = dict(self.event, trigger=datetime(2014, 3, 2, 9, 50, 0))
+        self.returns = [[], [], [{'shard': self.shard1}, {'shard': self.shard2}],
+                        [self.event]]
+
+        d = self.collection._fetch_due_events_after(2, self.now, 5, last)
+
+        self.assertEqual(self.successResultOf(d), [self.event])
+        params = {'bucket': 2, 'shard': self.shard1, 'now': self.now,
+                  'trigger': last['trigger'], 'policyId': 'ef', 'size': 5}
+        self.assertEqual(
+            self.connection.execute.mock_calls,
+            [mock.call('SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+                       'FROM scaling_schedule_v3 WHERE bucket = :bucket AND shard = :shard '
+                       'AND trigger = :trigger AND "policyId" > :policyId LIMIT :size;',
+                       params, ConsistencyLevel.QUORUM),
+             mock.call('SELECT "tenantId", "groupId", "policyId", "trigger", cron, version '
+                       'FROM scaling_schedule_v3 WHERE bucket = :bucket AND shard = :shard '
+                       'AND trigger > :trigger AND trigger <= :now LIMIT :size;',
+                       params, ConsistencyLevel.QUORUM),
+             mock.call('SELECT shard FROM scaling_schedule_shards WHERE bucket = :bucket '
+                       'AND shard <= :until;', {'bucket': 2, 'until': self.now},
+                       ConsistencyLevel.QUORUM),
+             self.fetch_call(self.shard2, 5)])
+
+
+class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
+                                          TestCase):
+    """
+    Tests for :class:`CassScalingGroupCollection`
+    """
+
+    def setUp(self):
+        """ Setup the mocks """
+        self.connection = mock.MagicMock(spec=['execute'])
+        set_config_data({'limits': {'absolute': {'maxGroups': 1000}}})
+        self.addCleanup(set_config_data, {})
+
+        self.returns = [[{"count": 0}], None]
+
+        def _responses(*args):
+            result = self.returns.pop(0)
+            if isinstance(result, Exception):
+                return defer.fail(result)
+            return defer.succeed(_de_identify(result))
+
+        self.connection.execute.side_effect = _responses
+
+        self.mock_log = mock_log()
+
+        self.collection = CassScalingGroupCollection(self.connection)
+        self.tenant_id = 'goo1234'
+        self.config = _de_identify({
+            'name': 'blah',
+            'cooldown': 600,
+            'minEntities': 0,
+            'maxEntities': 10,
+            'metadata': {}
+        })
+        self.launch = _de_identify(group_examples.launch_server_config()[0])
+
+        self.mock_key = patch(self, 'otter.models.cass.generate_key_str')
+        patch(self, 'otter.models.cass.get_consistency_level',
+              return_value=ConsistencyLevel.TWO)
+
+        self.uuid = patch(self, 'otter.models.cass.uuid')
+        self.uuid.uuid1.return_value = 'timeuuid'
+
+        # 'serializing' something just wraps it with a _S
+        self.mock_serial = patch(self, 'otter.models.cass.serialize_json_data',
+                                 side_effect=lambda *args: _S(args[0]))
 
     def test_create(self):
         """
@@ -2366,6 +4130,22 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
                                                    mock.ANY,
                                                    ConsistencyLevel.TWO)
 
+    def test_create_with_schedule_policy_event_listener(self):
+        """
+        The collection's event listener is told about the events of schedule
+        policies created with a group
+        """
+        self.collection.event_listener = mock.Mock()
+        self.collection.buckets = iter([5])
+        policy = {'name': 'at', 'cooldown': 5, 'change': 1, 'type': 'schedule',
+                  'args': {'at': '2012-10-20T03:23:45Z'}}
+
+        self.successResultOf(self.collection.create_scaling_group(
+            self.mock_log, '123', self.config, self.launch, [policy]))
+
+        self.collection.event_listener.assert_called_once_with(
+            [(5, from_timestamp('2012-10-20T03:23:45Z'))])
+
     def test_create_with_policy_multiple(self):
         """
         Test that you can create a scaling group with multiple policies, and if
@@ -2481,7 +4261,7 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
 
         expectedData = {'tenantId': '123', 'limit': 100}
         expectedCql = ('SELECT "tenantId", "groupId", group_config, active, pending, '
-                       '"groupTouched", "policyTouched", paused, desired, created_at FROM '
+                       '"groupTouched", "policyTouched", paused, desired, standby, created_at FROM '
                        'scaling_group WHERE "tenantId" = :tenantId LIMIT :limit;')
         r = self.validate_list_states_return_value(self.mock_log, '123')
         self.connection.execute.assert_called_once_with(expectedCql,
@@ -2500,7 +4280,7 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
 
         expectedData = {'tenantId': '123', 'limit': 100}
         expectedCql = ('SELECT "tenantId", "groupId", group_config, active, pending, '
-                       '"groupTouched", "policyTouched", paused, desired, created_at FROM '
+                       '"groupTouched", "policyTouched", paused, desired, standby, created_at FROM '
                        'scaling_group WHERE "tenantId" = :tenantId LIMIT :limit;')
         r = self.validate_list_states_return_value(self.mock_log, '123')
         self.assertEqual(r, [])
@@ -2516,7 +4296,7 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
         self.returns = [[]]
         expectedData = {'tenantId': '123', 'limit': 5}
         expectedCql = ('SELECT "tenantId", "groupId", group_config, active, pending, '
-                       '"groupTouched", "policyTouched", paused, desired, created_at FROM '
+                       '"groupTouched", "policyTouched", paused, desired, standby, created_at FROM '
                        'scaling_group WHERE "tenantId" = :tenantId LIMIT :limit;')
         self.collection.list_scaling_group_states(self.mock_log, '123', limit=5)
         self.connection.execute.assert_called_once_with(expectedCql,
@@ -2530,7 +4310,7 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
         self.returns = [[]]
         expectedData = {'tenantId': '123', 'limit': 100, 'marker': '345'}
         expectedCql = ('SELECT "tenantId", "groupId", group_config, active, pending, '
-                       '"groupTouched", "policyTouched", paused, desired, created_at FROM '
+                       '"groupTouched", "policyTouched", paused, desired, standby, created_at FROM '
                        'scaling_group WHERE "tenantId" = :tenantId AND '
                        '"groupId" > :marker LIMIT :limit;')
         self.collection.list_scaling_group_states(self.mock_log, '123',
@@ -2571,7 +4351,7 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
 
         expectedData = {'tenantId': '123', 'limit': 100}
         expectedCql = ('SELECT "tenantId", "groupId", group_config, active, pending, '
-                       '"groupTouched", "policyTouched", paused, desired, created_at FROM '
+                       '"groupTouched", "policyTouched", paused, desired, standby, created_at FROM '
                        'scaling_group WHERE "tenantId" = :tenantId LIMIT :limit;')
         r = self.validate_list_states_return_value(self.mock_log, '123')
         self.assertEqual(self.connection.execute.call_args_list[0],
@@ -2656,44 +4436,131 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
         self.assertEqual(g.uuid, '12345678')
         self.assertEqual(g.tenant_id, '123')
 
+    def test_get_scaling_group_capability_cache(self):
+        """
+        Groups got from the collection invalidate deleted webhooks in the
+        collection's capability cache
+        """
+        self.collection.capability_cache = CapabilityCache()
+        g = self.collection.get_scaling_group(self.mock_log, '123', '12345678')
+        self.assertIs(g.capability_cache, self.collection.capability_cache)
+
+    def test_get_scaling_group_event_listener(self):
+        """
+        Groups got from the collection tell the collection's event listener
+        about the events they add
+        """
+        listener = mock.Mock()
+        self.collection.set_event_listener(listener)
+        g = self.collection.get_scaling_group(self.mock_log, '123', '12345678')
+        self.assertIs(g.event_listener, listener)
+
     def test_webhook_hash(self):
         """
-        Test that you can get webhook info by hash.
+        Webhook info is got by capability hash from the webhook_keys table
         """
         self.returns = [_cassandrify_data([
-            {'tenantId': '123', 'groupId': 'group1', 'policyId': 'pol1'}]),
-            _cassandrify_data([{'data': '{}'}])
-        ]
+            {'tenantId': '123', 'groupId': 'group1', 'policyId': 'pol1'}])]
         expectedData = {'webhookKey': 'x'}
-        expectedCql = ('SELECT "tenantId", "groupId", "policyId" FROM policy_webhooks WHERE '
+        expectedCql = ('SELECT "tenantId", "groupId", "policyId" FROM webhook_keys WHERE '
                        '"webhookKey" = :webhookKey;')
         d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
         r = self.successResultOf(d)
         self.assertEqual(r, ('123', 'group1', 'pol1'))
-        self.connection.execute.assert_called_any(expectedCql,
-                                                  expectedData,
-                                                  ConsistencyLevel.TWO)
+        self.connection.execute.assert_called_once_with(expectedCql,
+                                                        expectedData,
+                                                        ConsistencyLevel.TWO)
 
-        expectedCql = ('SELECT data FROM scaling_policies WHERE "tenantId" = :tenantId '
-                       'AND "groupId" = :groupId AND "policyId" = :policyId;')
-        expectedData = {"tenantId": "123", "groupId": "group1", "policyId": "pol1"}
-        self.connection.execute.assert_called_any(expectedCql,
-                                                  expectedData,
-                                                  ConsistencyLevel.TWO)
+    def test_webhook_hash_from_index(self):
+        """
+        A webhook not in the webhook_keys table is looked up through the index
+        of policy_webhooks, and added to webhook_keys
+        """
+        self.returns = [[], _cassandrify_data([
+            {'tenantId': '123', 'groupId': 'group1', 'policyId': 'pol1',
+             'webhookId': 'web1'}]), None,
+            _cassandrify_data([{'data': '{}', 'capability': '{}'}])]
+        d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
+        self.assertEqual(self.successResultOf(d), ('123', 'group1', 'pol1'))
+        self.assertEqual(
+            self.connection.execute.mock_calls[1:],
+            [mock.call('SELECT "tenantId", "groupId", "policyId", "webhookId" FROM '
+                       'policy_webhooks WHERE "webhookKey" = :webhookKey;',
+                       {'webhookKey': 'x'}, ConsistencyLevel.TWO),
+             mock.call('INSERT INTO webhook_keys("webhookKey", "tenantId", "groupId", '
+                       '"policyId", "webhookId") VALUES (:webhookKey, :tenantId, :groupId, '
+                       ':policyId, :webhookId)',
+                       {'webhookKey': 'x', 'tenantId': '123', 'groupId': 'group1',
+                        'policyId': 'pol1', 'webhookId': 'web1'},
+                       ConsistencyLevel.TWO),
+             mock.call('SELECT data, capability FROM policy_webhooks WHERE '
+                       '"tenantId" = :tenantId AND "groupId" = :groupId AND '
+                       '"policyId" = :policyId AND "webhookId" = :webhookId;',
+                       {'tenantId': '123', 'groupId': 'group1', 'policyId': 'pol1',
+                        'webhookId': 'web1'},
+                       ConsistencyLevel.TWO)])
+
+    def test_webhook_hash_from_index_deleted(self):
+        """
+        If the webhook found through the index of policy_webhooks is deleted
+        while it is added to webhook_keys, its key is deleted again and the
+        capability is not recognized
+        """
+        self.collection.capability_cache = CapabilityCache()
+        self.returns = [[], _cassandrify_data([
+            {'tenantId': '123', 'groupId': 'group1', 'policyId': 'pol1',
+             'webhookId': 'web1'}]), None, [], None]
+        d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
+        self.failureResultOf(d, UnrecognizedCapabilityError)
+        self.assertEqual(
+            self.connection.execute.mock_calls[-1],
+            mock.call('DELETE FROM webhook_keys WHERE "webhookKey" = :webhookKey',
+                      {'webhookKey': 'x'}, ConsistencyLevel.TWO))
+        self.assertEqual(len(self.collection.capability_cache), 0)
 
     def test_webhook_bad(self):
         """
         Test that a bad webhook will fail predictably
         """
+        self.returns = [[], []]
+        d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
+        self.failureResultOf(d, UnrecognizedCapabilityError)
+        self.assertEqual(len(self.connection.execute.mock_calls), 2)
+
+    def test_webhook_bad_without_index_fallback(self):
+        """
+        A webhook not in the webhook_keys table is not looked up through the
+        index of policy_webhooks if the fallback is disabled
+        """
+        self.collection.webhook_index_fallback = False
         self.returns = [[]]
-        expectedData = {'webhookKey': 'x'}
-        expectedCql = ('SELECT "tenantId", "groupId", "policyId" FROM policy_webhooks WHERE '
-                       '"webhookKey" = :webhookKey;')
         d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
         self.failureResultOf(d, UnrecognizedCapabilityError)
-        self.connection.execute.assert_called_once_with(expectedCql,
-                                                        expectedData,
-                                                        ConsistencyLevel.TWO)
+        self.assertEqual(len(self.connection.execute.mock_calls), 1)
+
+    def test_webhook_hash_cached(self):
+        """
+        Webhook info found by capability hash is cached, and got from the cache
+        without reading Cassandra afterwards
+        """
+        self.collection.capability_cache = CapabilityCache()
+        self.returns = [_cassandrify_data([
+            {'tenantId': '123', 'groupId': 'group1', 'policyId': 'pol1'}])]
+        d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
+        self.assertEqual(self.successResultOf(d), ('123', 'group1', 'pol1'))
+        d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
+        self.assertEqual(self.successResultOf(d), ('123', 'group1', 'pol1'))
+        self.assertEqual(len(self.connection.execute.mock_calls), 1)
+
+    def test_webhook_bad_not_cached(self):
+        """
+        Unrecognized capability hashes are not cached
+        """
+        self.collection.capability_cache = CapabilityCache()
+        self.returns = [[], []]
+        d = self.collection.webhook_info_by_hash(self.mock_log, 'x')
+        self.failureResultOf(d, UnrecognizedCapabilityError)
+        self.assertEqual(len(self.collection.capability_cache), 0)
 
     def test_get_counts(self):
         """
@@ -2725,6 +4592,211 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
         self.connection.execute.assert_has_calls(calls)
 
 
+class CassScalingGroupsCollectionResourceCountsTests(TestCase):
+    """
+    Tests for :class:`CassScalingGroupCollection` counting groups, policies and
+    webhooks in :class:`ResourceCounts`
+    """
+
+    def setUp(self):
+        """
+        Collection checking limits against resource counts
+        """
+        self.connection = mock.Mock(spec=['execute'])
+        self.returns = []
+        self.connection.execute.side_effect = lambda *args: defer.succeed(self.returns.pop(0))
+        set_config_data({'limits': {'absolute': {'maxGroups': 2}}})
+        self.addCleanup(set_config_data, {})
+        self.collection = CassScalingGroupCollection(
+            self.connection, resource_counts=ResourceCounts(limits=True))
+        self.log = mock_log()
+        patch(self, 'otter.models.cass.generate_key_str', return_value='g1')
+        patch(self, 'otter.models.cass.get_consistency_level',
+              return_value=ConsistencyLevel.TWO)
+
+    def test_get_scaling_group(self):
+        """
+        Groups got from the collection use its resource counts
+        """
+        group = self.collection.get_scaling_group(self.log, 't', 'g')
+        self.assertIs(group.resource_counts, self.collection.resource_counts)
+
+    def test_create_scaling_group(self):
+        """
+        Creating a group checks the limit against the count of groups of the
+        tenant, and counts the group and its policies
+        """
+        self.returns = [[{'groups': 1, 'policies': None, 'webhooks': None}], None, None]
+        d = self.collection.create_scaling_group(
+            self.log, 't', {'name': 'a'}, {}, [{'name': 'p'}])
+        self.successResultOf(d)
+        self.connection.execute.assert_any_call(
+            'SELECT groups, policies, webhooks FROM resource_counts WHERE '
+            '"tenantId" = :tenantId AND "groupId" = :groupId AND "policyId" = :policyId;',
+            {'tenantId': 't', 'groupId': '', 'policyId': ''}, ConsistencyLevel.TWO)
+        cql, data = _counter_batch('t', [('', '', 'groups', 1), ('', '', 'policies', 1),
+                                         ('g1', '', 'policies', 1)])
+        self.connection.execute.assert_called_with(cql, data, ConsistencyLevel.TWO)
+
+    def test_create_scaling_group_over_limit(self):
+        """
+        Creating a group fails if the count of groups of the tenant is at the limit
+        """
+        self.returns = [[{'groups': 2, 'policies': None, 'webhooks': None}]]
+        d = self.collection.create_scaling_group(self.log, 't', {'name': 'a'}, {})
+        self.failureResultOf(d, ScalingGroupOverLimitError)
+        self.assertEqual(len(self.connection.execute.mock_calls), 1)
+
+    def test_get_counts(self):
+        """
+        The counts of a tenant are read from its row of counts
+        """
+        self.returns = [[{'groups': 1, 'policies': 2, 'webhooks': None}]]
+        d = self.collection.get_counts(self.log, 't')
+        self.assertEqual(self.successResultOf(d),
+                         {'groups': 1, 'policies': 2, 'webhooks': 0})
+        self.assertEqual(len(self.connection.execute.mock_calls), 1)
+
+    def test_get_counts_without_limits(self):
+        """
+        The rows of a tenant are counted if limits are not checked against the
+        resource counts
+        """
+        self.collection.resource_counts.limits = False
+        self.returns = [[{'count': 1}], [{'count': 2}], [{'count': 3}]]
+        d = self.collection.get_counts(self.log, 't')
+        self.assertEqual(self.successResultOf(d),
+                         {'groups': 1, 'policies': 2, 'webhooks': 3})
+
+    def test_list_tenants(self):
+        """
+        Tenants of a page of groups are listed once each
+        """
+        self.returns = [[{'tenantId': 't1'}, {'tenantId': 't1'}, {'tenantId': 't2'}],
+                        [{'tenantId': 't3'}]]
+        self.assertEqual(self.successResultOf(self.collection.list_tenants(limit=3)),
+                         ['t1', 't2'])
+        self.assertEqual(self.successResultOf(self.collection.list_tenants('t2', 3)),
+                         ['t3'])
+        self.assertEqual(
+            self.connection.execute.mock_calls,
+            [mock.call('SELECT "tenantId" FROM scaling_group LIMIT :limit;', {'limit': 3},
+                       ConsistencyLevel.TWO),
+             mock.call('SELECT "tenantId" FROM scaling_group WHERE token("tenantId") > '
+                       'token(:tenantId) LIMIT :limit;', {'tenantId': 't2', 'limit': 3},
+                       ConsistencyLevel.TWO)])
+
+    def test_repair_counts(self):
+        """
+        The groups, policies and webhooks of a tenant are listed again, their
+        counts corrected, and the counts of groups and policies removed once
+        their rows are read again and not found
+        """
+        self.returns = [
+            [{'groupId': 'g1', 'created_at': 1}, {'groupId': 'g2', 'created_at': None}],
+            [{'groupId': 'g1', 'policyId': 'p1'}, {'groupId': 'g1', 'policyId': 'p2'}],
+            [{'groupId': 'g1', 'policyId': 'p1'}],
+            [{'groupId': '', 'policyId': '', 'groups': 1, 'policies': 3, 'webhooks': 1},
+             {'groupId': 'g1', 'policyId': '', 'groups': None, 'policies': 2,
+              'webhooks': None},
+             {'groupId': 'g1', 'policyId': 'p3', 'groups': None, 'policies': None,
+              'webhooks': 1},
+             {'groupId': 'g3', 'policyId': '', 'groups': None, 'policies': 1,
+              'webhooks': None},
+             {'groupId': 'g3', 'policyId': 'p9', 'groups': None, 'policies': None,
+              'webhooks': 1}],
+            [], [], None, None, None]
+        d = self.collection.repair_counts(self.log, 't')
+        self.assertEqual(self.successResultOf(d), 4)
+        params = {'tenantId': 't'}
+        cql, data = _counter_batch('t', [('', '', 'policies', -1),
+                                         ('g1', 'p1', 'webhooks', 1)])
+        self.assertEqual(
+            self.connection.execute.mock_calls,
+            [mock.call('SELECT "groupId", created_at FROM scaling_group WHERE '
+                       '"tenantId" = :tenantId;', params, ConsistencyLevel.TWO),
+             mock.call('SELECT "groupId", "policyId" FROM scaling_policies WHERE '
+                       '"tenantId" = :tenantId;', params, ConsistencyLevel.TWO),
+             mock.call('SELECT "groupId", "policyId" FROM policy_webhooks WHERE '
+                       '"tenantId" = :tenantId;', params, ConsistencyLevel.TWO),
+             mock.call('SELECT "groupId", "policyId", groups, policies, webhooks FROM '
+                       'resource_counts WHERE "tenantId" = :tenantId;', params,
+                       ConsistencyLevel.TWO),
+             mock.call('SELECT data, version FROM scaling_policies WHERE '
+                       '"tenantId" = :tenantId AND "groupId" = :groupId AND '
+                       '"policyId" = :policyId;',
+                       {'tenantId': 't', 'groupId': 'g1', 'policyId': 'p3'},
+                       ConsistencyLevel.TWO),
+             mock.call('SELECT "groupId", created_at FROM scaling_group WHERE '
+                       '"tenantId" = :tenantId AND "groupId" = :groupId;',
+                       {'tenantId': 't', 'groupId': 'g3'}, ConsistencyLevel.TWO),
+             mock.call(cql, data, ConsistencyLevel.TWO),
+             mock.call('DELETE FROM resource_counts WHERE "tenantId" = :tenantId AND '
+                       '"groupId" = :groupId AND "policyId" = :policyId',
+                       {'tenantId': 't', 'groupId': 'g1', 'policyId': 'p3'},
+                       ConsistencyLevel.TWO),
+             mock.call('DELETE FROM resource_counts WHERE "tenantId" = :tenantId AND '
+                       '"groupId" = :groupId',
+                       {'tenantId': 't', 'groupId': 'g3'}, ConsistencyLevel.TWO)])
+        self.log.msg.assert_called_once_with(
+            'Repairing resource counts', tenant_id='t',
+            changes=[('', '', 'policies', -1), ('g1', 'p1', 'webhooks', 1)],
+            removed=[('g1', 'p3'), ('g3', None)])
+
+    def test_repair_counts_keeps_counts_of_new_resources(self):
+        """
+        The counts of a group or policy created while the tables are listed,
+        which are read but not listed, are not removed since their rows are found
+        when read again
+        """
+        self.returns = [
+            [{'groupId': 'g1', 'created_at': 1}],
+            [{'groupId': 'g1', 'policyId': 'p1'}],
+            [],
+            [{'groupId': '', 'policyId': '', 'groups': 1, 'policies': 1,
+              'webhooks': None},
+             {'groupId': 'g1', 'policyId': '', 'groups': None, 'policies': 1,
+              'webhooks': None},
+             {'groupId': 'g1', 'policyId': 'p2', 'groups': None, 'policies': None,
+              'webhooks': 1},
+             {'groupId': 'g2', 'policyId': '', 'groups': None, 'policies': 1,
+              'webhooks': None}],
+            [{'data': '{}', 'version': 'v'}],
+            [{'groupId': 'g2', 'created_at': 1}]]
+        d = self.collection.repair_counts(self.log, 't')
+        self.assertEqual(self.successResultOf(d), 0)
+        self.assertEqual(len(self.connection.execute.mock_calls), 6)
+        self.assertFalse(self.log.msg.called)
+
+    def test_repair_counts_adds_missing(self):
+        """
+        Counts that are missing, such as those of a tenant that had groups before
+        they were counted, are added
+        """
+        self.returns = [[{'groupId': 'g1', 'created_at': 1}],
+                        [{'groupId': 'g1', 'policyId': 'p1'}],
+                        [{'groupId': 'g1', 'policyId': 'p1'}],
+                        [], None]
+        d = self.collection.repair_counts(self.log, 't')
+        self.assertEqual(self.successResultOf(d), 5)
+        cql, data = _counter_batch('t', [('', '', 'groups', 1), ('', '', 'policies', 1),
+                                         ('', '', 'webhooks', 1), ('g1', '', 'policies', 1),
+                                         ('g1', 'p1', 'webhooks', 1)])
+        self.connection.execute.assert_called_with(cql, data, ConsistencyLevel.TWO)
+
+    def test_repair_counts_nothing_to_correct(self):
+        """
+        Nothing is written if the counts are right
+        """
+        self.returns = [[{'groupId': 'g1', 'created_at': 1}], [], [],
+                        [{'groupId': '', 'policyId': '', 'groups': 1, 'policies': 0,
+                          'webhooks': None}]]
+        d = self.collection.repair_counts(self.log, 't')
+        self.assertEqual(self.successResultOf(d), 0)
+        self.assertEqual(len(self.connection.execute.mock_calls), 4)
+        self.assertFalse(self.log.msg.called)
+
+
 class CassScalingGroupsCollectionHealthCheckTestCase(
         IScalingGroupCollectionProviderMixin, TestCase):
     """
@@ -2897,6 +4969,11 @@ class CassAdminTestCase(TestCase):
                 'id': 'otter.metrics.webhooks',
                 'value': 192,
                 'time': 1234567890
+            },
+            {
+                'id': 'otter.metrics.snapshot_age',
+                'value': 0,
+                'time': 1234567890
             }
         ]
         config_query = ('SELECT COUNT(*) FROM scaling_group;')
@@ -2911,3 +4988,105 @@ class CassAdminTestCase(TestCase):
         result = self.successResultOf(d)
         self.assertEquals(result, expectedResults)
         self.connection.execute.assert_has_calls(calls)
+
+    @mock.patch('otter.models.cass.time')
+    def test_get_metrics_from_totals(self, time):
+        """
+        The metrics are read from the totals of the resource counts if counts are
+        kept, whether or not limits are checked against them
+        """
+        time.time.return_value = 100
+        self.collection.resource_counts = ResourceCounts(limits=False)
+        self.returns = [[{'groups': 3, 'policies': 4, 'webhooks': None}]]
+        result = self.successResultOf(self.collection.get_metrics(self.mock_log))
+        self.assertEqual([(m['id'], m['value']) for m in result],
+                         [('otter.metrics.groups', 3), ('otter.metrics.policies', 4),
+                          ('otter.metrics.webhooks', 0), ('otter.metrics.snapshot_age', 0)])
+        self.connection.execute.assert_called_once_with(
+            'SELECT groups, policies, webhooks FROM resource_counts WHERE '
+            '"tenantId" = :tenantId AND "groupId" = :groupId AND "policyId" = :policyId;',
+            {'tenantId': '', 'groupId': '', 'policyId': ''}, ConsistencyLevel.TWO)
+
+    @mock.patch('otter.models.cass.time')
+    def test_get_metrics_cached(self, time):
+        """
+        When cached, the metrics are served from the snapshot taken by
+        `refresh_metrics` with its age, until refreshed again
+        """
+        self.collection.cached = True
+        time.time.return_value = 100
+        self.returns = [[{'count': 1}], [{'count': 2}], [{'count': 3}]]
+        self.successResultOf(self.collection.refresh_metrics(self.mock_log))
+
+        time.time.return_value = 130
+        result = self.successResultOf(self.collection.get_metrics(self.mock_log))
+        self.assertEqual(result[0], {'id': 'otter.metrics.groups', 'value': 1, 'time': 100})
+        self.assertEqual(result[-1],
+                         {'id': 'otter.metrics.snapshot_age', 'value': 30, 'time': 130})
+        self.assertEqual(len(self.connection.execute.mock_calls), 3)
+
+        self.returns = [[{'count': 4}], [{'count': 2}], [{'count': 3}]]
+        self.assertIsNone(
+            self.successResultOf(self.collection.refresh_metrics(self.mock_log)))
+        result = self.successResultOf(self.collection.get_metrics(self.mock_log))
+        self.assertEqual(result[0], {'id': 'otter.metrics.groups', 'value': 4, 'time': 130})
+        self.assertEqual(result[-1]['value'], 0)
+
+    def test_get_metrics_cached_before_snapshot(self):
+        """
+        When cached, the counts are left out instead of taken until the first
+        snapshot is taken, and only the metrics of the config cache are returned
+        """
+        self.collection.cached = True
+        self.assertEqual(self.successResultOf(self.collection.get_metrics(self.mock_log)),
+                         [])
+        self.collection.config_cache = mock.Mock(spec=['get_metrics'])
+        self.collection.config_cache.get_metrics.return_value = [{'id': 'cache'}]
+        self.assertEqual(self.successResultOf(self.collection.get_metrics(self.mock_log)),
+                         [{'id': 'cache'}])
+        self.assertFalse(self.connection.execute.called)
+
+    @mock.patch('otter.models.cass.time')
+    def test_get_metrics_with_config_cache(self, time):
+        """
+        The metrics of the config cache are added
+        """
+        time.time.return_value = 100
+        self.collection.config_cache = mock.Mock(spec=['get_metrics'])
+        self.collection.config_cache.get_metrics.return_value = [{'id': 'cache'}]
+        self.returns = [[{'count': 1}], [{'count': 2}], [{'count': 3}]]
+        result = self.successResultOf(self.collection.get_metrics(self.mock_log))
+        self.assertEqual(result[-1], {'id': 'cache'})
+        self.assertEqual(len(result), 5)
+
+    def test_refresh_metrics_failure_logged(self):
+        """
+        Failing to refresh the metrics is logged and the last snapshot is kept
+        """
+        self.collection.snapshot = ({'groups': 1}, 100)
+        self.connection.execute.side_effect = [
+            defer.fail(DummyException('bad')), defer.succeed([{'count': 2}]),
+            defer.succeed([{'count': 3}])]
+        self.successResultOf(self.collection.refresh_metrics(self.mock_log))
+        self.mock_log.err.assert_called_once_with(CheckFailure(DummyException),
+                                                  'Could not refresh metrics')
+        self.assertEqual(self.collection.snapshot, ({'groups': 1}, 100))
+
+    @mock.patch('otter.models.cass.time')
+    def test_concurrent_counts_shared(self, time):
+        """
+        The metrics are counted once for calls made while they are being counted
+        """
+        time.time.return_value = 100
+        self.collection.resource_counts = ResourceCounts(limits=True)
+        counted = defer.Deferred()
+        self.connection.execute.side_effect = lambda *args: counted
+        d1 = self.collection.get_metrics(self.mock_log)
+        d2 = self.collection.refresh_metrics(self.mock_log)
+        self.assertNoResult(d1)
+        counted.callback([{'groups': 1, 'policies': 2, 'webhooks': 3}])
+        self.assertEqual(self.successResultOf(d1)[0]['value'], 1)
+        self.assertIsNone(self.successResultOf(d2))
+        self.assertEqual(len(self.connection.execute.mock_calls), 1)
+        self.assertEqual(self.collection.snapshot,
+                         ({'groups': 1, 'policies': 2, 'webhooks': 3}, 100))
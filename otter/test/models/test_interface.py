@@ -30,7 +30,7 @@ class GroupStateTestCase(TestCase):
                            True, desired=5)
         self.assertEqual(
             repr(state),
-            "GroupState(tid, gid, name, 5, {'1': {}}, {}, date, {}, True)")
+            "GroupState(tid, gid, name, 5, {'1': {}}, {}, date, {}, True, {}, {})")
 
     def test_default_desired_capacity_is_zero(self):
         """
@@ -185,6 +185,127 @@ class GroupStateTestCase(TestCase):
         self.assertEqual(state.group_touched, '0')
         self.assertEqual(state.policy_touched, {'pid': '0'})
 
+    def test_slots(self):
+        """
+        States have no ``__dict__``, so they stay small
+        """
+        state = GroupState('tid', 'gid', 'name', {}, {}, None, {}, True)
+        self.assertFalse(hasattr(state, '__dict__'))
+
+    def test_get_oldest_active(self):
+        """
+        ``get_oldest_active`` returns the ids of the oldest active servers,
+        oldest first, including those added and excluding those removed since
+        the first call
+        """
+        state = GroupState('tid', 'gid', 'name',
+                           {'a': {'created': '2014-01-01T00:00:03Z'},
+                            'b': {'created': '2014-01-01T00:00:01Z'},
+                            'c': {'created': '2014-01-01T00:00:02.5Z'}},
+                           {}, None, {}, True)
+        self.assertEqual(state.get_oldest_active(2), ['b', 'c'])
+        self.assertEqual(state.get_oldest_active(2), ['b', 'c'])
+        state.remove_active('b')
+        state.add_active('d', {'created': '2014-01-01T00:00:02Z'})
+        self.assertEqual(state.get_oldest_active(5), ['d', 'c', 'a'])
+        state.remove_active('d')
+        state.add_active('d', {'created': '2014-01-01T00:00:04Z'})
+        self.assertEqual(state.get_oldest_active(5), ['c', 'a', 'd'])
+
+    def test_get_newest_pending(self):
+        """
+        ``get_newest_pending`` returns the ids of the most recently created
+        pending jobs, newest first, including those added and excluding those
+        removed since the first call
+        """
+        times = ['2014-01-01T00:00:05Z']
+        state = GroupState('tid', 'gid', 'name', {},
+                           {'1': {'created': '2014-01-01T00:00:01Z'},
+                            '2': {'created': '2014-01-01T00:00:03Z'},
+                            '3': {'created': '2014-01-01T00:00:02Z'}},
+                           None, {}, True, now=times.pop)
+        self.assertEqual(state.get_newest_pending(2), ['2', '3'])
+        state.add_job('4')
+        state.remove_job('2')
+        self.assertEqual(state.get_newest_pending(2), ['4', '3'])
+
+    def test_replacing_active_and_pending_reindexes(self):
+        """
+        Assigning new ``active`` or ``pending`` mappings indexes them anew
+        """
+        state = GroupState('tid', 'gid', 'name',
+                           {'a': {'created': '2014-01-01T00:00:01Z'}},
+                           {'1': {'created': '2014-01-01T00:00:01Z'}},
+                           None, {}, True)
+        self.assertEqual(state.get_oldest_active(1), ['a'])
+        self.assertEqual(state.get_newest_pending(1), ['1'])
+        state.active = {'b': {'created': '2014-01-01T00:00:01Z'}}
+        state.pending = {'2': {'created': '2014-01-01T00:00:01Z'}}
+        self.assertEqual(state.get_oldest_active(1), ['b'])
+        self.assertEqual(state.get_newest_pending(1), ['2'])
+
+    def test_get_touched_epoch(self):
+        """
+        ``get_touched_epoch`` returns the group or policy touched time in
+        seconds since the epoch, None if the policy was never executed, and
+        follows ``mark_executed``
+        """
+        state = GroupState('tid', 'gid', 'name', {}, {}, '2014-01-01T00:00:01Z',
+                           {'pid': '2014-01-01T00:00:00Z'}, True,
+                           now=lambda: '2014-01-01T00:00:02Z')
+        self.assertEqual(state.get_touched_epoch(), 1388534401)
+        self.assertEqual(state.get_touched_epoch('pid'), 1388534400)
+        self.assertIsNone(state.get_touched_epoch('other'))
+        state.mark_executed('pid')
+        self.assertEqual(state.get_touched_epoch(), 1388534402)
+        self.assertEqual(state.get_touched_epoch('pid'), 1388534402)
+
+    def test_standby_jobs(self):
+        """
+        ``add_standby_job`` adds a job building a standby server with its
+        creation time and launch config key, which ``remove_standby_job`` removes
+        """
+        state = GroupState('tid', 'gid', 'name', {}, {}, None, {}, True,
+                           now=lambda: 'datetime')
+        state.add_standby_job('1', 'key')
+        self.assertEqual(state.standby_pending,
+                         {'1': {'created': 'datetime', 'config': 'key'}})
+        self.assertRaises(AssertionError, state.add_standby_job, '1', 'key')
+        state.remove_standby_job('1')
+        self.assertEqual(state.standby_pending, {})
+        self.assertRaises(AssertionError, state.remove_standby_job, '1')
+
+    def test_standby_servers_not_counted_in_capacity(self):
+        """
+        Standby servers and the jobs building them are not part of the capacity
+        """
+        state = GroupState('tid', 'gid', 'name', {'1': {}}, {}, None, {}, True,
+                           standby={'2': {}}, standby_pending={'3': {}})
+        self.assertEqual(state.get_capacity(), {
+            'desired_capacity': 1,
+            'pending_capacity': 0,
+            'current_capacity': 1
+        })
+
+    def test_take_standby(self):
+        """
+        ``take_standby`` removes and returns the oldest standby servers built
+        from the launch config with the given key
+        """
+        state = GroupState('tid', 'gid', 'name', {}, {}, None, {}, True,
+                           now=lambda: '2014-01-01T00:00:00Z')
+        state.add_standby('a', {'id': 'a', 'config': 'key',
+                                'created': '2014-01-01T00:00:02Z'})
+        state.add_standby('b', {'id': 'b', 'config': 'key',
+                                'created': '2014-01-01T00:00:01.5Z'})
+        state.add_standby('c', {'id': 'c', 'config': 'old'})
+        self.assertRaises(AssertionError, state.add_standby, 'c', {'id': 'c'})
+        self.assertEqual([info['id'] for info in state.take_standby('key', 1)], ['b'])
+        self.assertEqual(sorted(state.standby), ['a', 'c'])
+        self.assertEqual([info['id'] for info in state.take_standby('key', 5)], ['a'])
+        state.remove_standby('c')
+        self.assertEqual(state.standby, {})
+
     def test_get_capacity(self):
         """
         Getting capacity returns a dictionary with the desired capacity,
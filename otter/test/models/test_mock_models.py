@@ -2,6 +2,9 @@
 Tests for :mod:`otter.models.mock`
 """
 import mock
+from datetime import datetime
+
+from zope.interface.verify import verifyObject
 
 from twisted.trial.unittest import TestCase
 
@@ -13,7 +16,8 @@ from otter.models.mock import (
 from otter.models.interface import (
     GroupState, GroupNotEmptyError, NoSuchScalingGroupError,
     NoSuchPolicyError, NoSuchWebhookError, UnrecognizedCapabilityError,
-    ScalingGroupOverLimitError, WebhooksOverLimitError, PoliciesOverLimitError)
+    ScalingGroupOverLimitError, WebhooksOverLimitError, PoliciesOverLimitError,
+    IServerDeletionQueue)
 
 from otter.test.models.test_interface import (
     IScalingGroupProviderMixin,
@@ -202,6 +206,36 @@ class MockScalingGroupTestCase(IScalingGroupProviderMixin, TestCase):
         f = self.failureResultOf(d)
         self.assertTrue(f.check(AssertionError))
 
+    def test_modify_state_for_policy(self):
+        """
+        ``modify_state_for_policy`` calls the modifier with the state, configs
+        and policy, and saves the new state it returns
+        """
+        new_state = GroupState(self.tenant_id, self.group_id, 'aname', {1: {}}, {},
+                               'date', {}, True)
+        policy_id = self.successResultOf(self.group.list_policies())[0]['id']
+        calls = []
+
+        def modifier(group, state, **bundle):
+            calls.append(bundle)
+            return new_state
+
+        self.successResultOf(self.group.modify_state_for_policy(modifier, policy_id))
+        self.assertEqual(self.group.state, new_state)
+        self.assertEqual(calls, [{'config': self.output_config,
+                                  'launch': self.launch_config,
+                                  'policy': self.policies[0]}])
+
+    def test_modify_state_for_nonexistent_policy_fails(self):
+        """
+        ``modify_state_for_policy`` fails with :class:`NoSuchPolicyError` without
+        calling the modifier if the policy does not exist
+        """
+        modifier = mock.Mock()
+        d = self.group.modify_state_for_policy(modifier, 'nope')
+        self.failureResultOf(d, NoSuchPolicyError)
+        self.assertFalse(modifier.called)
+
     def test_update_config_overwrites_existing_data(self):
         """
         Passing in a dict only overwrites the existing dict unless the
@@ -336,6 +370,15 @@ class MockScalingGroupTestCase(IScalingGroupProviderMixin, TestCase):
         self.failureResultOf(self.group.delete_group(), GroupNotEmptyError)
         self.assertEqual(len(self.collection.data[self.group.tenant_id]), 1)
 
+    def test_delete_scaling_group_fails_if_warm_pool_not_empty(self):
+        """
+        Deleting a scaling group that has standby servers errbacks with a
+        :class:`GroupNotEmptyError`
+        """
+        self.group.state.standby = {'1': {}}
+        self.failureResultOf(self.group.delete_group(), GroupNotEmptyError)
+        self.assertEqual(len(self.collection.data[self.group.tenant_id]), 1)
+
     def test_list_empty_policies(self):
         """
         If there are no policies, list policies conforms to the schema and
@@ -769,6 +812,68 @@ class MockScalingScheduleCollectionTestCase(IScalingScheduleCollectionProviderMi
         deferred = self.collection.fetch_and_delete(2, 1234, 100)
         self.assertEqual(self.successResultOf(deferred), [])
 
+    def test_move_events(self):
+        """
+        `move_events` moves nothing
+        """
+        self.assertEqual(self.successResultOf(self.collection.move_events(2, 100)), 0)
+
+    def test_claim_events(self):
+        """
+        `claim_events` claims nothing and `delete_claimed_events` does nothing
+        """
+        self.assertEqual(self.successResultOf(self.collection.claim_events(2, 1234)), [])
+        self.assertIsNone(
+            self.successResultOf(self.collection.delete_claimed_events(2, [])))
+
+
+class MockServerDeletionQueueTestCase(TestCase):
+    """
+    Tests for :class:`MockScalingGroupCollection` as a server deletion queue
+    """
+
+    def setUp(self):
+        """
+        Queue two server deletions
+        """
+        self.collection = MockScalingGroupCollection()
+        self.now = datetime(1970, 1, 1, 0, 3, 20)
+        self.servers = [{'id': 's1', 'lb_info': []}, {'id': 's2', 'lb_info': []}]
+        self.successResultOf(self.collection.add_server_deletions(
+            mock_log(), 'tr', 't1', 'g1', self.servers))
+        self.deletions = [{'tenantId': 't1', 'groupId': 'g1', 'serverId': server['id'],
+                           'transactionId': 'tr', 'server': server}
+                          for server in self.servers]
+
+    def test_implements_interface(self):
+        """
+        The collection implements IServerDeletionQueue
+        """
+        verifyObject(IServerDeletionQueue, self.collection)
+
+    def test_claim_in_order(self):
+        """
+        Deletions are claimed in the order queued, and claimed ones are not claimed
+        again until their lease expires
+        """
+        claim = self.collection.claim_server_deletions
+        self.assertEqual(self.successResultOf(claim(self.now, 1, 60)), self.deletions[:1])
+        self.assertEqual(self.successResultOf(claim(self.now, 5, 60)), self.deletions[1:])
+        self.assertEqual(self.successResultOf(claim(self.now, 5, 60)), [])
+        self.assertEqual(
+            self.successResultOf(claim(datetime(1970, 1, 1, 0, 4, 20), 5, 60)),
+            self.deletions)
+
+    def test_delete(self):
+        """
+        Deleted deletions are not claimed anymore
+        """
+        self.assertIsNone(self.successResultOf(
+            self.collection.delete_server_deletions(self.deletions[:1])))
+        self.assertEqual(
+            self.successResultOf(self.collection.claim_server_deletions(self.now)),
+            self.deletions[1:])
+
 
 class MockScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
                                           TestCase):
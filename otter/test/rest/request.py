@@ -280,6 +280,13 @@ class RestAPITestMixin(RequestTestMixin):
             return defer.succeed(None)
 
         self.mock_group.modify_state.side_effect = _mock_modify_state
+
+        def _mock_modify_state_for_policy(modifier, policy_id, version=None):
+            modifier(self.mock_group, self.mock_state, config='config',
+                     launch='launch', policy='policy')
+            return defer.succeed(None)
+
+        self.mock_group.modify_state_for_policy.side_effect = _mock_modify_state_for_policy
         self.root = Otter(self.mock_store).app.resource()
         self.get_url_root = patch(self, 'otter.util.http.get_url_root', return_value="")
 
@@ -296,9 +296,11 @@ class LaunchConfigTestCase(RestAPITestMixin, TestCase):
         Set up a mock group to be used for viewing and updating configurations
         """
         super(LaunchConfigTestCase, self).setUp()
+        modify_state = self.mock_group.modify_state
         self.mock_group = mock.MagicMock(
-            spec=('uuid', 'view_launch_config', 'update_launch_config'),
-            uuid='1')
+            spec=('uuid', 'view_launch_config', 'update_launch_config',
+                  'modify_state'),
+            uuid='1', modify_state=modify_state)
         self.mock_store.get_scaling_group.return_value = self.mock_group
 
         # Patch supervisor
@@ -404,7 +406,8 @@ class LaunchConfigTestCase(RestAPITestMixin, TestCase):
         self.assertEqual(resp['error']['message'], 'hmph')
         self.flushLoggedErrors(InvalidLaunchConfiguration)
 
-    def test_update_launch_config_success(self):
+    @mock.patch('otter.rest.configs.controller', spec=['obey_warm_pool_change'])
+    def test_update_launch_config_success(self, *args):
         """
         If the update succeeds, the data is updated and a 204 is returned
         """
@@ -416,6 +419,20 @@ class LaunchConfigTestCase(RestAPITestMixin, TestCase):
         self.mock_group.update_launch_config.assert_called_once_with(
             launch_examples()[0])
 
+    @mock.patch('otter.rest.configs.controller', spec=['obey_warm_pool_change'])
+    def test_update_launch_config_calls_obey_warm_pool_change(self, mock_controller):
+        """
+        Once the launch config is updated, ``obey_warm_pool_change`` is called with
+        the new launch config so that outdated standby servers are replaced
+        """
+        self.mock_group.update_launch_config.return_value = defer.succeed(None)
+        self.assert_status_code(204, method='PUT',
+                                body=json.dumps(launch_examples()[0]))
+        self.mock_group.modify_state.assert_called_once_with(mock.ANY)
+        mock_controller.obey_warm_pool_change.assert_called_once_with(
+            mock.ANY, "transaction-id", self.mock_group, self.mock_state,
+            launch=launch_examples()[0])
+
     def test_launch_config_modify_bad_or_missing_input_400(self):
         """
         Checks that an update with no PUT data will fail with a 400
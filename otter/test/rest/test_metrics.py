@@ -7,6 +7,7 @@ import mock
 from twisted.internet import defer
 from twisted.trial.unittest import TestCase
 
+from otter.rest.admin import OtterAdmin
 from otter.test.rest.request import AdminRestAPITestMixin
 
 
@@ -40,3 +41,34 @@ class MetricsEndpointsTestCase(AdminRestAPITestMixin, TestCase):
         self.assertEqual(response_body, {'metrics': metrics})
 
         self.mock_store.get_metrics.assert_called_once_with(mock.ANY)
+
+    def test_scheduler_metrics(self):
+        """
+        Scheduler metrics, if any, are returned after the store metrics
+        """
+        store_metrics = [{'id': 'otter.metrics.foo', 'value': 10, 'time': 1234567890}]
+        scheduler_metrics = [
+            {'id': 'otter.metrics.scheduler.fetched', 'value': 3, 'time': 1234567890}]
+        self.mock_store.get_metrics.return_value = defer.succeed(store_metrics)
+        metrics = mock.Mock(spec=['get_metrics'])
+        metrics.get_metrics.return_value = scheduler_metrics
+        self.root = OtterAdmin(self.mock_store, metrics).app.resource()
+
+        response_body = json.loads(self.assert_status_code(200))
+        self.assertEqual(response_body, {'metrics': store_metrics + scheduler_metrics})
+
+    def test_supervisor_metrics(self):
+        """
+        Supervisor metrics, if supervisor is given, are returned after the store
+        metrics
+        """
+        store_metrics = [{'id': 'otter.metrics.foo', 'value': 10, 'time': 1234567890}]
+        launch_metrics = [{'id': 'otter.metrics.supervisor.launches.queued', 'value': 3,
+                           'time': 1234567890}]
+        self.mock_store.get_metrics.return_value = defer.succeed(store_metrics)
+        supervisor = mock.Mock(spec=['get_metrics'])
+        supervisor.get_metrics.return_value = launch_metrics
+        self.root = OtterAdmin(self.mock_store, None, supervisor).app.resource()
+
+        response_body = json.loads(self.assert_status_code(200))
+        self.assertEqual(response_body, {'metrics': store_metrics + launch_metrics})
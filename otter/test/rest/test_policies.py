@@ -572,22 +572,35 @@ class OnePolicyTestCase(RestAPITestMixin, TestCase):
                                                 method="POST")
         self.assertEqual(response_body, "{}")
         self.mock_store.get_scaling_group.assert_called_once_with(mock.ANY, '11111', '1')
-        self.assertEqual(self.mock_group.modify_state.call_count, 1)
+        self.mock_group.modify_state_for_policy.assert_called_once_with(
+            mock.ANY, self.policy_id, None)
 
         self.mock_controller.maybe_execute_scaling_policy.assert_called_once_with(
             mock.ANY,
             'transaction-id',
             self.mock_group,
             self.mock_state,
-            policy_id=self.policy_id
+            policy_id=self.policy_id,
+            config='config', launch='launch', policy='policy'
         )
 
+    @mock.patch('otter.rest.policies.modify_state_unless_cooling_down',
+                return_value=defer.succeed(None))
+    def test_execute_policy_not_coalesced(self, modify):
+        """
+        Executing a policy through the API is never coalesced with another
+        execution, since its outcome is reported
+        """
+        self.assert_status_code(202, endpoint=self.endpoint + 'execute/', method="POST")
+        modify.assert_called_once_with(mock.ANY, self.mock_group, self.policy_id,
+                                       mock.ANY)
+
     def test_execute_policy_failure_404(self):
         """
         Try to execute a nonexistant policy, fails with a 404.
         """
-        self.mock_group.modify_state.side_effect = None
-        self.mock_group.modify_state.return_value = defer.fail(
+        self.mock_group.modify_state_for_policy.side_effect = None
+        self.mock_group.modify_state_for_policy.return_value = defer.fail(
             NoSuchPolicyError('11111', '1', '2'))
 
         response_body = self.assert_status_code(404,
@@ -602,8 +615,8 @@ class OnePolicyTestCase(RestAPITestMixin, TestCase):
         If a policy cannot be executed due to cooldowns or budgetary constraints,
         fail with a 403.
         """
-        self.mock_group.modify_state.side_effect = None
-        self.mock_group.modify_state.return_value = defer.fail(
+        self.mock_group.modify_state_for_policy.side_effect = None
+        self.mock_group.modify_state_for_policy.return_value = defer.fail(
             CannotExecutePolicyError('11111', '1', '2', 'meh'))
 
         response_body = self.assert_status_code(403,
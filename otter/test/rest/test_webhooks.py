@@ -478,11 +478,25 @@ class OneWebhookTestCase(RestAPITestMixin, TestCase):
             'transaction-id',
             self.mock_group,
             self.mock_state,
-            policy_id=self.policy_id
+            policy_id=self.policy_id,
+            config='config', launch='launch', policy='policy'
         )
 
         self.assertEqual(response_body, '')
 
+    @mock.patch('otter.rest.webhooks.modify_state_unless_cooling_down',
+                return_value=defer.succeed(None))
+    def test_execute_webhook_coalesced(self, modify):
+        """
+        Executions of a webhook may be coalesced with an execution of its policy
+        in progress, since their outcome is not reported
+        """
+        self.mock_store.webhook_info_by_hash.return_value = defer.succeed(
+            (self.tenant_id, self.group_id, self.policy_id))
+        self.assert_status_code(202, '/v1.0/execute/1/11111/', 'POST')
+        modify.assert_called_once_with(mock.ANY, self.mock_group, self.policy_id,
+                                       mock.ANY, coalesce=True)
+
     def test_execute_webhook_does_not_wait_for_response(self):
         """
         If the policy execution fails, the webhook should still return 202 and
@@ -535,7 +549,8 @@ class OneWebhookTestCase(RestAPITestMixin, TestCase):
                     UnrecognizedCapabilityError("11111", 1)]:
             self.mock_store.webhook_info_by_hash.return_value = defer.succeed(
                 ('tenant', 'group', 'policy'))
-            self.mock_group.modify_state.side_effect = lambda *args, **kwargs: defer.fail(exc)
+            self.mock_group.modify_state_for_policy.side_effect = (
+                lambda *args, **kwargs: defer.fail(exc))
             self.assert_status_code(202, '/v1.0/execute/1/11111/', 'POST')
 
             cap_log.bind().msg.assert_any_call(
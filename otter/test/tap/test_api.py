@@ -13,11 +13,18 @@ from twisted.application.service import MultiService
 from twisted.trial.unittest import TestCase
 
 from otter.supervisor import get_supervisor, set_supervisor, SupervisorService
+from otter.controller import (
+    get_completion_coalescer, set_completion_coalescer, get_cooldown_cache,
+    set_cooldown_cache, get_execution_coalescer, set_execution_coalescer,
+    ExecutionCoalescer)
+from otter.deletion import get_deletion_queue, set_deletion_queue
 from otter.tap.api import (
-    Options, HealthChecker, makeService, setup_scheduler, call_after_supervisor)
+    Options, HealthChecker, makeService, setup_scheduler, call_after_supervisor,
+    setup_deletion_service, setup_counts_repair)
 from otter.test.utils import matches, patch, CheckFailure
 from otter.util.config import set_config_data
 from otter.util.deferredutils import DeferredPool
+from otter.scheduler import SchedulerMetrics
 
 
 test_config = {
@@ -270,6 +277,26 @@ class APIMakeServiceTests(TestCase):
         makeService(test_config)
         self.service.assert_any_call('tcp:9789', self.Site.return_value)
 
+    @mock.patch('otter.tap.api.OtterAdmin')
+    @mock.patch('otter.tap.api.setup_scheduler')
+    @mock.patch('otter.tap.api.TxKazooClient')
+    def test_scheduler_metrics(self, mock_txkz, mock_setup_scheduler, mock_admin):
+        """
+        When scheduler is configured, the same `SchedulerMetrics` is given to the
+        admin service and to `setup_scheduler`
+        """
+        config = test_config.copy()
+        config['zookeeper'] = {'hosts': 'zk_hosts', 'threads': 20}
+        config['scheduler'] = {'buckets': 10}
+        mock_txkz.return_value.start.return_value = defer.succeed(None)
+
+        makeService(config)
+
+        metrics = mock_admin.call_args[0][1]
+        self.assertIsInstance(metrics, SchedulerMetrics)
+        mock_setup_scheduler.assert_called_once_with(mock.ANY, self.store, mock.ANY,
+                                                     metrics=metrics)
+
     def test_no_admin(self):
         """
         makeService does not create admin service if admin config value is
@@ -342,7 +369,126 @@ class APIMakeServiceTests(TestCase):
         self.log.bind.assert_called_once_with(system='otter.silverberg')
         self.LoggingCQLClient.assert_called_once_with(self.RoundRobinCassandraCluster.return_value,
                                                       self.log.bind.return_value)
-        self.CassScalingGroupCollection.assert_called_once_with(self.LoggingCQLClient.return_value)
+        self.CassScalingGroupCollection.assert_called_once_with(
+            self.LoggingCQLClient.return_value, None, capability_cache=None,
+            webhook_index_fallback=True,
+            resource_counts=None, config_cache=None)
+
+    def test_cassandra_event_shard_interval(self):
+        """
+        makeService configures CassScalingGroupCollection to shard events if
+        `cassandra.event_shard_interval` is configured
+        """
+        config = test_config.copy()
+        config['cassandra'] = dict(test_config['cassandra'], event_shard_interval=3600)
+        makeService(config)
+        self.CassScalingGroupCollection.assert_called_once_with(
+            self.LoggingCQLClient.return_value, 3600, capability_cache=None,
+            webhook_index_fallback=True,
+            resource_counts=None, config_cache=None)
+
+    def test_cassandra_webhook_cache(self):
+        """
+        makeService gives CassScalingGroupCollection a CapabilityCache of
+        `cassandra.webhook_cache_size` hashes kept for `cassandra.webhook_cache_ttl`
+        seconds if the size is configured
+        """
+        config = test_config.copy()
+        config['cassandra'] = dict(test_config['cassandra'], webhook_cache_size=100,
+                                   webhook_cache_ttl=30)
+        CapabilityCache = patch(self, 'otter.tap.api.CapabilityCache')
+        makeService(config)
+        CapabilityCache.assert_called_once_with(100, 30)
+        self.CassScalingGroupCollection.assert_called_once_with(
+            self.LoggingCQLClient.return_value, None,
+            capability_cache=CapabilityCache.return_value, webhook_index_fallback=True,
+            resource_counts=None, config_cache=None)
+
+    def test_cassandra_webhook_keys_only(self):
+        """
+        makeService configures CassScalingGroupCollection to not look up webhooks
+        through the index of policy_webhooks if `cassandra.webhook_keys_only` is set
+        """
+        config = test_config.copy()
+        config['cassandra'] = dict(test_config['cassandra'], webhook_keys_only=True)
+        makeService(config)
+        self.CassScalingGroupCollection.assert_called_once_with(
+            self.LoggingCQLClient.return_value, None, capability_cache=None,
+            webhook_index_fallback=False,
+            resource_counts=None, config_cache=None)
+
+    def test_cassandra_resource_counts(self):
+        """
+        makeService configures CassScalingGroupCollection to count groups,
+        policies and webhooks if `cassandra.resource_counts` is configured, and
+        to check limits against the counts if `cassandra.resource_counts.limits`
+        is set
+        """
+        config = test_config.copy()
+        ResourceCounts = patch(self, 'otter.tap.api.ResourceCounts')
+        for counts, limits in (({'repair_interval': 3600}, False),
+                               ({'limits': True}, True)):
+            config['cassandra'] = dict(test_config['cassandra'], resource_counts=counts)
+            makeService(config)
+            ResourceCounts.assert_called_once_with(limits=limits)
+            self.CassScalingGroupCollection.assert_called_once_with(
+                self.LoggingCQLClient.return_value, None, capability_cache=None,
+                webhook_index_fallback=True, resource_counts=ResourceCounts.return_value,
+                config_cache=None)
+            ResourceCounts.reset_mock()
+            self.CassScalingGroupCollection.reset_mock()
+
+    def test_cassandra_config_cache(self):
+        """
+        makeService gives CassScalingGroupCollection and CassAdmin a ConfigCache of
+        `cassandra.config_cache_size` entries kept for `cassandra.config_cache_ttl`
+        seconds, or 30 seconds by default, if the size is configured
+        """
+        config = test_config.copy()
+        ConfigCache = patch(self, 'otter.tap.api.ConfigCache')
+        CassAdmin = patch(self, 'otter.tap.api.CassAdmin')
+        for cache, ttl in (({'config_cache_size': 100, 'config_cache_ttl': 10}, 10),
+                           ({'config_cache_size': 100}, 30)):
+            config['cassandra'] = dict(test_config['cassandra'], **cache)
+            makeService(config)
+            ConfigCache.assert_called_once_with(100, ttl)
+            self.CassScalingGroupCollection.assert_called_once_with(
+                self.LoggingCQLClient.return_value, None, capability_cache=None,
+                webhook_index_fallback=True, resource_counts=None,
+                config_cache=ConfigCache.return_value)
+            CassAdmin.assert_called_once_with(
+                self.LoggingCQLClient.return_value, None, cached=False,
+                config_cache=ConfigCache.return_value)
+            for m in (ConfigCache, CassAdmin, self.CassScalingGroupCollection):
+                m.reset_mock()
+
+    def test_cassandra_admin(self):
+        """
+        makeService gives CassAdmin the resource counts, and counts its metrics on
+        every request if `cassandra.metrics_interval` is not configured
+        """
+        CassAdmin = patch(self, 'otter.tap.api.CassAdmin')
+        TimerService = patch(self, 'otter.tap.api.TimerService')
+        makeService(test_config)
+        CassAdmin.assert_called_once_with(self.LoggingCQLClient.return_value, None,
+                                          cached=False, config_cache=None)
+        self.assertFalse(TimerService.called)
+
+    def test_cassandra_admin_metrics_interval(self):
+        """
+        makeService configures CassAdmin to serve a snapshot of its metrics,
+        refreshed every `cassandra.metrics_interval` seconds
+        """
+        CassAdmin = patch(self, 'otter.tap.api.CassAdmin')
+        TimerService = patch(self, 'otter.tap.api.TimerService')
+        config = test_config.copy()
+        config['cassandra'] = dict(test_config['cassandra'], metrics_interval=60)
+        parent = makeService(config)
+        CassAdmin.assert_called_once_with(self.LoggingCQLClient.return_value, None,
+                                          cached=True, config_cache=None)
+        TimerService.assert_called_once_with(
+            60, CassAdmin.return_value.refresh_metrics, self.log.bind.return_value)
+        TimerService.return_value.setServiceParent.assert_called_once_with(parent)
 
     def test_cassandra_cluster_disconnects_on_stop(self):
         """
@@ -415,14 +561,114 @@ class APIMakeServiceTests(TestCase):
         supervisor_service = parent.getServiceNamed('supervisor')
 
         self.assertEqual(get_supervisor(), supervisor_service)
+        self.assertIsNone(supervisor_service.launch_limiter)
+        self.assertEqual(supervisor_service.multi_create_max, 1)
+
+    def test_no_completion_coalescer_by_default(self):
+        """
+        Job completions are not coalesced by default
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        makeService(test_config)
+        self.assertIsNone(get_completion_coalescer())
 
+    def test_completion_coalescer(self):
+        """
+        Job completions are coalesced as configured
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        self.addCleanup(set_completion_coalescer, None)
+        config = test_config.copy()
+        config['controller'] = {'completion_window': 2, 'completion_max_batch': 50}
+
+        makeService(config)
+
+        coalescer = get_completion_coalescer()
+        self.assertEqual((coalescer.window, coalescer.max_batch), (2.0, 50))
+
+    def test_no_cooldown_cache_by_default(self):
+        """
+        Policy executions always take the lock to check cooldowns by default
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        makeService(test_config)
+        self.assertIsNone(get_cooldown_cache())
+
+    def test_cooldown_cache(self):
+        """
+        Cooldown cache is set up as configured
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        self.addCleanup(set_cooldown_cache, None)
+        config = test_config.copy()
+        config['controller'] = {'cooldown_cache_ttl': 5, 'cooldown_cache_margin': 1,
+                                'cooldown_cache_groups': 100}
+
+        makeService(config)
+
+        cache = get_cooldown_cache()
+        self.assertEqual((cache.ttl, cache.margin, cache.max_groups), (5.0, 1.0, 100))
+
+    def test_no_execution_coalescer_by_default(self):
+        """
+        Policy executions are not coalesced by default
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        makeService(test_config)
+        self.assertIsNone(get_execution_coalescer())
+
+    def test_execution_coalescer(self):
+        """
+        Policy executions are coalesced if configured
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        self.addCleanup(set_execution_coalescer, None)
+        config = test_config.copy()
+        config['controller'] = {'coalesce_executions': True}
+
+        makeService(config)
+
+        self.assertIsInstance(get_execution_coalescer(), ExecutionCoalescer)
+
+    def test_supervisor_multi_create_max(self):
+        """
+        The supervisor batches as many server creations as configured
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        config = test_config.copy()
+        config['supervisor'] = {'launch': {'multi_create_max': 10}}
+
+        parent = makeService(config)
+
+        self.assertEqual(parent.getServiceNamed('supervisor').multi_create_max, 10)
+
+    @mock.patch('otter.tap.api.OtterAdmin')
+    def test_supervisor_launch_limiter(self, mock_admin):
+        """
+        The supervisor limits launches as configured and is given to the admin
+        service to report them
+        """
+        self.addCleanup(lambda: set_supervisor(None))
+        config = test_config.copy()
+        config['supervisor'] = {'launch': {'max_concurrent': 20,
+                                           'max_concurrent_per_tenant': 5}}
+
+        parent = makeService(config)
+
+        supervisor = parent.getServiceNamed('supervisor')
+        self.assertEqual((supervisor.launch_limiter.limit,
+                          supervisor.launch_limiter.key_limit), (20, 5))
+        mock_admin.assert_called_once_with(mock.ANY, None, supervisor)
+
+    @mock.patch('otter.tap.api.setup_counts_repair')
     @mock.patch('otter.tap.api.setup_scheduler')
     @mock.patch('otter.tap.api.TxKazooClient')
-    def test_kazoo_client_success(self, mock_txkz, mock_setup_scheduler):
+    def test_kazoo_client_success(self, mock_txkz, mock_setup_scheduler,
+                                  mock_setup_counts_repair):
         """
-        TxKazooClient is started and calls `setup_scheduler`. Its instance
-        is also set in store.kz_client after start has finished, and the
-        scheduler added to the health checker
+        TxKazooClient is started and calls `setup_scheduler` and
+        `setup_counts_repair`. Its instance is also set in store.kz_client after
+        start has finished, and the scheduler added to the health checker
         """
         config = test_config.copy()
         config['zookeeper'] = {'hosts': 'zk_hosts', 'threads': 20}
@@ -443,11 +689,14 @@ class APIMakeServiceTests(TestCase):
         # setup_scheduler and store.kz_client is not called yet, and nothing
         # added to the health checker
         self.assertFalse(mock_setup_scheduler.called)
+        self.assertFalse(mock_setup_counts_repair.called)
         self.assertIsNone(self.store.kz_client)
 
         # they are called after start completes
         start_d.callback(None)
-        mock_setup_scheduler.assert_called_once_with(parent, self.store, kz_client)
+        mock_setup_scheduler.assert_called_once_with(parent, self.store, kz_client,
+                                                     metrics=None)
+        mock_setup_counts_repair.assert_called_once_with(parent, self.store, kz_client)
         self.assertEqual(self.store.kz_client, kz_client)
         self.assertEqual(self.health_checker.checks['scheduler'],
                          mock_setup_scheduler.return_value.health_check)
@@ -562,8 +811,133 @@ class SchedulerSetupTests(TestCase):
         buckets = range(1, 11)
         self.store.set_scheduler_buckets.assert_called_once_with(buckets)
         self.scheduler_service.assert_called_once_with(
-            100, 10, self.store, self.kz_client, '/part_path', 15, buckets)
+            100, 10, self.store, self.kz_client, '/part_path', 15, buckets,
+            event_driven=False, prefetch=0, limiter=None, metrics=None,
+            partitioner=None, retired_buckets=[], lease=None)
         self.scheduler_service.return_value.setServiceParent.assert_called_once_with(self.parent)
+        self.assertFalse(self.store.set_event_listener.called)
+
+    def test_event_driven(self):
+        """
+        `SchedulerService` is created in event driven mode if configured and the
+        store tells it about the events added
+        """
+        self.config['scheduler']['event_driven'] = True
+        set_config_data(self.config)
+
+        setup_scheduler(self.parent, self.store, self.kz_client)
+
+        self.scheduler_service.assert_called_once_with(
+            100, 10, self.store, self.kz_client, '/part_path', 15, range(1, 11),
+            event_driven=True, prefetch=0, limiter=None, metrics=None,
+            partitioner=None, retired_buckets=[], lease=None)
+        self.store.set_event_listener.assert_called_once_with(
+            self.scheduler_service.return_value.events_added)
+
+    def test_lease(self):
+        """
+        `SchedulerService` is created to claim events with configured lease
+        """
+        self.config['scheduler']['lease'] = 60
+        set_config_data(self.config)
+
+        setup_scheduler(self.parent, self.store, self.kz_client)
+
+        self.scheduler_service.assert_called_once_with(
+            100, 10, self.store, self.kz_client, '/part_path', 15, range(1, 11),
+            event_driven=False, prefetch=0, limiter=None, metrics=None,
+            partitioner=None, retired_buckets=[], lease=60)
+
+    def test_prefetch(self):
+        """
+        `SchedulerService` is created with configured prefetch depth
+        """
+        self.config['scheduler']['prefetch'] = 2
+        set_config_data(self.config)
+
+        setup_scheduler(self.parent, self.store, self.kz_client)
+
+        self.scheduler_service.assert_called_once_with(
+            100, 10, self.store, self.kz_client, '/part_path', 15, range(1, 11),
+            event_driven=False, prefetch=2, limiter=None, metrics=None,
+            partitioner=None, retired_buckets=[], lease=None)
+
+    @mock.patch('otter.tap.api.FairLimiter')
+    def test_execution_limit(self, mock_limiter):
+        """
+        `SchedulerService` is created with a `FairLimiter` if maximum concurrent
+        executions is configured, with limits converted to ``int``
+        """
+        self.config['scheduler']['execution'] = {'max_concurrent': '50',
+                                                 'max_concurrent_per_tenant': '5'}
+        set_config_data(self.config)
+
+        setup_scheduler(self.parent, self.store, self.kz_client)
+
+        mock_limiter.assert_called_once_with(50, key_limit=5)
+        self.scheduler_service.assert_called_once_with(
+            100, 10, self.store, self.kz_client, '/part_path', 15, range(1, 11),
+            event_driven=False, prefetch=0, limiter=mock_limiter.return_value,
+            metrics=None, partitioner=None, retired_buckets=[], lease=None)
+
+    def test_metrics(self):
+        """
+        `SchedulerService` is created with given metrics
+        """
+        setup_scheduler(self.parent, self.store, self.kz_client, metrics='metrics')
+
+        self.scheduler_service.assert_called_once_with(
+            100, 10, self.store, self.kz_client, '/part_path', 15, range(1, 11),
+            event_driven=False, prefetch=0, limiter=None, metrics='metrics',
+            partitioner=None, retired_buckets=[], lease=None)
+
+    @mock.patch('otter.tap.api.ConsistentHashPartitioner')
+    def test_consistent_hash_partition(self, mock_partitioner):
+        """
+        `SchedulerService` is created with `ConsistentHashPartitioner` bound to the
+        kazoo client if configured
+        """
+        self.config['scheduler']['partition']['mode'] = 'consistent_hash'
+        set_config_data(self.config)
+
+        setup_scheduler(self.parent, self.store, self.kz_client)
+
+        partitioner = self.scheduler_service.call_args[1]['partitioner']
+        partitioner('/part_path', set=set([1]), time_boundary=15)
+        mock_partitioner.assert_called_once_with(self.kz_client, '/part_path', set=set([1]),
+                                                 time_boundary=15)
+
+    def test_retired_buckets(self):
+        """
+        When number of buckets is reduced, events are added to new buckets while the
+        old buckets beyond them are still partitioned and given as retired
+        """
+        self.config['scheduler']['buckets'] = 5
+        self.config['scheduler']['previous_buckets'] = 8
+        set_config_data(self.config)
+
+        setup_scheduler(self.parent, self.store, self.kz_client)
+
+        self.store.set_scheduler_buckets.assert_called_once_with(range(1, 6))
+        self.scheduler_service.assert_called_once_with(
+            100, 10, self.store, self.kz_client, '/part_path', 15, range(1, 9),
+            event_driven=False, prefetch=0, limiter=None, metrics=None,
+            partitioner=None, retired_buckets=[6, 7, 8], lease=None)
+
+    def test_more_buckets(self):
+        """
+        When number of buckets is increased, there are no retired buckets
+        """
+        self.config['scheduler']['previous_buckets'] = 5
+        set_config_data(self.config)
+
+        setup_scheduler(self.parent, self.store, self.kz_client)
+
+        self.store.set_scheduler_buckets.assert_called_once_with(range(1, 11))
+        self.scheduler_service.assert_called_once_with(
+            100, 10, self.store, self.kz_client, '/part_path', 15, range(1, 11),
+            event_driven=False, prefetch=0, limiter=None, metrics=None,
+            partitioner=None, retired_buckets=[], lease=None)
 
     def test_mock_store_with_scheduler(self):
         """
@@ -576,3 +950,102 @@ class SchedulerSetupTests(TestCase):
 
         self.assertFalse(self.store.set_scheduler_buckets.called)
         self.assertFalse(self.scheduler_service.called)
+
+
+class CountsRepairSetupTests(TestCase):
+    """
+    Tests for `setup_counts_repair`
+    """
+
+    def setUp(self):
+        """
+        Mock args
+        """
+        self.repair_service = patch(self, 'otter.tap.api.CountsRepairService')
+        self.parent = mock.Mock()
+        self.store = mock.Mock()
+        self.kz_client = mock.Mock()
+        self.addCleanup(set_config_data, {})
+
+    def test_not_configured(self):
+        """
+        No service is created if the repair interval is not configured
+        """
+        set_config_data({'cassandra': {'resource_counts': {'limits': True}}})
+        self.assertIsNone(setup_counts_repair(self.parent, self.store, self.kz_client))
+        self.assertFalse(self.repair_service.called)
+
+    def test_mock_store(self):
+        """
+        No service is created with the mock store
+        """
+        set_config_data({'mock': True,
+                         'cassandra': {'resource_counts': {'repair_interval': 60}}})
+        self.assertIsNone(setup_counts_repair(self.parent, self.store, self.kz_client))
+        self.assertFalse(self.repair_service.called)
+
+    def test_configured(self):
+        """
+        `CountsRepairService` is created with the repair interval and set as
+        child of passed `MultiService`
+        """
+        set_config_data({'cassandra': {'resource_counts': {'repair_interval': 60}}})
+        self.assertIs(setup_counts_repair(self.parent, self.store, self.kz_client),
+                      self.repair_service.return_value)
+        self.repair_service.assert_called_once_with(self.store, self.kz_client, 60)
+        self.repair_service.return_value.setServiceParent.assert_called_once_with(
+            self.parent)
+
+
+class DeletionSetupTests(TestCase):
+    """
+    Tests for `setup_deletion_service`
+    """
+
+    def setUp(self):
+        """
+        Mock args
+        """
+        self.deletion_service = patch(self, 'otter.tap.api.DeletionService')
+        self.parent = mock.Mock()
+        self.store = mock.Mock()
+        self.supervisor = mock.Mock()
+        self.addCleanup(set_config_data, {})
+        self.addCleanup(set_deletion_queue, None)
+
+    def test_not_configured(self):
+        """
+        No service is created and there is no deletion queue if not configured
+        """
+        set_config_data({})
+        self.assertIsNone(setup_deletion_service(self.parent, self.store, self.supervisor))
+        self.assertFalse(self.deletion_service.called)
+        self.assertIsNone(get_deletion_queue())
+
+    def test_defaults(self):
+        """
+        `DeletionService` is created with defaults, set as child of passed
+        `MultiService` and the store is set as the deletion queue
+        """
+        set_config_data({'deletion': {'interval': 5}})
+        setup_deletion_service(self.parent, self.store, self.supervisor)
+        self.deletion_service.assert_called_once_with(
+            self.store, self.supervisor, 5, batchsize=100, lease=600, limiter=None,
+            lb_limit=None)
+        self.deletion_service.return_value.setServiceParent.assert_called_once_with(
+            self.parent)
+        self.assertIs(get_deletion_queue(), self.store)
+
+    def test_limits(self):
+        """
+        Deletions are limited in total, per tenant and per load balancer as configured
+        """
+        set_config_data({'deletion': {'max_concurrent': 20, 'max_concurrent_per_tenant': 5,
+                                      'max_concurrent_per_lb': 1, 'batchsize': 50,
+                                      'lease': 300}})
+        setup_deletion_service(self.parent, self.store, self.supervisor)
+        self.deletion_service.assert_called_once_with(
+            self.store, self.supervisor, 10, batchsize=50, lease=300, limiter=mock.ANY,
+            lb_limit=1)
+        limiter = self.deletion_service.call_args[1]['limiter']
+        self.assertEqual((limiter.limit, limiter.key_limit), (20, 5))
@@ -602,6 +602,10 @@ class ObeyConfigChangeTestCase(TestCase):
         self.exec_scale_down = patch(
             self, 'otter.controller.exec_scale_down',
             return_value=defer.succeed(None))
+        self.maintain_warm_pool = patch(
+            self, 'otter.controller.maintain_warm_pool',
+            side_effect=lambda log, txn, config, group, state, launch=None:
+            defer.succeed(state))
 
         self.log = mock.MagicMock()
         self.state = mock.MagicMock(spec=['get_capacity'])
@@ -622,6 +626,29 @@ class ObeyConfigChangeTestCase(TestCase):
                                       'config', self.group, self.state)
         self.log.bind.assert_called_once_with(scaling_group_id=self.group.uuid)
 
+    def test_warm_pool_maintained(self):
+        """
+        The warm pool is maintained after scaling, or if there is no change in
+        servers, with the launch config if it was read
+        """
+        for delta in (0, -1):
+            self.calculate_delta.return_value = delta
+            d = controller.obey_config_change(self.log, 'transaction-id',
+                                              'config', self.group, self.state)
+            self.assertIs(self.successResultOf(d), self.state)
+            self.maintain_warm_pool.assert_called_once_with(
+                self.log.bind.return_value, 'transaction-id', 'config', self.group,
+                self.state)
+            self.maintain_warm_pool.reset_mock()
+
+        self.calculate_delta.return_value = 1
+        d = controller.obey_config_change(self.log, 'transaction-id',
+                                          'config', self.group, self.state)
+        self.assertIs(self.successResultOf(d), self.state)
+        self.maintain_warm_pool.assert_called_once_with(
+            self.log.bind.return_value, 'transaction-id', 'config', self.group,
+            self.state, 'launch')
+
     def test_zero_delta_nothing_happens_state_is_returned(self):
         """
         If the delta is zero, ``execute_launch_config`` is not called and
@@ -882,6 +909,27 @@ class DeleteActiveServersTests(TestCase):
         # now pool should be empty
         self.successResultOf(done)
 
+    def test_queued(self):
+        """
+        When there is a deletion queue, servers to evict are removed from state and
+        queued to be deleted instead of creating `_DeleteJob`
+        """
+        queue = mock.Mock(spec=['add_server_deletions'])
+        queue.add_server_deletions.return_value = defer.succeed(None)
+        patch(self, 'otter.controller.get_deletion_queue', return_value=queue)
+        group = mock.Mock(tenant_id='t', uuid='g')
+
+        d = controller.delete_active_servers(self.log, 'trans-id', group, 3,
+                                             self.fake_state)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertTrue(
+            all([_id not in self.fake_state.active for _id in self.evict_servers]))
+        queue.add_server_deletions.assert_called_once_with(
+            self.log, 'trans-id', 't', 'g', self.evict_servers.values())
+        self.assertFalse(self.del_job.called)
+        self.successResultOf(self.supervisor.deferred_pool.notify_when_empty())
+
 
 class DeleteJobTests(TestCase):
     """
@@ -984,6 +1032,25 @@ class ExecScaleDownTests(TestCase):
                                                         'g', 2,
                                                         self.fake_state)
 
+    def test_waits_for_queueing_deletions(self):
+        """
+        The deferred returned by ``delete_active_servers`` when servers are queued
+        to be deleted is returned
+        """
+        self.find_pending_jobs_to_cancel.return_value = []
+        self.del_active_servers.return_value = defer.Deferred()
+        d = controller.exec_scale_down(self.log, 'tid', self.fake_state, 'g', 2)
+        self.assertIs(d, self.del_active_servers.return_value)
+
+    def test_no_deletion_queue(self):
+        """
+        Returns a Deferred firing with None when deleting servers without a queue
+        """
+        self.find_pending_jobs_to_cancel.return_value = []
+        self.del_active_servers.return_value = None
+        d = controller.exec_scale_down(self.log, 'tid', self.fake_state, 'g', 2)
+        self.assertIsNone(self.successResultOf(d))
+
     def test_del_active_servers_not_called(self):
         """
         ``delete_active_servers`` is not called when pending jobs are enough
@@ -1015,6 +1082,10 @@ class MaybeExecuteScalingPolicyTestCase(TestCase):
             self.mocks[thing] = patch(self,
                                       'otter.controller.{0}'.format(thing),
                                       return_value=return_val)
+        self.mocks['maintain_warm_pool'] = patch(
+            self, 'otter.controller.maintain_warm_pool',
+            side_effect=lambda log, txn, config, group, state, launch=None:
+            defer.succeed(state))
 
         self.mock_log = mock.MagicMock()
         self.mock_state = mock.MagicMock(GroupState)
@@ -1084,6 +1155,38 @@ class MaybeExecuteScalingPolicyTestCase(TestCase):
         # state should have been updated
         self.mock_state.mark_executed.assert_called_once_with('pol1')
 
+    def test_execution_bundle_not_read_again(self):
+        """
+        If the configs and the policy are given, as read along with the state,
+        they are used without reading them from the group
+        """
+        d = controller.maybe_execute_scaling_policy(
+            self.mock_log, 'transaction', self.group, self.mock_state, 'pol1',
+            config='given config', launch='given launch', policy='given policy')
+        self.assertEqual(self.successResultOf(d), self.mock_state)
+        self.assertFalse(self.group.get_policy.called)
+        self.assertFalse(self.group.view_config.called)
+        self.assertFalse(self.group.view_launch_config.called)
+        self.mocks['check_cooldowns'].assert_called_once_with(
+            self.mock_log.bind.return_value, self.mock_state, 'given config',
+            'given policy', 'pol1')
+        self.mocks['execute_launch_config'].assert_called_once_with(
+            self.mock_log.bind.return_value.bind.return_value,
+            'transaction', self.mock_state, 'given launch', self.group,
+            self.mocks['calculate_delta'].return_value)
+
+    def test_warm_pool_maintained_on_positive_delta(self):
+        """
+        The warm pool is maintained after executing the launch config
+        """
+        d = controller.maybe_execute_scaling_policy(self.mock_log, 'transaction',
+                                                    self.group, self.mock_state,
+                                                    'pol1')
+        self.successResultOf(d)
+        self.mocks['maintain_warm_pool'].assert_called_once_with(
+            self.mock_log.bind.return_value.bind.return_value, 'transaction',
+            'config', self.group, self.mock_state, 'launch')
+
     def test_execute_launch_config_failure_on_positive_delta(self):
         """
         If ``execute_launch_config`` fails for some reason, then state should
@@ -1421,6 +1524,270 @@ class ExecuteLaunchConfigTestCase(TestCase):
             CheckFailure(AssertionError))
 
 
+class WarmPoolTests(TestCase):
+    """
+    Tests for the warm pool of standby servers: :func:`controller.maintain_warm_pool`
+    and its use by :func:`controller.execute_launch_config`
+    """
+
+    def setUp(self):
+        """
+        Mock the supervisor and the deletion of servers, and set up a state with a
+        standby server built from the launch config
+        """
+        self.execute_config_deferreds = []
+
+        def fake_execute(*args, **kwargs):
+            d = defer.Deferred()
+            self.execute_config_deferreds.append(d)
+            return defer.succeed((str(len(self.execute_config_deferreds)), d))
+
+        self.supervisor = iMock(ISupervisor)
+        self.supervisor.execute_config.side_effect = fake_execute
+        self.supervisor.execute_promote_server.side_effect = fake_execute
+        patch(self, 'otter.controller.get_supervisor', return_value=self.supervisor)
+        self.delete_servers = patch(self, 'otter.controller._delete_servers',
+                                    return_value=None)
+
+        self.log = mock_log()
+        self.group = iMock(IScalingGroup, tenant_id='tenant', uuid='group')
+        self.launch = {'type': 'launch_server',
+                       'args': {'server': {'imageRef': 'i'},
+                                'loadBalancers': [{'loadBalancerId': 1, 'port': 80}]}}
+        self.key = controller.standby_key(self.launch)
+        self.state = GroupState('tenant', 'group', 'name', {}, {}, None, {}, False,
+                                now=lambda: '2014-01-01T00:00:00Z')
+        self.state.add_standby('s1', {'id': 's1', 'config': self.key,
+                                      'created': '2014-01-01T00:00:00Z'})
+
+        def fake_modify_state(callback, *args, **kwargs):
+            return defer.maybeDeferred(callback, self.group, self.state, *args,
+                                       **kwargs)
+
+        self.group.modify_state.side_effect = fake_modify_state
+        self.group.view_config.side_effect = lambda: defer.succeed({'warmPoolSize': 3})
+        self.group.view_launch_config.side_effect = lambda: defer.succeed(self.launch)
+
+        self.clock = Clock()
+        self.failures = controller.StandbyFailures(delay=10, max_delay=40,
+                                                   max_failures=4, clock=self.clock)
+        controller.set_standby_failures(self.failures)
+        self.addCleanup(controller.set_standby_failures, None)
+
+    def test_standby_key_ignores_load_balancers(self):
+        """
+        The key of a launch config depends on its server args only
+        """
+        launch = {'type': 'launch_server', 'args': {'server': {'imageRef': 'i'}}}
+        self.assertEqual(controller.standby_key(launch), self.key)
+        launch['args']['server']['imageRef'] = 'other'
+        self.assertNotEqual(controller.standby_key(launch), self.key)
+
+    def test_scale_up_promotes_standby_servers_first(self):
+        """
+        ``execute_launch_config`` puts standby servers built from the launch
+        config into service, and launches new servers for the rest of the delta
+        """
+        self.state.add_standby('s2', {'id': 's2', 'config': 'old',
+                                      'created': '2014-01-01T00:00:00Z'})
+        d = controller.execute_launch_config(self.log, '1', self.state,
+                                             self.launch, self.group, 2)
+        self.successResultOf(d)
+        self.supervisor.execute_promote_server.assert_called_once_with(
+            mock.ANY, '1', self.group, self.launch,
+            {'id': 's1', 'config': self.key, 'created': '2014-01-01T00:00:00Z'})
+        self.supervisor.execute_config.assert_called_once_with(
+            mock.ANY, '1', self.group, self.launch)
+        self.assertEqual(sorted(self.state.pending), ['1', '2'])
+        self.assertEqual(self.state.standby.keys(), ['s2'])
+
+        self.execute_config_deferreds[0].callback({'id': 's1'})
+        self.assertEqual(self.state.active,
+                         {'s1': {'id': 's1', 'created': '2014-01-01T00:00:00Z'}})
+
+    def test_builds_missing_standby_servers(self):
+        """
+        ``maintain_warm_pool`` starts jobs building the missing standby servers
+        from the launch config without its load balancers, which are added to
+        the warm pool once built
+        """
+        d = controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 3},
+                                          self.group, self.state, self.launch)
+        self.assertIs(self.successResultOf(d), self.state)
+        self.assertEqual(
+            self.supervisor.execute_config.mock_calls,
+            [mock.call(mock.ANY, '1', self.group,
+                       {'type': 'launch_server',
+                        'args': {'server': {'imageRef': 'i'}}})] * 2)
+        self.assertEqual(sorted(self.state.standby_pending), ['1', '2'])
+        self.assertEqual(self.state.get_capacity()['desired_capacity'], 0)
+
+        self.execute_config_deferreds[0].callback({'id': 's3'})
+        self.assertEqual(self.state.standby_pending.keys(), ['2'])
+        self.assertEqual(self.state.standby['s3'],
+                         {'id': 's3', 'config': self.key,
+                          'created': '2014-01-01T00:00:00Z'})
+
+    def test_failed_standby_job_replaced(self):
+        """
+        When a job building a standby server fails, it is removed and the warm
+        pool is maintained again after a delay, building another standby server
+        """
+        controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 3},
+                                      self.group, self.state, self.launch)
+        self.assertEqual(sorted(self.state.standby_pending), ['1', '2'])
+        self.execute_config_deferreds[0].errback(DummyException('meh'))
+        self.assertEqual(self.state.standby_pending.keys(), ['2'])
+        self.clock.advance(9)
+        self.assertEqual(self.supervisor.execute_config.call_count, 2)
+        self.clock.advance(1)
+        self.assertEqual(sorted(self.state.standby_pending), ['2', '3'])
+        self.assertEqual(self.supervisor.execute_config.call_count, 3)
+        self.flushLoggedErrors(DummyException)
+
+    def test_failing_standby_jobs_back_off(self):
+        """
+        Standby jobs failing in a row are replaced after delays doubling up to
+        the maximum delay, and not at all after the maximum number of failures
+        """
+        controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 2},
+                                      self.group, self.state, self.launch)
+        self.group.view_config.side_effect = lambda: defer.succeed({'warmPoolSize': 2})
+        delays = []
+        for _ in range(5):
+            self.execute_config_deferreds[-1].errback(DummyException('meh'))
+            started = self.supervisor.execute_config.call_count
+            for waited in range(1, 100):
+                self.clock.advance(1)
+                if self.supervisor.execute_config.call_count > started:
+                    delays.append(waited)
+                    break
+        self.assertEqual(delays, [10, 20, 40, 40])
+        self.assertEqual(self.supervisor.execute_config.call_count, 5)
+        self.assertEqual(self.state.standby_pending, {})
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.flushLoggedErrors(DummyException)
+
+    def test_built_standby_server_resets_backoff(self):
+        """
+        Once a standby server is built, the next failure of a standby job of the
+        group is replaced after the initial delay again
+        """
+        controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 3},
+                                      self.group, self.state, self.launch)
+        self.execute_config_deferreds[0].errback(DummyException('meh'))
+        self.clock.advance(10)
+        self.execute_config_deferreds[1].callback({'id': 's2'})
+        self.execute_config_deferreds[2].errback(DummyException('meh'))
+        self.clock.advance(10)
+        self.assertEqual(self.supervisor.execute_config.call_count, 4)
+        self.flushLoggedErrors(DummyException)
+
+    def test_standby_failures_bounded(self):
+        """
+        ``StandbyFailures`` forgets the least recently failed groups beyond
+        `max_groups`
+        """
+        failures = controller.StandbyFailures(delay=1, max_groups=2, clock=self.clock)
+        groups = [mock.Mock(tenant_id='t', uuid=str(i)) for i in range(3)]
+        for group in [groups[0], groups[0], groups[1], groups[2]]:
+            failures.failed(group)
+        self.assertEqual(failures.failed(groups[0]), 1)
+        self.assertEqual(failures.failed(groups[2]), 2)
+
+    def test_failed_standby_job_of_deleted_group(self):
+        """
+        The warm pool of a group deleted while a standby job was building is not
+        maintained
+        """
+        controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 2},
+                                      self.group, self.state, self.launch)
+        self.group.modify_state.side_effect = lambda *a, **kw: defer.fail(
+            NoSuchScalingGroupError('tenant', 'group'))
+        self.execute_config_deferreds[0].errback(DummyException('meh'))
+        self.clock.advance(10)
+        self.assertEqual(self.supervisor.execute_config.call_count, 1)
+        self.assertEqual(self.flushLoggedErrors(NoSuchScalingGroupError), [])
+        self.flushLoggedErrors(DummyException)
+
+    def test_obey_warm_pool_change(self):
+        """
+        ``obey_warm_pool_change`` reads the group config and maintains the warm
+        pool with the given launch config
+        """
+        launch = {'type': 'launch_server', 'args': {'server': {'imageRef': 'new'}}}
+        d = controller.obey_warm_pool_change(self.log, '1', self.group, self.state,
+                                             launch=launch)
+        self.assertIs(self.successResultOf(d), self.state)
+        self.assertEqual(self.state.standby, {})
+        self.assertEqual(self.delete_servers.call_count, 1)
+        self.assertEqual(self.supervisor.execute_config.call_count, 3)
+        self.assertFalse(self.group.view_launch_config.called)
+
+    def test_reads_launch_config_if_not_given(self):
+        """
+        ``maintain_warm_pool`` reads the launch config if it is not given
+        """
+        self.group.view_launch_config.return_value = defer.succeed(self.launch)
+        d = controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 2},
+                                          self.group, self.state)
+        self.assertIs(self.successResultOf(d), self.state)
+        self.assertEqual(self.supervisor.execute_config.call_count, 1)
+
+    def test_nothing_without_warm_pool(self):
+        """
+        ``maintain_warm_pool`` does nothing for groups without warm pool
+        """
+        state = GroupState('tenant', 'group', 'name', {}, {}, None, {}, False)
+        d = controller.maintain_warm_pool(self.log, '1', {}, self.group, state)
+        self.assertIs(self.successResultOf(d), state)
+        self.assertFalse(self.group.view_launch_config.called)
+
+    def test_deletes_outdated_and_excess_standby_servers(self):
+        """
+        ``maintain_warm_pool`` deletes standby servers built from another launch
+        config or beyond the warm pool size, and cancels jobs building them
+        """
+        self.state.add_standby('s2', {'id': 's2', 'config': 'old'})
+        self.state.add_standby_job('j1', 'old')
+        self.state.add_standby_job('j2', self.key)
+        d = controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 0},
+                                          self.group, self.state, self.launch)
+        self.assertIs(self.successResultOf(d), self.state)
+        self.assertEqual(self.state.standby, {})
+        self.assertEqual(self.state.standby_pending, {})
+        self.delete_servers.assert_called_once_with(
+            mock.ANY, '1', self.group, mock.ANY)
+        self.assertEqual(
+            sorted(server['id'] for server in self.delete_servers.call_args[0][3]),
+            ['s1', 's2'])
+        self.assertFalse(self.supervisor.execute_config.called)
+
+    def test_waits_for_queued_deletions(self):
+        """
+        ``maintain_warm_pool`` fires once the deleted standby servers are queued
+        """
+        deleted = defer.Deferred()
+        self.delete_servers.return_value = deleted
+        d = controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 0},
+                                          self.group, self.state, self.launch)
+        self.assertNoResult(d)
+        deleted.callback(None)
+        self.assertIs(self.successResultOf(d), self.state)
+
+    def test_cancelled_standby_server_deleted(self):
+        """
+        A standby server whose job was cancelled is deleted once built
+        """
+        del_job = patch(self, 'otter.controller._DeleteJob')
+        controller.maintain_warm_pool(self.log, '1', {'warmPoolSize': 2},
+                                      self.group, self.state, self.launch)
+        self.state.remove_standby_job('1')
+        self.execute_config_deferreds[0].callback({'id': 's3'})
+        self.assertNotIn('s3', self.state.standby)
+        del_job.return_value.start.assert_called_once_with()
+
+
 class DummyException(Exception):
     """
     Dummy exception used in tests
@@ -1694,3 +2061,482 @@ class PrivateJobHelperTestCase(TestCase):
 
         self.log.bind.return_value.err.assert_called_once_with(
             CheckFailure(DummyException))
+
+    def test_job_completion_coalesced(self):
+        """
+        If there is a completion coalescer, job completion modifies state through
+        it and the change is added to the supervisor's deferred pool
+        """
+        coalescer = mock.Mock(spec=['modify_state'])
+        coalescer.modify_state.return_value = defer.Deferred()
+        patch(self, 'otter.controller.get_completion_coalescer', return_value=coalescer)
+        self.supervisor.deferred_pool = DeferredPool()
+
+        self.job.start('launch')
+        self.completion_deferred.callback({'id': 'active'})
+
+        coalescer.modify_state.assert_called_once_with(self.group, mock.ANY)
+        self.assertFalse(self.group.modify_state.called)
+        empty = self.supervisor.deferred_pool.notify_when_empty()
+        self.assertNoResult(empty)
+        coalescer.modify_state.return_value.callback(None)
+        self.successResultOf(empty)
+
+
+class CompletionCoalescerTests(TestCase):
+    """
+    Tests for :class:`controller.CompletionCoalescer`
+    """
+
+    def setUp(self):
+        """
+        Coalescer of up to 3 changes in 1 second and a group recording the states
+        it saves
+        """
+        self.clock = Clock()
+        self.coalescer = controller.CompletionCoalescer(1, 3, clock=self.clock)
+        self.group = iMock(IScalingGroup, tenant_id='tenant', uuid='group')
+        self.saved = []
+
+        def modify_state(modifier):
+            self.saved.append(modifier(self.group, []))
+            return defer.succeed(None)
+
+        self.group.modify_state.side_effect = modify_state
+
+    def change(self, item):
+        """
+        Return state modifier appending `item` to the list state
+        """
+        return lambda group, state: state + [item]
+
+    def test_coalesced_in_window(self):
+        """
+        Changes of a group within the window are applied in order in one
+        `modify_state` after the window
+        """
+        ds = [self.coalescer.modify_state(self.group, self.change(i)) for i in range(2)]
+        self.assertEqual(self.saved, [])
+        self.clock.advance(1)
+        self.assertEqual(self.saved, [[0, 1]])
+        for d in ds:
+            self.assertIsNone(self.successResultOf(d))
+
+    def test_flushed_at_max_batch(self):
+        """
+        Changes are applied as soon as there are `max_batch` of them
+        """
+        for i in range(4):
+            self.coalescer.modify_state(self.group, self.change(i))
+        self.assertEqual(self.saved, [[0, 1, 2]])
+        self.clock.advance(1)
+        self.assertEqual(self.saved, [[0, 1, 2], [3]])
+
+    def test_groups_separate(self):
+        """
+        Changes of different groups are applied to their own groups
+        """
+        other = iMock(IScalingGroup, tenant_id='tenant', uuid='other')
+        other.modify_state.return_value = defer.succeed(None)
+        self.coalescer.modify_state(self.group, self.change(0))
+        self.coalescer.modify_state(other, self.change(1))
+        self.clock.advance(1)
+        self.assertEqual(self.saved, [[0]])
+        self.assertEqual(other.modify_state.call_count, 1)
+
+    def test_failing_change_fails_alone(self):
+        """
+        A change that raises fails its Deferred while the other changes are saved
+        """
+        def fail(group, state):
+            raise DummyException('e')
+
+        d1 = self.coalescer.modify_state(self.group, fail)
+        d2 = self.coalescer.modify_state(self.group, self.change(1))
+        self.clock.advance(1)
+        self.failureResultOf(d1, DummyException)
+        self.assertIsNone(self.successResultOf(d2))
+        self.assertEqual(self.saved, [[1]])
+
+    def test_failing_change_mutations_discarded(self):
+        """
+        Mutations a change made to the state before raising are not saved
+        """
+        def fail(group, state):
+            state.append('partial')
+            raise DummyException('e')
+
+        d1 = self.coalescer.modify_state(self.group, self.change(0))
+        d2 = self.coalescer.modify_state(self.group, fail)
+        d3 = self.coalescer.modify_state(self.group, self.change(2))
+        self.failureResultOf(d2, DummyException)
+        self.assertIsNone(self.successResultOf(d1))
+        self.assertIsNone(self.successResultOf(d3))
+        self.assertEqual(self.saved, [[0, 2]])
+
+    def test_modify_state_failure(self):
+        """
+        If saving the changes fails, all of them fail with the same error
+        """
+        self.group.modify_state.side_effect = lambda modifier: defer.fail(
+            NoSuchScalingGroupError('tenant', 'group'))
+        ds = [self.coalescer.modify_state(self.group, self.change(i)) for i in range(2)]
+        self.clock.advance(1)
+        for d in ds:
+            self.failureResultOf(d, NoSuchScalingGroupError)
+
+
+class CooldownCacheTests(TestCase):
+    """
+    Tests for :class:`controller.CooldownCache` and
+    :func:`controller.modify_state_unless_cooling_down`
+    """
+
+    def setUp(self):
+        """
+        Cache trusted for 10 seconds with 2 seconds margin, at 2014-01-01T00:00:00Z
+        """
+        self.clock = Clock()
+        self.clock.advance(1388534400)
+        self.cache = controller.CooldownCache(10, 2, clock=self.clock)
+        self.group = iMock(IScalingGroup, tenant_id='tenant', uuid='group')
+        self.config = {'cooldown': 30}
+        self.policy = {'cooldown': 60}
+
+    def state(self, group_touched=None, policy_touched=None):
+        """
+        Return group state touched at given times
+        """
+        return GroupState('tenant', 'group', 'name', {}, {}, group_touched,
+                          policy_touched or {}, False)
+
+    def test_not_known(self):
+        """
+        Nothing is rejected for a group that is not cached
+        """
+        self.assertFalse(self.cache.rejects(self.group, 'pol'))
+
+    def test_never_touched(self):
+        """
+        Nothing is rejected if group and policy were never executed
+        """
+        self.cache.update(self.group, self.state(), self.config, self.policy, 'pol')
+        self.assertFalse(self.cache.rejects(self.group, 'pol'))
+
+    def test_group_cooldown(self):
+        """
+        Any policy of the group is rejected while group cooldown has more than
+        `margin` seconds left
+        """
+        self.cache.update(self.group, self.state('2013-12-31T23:59:40Z'),
+                          self.config, self.policy, 'pol')
+        self.assertTrue(self.cache.rejects(self.group, 'pol'))
+        self.assertTrue(self.cache.rejects(self.group, 'other'))
+        self.clock.advance(7)
+        self.assertTrue(self.cache.rejects(self.group, 'other'))
+        self.clock.advance(1)
+        self.assertFalse(self.cache.rejects(self.group, 'other'))
+
+    def test_policy_cooldown(self):
+        """
+        Only the policy is rejected while its cooldown has more than `margin`
+        seconds left
+        """
+        self.cache.update(self.group,
+                          self.state('2013-12-31T23:58:00Z', {'pol': '2013-12-31T23:59:30Z'}),
+                          self.config, self.policy, 'pol')
+        self.assertTrue(self.cache.rejects(self.group, 'pol'))
+        self.assertFalse(self.cache.rejects(self.group, 'other'))
+
+    def test_group_cooldown_from_other_group(self):
+        """
+        Cooldowns of one group do not reject policies of another
+        """
+        self.cache.update(self.group, self.state('2013-12-31T23:59:50Z'),
+                          self.config, self.policy, 'pol')
+        other = iMock(IScalingGroup, tenant_id='tenant', uuid='other')
+        self.assertFalse(self.cache.rejects(other, 'pol'))
+
+    def test_expires_after_ttl(self):
+        """
+        Entries older than `ttl` seconds are dropped and reject nothing
+        """
+        self.cache.update(self.group, self.state(None, {'pol': '2013-12-31T23:59:59Z'}),
+                          self.config, self.policy, 'pol')
+        self.clock.advance(11)
+        self.assertFalse(self.cache.rejects(self.group, 'pol'))
+        self.assertEqual(self.cache._groups, {})
+
+    def test_update_keeps_other_policies(self):
+        """
+        Updating for one policy keeps cooldowns of other policies that have not ended
+        """
+        self.cache.update(self.group, self.state(None, {'p1': '2013-12-31T23:59:59Z'}),
+                          self.config, self.policy, 'p1')
+        self.cache.update(self.group, self.state(None, {'p1': '2013-12-31T23:59:59Z'}),
+                          self.config, self.policy, 'p2')
+        self.assertTrue(self.cache.rejects(self.group, 'p1'))
+        self.assertFalse(self.cache.rejects(self.group, 'p2'))
+
+    def execute_saving(self, modifier, save, **kwargs):
+        """
+        Execute policy 'pol' through `modify_state_unless_cooling_down` with the
+        cache, calling `modifier` with a state touched long ago and saving the
+        state it returns with Deferred `save`
+        """
+        patch(self, 'otter.controller.get_cooldown_cache', return_value=self.cache)
+
+        def modify_state_for_policy(execute, policy_id, version):
+            d = execute(self.group, self.state(), config=self.config, launch={},
+                        policy=self.policy)
+            return d.addCallback(lambda _: save)
+
+        self.group.modify_state_for_policy.side_effect = modify_state_for_policy
+        return controller.modify_state_unless_cooling_down(
+            mock_log(), self.group, 'pol', modifier, **kwargs)
+
+    def executed(self, group, state, **kwargs):
+        """
+        Modifier executing the policy now
+        """
+        return self.state('2014-01-01T00:00:00Z', {'pol': '2014-01-01T00:00:00Z'})
+
+    def test_updated_after_execution_saved(self):
+        """
+        Cooldowns of the state left by an executed policy are remembered once that
+        state is saved
+        """
+        save = defer.Deferred()
+        d = self.execute_saving(self.executed, save)
+        self.assertFalse(self.cache.rejects(self.group, 'pol'))
+        save.callback(None)
+        self.successResultOf(d)
+        self.assertTrue(self.cache.rejects(self.group, 'pol'))
+        self.assertTrue(self.cache.rejects(self.group, 'other'))
+
+    def test_not_updated_if_save_fails(self):
+        """
+        Cooldowns are not remembered if the state of an executed policy could not
+        be saved
+        """
+        d = self.execute_saving(self.executed, defer.fail(DummyException('save')))
+        self.failureResultOf(d, DummyException)
+        self.assertEqual(self.cache._groups, {})
+
+    def test_not_updated_if_not_executed(self):
+        """
+        Cooldowns are not remembered if the policy is not executed, like when it
+        would not change the number of servers
+        """
+        def no_change(group, state, **kwargs):
+            raise controller.CannotExecutePolicyError('tenant', 'group', 'pol',
+                                                      'No change in servers')
+
+        d = self.execute_saving(no_change, defer.succeed(None))
+        self.failureResultOf(d, controller.CannotExecutePolicyError)
+        self.assertEqual(self.cache._groups, {})
+
+    def test_least_recently_updated_forgotten(self):
+        """
+        Only `max_groups` groups are remembered, forgetting the least recently
+        updated ones
+        """
+        self.cache.max_groups = 2
+        groups = [iMock(IScalingGroup, tenant_id='tenant', uuid=str(i)) for i in range(3)]
+        state = self.state('2013-12-31T23:59:50Z')
+        for group in groups[:2]:
+            self.cache.update(group, state, self.config, self.policy, 'pol')
+        self.cache.update(groups[0], state, self.config, self.policy, 'pol')
+        self.cache.update(groups[2], state, self.config, self.policy, 'pol')
+        self.assertEqual(self.cache._groups.keys(), [('tenant', '0'), ('tenant', '2')])
+        self.assertFalse(self.cache.rejects(groups[1], 'pol'))
+
+    def test_modify_state_rejected_without_lock(self):
+        """
+        `modify_state_unless_cooling_down` fails with `CannotExecutePolicyError`
+        without modifying the state when the cache rejects the policy
+        """
+        patch(self, 'otter.controller.get_cooldown_cache', return_value=self.cache)
+        self.cache.update(self.group, self.state('2013-12-31T23:59:50Z'),
+                          self.config, self.policy, 'pol')
+        log = mock_log()
+        d = controller.modify_state_unless_cooling_down(log, self.group, 'pol', 'modifier')
+        self.failureResultOf(d, controller.CannotExecutePolicyError)
+        self.assertFalse(self.group.modify_state_for_policy.called)
+        log.msg.assert_called_once_with(
+            'cooldown not reached as of last execution, rejecting without lock',
+            scaling_group_id='group', policy_id='pol')
+
+    def test_modify_state_when_not_rejected(self):
+        """
+        `modify_state_unless_cooling_down` modifies the state when the cache does
+        not reject the policy or there is no cache
+        """
+        self.group.modify_state_for_policy.return_value = defer.succeed('r')
+        d = controller.modify_state_unless_cooling_down(
+            mock_log(), self.group, 'pol', 'modifier')
+        self.assertEqual(self.successResultOf(d), 'r')
+        patch(self, 'otter.controller.get_cooldown_cache', return_value=self.cache)
+        self.group.modify_state_for_policy.return_value = defer.succeed('r2')
+        d = controller.modify_state_unless_cooling_down(
+            mock_log(), self.group, 'pol', 'modifier', version='v')
+        self.assertEqual(self.successResultOf(d), 'r2')
+        self.group.modify_state_for_policy.assert_called_with(mock.ANY, 'pol', 'v')
+
+    def test_modify_state_not_rejected_from_cache_if_asked(self):
+        """
+        `modify_state_unless_cooling_down` modifies the state even if the cache
+        rejects the policy when not asked to reject from the cache
+        """
+        patch(self, 'otter.controller.get_cooldown_cache', return_value=self.cache)
+        self.cache.update(self.group, self.state('2013-12-31T23:59:50Z'),
+                          self.config, self.policy, 'pol')
+        self.group.modify_state_for_policy.return_value = defer.fail(
+            NoSuchPolicyError('tenant', 'group', 'pol'))
+        d = controller.modify_state_unless_cooling_down(
+            mock_log(), self.group, 'pol', 'modifier', reject_cached=False)
+        self.failureResultOf(d, NoSuchPolicyError)
+
+
+class ExecutionCoalescerTests(TestCase):
+    """
+    Tests for :class:`controller.ExecutionCoalescer`
+    """
+
+    def setUp(self):
+        """
+        Coalescer and a group whose state modifications are pending
+        """
+        self.coalescer = controller.ExecutionCoalescer()
+        self.group = iMock(IScalingGroup, tenant_id='tenant', uuid='group')
+        self.modifications = []
+        self.modifiers = []
+
+        def modify_state_for_policy(modifier, policy_id, version):
+            self.modifiers.append(modifier)
+            self.modifications.append(defer.Deferred())
+            return self.modifications[-1]
+
+        self.group.modify_state_for_policy.side_effect = modify_state_for_policy
+        patch(self, 'otter.controller.get_execution_coalescer',
+              return_value=self.coalescer)
+        self.modifier = mock.Mock(side_effect=lambda group, state, **kwargs: state)
+        self.log = mock_log()
+
+    def execute(self, policy_id='pol', version=None, coalesce=True):
+        """
+        Execute policy through :func:`controller.modify_state_unless_cooling_down`
+        """
+        return controller.modify_state_unless_cooling_down(
+            self.log, self.group, policy_id, self.modifier, version, coalesce=coalesce)
+
+    def finish(self, i, group_cooldown=0, policy_cooldown=30):
+        """
+        Finish the `i`th modification, calling its modifier with the given
+        cooldowns and firing with the state it returns
+        """
+        state = self.modifiers[i](self.group, 'state{}'.format(i),
+                                  config={'cooldown': group_cooldown}, launch={},
+                                  policy={'cooldown': policy_cooldown})
+        self.modifications[i].callback(state)
+
+    def test_coalesced_with_in_progress(self):
+        """
+        Executions of a policy while it is being executed get outcome of that
+        execution without modifying the state again if the policy has a cooldown,
+        and are logged
+        """
+        d1, d2, d3 = self.execute(), self.execute(), self.execute()
+        self.group.modify_state_for_policy.assert_called_once_with(mock.ANY, 'pol', None)
+        self.finish(0)
+        self.assertEqual([self.successResultOf(d) for d in (d1, d2, d3)],
+                         ['state0'] * 3)
+        self.modifier.assert_called_once_with(
+            self.group, 'state0', config={'cooldown': 0}, launch={},
+            policy={'cooldown': 30})
+        self.log.msg.assert_called_with(
+            'policy executed while waiting, coalescing with it',
+            scaling_group_id='group', policy_id='pol')
+        self.assertEqual(self.log.msg.call_count, 2)
+
+    def test_coalesced_with_group_cooldown(self):
+        """
+        Executions are coalesced if only the group has a cooldown
+        """
+        d1, d2 = self.execute(), self.execute()
+        self.finish(0, group_cooldown=10, policy_cooldown=0)
+        self.assertEqual(self.successResultOf(d2), 'state0')
+        self.assertEqual(len(self.modifications), 1)
+
+    def test_not_coalesced_without_cooldowns(self):
+        """
+        Without any cooldown, executions requested while the policy is being
+        executed each execute it after it, one after another
+        """
+        d1, d2, d3 = self.execute(), self.execute(), self.execute()
+        self.finish(0, policy_cooldown=0)
+        self.assertEqual(self.successResultOf(d1), 'state0')
+        self.assertEqual(len(self.modifications), 2)
+        self.assertNoResult(d2)
+        self.finish(1, policy_cooldown=0)
+        self.assertEqual(self.successResultOf(d2), 'state1')
+        self.assertEqual(len(self.modifications), 3)
+        self.finish(2, policy_cooldown=0)
+        self.assertEqual(self.successResultOf(d3), 'state2')
+        self.assertEqual(self.modifier.call_count, 3)
+
+    def test_not_coalesced_unless_asked(self):
+        """
+        Executions whose caller reports their outcome, like executing a policy
+        through the API, are never coalesced
+        """
+        self.execute(coalesce=False)
+        self.execute(coalesce=False)
+        self.assertEqual(len(self.modifications), 2)
+        self.group.modify_state_for_policy.assert_called_with(self.modifier, 'pol', None)
+
+    def test_failure_coalesced(self):
+        """
+        Coalesced executions fail like the execution they are attached to
+        """
+        d1, d2 = self.execute(), self.execute()
+        self.modifiers[0](self.group, 'state', config={'cooldown': 0}, launch={},
+                          policy={'cooldown': 30})
+        self.modifications[0].errback(
+            controller.CannotExecutePolicyError('tenant', 'group', 'pol', 'e'))
+        self.failureResultOf(d1, controller.CannotExecutePolicyError)
+        self.failureResultOf(d2, controller.CannotExecutePolicyError)
+
+    def test_other_policies_not_coalesced(self):
+        """
+        Executions of different policies are not coalesced
+        """
+        self.execute('p1')
+        self.execute('p2')
+        self.assertEqual(len(self.modifications), 2)
+
+    def test_other_versions_not_coalesced(self):
+        """
+        Executions checking different policy versions are not coalesced, so an
+        execution of a stale version fails on its own
+        """
+        d1 = self.execute(version='v1')
+        d2 = self.execute(version='v2')
+        d3 = self.execute(version='v2')
+        self.assertEqual(len(self.modifications), 2)
+        self.group.modify_state_for_policy.assert_any_call(mock.ANY, 'pol', 'v1')
+        self.group.modify_state_for_policy.assert_any_call(mock.ANY, 'pol', 'v2')
+        self.modifications[0].errback(NoSuchPolicyError('tenant', 'group', 'pol'))
+        self.finish(1)
+        self.failureResultOf(d1, NoSuchPolicyError)
+        self.assertEqual(self.successResultOf(d2), 'state1')
+        self.assertEqual(self.successResultOf(d3), 'state1')
+
+    def test_executed_again_after_finished(self):
+        """
+        An execution requested after the previous one finished modifies the state
+        """
+        self.execute()
+        self.finish(0)
+        self.execute()
+        self.assertEqual(len(self.modifications), 2)
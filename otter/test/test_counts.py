@@ -0,0 +1,80 @@
+"""
+Tests for :mod:`otter.counts`
+"""
+import mock
+
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from otter.counts import CountsRepairService
+from otter.test.utils import mock_log, CheckFailure
+
+
+class CountsRepairServiceTests(TestCase):
+    """
+    Tests for :class:`CountsRepairService`
+    """
+
+    def setUp(self):
+        """
+        Mock store with tenants in two pages, and ZooKeeper client with a lock
+        """
+        self.store = mock.Mock(spec=['list_tenants', 'repair_counts'])
+        pages = {None: ['t1', 't2'], 't2': ['t3'], 't3': []}
+        self.store.list_tenants.side_effect = lambda marker, size: defer.succeed(pages[marker])
+        self.store.repair_counts.return_value = defer.succeed(0)
+        self.kz_client = mock.Mock(spec=['Lock'])
+        self.lock = self.kz_client.Lock.return_value
+        self.lock.acquire.return_value = defer.succeed(True)
+        self.lock.release.return_value = defer.succeed(None)
+        self.log = mock_log()
+        self.service = CountsRepairService(self.store, self.kz_client, 3600, page_size=2)
+        self.service.log = self.log
+
+    def test_repairs_every_tenant(self):
+        """
+        The counts of every tenant are repaired, a page of tenants at a time,
+        while holding the lock
+        """
+        self.successResultOf(self.service.repair())
+        self.kz_client.Lock.assert_called_once_with('/counts_repair')
+        self.lock.acquire.assert_called_once_with(blocking=False)
+        self.assertEqual(self.store.list_tenants.call_args_list,
+                         [mock.call(None, 2), mock.call('t2', 2), mock.call('t3', 2)])
+        self.assertEqual([c[0][1] for c in self.store.repair_counts.call_args_list],
+                         ['t1', 't2', 't3'])
+        self.lock.release.assert_called_once_with()
+
+    def test_lock_held_elsewhere(self):
+        """
+        Nothing is repaired if another node holds the lock
+        """
+        self.lock.acquire.return_value = defer.succeed(False)
+        self.successResultOf(self.service.repair())
+        self.assertFalse(self.store.list_tenants.called)
+        self.assertFalse(self.lock.release.called)
+        self.log.msg.assert_called_once_with('Counts are being repaired by another node')
+
+    def test_tenant_failure_logged(self):
+        """
+        Failing to repair the counts of a tenant is logged, and the other tenants
+        are still repaired
+        """
+        self.store.repair_counts.side_effect = [
+            defer.fail(ValueError('bad')), defer.succeed(0), defer.succeed(0)]
+        self.successResultOf(self.service.repair())
+        self.assertEqual(self.store.repair_counts.call_count, 3)
+        self.log.err.assert_called_once_with(CheckFailure(ValueError),
+                                             'Could not repair counts of tenant',
+                                             tenant_id='t1')
+        self.lock.release.assert_called_once_with()
+
+    def test_listing_failure_releases_lock(self):
+        """
+        Failing to list tenants is logged and the lock is released
+        """
+        self.store.list_tenants.side_effect = lambda marker, size: defer.fail(ValueError('bad'))
+        self.successResultOf(self.service.repair())
+        self.log.err.assert_called_once_with(CheckFailure(ValueError),
+                                             'Could not repair counts')
+        self.lock.release.assert_called_once_with()
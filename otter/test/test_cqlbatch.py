@@ -69,3 +69,38 @@ class CqlBatchTestCase(TestCase):
         expected += ' INSERT * INTO BLAH APPLY BATCH;'
         self.connection.execute.assert_called_once_with(
             expected, {}, ConsistencyLevel.QUORUM)
+
+    def test_fixed_batch_generated_once(self):
+        """
+        The text of a fixed-shape batch is generated once and reused by batches
+        of the same statements and timestamp
+        """
+        statements = ['INSERT :a INTO FIXED', 'DELETE :b FROM FIXED']
+        first = Batch(statements, {'a': 1, 'b': 2}, fixed=True)
+        second = Batch(list(statements), {'a': 3, 'b': 4}, fixed=True)
+        other = Batch(statements, {'a': 1, 'b': 2}, timestamp=5, fixed=True)
+        self.assertIs(first._generate(), second._generate())
+        self.assertEqual(first._generate(),
+                         'BEGIN BATCH INSERT :a INTO FIXED DELETE :b FROM FIXED APPLY BATCH;')
+        self.assertEqual(
+            other._generate(),
+            'BEGIN BATCH USING TIMESTAMP 5 INSERT :a INTO FIXED DELETE :b FROM FIXED '
+            'APPLY BATCH;')
+
+    def test_dynamic_batch_generated_each_time(self):
+        """
+        The text of a batch that is not fixed is generated each time
+        """
+        statements = ['INSERT :a INTO DYNAMIC']
+        self.assertIsNot(Batch(statements, {})._generate(),
+                         Batch(statements, {})._generate())
+
+    def test_counter_batch(self):
+        """
+        A batch of counter updates is a counter batch
+        """
+        batch = Batch(['UPDATE BLAH SET c = c + :n'], {'n': 1}, counter=True)
+        self.successResultOf(batch.execute(self.connection))
+        self.connection.execute.assert_called_once_with(
+            'BEGIN COUNTER BATCH UPDATE BLAH SET c = c + :n APPLY BATCH;', {'n': 1},
+            ConsistencyLevel.ONE)
@@ -8,7 +8,7 @@ from twisted.internet.defer import CancelledError, Deferred
 from twisted.trial.unittest import TestCase
 
 from otter.util.deferredutils import (
-    timeout_deferred, retry_and_timeout, TimedOutError, DeferredPool)
+    timeout_deferred, retry_and_timeout, TimedOutError, DeferredPool, FairLimiter)
 from otter.test.utils import DummyException, patch
 
 
@@ -264,3 +264,152 @@ class DeferredPoolTests(TestCase):
         self.pool.add(holdup)
         holdup.errback(DummyException('hey'))
         self.failureResultOf(holdup, DummyException)
+
+
+class FairLimiterTests(TestCase):
+    """
+    Tests for :class:`FairLimiter`
+    """
+
+    def setUp(self):
+        """
+        Calls made through the limiter return deferreds that are fired by the tests
+        """
+        self.clock = Clock()
+        self.calls = []
+
+    def call(self, name):
+        """
+        Record the call and return deferred for it
+        """
+        d = Deferred()
+        self.calls.append((name, d))
+        return d
+
+    def fire(self, name, result=None):
+        """
+        Fire the deferred of the call with given name
+        """
+        [d for n, d in self.calls if n == name][0].callback(result)
+
+    def names(self):
+        """
+        Names of calls started
+        """
+        return [n for n, _ in self.calls]
+
+    def test_runs_within_limit(self):
+        """
+        Calls are started immediately when within limit and their results
+        are returned
+        """
+        limiter = FairLimiter(2, clock=self.clock)
+        d1 = limiter.run('t1', self.call, 'a')
+        d2 = limiter.run('t1', self.call, 'b')
+        self.assertEqual(self.names(), ['a', 'b'])
+        self.fire('a', 'result')
+        self.assertEqual(self.successResultOf(d1), 'result')
+        self.assertNoResult(d2)
+
+    def test_waits_over_limit(self):
+        """
+        Calls over the limit wait until a running call finishes
+        """
+        limiter = FairLimiter(1, clock=self.clock)
+        limiter.run('t1', self.call, 'a')
+        d = limiter.run('t1', self.call, 'b')
+        self.assertEqual(self.names(), ['a'])
+        self.assertEqual(limiter.queued(), 1)
+        self.fire('a')
+        self.assertEqual(self.names(), ['a', 'b'])
+        self.assertNoResult(d)
+
+    def test_round_robin_across_keys(self):
+        """
+        Waiting calls are started alternating between keys rather than in
+        the order they were made
+        """
+        limiter = FairLimiter(1, clock=self.clock)
+        limiter.run('t0', self.call, 'first')
+        for name in ['a1', 'a2', 'a3']:
+            limiter.run('a', self.call, name)
+        limiter.run('b', self.call, 'b1')
+        limiter.run('c', self.call, 'c1')
+        for name in ['first', 'a1', 'b1', 'c1', 'a2']:
+            self.fire(name)
+        self.assertEqual(self.names(), ['first', 'a1', 'b1', 'c1', 'a2', 'a3'])
+
+    def test_key_limit(self):
+        """
+        No more than `key_limit` calls of a key run at a time even if there is
+        overall capacity
+        """
+        limiter = FairLimiter(5, key_limit=2, clock=self.clock)
+        for name in ['a1', 'a2', 'a3']:
+            limiter.run('a', self.call, name)
+        limiter.run('b', self.call, 'b1')
+        self.assertEqual(self.names(), ['a1', 'a2', 'b1'])
+        self.fire('b1')
+        self.assertEqual(self.names(), ['a1', 'a2', 'b1'])
+        self.fire('a1')
+        self.assertEqual(self.names(), ['a1', 'a2', 'b1', 'a3'])
+
+    def test_failure_propagated(self):
+        """
+        Failure of a call is returned and frees its capacity
+        """
+        limiter = FairLimiter(1, clock=self.clock)
+        inner = Deferred()
+        d = limiter.run('t1', lambda: inner)
+        limiter.run('t1', self.call, 'b')
+        d2 = limiter.run('t2', lambda: 1 / 0)
+        inner.errback(DummyException('e'))
+        self.failureResultOf(d, DummyException)
+        self.assertEqual(self.names(), ['b'])
+        self.fire('b')
+        self.failureResultOf(d2, ZeroDivisionError)
+        self.assertEqual(limiter.running, 0)
+
+    def test_synchronous_calls(self):
+        """
+        Many waiting calls that complete synchronously are all started and return
+        their results, without recursing once per call
+        """
+        limiter = FairLimiter(1, clock=self.clock)
+        limiter.run('t1', self.call, 'a')
+        ds = [limiter.run('t{}'.format(i % 3), lambda i=i: i) for i in range(3000)]
+        ds.append(limiter.run('t1', lambda: 1 / 0))
+        self.fire('a')
+        self.assertEqual([self.successResultOf(d) for d in ds[:-1]], range(3000))
+        self.failureResultOf(ds[-1], ZeroDivisionError)
+        self.assertEqual((limiter.running, limiter.queued()), (0, 0))
+
+    def test_call_made_from_result(self):
+        """
+        A call made by a callback of a synchronous call's result is started
+        """
+        limiter = FairLimiter(1, clock=self.clock)
+        limiter.run('t1', self.call, 'a')
+        d = limiter.run('t1', lambda: 'b')
+        d.addCallback(lambda _: limiter.run('t2', self.call, 'c'))
+        self.fire('a')
+        self.assertEqual(self.names(), ['a', 'c'])
+
+    def test_stats(self):
+        """
+        `stats` reports running and waiting calls and time waited
+        """
+        limiter = FairLimiter(1, clock=self.clock)
+        self.assertEqual(limiter.stats(), {'running': 0, 'queued': 0, 'queued_keys': 0,
+                                           'avg_wait': 0.0, 'max_wait': 0.0})
+        limiter.run('a', self.call, 'a1')
+        limiter.run('a', self.call, 'a2')
+        limiter.run('b', self.call, 'b1')
+        self.assertEqual(limiter.stats(), {'running': 1, 'queued': 2, 'queued_keys': 2,
+                                           'avg_wait': 0.0, 'max_wait': 0.0})
+        self.clock.advance(3)
+        self.fire('a1')
+        self.clock.advance(3)
+        self.fire('a2')
+        self.assertEqual(limiter.stats(), {'running': 1, 'queued': 0, 'queued_keys': 0,
+                                           'avg_wait': 3.0, 'max_wait': 6.0})
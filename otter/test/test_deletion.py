@@ -0,0 +1,140 @@
+"""
+Tests for :mod:`otter.deletion`
+"""
+import mock
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from otter.deletion import DeletionService
+from otter.models.mock import MockScalingGroupCollection
+from otter.test.utils import mock_log, patch, CheckFailure
+from otter.util.deferredutils import DeferredPool, FairLimiter
+
+
+class DeletionServiceTests(TestCase):
+    """
+    Tests for :class:`DeletionService`
+    """
+
+    def setUp(self):
+        """
+        Mock store with queued deletions and supervisor
+        """
+        self.store = MockScalingGroupCollection()
+        self.log = mock_log()
+        self.store.add_server_deletions(
+            self.log, 'tr', 't1', 'g1',
+            [{'id': 's1', 'lb_info': [[10, {}], [20, {}]]},
+             {'id': 's2', 'lb_info': [[20, {}]]},
+             {'id': 's3', 'lb_info': []}])
+        self.supervisor = mock.Mock(spec=['execute_delete_server', 'deferred_pool'])
+        self.supervisor.deferred_pool = DeferredPool()
+        self.deletes = {}
+
+        def execute_delete_server(log, transaction_id, group, server):
+            self.deletes[server['id']] = defer.Deferred()
+            return self.deletes[server['id']]
+
+        self.supervisor.execute_delete_server.side_effect = execute_delete_server
+        self.clock = Clock()
+        self.service = DeletionService(self.store, self.supervisor, 10, batchsize=2,
+                                       clock=self.clock)
+        self.service.log = self.log
+
+    def test_deletes_claimed(self):
+        """
+        Servers of claimed deletions are deleted through the supervisor and removed
+        from the queue once deleted
+        """
+        self.successResultOf(self.service.claim_deletions())
+
+        self.assertEqual(sorted(self.deletes), ['s1', 's2'])
+        self.supervisor.execute_delete_server.assert_any_call(
+            mock.ANY, 'tr', mock.ANY, {'id': 's1', 'lb_info': [[10, {}], [20, {}]]})
+        group = self.supervisor.execute_delete_server.call_args[0][2]
+        self.assertEqual((group.tenant_id, group.uuid), ('t1', 'g1'))
+        self.deletes['s1'].callback(None)
+        self.assertEqual(self.store.deletions.keys(), [('t1', 's2'), ('t1', 's3')])
+        self.assertEqual(self.service.in_progress, set([('t1', 's2')]))
+        self.log.msg.assert_any_call('Server deleted.', audit_log=True,
+                                     event_type='server.delete', tenant_id='t1',
+                                     scaling_group_id='g1', server_id='s1',
+                                     transaction_id='tr')
+
+    def test_bounded_by_batchsize(self):
+        """
+        No more than `batchsize` deletions are in progress
+        """
+        self.service.claim_deletions()
+        self.assertIsNone(self.service.claim_deletions())
+        self.deletes['s1'].callback(None)
+        self.successResultOf(self.service.claim_deletions())
+        self.assertEqual(sorted(self.deletes), ['s1', 's2', 's3'])
+
+    def test_in_progress_not_started_again(self):
+        """
+        A deletion claimed again while in progress is not started again
+        """
+        self.service.batchsize = 5
+        self.service.claim_deletions()
+        self.store.deletion_claims.clear()
+        self.service.claim_deletions()
+        self.assertEqual(self.supervisor.execute_delete_server.call_count, 3)
+
+    def test_failed_deletion_stays_queued(self):
+        """
+        A deletion that fails is logged and stays in the queue to be claimed again
+        after its lease
+        """
+        self.service.claim_deletions()
+        self.deletes['s1'].errback(ValueError('e'))
+        self.log.err.assert_called_once_with(
+            CheckFailure(ValueError), 'Server deletion job failed', tenant_id='t1',
+            scaling_group_id='g1', server_id='s1', transaction_id='tr')
+        self.assertIn(('t1', 's1'), self.store.deletions)
+        self.assertEqual(self.service.in_progress, set([('t1', 's2')]))
+
+    def test_claim_error_logged(self):
+        """
+        Error claiming deletions is logged
+        """
+        patch(self, 'otter.models.mock.MockScalingGroupCollection.claim_server_deletions',
+              return_value=defer.fail(ValueError('e')))
+        self.successResultOf(self.service.claim_deletions())
+        self.log.err.assert_called_once_with(
+            CheckFailure(ValueError), 'Could not claim server deletions')
+
+    def test_added_to_deferred_pool(self):
+        """
+        Deletions in progress are added to the supervisor's deferred pool
+        """
+        self.service.claim_deletions()
+        empty = self.supervisor.deferred_pool.notify_when_empty()
+        self.deletes['s1'].callback(None)
+        self.assertNoResult(empty)
+        self.deletes['s2'].callback(None)
+        self.successResultOf(empty)
+
+    def test_tenant_limiter(self):
+        """
+        Deletions are run through the limiter keyed by tenant ID
+        """
+        self.service.limiter = FairLimiter(10, key_limit=1, clock=self.clock)
+        self.service.claim_deletions()
+        self.assertEqual(self.deletes.keys(), ['s1'])
+        self.deletes['s1'].callback(None)
+        self.assertEqual(sorted(self.deletes), ['s1', 's2'])
+
+    def test_load_balancer_limit(self):
+        """
+        Deletions removing nodes from the same load balancer are bounded by
+        `lb_limit`, while others are not
+        """
+        service = DeletionService(self.store, self.supervisor, 10, batchsize=3,
+                                  lb_limit=1, clock=self.clock)
+        service.claim_deletions()
+        self.assertEqual(sorted(self.deletes), ['s1', 's3'])
+        self.deletes['s1'].callback(None)
+        self.assertEqual(sorted(self.deletes), ['s1', 's2', 's3'])
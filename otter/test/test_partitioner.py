@@ -0,0 +1,212 @@
+"""
+Tests for `otter.util.partitioner`
+"""
+import mock
+
+from kazoo.exceptions import NoNodeError
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from otter.util.partitioner import HashRing, ConsistentHashPartitioner
+from otter.test.utils import mock_log
+
+
+class HashRingTests(TestCase):
+    """
+    Tests for `HashRing`
+    """
+
+    def test_no_members(self):
+        """
+        Nothing is owned when there are no members
+        """
+        self.assertIsNone(HashRing([]).owner(1))
+
+    def test_same_owner_everywhere(self):
+        """
+        Owner does not depend on order of members
+        """
+        ring1, ring2 = HashRing(['a', 'b', 'c']), HashRing(['c', 'a', 'b'])
+        self.assertEqual([ring1.owner(i) for i in range(100)],
+                         [ring2.owner(i) for i in range(100)])
+
+    def test_spread(self):
+        """
+        Items are spread among all the members
+        """
+        ring = HashRing(['a', 'b', 'c'])
+        self.assertEqual(set(ring.owner(i) for i in range(100)), set(['a', 'b', 'c']))
+
+    def test_member_leaving(self):
+        """
+        When a member leaves, only its items move
+        """
+        before, after = HashRing(['a', 'b', 'c']), HashRing(['a', 'b'])
+        for i in range(100):
+            if before.owner(i) != 'c':
+                self.assertEqual(before.owner(i), after.owner(i))
+
+
+class ConsistentHashPartitionerTests(TestCase):
+    """
+    Tests for `ConsistentHashPartitioner`
+    """
+
+    def setUp(self):
+        """
+        Mock kazoo client
+        """
+        self.kz_client = mock.Mock(spec=['create', 'get_children', 'delete'])
+        self.kz_client.create.return_value = defer.succeed('/part/members/a')
+        self.kz_client.delete.return_value = defer.succeed(None)
+        self.children = defer.Deferred()
+        self.kz_client.get_children.side_effect = lambda *_, **k: self.children
+        self.clock = Clock()
+        self.log = mock_log()
+        self.partitioner = ConsistentHashPartitioner(
+            self.kz_client, '/part', set(range(1, 31)), time_boundary=15,
+            identifier='a', clock=self.clock, log=self.log)
+
+    def members_changed(self, members):
+        """
+        Fire pending get_children with `members` and get a new one ready
+        """
+        children, self.children = self.children, defer.Deferred()
+        children.callback(members)
+
+    def owned(self, members):
+        """
+        Return items 'a' owns when `members` are in the partition
+        """
+        ring = HashRing(members)
+        return [i for i in range(1, 31) if ring.owner(i) == 'a']
+
+    def test_joins(self):
+        """
+        Partitioner registers ephemeral member node and watches members. It is
+        allocating until it reads the members
+        """
+        self.kz_client.create.assert_called_once_with(
+            '/part/members/a', ephemeral=True, makepath=True)
+        self.kz_client.get_children.assert_called_once_with(
+            '/part/members', watch=self.partitioner._watch_members)
+        self.assertTrue(self.partitioner.allocating)
+        self.assertFalse(self.partitioner.acquired)
+
+    def test_join_failed(self):
+        """
+        Partitioner fails if it cannot create its member node and deletes the
+        node in case it was created
+        """
+        self.kz_client.create.return_value = defer.fail(ValueError('e'))
+        partitioner = ConsistentHashPartitioner(
+            self.kz_client, '/part', set([1]), identifier='a', clock=self.clock,
+            log=self.log)
+        self.assertTrue(partitioner.failed)
+        self.log.err.assert_called_once_with(
+            mock.ANY, 'Could not join partition', system='otter.partitioner',
+            partition_path='/part', member='a')
+        self.kz_client.delete.assert_called_once_with('/part/members/a')
+
+    def test_gained_after_time_boundary(self):
+        """
+        Partitioner is acquired once members are read, and takes the items it owns
+        after `time_boundary` seconds
+        """
+        self.members_changed(['a', 'b'])
+        self.assertTrue(self.partitioner.acquired)
+        self.assertEqual(list(self.partitioner), [])
+        self.clock.advance(15)
+        self.assertEqual(list(self.partitioner), self.owned(['a', 'b']))
+
+    def test_lost_at_once(self):
+        """
+        When a member joins, items moving to it are dropped at once while other items
+        stay owned
+        """
+        self.members_changed(['a'])
+        self.clock.advance(15)
+        self.assertEqual(list(self.partitioner), range(1, 31))
+
+        self.partitioner._watch_members('event')
+        self.members_changed(['a', 'b'])
+
+        self.assertTrue(self.partitioner.acquired)
+        self.assertEqual(list(self.partitioner), self.owned(['a', 'b']))
+
+    def test_gained_item_lost_before_taken(self):
+        """
+        A gained item is not taken if it is lost before `time_boundary`
+        """
+        self.members_changed(['a', 'b'])
+        self.partitioner._watch_members('event')
+        self.members_changed(['a', 'b', 'c'])
+        self.clock.advance(15)
+        self.assertEqual(list(self.partitioner), self.owned(['a', 'b', 'c']))
+
+    def test_member_gone(self):
+        """
+        Partitioner fails and drops all items if its member node is gone
+        """
+        self.members_changed(['a'])
+        self.clock.advance(15)
+        self.partitioner._watch_members('event')
+        self.members_changed(['b'])
+        self.assertTrue(self.partitioner.failed)
+        self.assertEqual(list(self.partitioner), [])
+
+    def test_get_members_failed(self):
+        """
+        Partitioner fails if it cannot read members and deletes its member node so
+        that it does not keep owning items in the partitions of other members
+        """
+        self.children.errback(ValueError('e'))
+        self.assertTrue(self.partitioner.failed)
+        self.log.err.assert_called_once_with(
+            mock.ANY, 'Could not get partition members', system='otter.partitioner',
+            partition_path='/part', member='a')
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.kz_client.delete.assert_called_once_with('/part/members/a')
+
+    def test_failed_member_node_gone(self):
+        """
+        Member node that is already gone when the partitioner fails is not logged
+        """
+        self.kz_client.delete.return_value = defer.fail(NoNodeError())
+        self.children.errback(ValueError('e'))
+        self.assertTrue(self.partitioner.failed)
+        self.assertEqual(self.log.err.call_count, 1)
+
+    def test_failed_delete_error(self):
+        """
+        Error deleting member node of a failed partitioner is logged
+        """
+        self.kz_client.delete.return_value = defer.fail(ValueError('d'))
+        self.children.errback(ValueError('e'))
+        self.assertTrue(self.partitioner.failed)
+        self.log.err.assert_called_with(
+            mock.ANY, 'Could not leave partition', system='otter.partitioner',
+            partition_path='/part', member='a')
+
+    def test_release_set(self):
+        """
+        `release_set` does nothing
+        """
+        self.assertIsNone(self.successResultOf(self.partitioner.release_set()))
+
+    def test_finish(self):
+        """
+        `finish` drops all the items, cancels pending takes and deletes member node
+        """
+        self.kz_client.delete.return_value = defer.succeed(None)
+        self.members_changed(['a'])
+
+        d = self.partitioner.finish()
+
+        self.assertIsNone(self.successResultOf(d))
+        self.kz_client.delete.assert_called_once_with('/part/members/a')
+        self.assertTrue(self.partitioner.failed)
+        self.assertEqual(list(self.partitioner), [])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
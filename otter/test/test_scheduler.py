@@ -5,12 +5,16 @@ Tests for :mod:`otter.scheduler`
 from twisted.trial.unittest import TestCase
 from twisted.internet import defer
 from twisted.internet.task import Clock
+from twisted.python.failure import Failure
 
 import mock
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 from otter.scheduler import (
-    SchedulerService, check_events_in_bucket, process_events, add_cron_events, execute_event)
+    SchedulerService, check_events_in_bucket, process_events, add_cron_events, execute_event,
+    execute_group_events, parse_cron, next_cron_occurrence, next_cron_occurrences,
+    Histogram, SchedulerMetrics)
 from otter.test.utils import iMock, patch, CheckFailure, mock_log, DeferredFunctionMixin
 from otter.models.interface import (
     IScalingGroup, IScalingGroupCollection, IScalingScheduleCollection)
@@ -80,6 +84,18 @@ class SchedulerServiceTests(SchedulerTests, DeferredFunctionMixin):
         self.assertEqual(self.scheduler_service.kz_partition, self.kz_partition)
         self.timer_service.startService.assert_called_once_with(self.scheduler_service)
 
+    def test_start_service_partitioner(self):
+        """
+        startService() creates the partition with given partitioner if any
+        """
+        partitioner = mock.Mock(return_value=self.kz_partition)
+        self.scheduler_service.partitioner = partitioner
+        self.scheduler_service.startService()
+        partitioner.assert_called_once_with(
+            self.zk_partition_path, set=set(self.buckets), time_boundary=self.time_boundary)
+        self.assertFalse(self.kz_client.SetPartitioner.called)
+        self.assertEqual(self.scheduler_service.kz_partition, self.kz_partition)
+
     def test_stop_service(self):
         """
         stopService() calls super's stopService() and stops the allocation if it
@@ -127,6 +143,23 @@ class SchedulerServiceTests(SchedulerTests, DeferredFunctionMixin):
                                                           'buckets': [2, 3]}))
         self.mock_store.get_oldest_event.assert_has_calls([mock.call(2), mock.call(3)])
 
+    def test_health_check_limiter_stats(self):
+        """
+        `service.health_check` includes execution stats when there is a limiter
+        """
+        self.kz_partition.acquired = True
+        self.scheduler_service.limiter = mock.Mock(spec=['stats'])
+        self.scheduler_service.limiter.stats.return_value = {'queued': 2}
+        self.scheduler_service.startService()
+        self.kz_partition.__iter__.return_value = [2]
+        self.returns = [None]
+
+        d = self.scheduler_service.health_check()
+
+        self.assertEqual(self.successResultOf(d), (True, {'old_events': [],
+                                                          'buckets': [2],
+                                                          'execution': {'queued': 2}}))
+
     def test_health_check_None(self):
         """
         `service.health_check` returns True when there are no triggers
@@ -261,7 +294,7 @@ class SchedulerServiceTests(SchedulerTests, DeferredFunctionMixin):
         mock_datetime.utcnow.return_value = 'utcnow'
 
         responses = [4, 5]
-        self.check_events_in_bucket.side_effect = lambda *_: defer.succeed(responses.pop(0))
+        self.check_events_in_bucket.side_effect = lambda *_, **k: defer.succeed(responses.pop(0))
 
         d = self.scheduler_service.check_events(100)
 
@@ -272,8 +305,499 @@ class SchedulerServiceTests(SchedulerTests, DeferredFunctionMixin):
         log = self.scheduler_service.log.bind.return_value
         log.msg.assert_called_once_with('Got buckets {buckets}', buckets=[2, 3])
         self.assertEqual(self.check_events_in_bucket.mock_calls,
-                         [mock.call(log, self.mock_store, 2, 'utcnow', 100),
-                          mock.call(log, self.mock_store, 3, 'utcnow', 100)])
+                         [mock.call(log, self.mock_store, 2, 'utcnow', 100, prefetch=0,
+                                    limiter=None, metrics=None, lease=None),
+                          mock.call(log, self.mock_store, 3, 'utcnow', 100, prefetch=0,
+                                    limiter=None, metrics=None, lease=None)])
+
+    def test_check_events_metrics(self):
+        """
+        `check_events` starts a new metrics tick and checks buckets with the metrics
+        """
+        self.kz_partition.acquired = True
+        self.scheduler_service.metrics = mock.Mock(spec=['start_tick'])
+        self.scheduler_service.startService()
+        self.kz_partition.__iter__.return_value = [2]
+        self.check_events_in_bucket.return_value = defer.succeed(None)
+
+        self.scheduler_service.check_events(100)
+
+        self.scheduler_service.metrics.start_tick.assert_called_once_with()
+        self.check_events_in_bucket.assert_called_once_with(
+            mock.ANY, self.mock_store, 2, mock.ANY, 100, prefetch=0, limiter=None,
+            metrics=self.scheduler_service.metrics, lease=None)
+
+    def test_check_events_retired_bucket(self):
+        """
+        `check_events` moves events of retired buckets after checking them
+        """
+        self.kz_partition.acquired = True
+        self.scheduler_service.retired_buckets = set([3])
+        self.scheduler_service.startService()
+        self.kz_partition.__iter__.return_value = [2, 3]
+        self.check_events_in_bucket.return_value = defer.succeed(None)
+        moves = [defer.succeed(100), defer.succeed(4)]
+        self.mock_store.move_events.side_effect = lambda *_, **kw: moves.pop(0)
+
+        d = self.scheduler_service.check_events(100)
+
+        self.successResultOf(d)
+        self.assertEqual(self.mock_store.move_events.mock_calls,
+                         [mock.call(3, 100, lease=None)] * 2)
+        self.log.msg.assert_called_with('Moved {num_events} events from retired bucket',
+                                        num_events=104, scheduler_run_id='transaction-id',
+                                        utcnow=mock.ANY, bucket=3)
+        self.assertEqual(self.scheduler_service.draining, set())
+
+    def test_move_retired_events_lease(self):
+        """
+        With a lease, events of retired buckets are claimed while being moved so
+        that events claimed by others are not moved
+        """
+        self.scheduler_service.lease = 60
+        self.mock_store.move_events.return_value = defer.succeed(3)
+
+        d = self.scheduler_service.move_retired_events(self.log, 3, 100)
+
+        self.successResultOf(d)
+        self.mock_store.move_events.assert_called_once_with(3, 100, lease=60)
+
+    def test_move_retired_events_error(self):
+        """
+        Error moving events is logged and the bucket is not draining anymore
+        """
+        self.mock_store.move_events.return_value = defer.fail(ValueError('e'))
+
+        d = self.scheduler_service.move_retired_events(self.log, 3, 100)
+
+        self.successResultOf(d)
+        self.log.err.assert_called_once_with(
+            CheckFailure(ValueError), 'Could not move events from retired bucket', bucket=3)
+        self.assertEqual(self.scheduler_service.draining, set())
+
+    def test_check_events_lease(self):
+        """
+        With a lease, `check_events` claims events of owned buckets and then checks
+        the other buckets whose oldest event is late by more than threshold
+        """
+        self.kz_partition.acquired = True
+        self.scheduler_service.startService()
+        self.kz_partition.__iter__.return_value = [2]
+        self.scheduler_service.buckets = [2, 3, 4, 5]
+        self.scheduler_service.lease = 30
+        self.check_events_in_bucket.return_value = defer.succeed(None)
+        now = datetime.utcnow()
+        self.returns = [{'trigger': now - timedelta(seconds=700)},
+                        {'trigger': now - timedelta(seconds=10)},
+                        None]
+
+        d = self.scheduler_service.check_events(100)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(self.mock_store.get_oldest_event.mock_calls,
+                         [mock.call(3), mock.call(4), mock.call(5)])
+        self.assertEqual(
+            self.check_events_in_bucket.mock_calls,
+            [mock.call(mock.ANY, self.mock_store, 2, mock.ANY, 100, prefetch=0,
+                       limiter=None, metrics=None, lease=30),
+             mock.call(mock.ANY, self.mock_store, 3, mock.ANY, 100, limiter=None,
+                       metrics=None, lease=30)])
+        self.log.msg.assert_called_with('Helping lagging bucket {bucket}', bucket=3,
+                                        scheduler_run_id='transaction-id', utcnow=mock.ANY)
+
+    def test_help_lagging_buckets_error(self):
+        """
+        Error checking a lagging bucket is logged and others are still checked
+        """
+        self.scheduler_service.lease = 30
+        self.returns = [ValueError('e'), None]
+
+        d = self.scheduler_service.help_lagging_buckets(self.log, [1, 2, 3, 4, 5, 6, 7],
+                                                        datetime.utcnow(), 100)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.log.err.assert_called_once_with(
+            CheckFailure(ValueError), 'Could not check lagging bucket {bucket}', bucket=8)
+        self.assertFalse(self.check_events_in_bucket.called)
+
+    def test_help_lagging_buckets_not_read_until_they_may_lag(self):
+        """
+        Buckets of other nodes that are not lagging are not read again until their
+        oldest event, or any event added since they were read, may be late by more
+        than threshold. Lagging buckets and those that could not be read are read
+        again on the next check.
+        """
+        self.scheduler_service.lease = 30
+        self.check_events_in_bucket.return_value = defer.succeed(None)
+        self.scheduler_service.buckets = [2, 3, 4, 5, 6]
+        now = datetime(2014, 1, 1)
+
+        def help_at(seconds, *returns):
+            self.returns = list(returns)
+            self.mock_store.get_oldest_event.reset_mock()
+            d = self.scheduler_service.help_lagging_buckets(
+                self.log, [2], now + timedelta(seconds=seconds), 100)
+            self.assertIsNone(self.successResultOf(d))
+            return [c[1][0] for c in self.mock_store.get_oldest_event.mock_calls]
+
+        self.assertEqual(
+            help_at(0, {'trigger': now - timedelta(seconds=700)},
+                    {'trigger': now - timedelta(seconds=100)},
+                    {'trigger': now + timedelta(seconds=100)},
+                    ValueError('e')),
+            [3, 4, 5, 6])
+        self.assertEqual(help_at(499, None, None), [3, 6])
+        self.assertEqual(help_at(500, {'trigger': now + timedelta(seconds=100)}), [4])
+        self.assertEqual(help_at(600, None), [5])
+        self.assertEqual(help_at(1099, None, None, None), [3, 4, 6])
+        self.assertEqual(help_at(1199), [])
+        self.assertEqual(help_at(1200, None), [5])
+
+
+class EventDrivenSchedulerServiceTests(SchedulerTests):
+    """
+    Tests for `SchedulerService` in event driven mode
+    """
+
+    def setUp(self):
+        """
+        Mock partitioning, store's get_oldest_event and `check_events_in_bucket`.
+        Current time is fixed and the service's clock is a `Clock`
+        """
+        super(EventDrivenSchedulerServiceTests, self).setUp()
+        patch(self, 'otter.scheduler.otter_log', new=mock_log())
+        self.kz_client = mock.Mock(spec=['SetPartitioner'])
+        self.kz_partition = mock.MagicMock(allocating=False, release=False, failed=False,
+                                           acquired=True)
+        self.kz_partition.__iter__.return_value = [2, 3]
+        self.kz_client.SetPartitioner.return_value = self.kz_partition
+
+        self.now = datetime(2014, 1, 1, 12, 0, 0)
+        self.datetime = patch(self, 'otter.scheduler.datetime')
+        self.datetime.utcnow.return_value = self.now
+
+        self.oldest = {2: None, 3: None}
+        self.mock_store.get_oldest_event.side_effect = (
+            lambda bucket: defer.succeed(self.oldest[bucket]))
+
+        self.check_d = defer.Deferred()
+        self.check_events_in_bucket = patch(
+            self, 'otter.scheduler.check_events_in_bucket', return_value=self.check_d)
+
+        self.clock = Clock()
+        self.service = SchedulerService(
+            100, 1, self.mock_store, self.kz_client, '/part_path', 15, range(1, 10),
+            self.clock, event_driven=True)
+        self.timer_service = patch(self, 'otter.scheduler.TimerService')
+        self.service.startService()
+        self.service.running = True
+
+    def event_at(self, seconds):
+        """
+        Return an event that triggers `seconds` seconds from now
+        """
+        return {'trigger': self.now + timedelta(seconds=seconds), 'version': 'v'}
+
+    def test_check_events_retired_bucket(self):
+        """
+        Events of owned retired buckets that are not being drained are moved
+        """
+        self.service.retired_buckets = set([3, 4])
+        self.mock_store.move_events.return_value = defer.succeed(0)
+
+        self.successResultOf(self.service.check_events(100))
+
+        self.mock_store.move_events.assert_called_once_with(3, 100, lease=None)
+
+    def test_wakeup_skips_moving_bucket(self):
+        """
+        A wakeup does not check a bucket whose events are being moved
+        """
+        self.oldest[3] = self.event_at(5)
+        self.service.check_events(100)
+        self.service.draining.add(3)
+
+        self.clock.advance(5)
+
+        self.assertFalse(self.check_events_in_bucket.called)
+
+    def test_check_events_does_not_fetch(self):
+        """
+        `check_events` seeds earliest trigger of every owned bucket from its
+        oldest event instead of fetching events
+        """
+        self.oldest = {2: self.event_at(5), 3: None}
+
+        d = self.service.check_events(100)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(self.mock_store.get_oldest_event.mock_calls,
+                         [mock.call(2), mock.call(3)])
+        self.assertFalse(self.check_events_in_bucket.called)
+        self.assertEqual(self.service.wakeups.keys(), [2])
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=5))
+
+    def test_wakeup_at_trigger(self):
+        """
+        Events in a bucket are checked exactly when its earliest trigger occurs
+        and only that bucket is checked
+        """
+        self.oldest = {2: None, 3: self.event_at(5)}
+        self.service.check_events(100)
+
+        self.clock.advance(4.9)
+        self.assertFalse(self.check_events_in_bucket.called)
+        self.clock.advance(0.1)
+        self.check_events_in_bucket.assert_called_once_with(
+            mock.ANY, self.mock_store, 3, self.now, 100, prefetch=0, limiter=None, metrics=None,
+            lease=None)
+        self.assertEqual(self.service.wakeups, {})
+        self.assertEqual(self.service.draining, set([3]))
+
+    def test_overdue_trigger(self):
+        """
+        Bucket with an event triggering in the past is checked right away
+        """
+        self.oldest = {2: self.event_at(-30), 3: None}
+        self.service.check_events(100)
+        self.clock.advance(0)
+        self.check_events_in_bucket.assert_called_once_with(
+            mock.ANY, self.mock_store, 2, self.now, 100, prefetch=0, limiter=None, metrics=None,
+            lease=None)
+
+    def test_earlier_trigger_rearms(self):
+        """
+        Arming a wakeup earlier than the armed one replaces it, and a later
+        one is ignored
+        """
+        log = mock_log()
+        self.service.arm_wakeup(log, 2, self.now + timedelta(seconds=10), 100)
+        self.service.arm_wakeup(log, 2, self.now + timedelta(seconds=20), 100)
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=10))
+        self.service.arm_wakeup(log, 2, self.now + timedelta(seconds=3), 100)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(3)
+        self.assertEqual(self.check_events_in_bucket.call_count, 1)
+
+    def test_draining_bucket_not_armed(self):
+        """
+        A bucket being drained is neither seeded nor armed
+        """
+        self.oldest = {2: self.event_at(0), 3: self.event_at(0)}
+        self.service.check_events(100)
+        self.clock.advance(0)
+        self.assertEqual(self.service.draining, set([2, 3]))
+        self.mock_store.get_oldest_event.reset_mock()
+
+        self.service.check_events(100)
+
+        self.assertFalse(self.mock_store.get_oldest_event.called)
+        self.assertEqual(self.service.wakeups, {})
+
+    def test_reseeds_after_drain(self):
+        """
+        After a bucket is drained, only that bucket is seeded again
+        """
+        self.oldest = {2: self.event_at(0), 3: None}
+        self.service.check_events(100)
+        self.clock.advance(0)
+        self.oldest = {2: self.event_at(60), 3: self.event_at(30)}
+        self.mock_store.get_oldest_event.reset_mock()
+
+        self.check_d.callback(None)
+
+        self.assertEqual(self.service.draining, set())
+        self.assertEqual(self.mock_store.get_oldest_event.mock_calls, [mock.call(2)])
+        self.assertEqual(self.service.wakeups.keys(), [2])
+
+    def lease_drained(self, oldest, oldest_after):
+        """
+        Drain bucket 2 with a lease of 60 seconds, leaving `oldest` as its oldest
+        event and `oldest_after` as its oldest event after the check
+        """
+        self.service.lease = 60
+        self.oldest = {2: self.event_at(0), 3: None}
+        self.mock_store.get_oldest_event.side_effect = lambda bucket, after=None: (
+            defer.succeed(self.oldest.get(bucket) if after is None else oldest_after))
+        self.service.check_events(100)
+        self.clock.advance(0)
+        self.oldest[2] = oldest
+        self.mock_store.get_oldest_event.reset_mock()
+        self.check_d.callback(None)
+
+    def test_lease_claimed_head_backs_off(self):
+        """
+        With a lease, a due event left in the bucket after it is drained is claimed
+        by another node. The bucket is not checked again right away but when the
+        claim expires or at the oldest event after the check, whichever is earlier
+        """
+        self.lease_drained(self.event_at(-5), self.event_at(90))
+
+        self.assertEqual(self.mock_store.get_oldest_event.mock_calls,
+                         [mock.call(2), mock.call(2, after=self.now)])
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=60))
+        self.assertEqual(self.service.checked, {2: self.now})
+
+    def test_lease_claimed_head_earlier_event_after(self):
+        """
+        With a lease, the wakeup after a bucket is drained is armed at the oldest
+        event after the check if it is earlier than the claims expire
+        """
+        self.lease_drained(self.event_at(-5), self.event_at(10))
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=10))
+
+    def test_lease_backoff_kept_when_seeding(self):
+        """
+        Seeding the buckets on every iteration does not check a bucket whose due
+        events were left claimed by others
+        """
+        self.lease_drained(self.event_at(-5), None)
+        self.service.wakeups.pop(2)[1].cancel()
+
+        self.service.check_events(100)
+        self.clock.advance(0)
+
+        self.assertEqual(self.check_events_in_bucket.call_count, 1)
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=60))
+
+    def test_lease_backoff_cleared(self):
+        """
+        A bucket whose oldest event is after its last check is armed at that event
+        and its last check is forgotten
+        """
+        self.lease_drained(self.event_at(30), None)
+
+        self.assertEqual(self.mock_store.get_oldest_event.mock_calls, [mock.call(2)])
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=30))
+        self.assertEqual(self.service.checked, {})
+
+    def test_lease_backoff_of_lost_bucket_forgotten(self):
+        """
+        Last check of a bucket that is no longer owned is forgotten
+        """
+        self.lease_drained(self.event_at(-5), None)
+        self.kz_partition.__iter__.return_value = [3]
+
+        self.service.check_events(100)
+
+        self.assertEqual(self.service.checked, {})
+
+    def test_lost_bucket_not_reseeded_after_drain(self):
+        """
+        A bucket that is no longer owned after being drained is not seeded again
+        """
+        self.oldest = {2: self.event_at(0), 3: None}
+        self.service.check_events(100)
+        self.clock.advance(0)
+        self.kz_partition.__iter__.return_value = [3]
+        self.mock_store.get_oldest_event.reset_mock()
+
+        self.check_d.callback(None)
+
+        self.assertFalse(self.mock_store.get_oldest_event.called)
+        self.assertEqual(self.service.wakeups, {})
+
+    def test_events_added_arms_earlier(self):
+        """
+        Events added by this node arm wakeups of their owned buckets if they are
+        earlier than the armed ones
+        """
+        self.oldest = {2: self.event_at(60), 3: None}
+        self.service.check_events(100)
+
+        self.service.events_added([(2, self.now + timedelta(seconds=5)),
+                                   (3, self.now + timedelta(seconds=10)),
+                                   (4, self.now + timedelta(seconds=1))])
+
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=5))
+        self.assertEqual(self.service.wakeups[3][0], self.now + timedelta(seconds=10))
+        self.assertNotIn(4, self.service.wakeups)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 2)
+        self.clock.advance(5)
+        self.check_events_in_bucket.assert_called_once_with(
+            mock.ANY, self.mock_store, 2, self.now, 100, prefetch=0, limiter=None, metrics=None,
+            lease=None)
+
+    def test_events_added_to_draining_bucket(self):
+        """
+        Events added to a bucket being drained do not arm it. It is seeded again
+        once drained
+        """
+        self.oldest = {2: self.event_at(0), 3: None}
+        self.service.check_events(100)
+        self.clock.advance(0)
+
+        self.service.events_added([(2, self.now + timedelta(seconds=5))])
+        self.assertEqual(self.service.wakeups, {})
+
+        self.oldest[2] = self.event_at(5)
+        self.check_d.callback(None)
+        self.assertEqual(self.service.wakeups[2][0], self.now + timedelta(seconds=5))
+
+    def test_events_added_not_running(self):
+        """
+        Events added are ignored when the service is not event driven, is not
+        running or its buckets are not acquired
+        """
+        self.service.event_driven = False
+        self.service.events_added([(2, self.now)])
+        self.service.event_driven = True
+        self.service.running = False
+        self.service.events_added([(2, self.now)])
+        self.service.running = True
+        self.kz_partition.acquired = False
+        self.service.events_added([(2, self.now)])
+        self.assertEqual(self.service.wakeups, {})
+
+    def test_unowned_bucket_not_checked(self):
+        """
+        Wakeup of a bucket that is no longer owned does not check it
+        """
+        self.oldest = {2: self.event_at(5), 3: None}
+        self.service.check_events(100)
+        self.kz_partition.__iter__.return_value = [3]
+        self.clock.advance(5)
+        self.assertFalse(self.check_events_in_bucket.called)
+
+    def test_lost_buckets_disarmed(self):
+        """
+        Wakeups of buckets no longer owned are cancelled when seeding
+        """
+        self.oldest = {2: self.event_at(5), 3: self.event_at(5)}
+        self.service.check_events(100)
+        self.kz_partition.__iter__.return_value = [3]
+
+        self.service.check_events(100)
+
+        self.assertEqual(self.service.wakeups.keys(), [3])
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+
+    def test_seed_error_logged(self):
+        """
+        Error getting oldest event of a bucket is logged and other buckets are
+        still seeded
+        """
+        self.oldest = {2: None, 3: self.event_at(5)}
+        self.mock_store.get_oldest_event.side_effect = lambda b: (
+            defer.fail(ValueError('e')) if b == 2 else defer.succeed(self.oldest[b]))
+        log = mock_log()
+
+        d = self.service.track_buckets(log, [2, 3], 100)
+
+        self.assertIsNone(self.successResultOf(d))
+        log.err.assert_called_once_with(CheckFailure(ValueError),
+                                        'Could not seed bucket {bucket}', bucket=2)
+        self.assertEqual(self.service.wakeups.keys(), [3])
+
+    def test_stop_service_cancels_wakeups(self):
+        """
+        Stopping the service cancels all armed wakeups
+        """
+        self.oldest = {2: self.event_at(5), 3: self.event_at(10)}
+        self.service.check_events(100)
+        self.service.stopService()
+        self.assertEqual(self.service.wakeups, {})
+        self.assertEqual(self.clock.getDelayedCalls(), [])
 
 
 class CheckEventsInBucketTests(SchedulerTests):
@@ -298,7 +822,7 @@ class CheckEventsInBucketTests(SchedulerTests):
         self.mock_store.fetch_and_delete.side_effect = _responses
         self.process_events = patch(
             self, 'otter.scheduler.process_events',
-            side_effect=lambda events, store, log: defer.succeed(len(events)))
+            side_effect=lambda events, store, log, **_: defer.succeed(len(events)))
         self.log = mock.Mock()
 
     def test_fetch_called(self):
@@ -316,7 +840,8 @@ class CheckEventsInBucketTests(SchedulerTests):
         """
         d = check_events_in_bucket(self.log, self.mock_store, 1, 'utcnow', 100)
         self.successResultOf(d)
-        self.process_events.assert_called_once_with([], self.mock_store, self.log.bind())
+        self.process_events.assert_called_once_with([], self.mock_store, self.log.bind(),
+                                                    limiter=None, metrics=None)
 
     def test_events_in_limit(self):
         """
@@ -331,7 +856,8 @@ class CheckEventsInBucketTests(SchedulerTests):
         self.successResultOf(d)
         # Ensure fetch_and_delete and process_events is called only once
         self.mock_store.fetch_and_delete.assert_called_once_with(1, 'utcnow', 100)
-        self.process_events.assert_called_once_with(events, self.mock_store, self.log.bind())
+        self.process_events.assert_called_once_with(events, self.mock_store, self.log.bind(),
+                                                    limiter=None, metrics=None)
 
     def test_events_process_error(self):
         """
@@ -361,8 +887,10 @@ class CheckEventsInBucketTests(SchedulerTests):
         self.assertEqual(self.mock_store.fetch_and_delete.mock_calls,
                          [mock.call(1, 'now', 100)] * 2)
         self.assertEqual(self.process_events.mock_calls,
-                         [mock.call(events1, self.mock_store, self.log.bind()),
-                          mock.call(events2, self.mock_store, self.log.bind())])
+                         [mock.call(events1, self.mock_store, self.log.bind(), limiter=None,
+                                    metrics=None),
+                          mock.call(events2, self.mock_store, self.log.bind(), limiter=None,
+                                    metrics=None)])
 
     def test_events_batch_error(self):
         """
@@ -380,7 +908,7 @@ class CheckEventsInBucketTests(SchedulerTests):
         self.assertEqual(self.mock_store.fetch_and_delete.mock_calls,
                          [mock.call(1, 'now', 100)] * 2)
         self.process_events.assert_called_once_with(events, self.mock_store,
-                                                    self.log.bind())
+                                                    self.log.bind(), limiter=None, metrics=None)
 
     def test_events_batch_process(self):
         """
@@ -401,9 +929,149 @@ class CheckEventsInBucketTests(SchedulerTests):
         self.assertEqual(self.mock_store.fetch_and_delete.mock_calls,
                          [mock.call(1, 'now', 100)] * 3)
         self.assertEqual(self.process_events.mock_calls,
-                         [mock.call(events1, self.mock_store, self.log.bind()),
-                          mock.call(events2, self.mock_store, self.log.bind()),
-                          mock.call(events3, self.mock_store, self.log.bind())])
+                         [mock.call(events1, self.mock_store, self.log.bind(), limiter=None,
+                                    metrics=None),
+                          mock.call(events2, self.mock_store, self.log.bind(), limiter=None,
+                                    metrics=None),
+                          mock.call(events3, self.mock_store, self.log.bind(), limiter=None,
+                                    metrics=None)])
+
+    def test_lease(self):
+        """
+        With a lease, events are claimed and deleted as claimed after they are
+        processed, even if processing changed them
+        """
+        events = [{'tenantId': '1234', 'groupId': 'scal44', 'policyId': 'pol4',
+                   'trigger': 'now', 'cron': 'c', 'bucket': 1}]
+        self.mock_store.claim_events.return_value = defer.succeed(events)
+        self.mock_store.delete_claimed_events.return_value = defer.succeed(None)
+
+        def process(events, *_, **k):
+            events[0]['trigger'] = 'next'
+            return defer.succeed(1)
+
+        self.process_events.side_effect = process
+
+        d = check_events_in_bucket(self.log, self.mock_store, 1, 'now', 100, lease=30)
+
+        self.successResultOf(d)
+        self.mock_store.claim_events.assert_called_once_with(1, 'now', 100, lease=30)
+        self.assertFalse(self.mock_store.fetch_and_delete.called)
+        self.process_events.assert_called_once_with(events, self.mock_store, self.log.bind(),
+                                                    limiter=None, metrics=None)
+        self.mock_store.delete_claimed_events.assert_called_once_with(
+            1, [dict(events[0], trigger='now')])
+
+    def test_lease_process_error(self):
+        """
+        Claimed events are not deleted if processing them fails, so that they are
+        claimed again after the lease expires
+        """
+        self.mock_store.claim_events.return_value = defer.succeed([{'policyId': 'p'}])
+        self.process_events.side_effect = lambda *_, **k: defer.fail(ValueError('e'))
+
+        d = check_events_in_bucket(self.log, self.mock_store, 1, 'now', 100, lease=30)
+
+        self.successResultOf(d)
+        self.log.bind.return_value.err.assert_called_once_with(CheckFailure(ValueError))
+        self.assertFalse(self.mock_store.delete_claimed_events.called)
+
+
+class PipelinedCheckEventsInBucketTests(SchedulerTests):
+    """
+    Tests for `check_events_in_bucket` with prefetching
+    """
+
+    def setUp(self):
+        """
+        Mock store.fetch_and_delete and `process_events` to return deferreds
+        that are fired by the tests
+        """
+        super(PipelinedCheckEventsInBucketTests, self).setUp()
+        self.fetches = []
+        self.mock_store.fetch_and_delete.side_effect = (
+            lambda *_: self.fetches.append(defer.Deferred()) or self.fetches[-1])
+        self.processes = []
+        self.process_events = patch(
+            self, 'otter.scheduler.process_events',
+            side_effect=lambda *_, **k: self.processes.append(defer.Deferred()) or self.processes[-1])
+        self.log = mock_log()
+
+    def batch(self, num):
+        """
+        Return a batch of `num` events
+        """
+        return [{'tenantId': '1234', 'groupId': 'scal44', 'policyId': 'pol4{}'.format(i),
+                 'trigger': 'now', 'cron': None} for i in range(num)]
+
+    def test_next_batch_fetched_while_processing(self):
+        """
+        Next batch is fetched as soon as the previous fetch completes, without
+        waiting for it to be processed
+        """
+        events1, events2 = self.batch(3), self.batch(1)
+        d = check_events_in_bucket(self.log, self.mock_store, 1, 'now', 3, prefetch=1)
+
+        self.fetches[0].callback(events1)
+        self.assertEqual(len(self.fetches), 2)
+        self.assertEqual(self.process_events.mock_calls,
+                         [mock.call(events1, self.mock_store, mock.ANY, limiter=None, metrics=None)])
+
+        self.fetches[1].callback(events2)
+        self.assertEqual(len(self.fetches), 2)
+        # second batch is not processed until first one completes
+        self.assertEqual(len(self.processes), 1)
+        self.processes[0].callback(3)
+        self.assertEqual(self.process_events.call_args[0][0], events2)
+        self.assertNoResult(d)
+        self.processes[1].callback(1)
+        self.assertIsNone(self.successResultOf(d))
+
+    def test_prefetch_depth_bounded(self):
+        """
+        No more than `prefetch` batches are fetched ahead of the processing one
+        """
+        d = check_events_in_bucket(self.log, self.mock_store, 1, 'now', 2, prefetch=2)
+        for i in range(3):
+            self.fetches[i].callback(self.batch(2))
+        # 1 processing and 2 waiting
+        self.assertEqual(len(self.fetches), 3)
+        self.processes[0].callback(2)
+        self.assertEqual(len(self.fetches), 4)
+        self.fetches[3].callback([])
+        for i in range(1, 4):
+            self.processes[i].callback(None)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(self.mock_store.fetch_and_delete.mock_calls,
+                         [mock.call(1, 'now', 2)] * 4)
+
+    def test_fetch_error(self):
+        """
+        Error in fetching is logged and already fetched batches are processed
+        """
+        events = self.batch(2)
+        d = check_events_in_bucket(self.log, self.mock_store, 1, 'now', 2, prefetch=1)
+        self.fetches[0].callback(events)
+        self.fetches[1].errback(ValueError('e'))
+        self.log.err.assert_called_once_with(CheckFailure(ValueError), bucket=1)
+        self.processes[0].callback(2)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(self.process_events.call_count, 1)
+
+    def test_process_error(self):
+        """
+        Error in processing is logged, batches already fetched are still processed
+        and no more batches are fetched
+        """
+        d = check_events_in_bucket(self.log, self.mock_store, 1, 'now', 2, prefetch=1)
+        self.fetches[0].callback(self.batch(2))
+        self.fetches[1].callback(self.batch(2))
+        self.processes[0].errback(ValueError('e'))
+        self.log.err.assert_called_once_with(CheckFailure(ValueError), bucket=1)
+        self.assertEqual(len(self.fetches), 2)
+        self.processes[1].callback(2)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(len(self.fetches), 2)
 
 
 class ProcessEventsTests(SchedulerTests):
@@ -437,13 +1105,52 @@ class ProcessEventsTests(SchedulerTests):
         Test success path: Logs number of events, calls `execute_event` on each event
         and calls `add_cron_events`
         """
-        events = range(10)
+        events = [{'tenantId': '1234', 'groupId': 'scal{}'.format(i)} for i in range(10)]
         d = process_events(events, self.mock_store, self.log)
         self.assertEqual(self.successResultOf(d), 10)
         self.log.msg.assert_called_once_with('Processing {num_events} events', num_events=10)
         self.assertEqual(
             self.execute_event.mock_calls,
-            [mock.call(self.mock_store, self.log, event, set()) for event in events])
+            [mock.call(self.mock_store, self.log, event, set(), metrics=None)
+             for event in events])
+        self.add_cron_events.assert_called_once_with(self.mock_store, self.log, events, set())
+
+    def test_same_group_events(self):
+        """
+        Events of the same group are executed together with `execute_group_events`
+        and other events are executed with `execute_event`
+        """
+        group_events = patch(self, 'otter.scheduler.execute_group_events',
+                             return_value=defer.succeed(None))
+        events = [{'tenantId': '1234', 'groupId': 'scal1', 'policyId': 'p1'},
+                  {'tenantId': '1234', 'groupId': 'scal2', 'policyId': 'p2'},
+                  {'tenantId': '1234', 'groupId': 'scal1', 'policyId': 'p3'}]
+
+        d = process_events(events, self.mock_store, self.log)
+
+        self.assertEqual(self.successResultOf(d), 3)
+        group_events.assert_called_once_with(
+            self.mock_store, self.log, [events[0], events[2]], set(), metrics=None)
+        self.execute_event.assert_called_once_with(self.mock_store, self.log, events[1], set(),
+                                                   metrics=None)
+        self.add_cron_events.assert_called_once_with(self.mock_store, self.log, events, set())
+
+    def test_with_limiter(self):
+        """
+        Events of each group are executed through the limiter keyed by tenant ID
+        """
+        limiter = mock.Mock(spec=['run'])
+        limiter.run.side_effect = lambda key, f, *args: f(*args)
+        events = [{'tenantId': str(i), 'groupId': 'scal'} for i in range(3)]
+
+        d = process_events(events, self.mock_store, self.log, limiter=limiter)
+
+        self.assertEqual(self.successResultOf(d), 3)
+        self.assertEqual([c[1][0] for c in limiter.run.mock_calls], ['0', '1', '2'])
+        self.assertEqual(
+            self.execute_event.mock_calls,
+            [mock.call(self.mock_store, self.log, event, set(), metrics=None)
+             for event in events])
         self.add_cron_events.assert_called_once_with(self.mock_store, self.log, events, set())
 
 
@@ -454,12 +1161,12 @@ class AddCronEventsTests(SchedulerTests):
 
     def setUp(self):
         """
-        Mock store.add_cron_events and next_cron_occurrence
+        Mock store.add_cron_events and next_cron_occurrences
         """
         super(AddCronEventsTests, self).setUp()
         self.mock_store.add_cron_events.return_value = defer.succeed(None)
-        self.next_cron_occurrence = patch(self, 'otter.scheduler.next_cron_occurrence',
-                                          return_value='next')
+        self.next_cron_occurrences = patch(self, 'otter.scheduler.next_cron_occurrences',
+                                           side_effect=lambda events: ['next'] * len(events))
         self.log = mock_log()
 
     def test_no_events(self):
@@ -469,7 +1176,7 @@ class AddCronEventsTests(SchedulerTests):
         d = add_cron_events(self.mock_store, self.log, [], set())
         self.assertIsNone(d)
         self.assertFalse(self.log.msg.called)
-        self.assertFalse(self.next_cron_occurrence.called)
+        self.assertFalse(self.next_cron_occurrences.called)
         self.assertFalse(self.mock_store.add_cron_events.called)
 
     def test_no_events_to_add(self):
@@ -482,7 +1189,7 @@ class AddCronEventsTests(SchedulerTests):
                             set(['pol4{}'.format(i) for i in range(3)]))
         self.assertIsNone(d)
         self.assertFalse(self.log.msg.called)
-        self.assertFalse(self.next_cron_occurrence.called)
+        self.assertFalse(self.next_cron_occurrences.called)
         self.assertFalse(self.mock_store.add_cron_events.called)
 
     def test_store_add_cron_called(self):
@@ -500,10 +1207,263 @@ class AddCronEventsTests(SchedulerTests):
         d = add_cron_events(self.mock_store, self.log, events, deleted_policy_ids)
 
         self.assertIsNone(self.successResultOf(d), None)
-        self.assertEqual(self.next_cron_occurrence.call_count, 8)
+        self.next_cron_occurrences.assert_called_once_with(new_events)
         self.mock_store.add_cron_events.assert_called_once_with(new_events)
 
 
+class SchedulerMetricsTests(TestCase):
+    """
+    Tests for `Histogram` and `SchedulerMetrics`
+    """
+
+    def setUp(self):
+        """
+        Metrics with a clock
+        """
+        self.clock = Clock()
+        self.metrics = SchedulerMetrics(self.clock)
+
+    def test_histogram(self):
+        """
+        `Histogram` counts values cumulatively in buckets along with their count, sum
+        and max
+        """
+        histogram = Histogram([1, 5])
+        for value in [0.5, 1, 3, 10]:
+            histogram.observe(value)
+        self.assertEqual(histogram.as_dict(),
+                         {'le_1': 2, 'le_5': 3, 'le_inf': 4, 'count': 4, 'sum': 14.5,
+                          'max': 10})
+
+    def test_fetched(self):
+        """
+        Fetched events are counted and fetch latency observed
+        """
+        self.metrics.fetched(10, 0.2)
+        self.assertEqual(self.metrics.counts['fetched'], 10)
+        self.assertEqual(self.metrics.fetch_latency.count, 1)
+        self.assertEqual(self.metrics.fetch_latency.max, 0.2)
+
+    def test_executing(self):
+        """
+        Trigger lag is observed in histogram of event's bucket
+        """
+        self.clock.advance(100)
+        self.metrics.executing({'bucket': 2, 'trigger': datetime(1970, 1, 1, 0, 1, 30)})
+        self.assertEqual(self.metrics.lag.keys(), [2])
+        self.assertEqual(self.metrics.lag[2].sum, 10)
+
+    def test_policy_done(self):
+        """
+        Executed policies and the ones that could not be executed are counted, and
+        the result returned as is
+        """
+        failure = Failure(CannotExecutePolicyError(*range(4)))
+        self.assertEqual(self.metrics.policy_done('state'), 'state')
+        self.assertIs(self.metrics.policy_done(failure), failure)
+        self.metrics.policy_done(Failure(ValueError(2)))
+        self.assertEqual(self.metrics.counts['executed'], 1)
+        self.assertEqual(self.metrics.counts['cannot_execute'], 1)
+
+    def test_start_tick(self):
+        """
+        `start_tick` keeps fetched and executed counts since previous tick
+        """
+        self.metrics.fetched(10, 0.1)
+        self.metrics.policy_done('state')
+        self.metrics.start_tick()
+        self.metrics.fetched(3, 0.1)
+        self.metrics.start_tick()
+        self.assertEqual(self.metrics.last_tick, {'fetched': 3, 'executed': 0})
+        self.assertEqual(self.metrics.counts['fetched'], 13)
+
+    def test_get_metrics(self):
+        """
+        `get_metrics` returns flattened metrics with current time
+        """
+        self.clock.advance(100)
+        self.metrics.fetched(10, 0.1)
+        self.metrics.executing({'bucket': 2, 'trigger': datetime(1970, 1, 1, 0, 1, 30)})
+        metrics = dict((m['id'], m['value']) for m in self.metrics.get_metrics())
+        self.assertEqual(metrics['otter.metrics.scheduler.fetched'], 10)
+        self.assertEqual(metrics['otter.metrics.scheduler.fetch_latency.le_0.1'], 1)
+        self.assertEqual(metrics['otter.metrics.scheduler.lag.2.le_10'], 1)
+        self.assertEqual(metrics['otter.metrics.scheduler.lock_wait.count'], 0)
+        self.assertEqual(metrics['otter.metrics.scheduler.last_tick.executed'], 0)
+        self.assertEqual(set(m['time'] for m in self.metrics.get_metrics()), set([100]))
+
+
+class MeasuredExecutionTests(SchedulerTests):
+    """
+    Tests for recording fetching and execution of events in `SchedulerMetrics`
+    """
+
+    def setUp(self):
+        """
+        Mock the group and policy execution
+        """
+        super(MeasuredExecutionTests, self).setUp()
+        self.clock = Clock()
+        self.metrics = SchedulerMetrics(self.clock)
+        self.mock_group = iMock(IScalingGroup)
+        self.mock_store.get_scaling_group.return_value = self.mock_group
+        self.lock = defer.Deferred()
+
+        def _mock_modify_state(modifier, *args, **kwargs):
+            return self.lock.addCallback(lambda _: modifier(self.mock_group, {}))
+
+        def _mock_modify_state_for_policy(modifier, policy_id, version):
+            return self.lock.addCallback(lambda _: modifier(
+                self.mock_group, {}, config={}, launch={}, policy={}))
+
+        self.mock_group.modify_state.side_effect = _mock_modify_state
+        self.mock_group.modify_state_for_policy.side_effect = _mock_modify_state_for_policy
+        self.maybe_exec_policy = patch(self, 'otter.scheduler.maybe_execute_scaling_policy',
+                                       return_value=defer.succeed({}))
+        self.event = {'tenantId': '1234', 'groupId': 'scal44', 'policyId': 'pol44',
+                      'trigger': datetime(1970, 1, 1), 'cron': None, 'bucket': 1,
+                      'version': 'v2'}
+
+    def test_fetch(self):
+        """
+        Fetch latency and fetched events are recorded
+        """
+        self.mock_store.fetch_and_delete.return_value = defer.succeed([self.event])
+        patch(self, 'otter.scheduler.process_events', return_value=1)
+
+        d = check_events_in_bucket(mock_log(), self.mock_store, 1, 'now', 100,
+                                   metrics=self.metrics)
+
+        self.successResultOf(d)
+        self.assertEqual(self.metrics.counts['fetched'], 1)
+        self.assertEqual(self.metrics.fetch_latency.count, 1)
+
+    def test_execute_event(self):
+        """
+        Time waited for the lock, trigger lag and executed policy are recorded
+        """
+        d = execute_event(self.mock_store, mock_log(), self.event, set(),
+                          metrics=self.metrics)
+        self.clock.advance(3)
+        self.lock.callback(None)
+
+        self.successResultOf(d)
+        self.assertEqual(self.metrics.lock_wait.sum, 3)
+        self.assertEqual(self.metrics.lag[1].sum, 3)
+        self.assertEqual(self.metrics.counts['executed'], 1)
+
+    def test_execute_group_events(self):
+        """
+        Lock wait is recorded once and each policy execution is recorded
+        """
+        self.maybe_exec_policy.side_effect = [
+            defer.succeed({}), defer.fail(CannotExecutePolicyError(*range(4)))]
+        events = [self.event, dict(self.event, policyId='pol45')]
+
+        d = execute_group_events(self.mock_store, mock_log(), events, set(),
+                                 metrics=self.metrics)
+        self.clock.advance(2)
+        self.lock.callback(None)
+
+        self.successResultOf(d)
+        self.assertEqual(self.metrics.lock_wait.count, 1)
+        self.assertEqual(self.metrics.lag[1].count, 2)
+        self.assertEqual(self.metrics.counts['executed'], 1)
+        self.assertEqual(self.metrics.counts['cannot_execute'], 1)
+
+    def test_dropped(self):
+        """
+        Events of deleted policies are counted as dropped
+        """
+        self.mock_group.modify_state_for_policy.side_effect = (
+            lambda *_: defer.fail(NoSuchPolicyError(1, 2, 3)))
+        patch(self, 'otter.scheduler.add_cron_events')
+
+        d = process_events([self.event], self.mock_store, mock_log(), metrics=self.metrics)
+
+        self.assertEqual(self.successResultOf(d), 1)
+        self.assertEqual(self.metrics.counts['dropped'], 1)
+
+
+class NextCronOccurrenceTests(TestCase):
+    """
+    Tests for `parse_cron`, `next_cron_occurrence` and `next_cron_occurrences`
+    """
+
+    def setUp(self):
+        """
+        Start with empty cron cache
+        """
+        self.cache = patch(self, 'otter.scheduler._cron_cache', new=OrderedDict())
+
+    def test_parse_cron_cached(self):
+        """
+        `parse_cron` parses a cron entry only once
+        """
+        croniter = patch(self, 'otter.scheduler.croniter', side_effect=lambda cron: object())
+        parsed = parse_cron('0 * * * *')
+        self.assertIs(parse_cron('0 * * * *'), parsed)
+        croniter.assert_called_once_with('0 * * * *')
+
+    def test_parse_cron_evicts_least_recently_used(self):
+        """
+        `parse_cron` keeps at most CRON_CACHE_SIZE entries, evicting the least
+        recently used one
+        """
+        patch(self, 'otter.scheduler.CRON_CACHE_SIZE', new=2)
+        parse_cron('0 * * * *')
+        parse_cron('1 * * * *')
+        parse_cron('0 * * * *')
+        parse_cron('2 * * * *')
+        self.assertEqual(self.cache.keys(), ['0 * * * *', '2 * * * *'])
+
+    def test_next_cron_occurrence_start_time(self):
+        """
+        `next_cron_occurrence` returns next occurrence after given time and does
+        not change the cached entry
+        """
+        start = datetime(2014, 1, 1, 10, 0, 10)
+        self.assertEqual(next_cron_occurrence('0 * * * *', start),
+                         datetime(2014, 1, 1, 11, 0, 0))
+        self.assertEqual(next_cron_occurrence('0 * * * *', start),
+                         datetime(2014, 1, 1, 11, 0, 0))
+
+    def test_next_cron_occurrence_now(self):
+        """
+        `next_cron_occurrence` returns next occurrence after now by default
+        """
+        now = datetime.utcnow()
+        self.assertTrue(now < next_cron_occurrence('* * * * *') <= now + timedelta(minutes=1))
+
+    def test_next_cron_occurrences_follow_trigger(self):
+        """
+        Next occurrences follow the trigger time of each event and are computed once
+        for same cron entry and trigger
+        """
+        next_occurrence = patch(self, 'otter.scheduler.next_cron_occurrence',
+                                wraps=next_cron_occurrence)
+        trigger = datetime(2014, 1, 1, 10, 0, 0)
+        events = [{'cron': '0 * * * *', 'trigger': trigger},
+                  {'cron': '*/5 * * * *', 'trigger': trigger},
+                  {'cron': '0 * * * *', 'trigger': trigger}]
+
+        occurrences = next_cron_occurrences(events, now=trigger + timedelta(minutes=2))
+
+        self.assertEqual(occurrences, [datetime(2014, 1, 1, 11, 0, 0),
+                                       datetime(2014, 1, 1, 10, 5, 0),
+                                       datetime(2014, 1, 1, 11, 0, 0)])
+        self.assertEqual(next_occurrence.call_count, 2)
+
+    def test_next_cron_occurrences_skip_missed(self):
+        """
+        Occurrences that are already past are skipped
+        """
+        trigger = datetime(2014, 1, 1, 10, 0, 0)
+        occurrences = next_cron_occurrences([{'cron': '*/5 * * * *', 'trigger': trigger}],
+                                            now=trigger + timedelta(minutes=12))
+        self.assertEqual(occurrences, [datetime(2014, 1, 1, 10, 15, 0)])
+
+
 class ExecuteEventTests(SchedulerTests):
     """
     Tests for `execute_event`
@@ -524,11 +1484,12 @@ class ExecuteEventTests(SchedulerTests):
         def _set_new_state(new_state):
             self.new_state = new_state
 
-        def _mock_modify_state(modifier, *args, **kwargs):
-            d = modifier(self.mock_group, self.mock_state, *args, **kwargs)
+        def _mock_modify_state_for_policy(modifier, policy_id, version):
+            d = modifier(self.mock_group, self.mock_state, config='config',
+                         launch='launch', policy='policy')
             return d.addCallback(_set_new_state)
 
-        self.mock_group.modify_state.side_effect = _mock_modify_state
+        self.mock_group.modify_state_for_policy.side_effect = _mock_modify_state_for_policy
         self.maybe_exec_policy = patch(self, 'otter.scheduler.maybe_execute_scaling_policy',
                                        return_value=defer.succeed('newstate'))
         self.log = mock.Mock()
@@ -549,8 +1510,10 @@ class ExecuteEventTests(SchedulerTests):
         log.msg.assert_called_once_with('Scheduler executing policy {policy_id}')
         self.maybe_exec_policy.assert_called_once_with(
             log, 'transaction-id', self.mock_group, self.mock_state,
-            policy_id=self.event['policyId'], version=self.event['version'])
-        self.assertTrue(self.mock_group.modify_state.called)
+            policy_id=self.event['policyId'], version=self.event['version'],
+            config='config', launch='launch', policy='policy')
+        self.mock_group.modify_state_for_policy.assert_called_once_with(
+            mock.ANY, self.event['policyId'], self.event['version'])
         self.assertEqual(self.new_state, 'newstate')
         self.assertEqual(len(del_pol_ids), 0)
 
@@ -560,7 +1523,8 @@ class ExecuteEventTests(SchedulerTests):
         deleted_policy_ids and does not call maybe_execute_scaling_policy
         """
         del_pol_ids = set()
-        self.mock_group.modify_state.side_effect = lambda *_: defer.fail(NoSuchScalingGroupError(1, 2))
+        self.mock_group.modify_state_for_policy.side_effect = (
+            lambda *_: defer.fail(NoSuchScalingGroupError(1, 2)))
 
         d = execute_event(self.mock_store, self.log, self.event, del_pol_ids)
 
@@ -574,7 +1538,7 @@ class ExecuteEventTests(SchedulerTests):
         policyId in deleted_policy_ids and does not call maybe_execute_scaling_policy
         """
         del_pol_ids = set()
-        self.mock_group.modify_state.side_effect = (
+        self.mock_group.modify_state_for_policy.side_effect = (
             lambda *_: defer.fail(NoSuchPolicyError(1, 2, 3)))
 
         d = execute_event(self.mock_store, self.log, self.event, del_pol_ids)
@@ -583,6 +1547,25 @@ class ExecuteEventTests(SchedulerTests):
         self.assertEqual(del_pol_ids, set(['pol44']))
         self.assertFalse(self.maybe_exec_policy.called)
 
+    def test_deleted_policy_event_cached_cooldown(self):
+        """
+        Policy is checked before any cooldown cache, so that an event of a
+        deleted policy is captured in deleted_policy_ids even if the policy
+        was remembered to be cooling down
+        """
+        cache = mock.Mock(spec=['rejects', 'update'])
+        cache.rejects.return_value = True
+        patch(self, 'otter.controller.get_cooldown_cache', return_value=cache)
+        del_pol_ids = set()
+        self.mock_group.modify_state_for_policy.side_effect = (
+            lambda *_: defer.fail(NoSuchPolicyError(1, 2, 3)))
+
+        d = execute_event(self.mock_store, self.log, self.event, del_pol_ids)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(del_pol_ids, set(['pol44']))
+        self.assertFalse(cache.rejects.called)
+
     def test_semantic_prob(self):
         """
         Policy execution causes semantic error like cooldowns not met.
@@ -613,3 +1596,119 @@ class ExecuteEventTests(SchedulerTests):
         self.assertEqual(len(del_pol_ids), 0)
         self.log.bind.return_value.err.assert_called_with(
             CheckFailure(ValueError), 'Scheduler failed to execute policy {policy_id}')
+
+
+class ExecuteGroupEventsTests(SchedulerTests):
+    """
+    Tests for `execute_group_events`
+    """
+
+    def setUp(self):
+        """
+        Mock execution of scaling policies on a group whose state is a dict
+        """
+        super(ExecuteGroupEventsTests, self).setUp()
+        self.mock_group = iMock(IScalingGroup)
+        self.mock_store.get_scaling_group.return_value = self.mock_group
+
+        self.state = {'executed': []}
+        self.new_state = None
+
+        def _set_new_state(new_state):
+            self.new_state = new_state
+
+        def _mock_modify_state(modifier, *args, **kwargs):
+            d = modifier(self.mock_group, self.state, *args, **kwargs)
+            return d.addCallback(_set_new_state)
+
+        self.mock_group.modify_state.side_effect = _mock_modify_state
+
+        self.results = {}
+
+        def _maybe_exec_policy(log, transaction_id, group, state, policy_id, version):
+            state['executed'].append(policy_id)
+            return self.results.get(policy_id, defer.succeed(state))
+
+        self.maybe_exec_policy = patch(self, 'otter.scheduler.maybe_execute_scaling_policy',
+                                       side_effect=_maybe_exec_policy)
+        self.log = mock_log()
+        self.events = [{'tenantId': '1234', 'groupId': 'scal44', 'policyId': 'pol4{}'.format(i),
+                        'trigger': datetime(2014, 1, 1, 0, 0, 10 - i), 'cron': '*',
+                        'bucket': 1, 'version': 'v{}'.format(i)} for i in range(3)]
+
+    def test_executed_in_trigger_order(self):
+        """
+        Policies are executed one after the other in the order of their trigger time
+        within one `modify_state` and the resulting state is saved
+        """
+        del_pol_ids = set()
+        d = execute_group_events(self.mock_store, self.log, self.events, del_pol_ids)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.mock_store.get_scaling_group.assert_called_once_with(
+            mock.ANY, '1234', 'scal44')
+        self.assertEqual(self.mock_group.modify_state.call_count, 1)
+        self.assertEqual(self.new_state, {'executed': ['pol42', 'pol41', 'pol40']})
+        self.assertEqual(
+            [c[2]['version'] for c in self.maybe_exec_policy.mock_calls], ['v2', 'v1', 'v0'])
+        self.assertEqual(len(del_pol_ids), 0)
+
+    def test_failed_policy_leaves_state(self):
+        """
+        State changes made by a policy that could not be executed are discarded and
+        the other policies are still executed. The reason is logged
+        """
+        self.results['pol41'] = defer.fail(CannotExecutePolicyError(*range(4)))
+        self.results['pol40'] = defer.fail(ValueError(4))
+
+        d = execute_group_events(self.mock_store, self.log, self.events, set())
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(self.new_state, {'executed': ['pol42']})
+        self.log.msg.assert_any_call('Scheduler cannot execute policy {policy_id}',
+                                     reason=CheckFailure(CannotExecutePolicyError),
+                                     tenant_id='1234', scaling_group_id='scal44',
+                                     policy_id='pol41')
+        self.log.err.assert_called_once_with(
+            CheckFailure(ValueError), 'Scheduler failed to execute policy {policy_id}',
+            tenant_id='1234', scaling_group_id='scal44', policy_id='pol40')
+
+    def test_deleted_policy(self):
+        """
+        Deleted policies are captured in deleted_policy_ids
+        """
+        self.results['pol41'] = defer.fail(NoSuchPolicyError(1, 2, 3))
+        del_pol_ids = set()
+
+        d = execute_group_events(self.mock_store, self.log, self.events, del_pol_ids)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(del_pol_ids, set(['pol41']))
+        self.assertEqual(self.new_state, {'executed': ['pol42', 'pol40']})
+
+    def test_nothing_executed(self):
+        """
+        State is not saved when no policy could be executed
+        """
+        for i in range(3):
+            self.results['pol4{}'.format(i)] = defer.fail(CannotExecutePolicyError(*range(4)))
+
+        d = execute_group_events(self.mock_store, self.log, self.events, set())
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertIsNone(self.new_state)
+        self.assertFalse(self.log.err.called)
+
+    def test_deleted_group(self):
+        """
+        All the policies are captured in deleted_policy_ids if the group is deleted
+        """
+        self.mock_group.modify_state.side_effect = (
+            lambda *_: defer.fail(NoSuchScalingGroupError(1, 2)))
+        del_pol_ids = set()
+
+        d = execute_group_events(self.mock_store, self.log, self.events, del_pol_ids)
+
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(del_pol_ids, set(['pol40', 'pol41', 'pol42']))
+        self.assertFalse(self.maybe_exec_policy.called)
@@ -0,0 +1,295 @@
+"""
+Tests for :mod:`otter.simulator`
+"""
+from datetime import datetime
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from otter import controller
+from otter.deletion import get_deletion_queue
+from otter.models.interface import IScalingGroup
+from otter.simulator import (
+    FakeSupervisor, Simulation, SimulatedScalingGroup, SimulationError,
+    SimulationStats, simulated_time)
+from otter.supervisor import get_supervisor
+from otter.test.utils import iMock, mock_log
+from otter.util.deferredutils import FairLimiter
+from otter.util.timestamp import now
+
+
+def _group(min_entities=1, max_entities=10, cooldown=30):
+    """
+    Return a simulated group with an 'up' policy adding 2 servers and a 'down'
+    policy removing 3
+    """
+    return {
+        'config': {'name': 'web', 'cooldown': cooldown, 'minEntities': min_entities,
+                   'maxEntities': max_entities, 'metadata': {}},
+        'launch': {'type': 'launch_server', 'args': {'server': {}}},
+        'policies': {
+            'up': {'name': 'up', 'change': 2, 'cooldown': 60, 'type': 'webhook'},
+            'down': {'name': 'down', 'change': -3, 'cooldown': 60, 'type': 'webhook'}}
+    }
+
+
+class SimulatedTimeTests(TestCase):
+    """
+    Tests for :func:`simulated_time`
+    """
+
+    def test_now_is_clock_time(self):
+        """
+        Current time of the controller and of new timestamps is the time of the
+        clock, and is real time again after
+        """
+        clock = Clock()
+        clock.advance(3600)
+        with simulated_time(clock):
+            self.assertEqual(controller.datetime.utcnow(), datetime(1970, 1, 1, 1))
+            self.assertEqual(now(), '1970-01-01T01:00:00Z')
+        self.assertIs(controller.datetime, datetime)
+        self.assertNotEqual(now()[:4], '1970')
+
+
+class FakeSupervisorTests(TestCase):
+    """
+    Tests for :class:`FakeSupervisor`
+    """
+
+    def setUp(self):
+        """
+        Fake supervisor building servers in 60 seconds
+        """
+        self.clock = Clock()
+        self.stats = SimulationStats()
+        self.group = iMock(IScalingGroup, tenant_id='t', uuid='g')
+        self.supervisor = FakeSupervisor(self.clock, self.stats, build_time=60)
+
+    def test_execute_config(self):
+        """
+        Servers are built after the build time
+        """
+        job_id, d = self.successResultOf(self.supervisor.execute_config(
+            mock_log(), 'tr', self.group, {}))
+        self.assertNoResult(d)
+        self.clock.advance(60)
+        self.assertEqual(self.successResultOf(d),
+                         {'id': 'server-1', 'links': [], 'name': 'server-1',
+                          'lb_info': []})
+        self.assertEqual(self.stats.calls, {'create_server': 1})
+
+    def test_execute_config_fails(self):
+        """
+        Servers fail to build at the failure rate
+        """
+        self.supervisor.failure_rate = 1
+        _, d = self.successResultOf(self.supervisor.execute_config(
+            mock_log(), 'tr', self.group, {}))
+        self.clock.advance(60)
+        self.failureResultOf(d, SimulationError)
+        self.assertEqual(self.stats.failed_builds, 1)
+
+    def test_execute_config_limited(self):
+        """
+        Servers are built within the launch limiter's bounds
+        """
+        self.supervisor.launch_limiter = FairLimiter(1, clock=self.clock)
+        completions = [self.successResultOf(self.supervisor.execute_config(
+            mock_log(), 'tr', self.group, {}))[1] for i in range(2)]
+        self.clock.advance(60)
+        self.successResultOf(completions[0])
+        self.assertNoResult(completions[1])
+        self.clock.advance(60)
+        self.successResultOf(completions[1])
+
+    def test_promote_and_delete(self):
+        """
+        Standby servers are promoted and servers deleted after their times
+        """
+        _, d = self.successResultOf(self.supervisor.execute_promote_server(
+            mock_log(), 'tr', self.group, {}, {'id': 's1'}))
+        deleted = self.supervisor.execute_delete_server(mock_log(), 'tr', self.group,
+                                                        {'id': 's2'})
+        self.clock.advance(5)
+        self.assertEqual(self.successResultOf(d)['id'], 's1')
+        self.successResultOf(deleted)
+        self.assertEqual(self.stats.calls, {'promote_server': 1, 'delete_server': 1})
+
+
+class SimulatedScalingGroupTests(TestCase):
+    """
+    Tests for :class:`SimulatedScalingGroup`
+    """
+
+    def setUp(self):
+        """
+        Group whose reads and writes take a second
+        """
+        self.clock = Clock()
+        self.stats = SimulationStats()
+        self.group = SimulatedScalingGroup(
+            mock_log(), 't', 'g', None,
+            {'config': _group()['config'], 'launch': {}, 'policies': {'p': {}}},
+            self.clock, 1, self.stats)
+
+    def test_reads_delayed(self):
+        """
+        Reads take the store latency and are counted
+        """
+        d = self.group.get_policy('p')
+        self.assertNoResult(d)
+        self.clock.advance(1)
+        self.assertEqual(self.successResultOf(d), {})
+        self.assertEqual(self.stats.calls, {'get_policy': 1})
+
+    def test_modify_state_locked(self):
+        """
+        State modifications are serialized and the time waited for the lock is
+        recorded
+        """
+        modified = []
+
+        def modifier(group, state):
+            modified.append(self.clock.seconds())
+            return state
+
+        ds = [self.group.modify_state(modifier) for i in range(2)]
+        self.clock.pump([1, 1])
+        self.successResultOf(ds[0])
+        self.assertNoResult(ds[1])
+        self.clock.pump([1, 1])
+        self.successResultOf(ds[1])
+        self.assertEqual(modified, [1, 3])
+        self.assertEqual((self.stats.lock_wait.count, self.stats.lock_wait.sum), (2, 2))
+        self.assertEqual(self.stats.calls, {'view_state': 2, 'modify_state': 2})
+
+    def test_view_execution_bundle(self):
+        """
+        The state, configs and policy are read together with the latency of one
+        read
+        """
+        d = self.group.view_execution_bundle('p')
+        self.assertNoResult(d)
+        self.clock.advance(1)
+        state, config, launch, policy = self.successResultOf(d)
+        self.assertIs(state, self.group.state)
+        self.assertEqual((config, launch, policy), (_group()['config'], {}, {}))
+        self.assertEqual(self.stats.calls, {'view_execution_bundle': 1})
+
+
+class SimulationTests(TestCase):
+    """
+    Tests for :class:`Simulation`
+    """
+
+    def test_obeys_config_at_start(self):
+        """
+        Groups are scaled to their minimum at the start, and their capacity is
+        sampled over time
+        """
+        simulation = Simulation({'web': _group(min_entities=2)}, build_time=30,
+                                sample_interval=20)
+        report = simulation.run([], 60)
+        self.assertEqual(
+            [(s['time'], s['desired'], s['active'], s['pending'])
+             for s in report['capacity']['web']],
+            [(0, 0, 0, 0), (20, 2, 0, 2), (40, 2, 2, 0), (60, 2, 2, 0)])
+        self.assertEqual(report['api_calls']['create_server'], 2)
+
+    def test_webhooks_and_cooldowns(self):
+        """
+        A burst of webhook executions scales the group once and the others are
+        rejected by the cooldown
+        """
+        simulation = Simulation({'web': _group()}, build_time=30)
+        report = simulation.run(
+            [{'at': 10, 'type': 'webhook', 'group': 'web', 'policy': 'up', 'count': 3}],
+            100)
+        self.assertEqual(report['executions'],
+                         {'executed': 1, 'rejected': 2, 'coalesced': 0, 'failed': 0})
+        self.assertEqual(report['capacity']['web'][-1]['active'], 3)
+        # obeying the config, executions and completions of the 3 servers
+        self.assertEqual(report['lock_wait']['count'], 7)
+
+    def test_schedule_and_scale_down(self):
+        """
+        Scheduled policies are executed by the scheduler and evicted servers are
+        deleted from the deletion queue
+        """
+        simulation = Simulation({'web': _group(min_entities=0, cooldown=0)},
+                                build_time=30)
+        report = simulation.run(
+            [{'at': 10, 'type': 'schedule', 'group': 'web', 'policy': 'up'},
+             {'at': 100, 'type': 'schedule', 'group': 'web', 'policy': 'down'}],
+            200)
+        self.assertEqual(report['scheduler'], {'executed': 2, 'cannot_execute': 0})
+        self.assertEqual(report['capacity']['web'][-1]['active'], 0)
+        self.assertEqual(report['api_calls']['delete_server'], 2)
+
+    def test_config_change(self):
+        """
+        Config changes are obeyed
+        """
+        simulation = Simulation({'web': _group()}, build_time=30)
+        report = simulation.run(
+            [{'at': 10, 'type': 'config', 'group': 'web', 'config': {'minEntities': 4}}],
+            100)
+        self.assertEqual(report['capacity']['web'][-1]['active'], 4)
+        self.assertEqual(report['api_calls']['create_server'], 4)
+
+    def test_failed_builds(self):
+        """
+        Servers failing to build are reported
+        """
+        simulation = Simulation({'web': _group(min_entities=3)}, build_time=30,
+                                failure_rate=1, seed=0)
+        report = simulation.run([], 100)
+        self.assertEqual(report['failed_builds'], 3)
+        self.assertEqual(report['capacity']['web'][-1]['active'], 0)
+        self.flushLoggedErrors(SimulationError)
+
+    def test_restores_singletons(self):
+        """
+        The supervisor, deletion queue and controller optimizations are restored
+        after the simulation
+        """
+        supervisor = get_supervisor()
+        simulation = Simulation({'web': _group()}, cooldown_cache_ttl=10,
+                                coalesce_executions=True, completion_window=1)
+        simulation.run([], 10)
+        self.assertIs(get_supervisor(), supervisor)
+        self.assertIsNone(get_deletion_queue())
+        self.assertIsNone(controller.get_cooldown_cache())
+        self.assertIsNone(controller.get_execution_coalescer())
+        self.assertIsNone(controller.get_completion_coalescer())
+
+    def test_coalesced_executions(self):
+        """
+        With executions coalesced, a burst of webhook executions takes the lock once
+        and is reported as one execution, the others being coalesced with it
+        """
+        simulation = Simulation({'web': _group(min_entities=0)}, coalesce_executions=True)
+        report = simulation.run(
+            [{'at': 10, 'type': 'webhook', 'group': 'web', 'policy': 'up', 'count': 3}],
+            20)
+        self.assertEqual(report['executions'],
+                         {'executed': 1, 'rejected': 0, 'coalesced': 2, 'failed': 0})
+        self.assertEqual(report['lock_wait']['count'], 2)
+        self.assertEqual(report['api_calls']['view_execution_bundle'], 1)
+        self.assertNotIn('get_policy', report['api_calls'])
+
+    def test_not_coalesced_without_cooldowns(self):
+        """
+        Without cooldowns, each execution of a burst of webhook executions
+        changes the group
+        """
+        group = _group(min_entities=0, cooldown=0)
+        group['policies']['up']['cooldown'] = 0
+        simulation = Simulation({'web': group}, coalesce_executions=True)
+        report = simulation.run(
+            [{'at': 10, 'type': 'webhook', 'group': 'web', 'policy': 'up', 'count': 3}],
+            20)
+        self.assertEqual(report['executions'],
+                         {'executed': 3, 'rejected': 0, 'coalesced': 0, 'failed': 0})
+        self.assertEqual(report['api_calls']['view_execution_bundle'], 3)
@@ -5,7 +5,7 @@ import mock
 
 from twisted.trial.unittest import TestCase
 from twisted.internet.defer import succeed, fail, Deferred
-from twisted.internet.task import Cooperator
+from twisted.internet.task import Clock, Cooperator
 
 from zope.interface.verify import verifyObject
 
@@ -13,6 +13,7 @@ from otter.models.interface import IScalingGroup
 from otter.supervisor import ISupervisor, SupervisorService
 from otter.test.utils import iMock, patch
 from otter.util.config import set_config_data
+from otter.util.deferredutils import FairLimiter
 
 
 class SupervisorTests(TestCase):
@@ -58,6 +59,34 @@ class SupervisorTests(TestCase):
         verifyObject(ISupervisor, self.supervisor)
 
 
+class GetMetricsTests(SupervisorTests):
+    """
+    Tests for :meth:`SupervisorService.get_metrics`
+    """
+
+    def test_no_limiter(self):
+        """
+        No metrics are returned if launches are not limited
+        """
+        self.assertEqual(self.supervisor.get_metrics(), [])
+
+    def test_launches(self):
+        """
+        Number of launches in flight and queued are returned
+        """
+        clock = Clock()
+        clock.advance(100)
+        self.supervisor.launch_limiter = FairLimiter(1, clock=clock)
+        for _ in range(3):
+            self.supervisor.launch_limiter.run('t1', Deferred)
+        self.assertEqual(
+            self.supervisor.get_metrics(),
+            [{'id': 'otter.metrics.supervisor.launches.' + key, 'value': value,
+              'time': 100}
+             for key, value in [('avg_wait', 0.0), ('in_flight', 1), ('max_wait', 0.0),
+                                ('queued', 2), ('queued_tenants', 1)]])
+
+
 class LaunchConfigTests(SupervisorTests):
     """
     Test supervisor worker execution.
@@ -135,7 +164,22 @@ class LaunchConfigTests(SupervisorTests):
             self.service_catalog,
             self.auth_token,
             {'server': {}},
-            self.undo)
+            self.undo,
+            launch_limiter=None)
+
+    def test_execute_config_launch_limiter(self):
+        """
+        execute_config passes the supervisor's launch limiter to launch_server
+        """
+        self.supervisor.launch_limiter = mock.Mock()
+
+        d = self.supervisor.execute_config(self.log, 'transaction-id',
+                                           self.group, self.launch_config)
+
+        self.successResultOf(d)
+        self.launch_server.assert_called_once_with(
+            mock.ANY, 'ORD', self.group, self.service_catalog, self.auth_token,
+            {'server': {}}, self.undo, launch_limiter=self.supervisor.launch_limiter)
 
     def test_execute_config_rewinds_undo_stack_on_failure(self):
         """
@@ -207,6 +251,188 @@ class LaunchConfigTests(SupervisorTests):
         self.successResultOf(sd)
 
 
+class MultiCreateTests(SupervisorTests):
+    """
+    Tests for batching launch configs in :meth:`SupervisorService.execute_config`
+    """
+
+    def setUp(self):
+        """
+        Supervisor batching up to 3 servers with a fake clock
+        """
+        super(MultiCreateTests, self).setUp()
+        self.clock = Clock()
+        self.supervisor.multi_create_max = 3
+        self.supervisor.clock = self.clock
+        self.auth_function.side_effect = lambda *a, **kw: succeed(
+            (self.auth_token, self.service_catalog))
+        self.server_ds = []
+
+        def launch_servers(logs, *args, **kwargs):
+            self.server_ds = [Deferred() for _ in logs]
+            return self.server_ds
+
+        self.launch_servers = patch(
+            self, 'otter.supervisor.launch_server_v1.launch_servers',
+            side_effect=launch_servers)
+        self.launch_server = patch(self, 'otter.supervisor.launch_server_v1.launch_server')
+        self.launch_config = {'type': 'launch_server', 'args': {'server': {}}}
+
+    def execute(self, count, launch_config=None):
+        """
+        Execute the launch config `count` times and return the completion deferreds
+        """
+        return [self.successResultOf(self.supervisor.execute_config(
+                self.log, 'transaction-id', self.group,
+                launch_config or self.launch_config))[1]
+                for __ in range(count)]
+
+    def test_batch_launched_next_iteration(self):
+        """
+        Launch configs executed together are launched with one launch_servers call
+        in the next reactor iteration after authenticating once
+        """
+        completion_ds = self.execute(2)
+        self.assertFalse(self.launch_servers.called)
+
+        self.clock.advance(0)
+
+        self.auth_function.assert_called_once_with(11111, log=mock.ANY)
+        self.launch_servers.assert_called_once_with(
+            [self.log.bind.return_value] * 2, 'ORD', self.group, self.service_catalog,
+            self.auth_token, {'server': {}}, [self.undo] * 2, launch_limiter=None)
+        self.assertFalse(self.launch_server.called)
+
+        self.server_ds[1].callback((self.fake_server_details, {}))
+        self.assertEqual(self.successResultOf(completion_ds[1]),
+                         {'id': 'server_id', 'links': ['links'], 'name': 'meh',
+                          'lb_info': {}})
+        self.assertNoResult(completion_ds[0])
+
+    def test_full_batch_launched_at_once(self):
+        """
+        A batch is launched as soon as it has `multi_create_max` jobs and further
+        jobs start a new batch
+        """
+        self.execute(4)
+        self.assertEqual(len(self.launch_servers.call_args[0][0]), 3)
+
+        self.clock.advance(0)
+        self.assertEqual(self.launch_servers.call_count, 2)
+        self.assertEqual(len(self.launch_servers.call_args[0][0]), 1)
+
+    def test_batched_by_launch_config(self):
+        """
+        Different launch configs are launched in different batches
+        """
+        self.execute(1)
+        self.execute(1, {'type': 'launch_server', 'args': {'server': {'a': 'b'}}})
+        self.clock.advance(0)
+        self.assertEqual(
+            sorted(c[0][5] for c in self.launch_servers.call_args_list),
+            [{'server': {}}, {'server': {'a': 'b'}}])
+
+    def test_server_failure_rewinds_its_job(self):
+        """
+        If launching a server fails, only its job fails and rewinds its undo stack
+        """
+        completion_ds = self.execute(2)
+        self.clock.advance(0)
+
+        self.server_ds[0].errback(ValueError('e'))
+
+        self.failureResultOf(completion_ds[0], ValueError)
+        self.undo.rewind.assert_called_once_with()
+        self.assertNoResult(completion_ds[1])
+
+    def test_auth_failure_fails_all_jobs(self):
+        """
+        If authentication fails, all the jobs in the batch fail
+        """
+        self.auth_function.side_effect = lambda *a, **kw: fail(ValueError('auth failure'))
+        completion_ds = self.execute(2)
+        self.clock.advance(0)
+
+        for d in completion_ds:
+            self.failureResultOf(d, ValueError)
+        self.assertFalse(self.launch_servers.called)
+
+    def test_launch_error_fails_all_jobs(self):
+        """
+        If launching the batch raises after authenticating, all the jobs in the
+        batch fail
+        """
+        self.launch_servers.side_effect = ValueError('no endpoint')
+        completion_ds = self.execute(2)
+        self.clock.advance(0)
+
+        for d in completion_ds:
+            self.failureResultOf(d, ValueError)
+
+    def test_servers_added_to_deferred_pool(self):
+        """
+        The supervisor does not stop until all the servers in a batch are launched
+        """
+        self.execute(2)
+        self.clock.advance(0)
+
+        sd = self.supervisor.stopService()
+        self.server_ds[0].callback((self.fake_server_details, {}))
+        self.assertNoResult(sd)
+        self.server_ds[1].callback((self.fake_server_details, {}))
+        self.successResultOf(sd)
+
+
+class PromoteServerTests(SupervisorTests):
+    """
+    Tests for :meth:`SupervisorService.execute_promote_server`
+    """
+
+    def setUp(self):
+        """
+        mock worker functions and other dependant objects
+        """
+        super(PromoteServerTests, self).setUp()
+        self.promote_server = patch(
+            self, 'otter.supervisor.launch_server_v1.promote_server',
+            return_value=succeed((self.fake_server_details, [])))
+        patch(self, 'otter.supervisor.generate_job_id', return_value='job-id')
+        self.launch_config = {'type': 'launch_server',
+                              'args': {'server': {}, 'loadBalancers': []}}
+
+    def test_runs_promote_server_worker(self):
+        """
+        execute_promote_server runs the promote_server worker with the
+        credentials for the group owner, and completes with the details of the
+        server to store in the active state
+        """
+        d = self.supervisor.execute_promote_server(
+            self.log, 'transaction-id', self.group, self.launch_config,
+            {'id': 'server_id'})
+
+        job_id, completed_d = self.successResultOf(d)
+        self.assertEqual(job_id, 'job-id')
+        self.assertEqual(self.successResultOf(completed_d),
+                         {'id': 'server_id', 'links': ['links'], 'name': 'meh',
+                          'lb_info': []})
+        self.promote_server.assert_called_once_with(
+            mock.ANY, 'ORD', self.group, self.service_catalog, self.auth_token,
+            {'server': {}, 'loadBalancers': []}, 'server_id', self.undo)
+
+    def test_rewinds_undo_stack_on_failure(self):
+        """
+        execute_promote_server rewinds the undo stack when promoting fails
+        """
+        self.promote_server.return_value = fail(ValueError('meh'))
+        d = self.supervisor.execute_promote_server(
+            self.log, 'transaction-id', self.group, self.launch_config,
+            {'id': 'server_id'})
+
+        job_id, completed_d = self.successResultOf(d)
+        self.failureResultOf(completed_d, ValueError)
+        self.undo.rewind.assert_called_once_with()
+
+
 class DeleteServerTests(SupervisorTests):
     """
     Tests for func:``otter.supervisor.execute_delete_server``
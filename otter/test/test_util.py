@@ -305,6 +305,15 @@ class TimestampTests(TestCase):
         self.assertTrue(parsed.tzinfo is not None)
         self.assertEqual(parsed.replace(tzinfo=None), datetime.min)
 
+    def test_to_epoch(self):
+        """
+        ``to_epoch`` returns the seconds since the epoch, with microseconds,
+        of a timestamp
+        """
+        self.assertEqual(timestamp.to_epoch("1970-01-01T00:00:00Z"), 0)
+        self.assertEqual(timestamp.to_epoch("2014-01-01T00:00:01.5Z"), 1388534401.5)
+        self.assertEqual(timestamp.to_epoch(timestamp.MIN), -62135596800)
+
 
 class ConfigTest(TestCase):
     """
@@ -112,7 +112,8 @@ class CassStoreRestScalingGroupTestCase(TestCase, RequestTestMixin, LockMixin):
 
         # patch both the config and the groups
         self.mock_controller = patch(self, 'otter.rest.configs.controller',
-                                     spec=['obey_config_change'])
+                                     spec=['obey_config_change',
+                                           'obey_warm_pool_change'])
         patch(self, 'otter.rest.groups.controller', new=self.mock_controller)
 
         # Patch supervisor
@@ -125,6 +126,8 @@ class CassStoreRestScalingGroupTestCase(TestCase, RequestTestMixin, LockMixin):
                 state.tenant_id, state.group_id, *self.active_pending_etc))
 
         self.mock_controller.obey_config_change.side_effect = _mock_obey_config_change
+        self.mock_controller.obey_warm_pool_change.side_effect = (
+            lambda log, trans, group, state, launch=None: defer.succeed(state))
 
         store.kz_client = mock.Mock(Lock=self.mock_lock())
 
@@ -501,9 +504,6 @@ class CassStoreRestScalingPolicyTestCase(TestCase, RequestTestMixin, LockMixin):
         """
         Executing a non-existant scaling policy should result in a 404.
         """
-        self.mock_controller.maybe_execute_scaling_policy.return_value = defer.fail(
-            NoSuchPolicyError('11111', '1', '2'))
-
         wrapper = yield request(self.root, 'POST', self.policies_url + '1/execute/')
         self.assertEqual(wrapper.response.code, 404,
                          "Execute did not fail as expected: {0}".format(wrapper.content))
@@ -85,7 +85,8 @@ class MockStoreRestScalingGroupTestCase(TestCase):
 
         # patch both the config and the groups
         self.mock_controller = patch(self, 'otter.rest.configs.controller',
-                                     spec=['obey_config_change'])
+                                     spec=['obey_config_change',
+                                           'obey_warm_pool_change'])
         patch(self, 'otter.rest.groups.controller', new=self.mock_controller)
 
         # Patch supervisor
@@ -98,6 +99,8 @@ class MockStoreRestScalingGroupTestCase(TestCase):
                 state.tenant_id, state.group_id, state.group_name, *self.active_pending_etc))
 
         self.mock_controller.obey_config_change.side_effect = _mock_obey_config_change
+        self.mock_controller.obey_warm_pool_change.side_effect = (
+            lambda log, trans, group, state, launch=None: defer.succeed(state))
 
     def tearDown(self):
         """
@@ -405,9 +408,6 @@ class MockStoreRestScalingPolicyTestCase(TestCase):
         Executing a non-existant scaling policy should result in a 404.
         """
 
-        self.mock_controller.maybe_execute_scaling_policy.return_value = defer.fail(
-            NoSuchPolicyError('11111', '1', '2'))
-
         wrapper = self.successResultOf(
             request(self.root, 'POST', self.policies_url + '1/execute/'))
         self.assertEqual(wrapper.response.code, 404,
@@ -456,7 +456,7 @@ class MockStoreRestWebhooksTestCase(TestCase):
 
         self.mock_controller = patch(self, 'otter.rest.webhooks.controller')
 
-        def _mock_maybe_execute(log, trans, group, state, policy_id):
+        def _mock_maybe_execute(log, trans, group, state, policy_id, **bundle):
             return defer.succeed(state)
 
         self.mock_controller.maybe_execute_scaling_policy.side_effect = _mock_maybe_execute
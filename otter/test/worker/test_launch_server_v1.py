@@ -17,15 +17,21 @@ from otter.worker.launch_server_v1 import (
     server_details,
     wait_for_active,
     create_server,
+    create_servers,
+    delete_reserved_servers,
     launch_server,
+    launch_servers,
+    promote_server,
     prepare_launch_config,
     delete_server,
     remove_from_load_balancer,
     public_endpoint_url,
     UnexpectedServerStatus,
     ServerDeleted,
+    ServersNotListed,
     verified_delete,
-    LB_MAX_RETRIES, LB_RETRY_INTERVAL
+    LB_MAX_RETRIES, LB_RETRY_INTERVAL,
+    LIST_MAX_RETRIES, LIST_RETRY_INTERVAL
 )
 
 
@@ -783,6 +789,153 @@ class ServerTests(TestCase):
         self.assertTrue(real_failure.check(APIError))
         self.assertEqual(real_failure.value.code, 500)
 
+    def _setup_create_servers(self, listed):
+        """
+        Setup treq to accept the multi-create request and then list servers
+        from `listed` one response at a time
+        """
+        self.treq.post.return_value = succeed(mock.Mock(code=202))
+        self.treq.get.side_effect = lambda *a, **kw: succeed(mock.Mock(code=200))
+        bodies = [{'reservation_id': 'r-abc'}] + [{'servers': servers}
+                                                  for servers in listed]
+        self.treq.json_content.side_effect = lambda _: succeed(bodies.pop(0))
+
+    def test_create_servers(self):
+        """
+        create_servers POSTs one request with min_count and max_count and lists the
+        created servers by the reservation ID, sorted by name
+        """
+        self._setup_create_servers([[{'id': 'b', 'name': 'as-2'},
+                                     {'id': 'a', 'name': 'as-1'}]])
+
+        d = create_servers('http://url/', 'my-auth-token', {'name': 'as'}, 2)
+
+        self.assertEqual(self.successResultOf(d), [{'server': {'id': 'a', 'name': 'as-1'}},
+                                                   {'server': {'id': 'b', 'name': 'as-2'}}])
+        self.treq.post.assert_called_once_with(
+            'http://url/servers', headers=expected_headers, log=None,
+            data=mock.ANY)
+        self.assertEqual(
+            json.loads(self.treq.post.call_args[1]['data']),
+            {'server': {'name': 'as', 'min_count': 2, 'max_count': 2,
+                        'return_reservation_id': True}})
+        self.treq.get.assert_called_once_with(
+            'http://url/servers/detail', headers=expected_headers,
+            params={'reservation_id': 'r-abc'}, log=None)
+
+    def test_create_servers_retries_listing(self):
+        """
+        create_servers lists servers again after LIST_RETRY_INTERVAL seconds if all
+        of them are not listed yet
+        """
+        clock = Clock()
+        self._setup_create_servers([[{'id': 'a', 'name': 'as-1'}],
+                                    [{'id': 'a', 'name': 'as-1'}, {'id': 'b', 'name': 'as-2'}]])
+
+        d = create_servers('http://url/', 'my-auth-token', {}, 2, clock=clock)
+
+        self.assertNoResult(d)
+        clock.advance(LIST_RETRY_INTERVAL)
+        self.assertEqual(len(self.successResultOf(d)), 2)
+        self.assertEqual(self.treq.get.call_count, 2)
+
+    def test_create_servers_gives_up_listing(self):
+        """
+        create_servers fails with ServersNotListed if all the servers are not listed
+        after LIST_MAX_RETRIES retries
+        """
+        clock = Clock()
+        self._setup_create_servers([[]] * (LIST_MAX_RETRIES + 1))
+
+        d = create_servers('http://url/', 'my-auth-token', {}, 2, clock=clock)
+
+        clock.pump([LIST_RETRY_INTERVAL] * LIST_MAX_RETRIES)
+        f = self.failureResultOf(d, ServersNotListed)
+        self.assertEqual((f.value.reservation_id, f.value.expected, f.value.listed),
+                         ('r-abc', 2, 0))
+
+    def test_create_servers_not_listed_undo(self):
+        """
+        If the created servers are not listed, deleting all the servers of the
+        reservation is pushed on the undo stack given
+        """
+        clock = Clock()
+        self._setup_create_servers([[]] * (LIST_MAX_RETRIES + 1))
+
+        d = create_servers('http://url/', 'my-auth-token', {}, 2, log=self.log,
+                           clock=clock, undo=self.undo)
+
+        clock.pump([LIST_RETRY_INTERVAL] * LIST_MAX_RETRIES)
+        self.failureResultOf(d, ServersNotListed)
+        self.undo.push.assert_called_once_with(
+            delete_reserved_servers, self.log, 'http://url/', 'my-auth-token', 'r-abc',
+            clock=clock)
+
+    def test_create_servers_list_error_undo(self):
+        """
+        If listing the created servers fails, deleting all the servers of the
+        reservation is pushed on the undo stack given
+        """
+        self.treq.post.return_value = succeed(mock.Mock(code=202))
+        self.treq.json_content.return_value = succeed({'reservation_id': 'r-abc'})
+        self.treq.get.return_value = succeed(mock.Mock(code=500))
+        self.treq.content.return_value = succeed(error_body)
+
+        d = create_servers('http://url/', 'my-auth-token', {}, 2, log=self.log,
+                           clock=Clock(), undo=self.undo)
+
+        self.failureResultOf(d, RequestError)
+        self.undo.push.assert_called_once_with(
+            delete_reserved_servers, self.log, 'http://url/', 'my-auth-token', 'r-abc',
+            clock=mock.ANY)
+
+    @mock.patch('otter.worker.launch_server_v1.verified_delete')
+    def test_delete_reserved_servers(self, verified_delete):
+        """
+        delete_reserved_servers lists the servers of the reservation and deletes
+        each of them
+        """
+        self.treq.get.return_value = succeed(mock.Mock(code=200))
+        self.treq.json_content.return_value = succeed(
+            {'servers': [{'id': 'a'}, {'id': 'b'}]})
+        verified_delete.return_value = succeed(None)
+
+        d = delete_reserved_servers(self.log, 'http://url/', 'my-auth-token', 'r-abc')
+
+        self.assertIsNone(self.successResultOf(d))
+        self.treq.get.assert_called_once_with(
+            'http://url/servers/detail', headers=expected_headers,
+            params={'reservation_id': 'r-abc'}, log=mock.ANY)
+        self.assertEqual(
+            verified_delete.mock_calls,
+            [mock.call(mock.ANY, 'http://url/', 'my-auth-token', server_id, clock=None)
+             for server_id in ('a', 'b')])
+
+    def test_create_servers_propagates_api_failure(self):
+        """
+        create_servers will propagate API failures of the create request
+        """
+        self.treq.post.return_value = succeed(mock.Mock(code=500))
+        self.treq.content.return_value = succeed(error_body)
+
+        d = create_servers('http://url/', 'my-auth-token', {}, 2)
+
+        failure = self.failureResultOf(d, RequestError)
+        self.assertTrue(failure.value.reason.check(APIError))
+        self.assertFalse(self.treq.get.called)
+
+    def test_create_servers_failure_no_undo(self):
+        """
+        Nothing is pushed on the undo stack if the create request fails
+        """
+        self.treq.post.return_value = succeed(mock.Mock(code=500))
+        self.treq.content.return_value = succeed(error_body)
+
+        d = create_servers('http://url/', 'my-auth-token', {}, 2, undo=self.undo)
+
+        self.failureResultOf(d, RequestError)
+        self.assertFalse(self.undo.push.called)
+
     @mock.patch('otter.worker.launch_server_v1.server_details')
     def test_wait_for_active(self, server_details):
         """
@@ -1055,6 +1208,152 @@ class ServerTests(TestCase):
             log.bind.return_value, 'http://dfw.lbaas/', 'my-auth-token', prepared_load_balancers,
             '10.0.0.1', self.undo)
 
+    @mock.patch('otter.worker.launch_server_v1.add_to_load_balancers')
+    @mock.patch('otter.worker.launch_server_v1.server_details')
+    def test_promote_server(self, server_details, add_to_load_balancers):
+        """
+        promote_server checks the standby server is active and adds its first
+        private IPv4 address to the load balancers, with its name in their
+        metadata.  Deleting the server is pushed on the undo stack.
+        """
+        launch_config = {'server': {'imageRef': '1', 'flavorRef': '1'},
+                         'loadBalancers': [{'loadBalancerId': 12345, 'port': 80}]}
+        details = {'server': {'id': '1', 'name': 'standby', 'status': 'ACTIVE',
+                              'addresses': {'private': [
+                                  {'version': 4, 'addr': '10.0.0.1'}]}}}
+        server_details.return_value = succeed(details)
+        add_to_load_balancers.return_value = succeed([(12345, ('10.0.0.1', 80))])
+
+        d = promote_server(self.log, 'DFW', self.scaling_group, fake_service_catalog,
+                           'my-auth-token', launch_config, '1', self.undo)
+
+        self.assertEqual(self.successResultOf(d),
+                         (details, [(12345, ('10.0.0.1', 80))]))
+        server_details.assert_called_once_with(
+            'http://dfw.openstack/', 'my-auth-token', '1', log=mock.ANY)
+        add_to_load_balancers.assert_called_once_with(
+            mock.ANY, 'http://dfw.lbaas/', 'my-auth-token',
+            [{'loadBalancerId': 12345, 'port': 80,
+              'metadata': {'rax:auto_scaling_server_name': 'standby',
+                           'rax:auto_scaling_group_id': self.scaling_group_uuid}}],
+            '10.0.0.1', self.undo)
+        self.undo.push.assert_called_once_with(
+            verified_delete, mock.ANY, 'http://dfw.openstack/', 'my-auth-token', '1')
+
+    @mock.patch('otter.worker.launch_server_v1.add_to_load_balancers')
+    @mock.patch('otter.worker.launch_server_v1.server_details')
+    def test_promote_server_not_active(self, server_details, add_to_load_balancers):
+        """
+        promote_server fails with :class:`UnexpectedServerStatus` if the standby
+        server is not active anymore
+        """
+        server_details.return_value = succeed(
+            {'server': {'id': '1', 'name': 'standby', 'status': 'ERROR'}})
+
+        d = promote_server(self.log, 'DFW', self.scaling_group, fake_service_catalog,
+                           'my-auth-token', {'server': {}}, '1', self.undo)
+
+        self.failureResultOf(d, UnexpectedServerStatus)
+        self.assertFalse(add_to_load_balancers.called)
+
+    @mock.patch('otter.worker.launch_server_v1.add_to_load_balancers')
+    @mock.patch('otter.worker.launch_server_v1.create_server')
+    @mock.patch('otter.worker.launch_server_v1.wait_for_active')
+    def test_launch_server_with_limiter(self, wait_for_active, create_server,
+                                        add_to_load_balancers):
+        """
+        launch_server creates the server through the launch limiter, keyed by tenant
+        """
+        launch_config = {'server': {'imageRef': '1', 'flavorRef': '1'}}
+        server_details = {'server': {'id': '1', 'addresses': {'private': [
+            {'version': 4, 'addr': '10.0.0.1'}]}}}
+        wait_for_active.return_value = succeed(server_details)
+        add_to_load_balancers.return_value = succeed([])
+        limiter = mock.Mock(spec=['run'])
+        limiter.run.return_value = succeed(server_details)
+
+        d = launch_server(self.log, 'DFW', self.scaling_group, fake_service_catalog,
+                          'my-auth-token', launch_config, self.undo,
+                          launch_limiter=limiter)
+
+        self.assertEqual(self.successResultOf(d), (server_details, []))
+        limiter.run.assert_called_once_with(
+            '1234', create_server, 'http://dfw.openstack/', 'my-auth-token',
+            mock.ANY, log=mock.ANY)
+        self.assertFalse(create_server.called)
+
+    @mock.patch('otter.worker.launch_server_v1.add_to_load_balancers')
+    @mock.patch('otter.worker.launch_server_v1.create_servers')
+    @mock.patch('otter.worker.launch_server_v1.wait_for_active')
+    def test_launch_servers(self, wait_for_active, create_servers,
+                            add_to_load_balancers):
+        """
+        launch_servers creates all the servers with one request and then waits for
+        each server and adds it to load balancers with its own undo stack
+        """
+        launch_config = {'server': {'imageRef': '1', 'flavorRef': '1'},
+                         'loadBalancers': [{'loadBalancerId': 12345, 'port': 80}]}
+        servers = [{'server': {'id': str(i), 'addresses': {'private': [
+            {'version': 4, 'addr': '10.0.0.{}'.format(i)}]}}} for i in (1, 2)]
+        create_servers.return_value = succeed(
+            [{'server': {'id': '1'}}, {'server': {'id': '2'}}])
+        wait_for_active.side_effect = lambda log, endpoint, token, server_id: succeed(
+            servers[int(server_id) - 1])
+        add_to_load_balancers.side_effect = lambda *args: succeed([args[4]])
+        undos = [iMock(IUndoStack), iMock(IUndoStack)]
+
+        ds = launch_servers([self.log, self.log], 'DFW', self.scaling_group,
+                            fake_service_catalog, 'my-auth-token', launch_config, undos)
+
+        self.assertEqual([self.successResultOf(d) for d in ds],
+                         [(servers[0], ['10.0.0.1']), (servers[1], ['10.0.0.2'])])
+        create_servers.assert_called_once_with(
+            'http://dfw.openstack/', 'my-auth-token',
+            {'imageRef': '1', 'flavorRef': '1', 'name': 'as000000',
+             'metadata': {'rax:auto_scaling_group_id': '1111111-11111-11111-11111111'}},
+            2, log=mock.ANY, undo=undos[0])
+        for i, undo in enumerate(undos):
+            undo.push.assert_called_once_with(
+                verified_delete, mock.ANY, 'http://dfw.openstack/', 'my-auth-token',
+                str(i + 1))
+            add_to_load_balancers.assert_any_call(
+                mock.ANY, 'http://dfw.lbaas/', 'my-auth-token', mock.ANY,
+                '10.0.0.{}'.format(i + 1), undo)
+
+    @mock.patch('otter.worker.launch_server_v1.create_servers')
+    def test_launch_servers_with_limiter(self, create_servers):
+        """
+        launch_servers creates the servers through the launch limiter, keyed by tenant
+        """
+        limiter = mock.Mock(spec=['run'])
+        limiter.run.return_value = Deferred()
+
+        launch_servers([self.log], 'DFW', self.scaling_group, fake_service_catalog,
+                       'my-auth-token', {'server': {}}, [self.undo],
+                       launch_limiter=limiter)
+
+        limiter.run.assert_called_once_with(
+            '1234', create_servers, 'http://dfw.openstack/', 'my-auth-token',
+            mock.ANY, 1, log=mock.ANY, undo=self.undo)
+        self.assertFalse(create_servers.called)
+
+    @mock.patch('otter.worker.launch_server_v1.create_servers')
+    def test_launch_servers_create_fails(self, create_servers):
+        """
+        If creating the servers fails, every returned Deferred fails with it and
+        nothing is pushed on the undo stacks
+        """
+        create_servers.return_value = fail(ValueError('e'))
+        undos = [iMock(IUndoStack), iMock(IUndoStack)]
+
+        ds = launch_servers([self.log, self.log], 'DFW', self.scaling_group,
+                            fake_service_catalog, 'my-auth-token', {'server': {}}, undos)
+
+        for d in ds:
+            self.failureResultOf(d, ValueError)
+        for undo in undos:
+            self.assertFalse(undo.push.called)
+
     @mock.patch('otter.worker.launch_server_v1.add_to_load_balancers')
     @mock.patch('otter.worker.launch_server_v1.create_server')
     @mock.patch('otter.worker.launch_server_v1.wait_for_active')
@@ -4,16 +4,37 @@ from silverberg.client import ConsistencyLevel
 
 
 class Batch(object):
-    """ CQL Batch wrapper"""
+    """ CQL Batch wrapper
+
+    :ivar bool fixed: Whether the statements are of a fixed shape executed again
+        and again, in which case the text of the batch is generated once and
+        reused by all the batches of the same statements
+    :ivar bool counter: Whether the statements update counters, which cannot
+        be batched with other statements
+    """
+    # texts of fixed-shape batches by their statements and timestamp
+    _fixed_texts = {}
+
     def __init__(self, statements, params, consistency=ConsistencyLevel.ONE,
-                 timestamp=None):
+                 timestamp=None, fixed=False, counter=False):
         self.statements = statements
         self.params = params
         self.consistency = consistency
         self.timestamp = timestamp
+        self.fixed = fixed
+        self.counter = counter
 
     def _generate(self):
-        str = 'BEGIN BATCH '
+        if self.fixed:
+            key = (tuple(self.statements), self.timestamp, self.counter)
+            text = self._fixed_texts.get(key)
+            if text is None:
+                text = self._fixed_texts[key] = self._generate_text()
+            return text
+        return self._generate_text()
+
+    def _generate_text(self):
+        str = 'BEGIN COUNTER BATCH ' if self.counter else 'BEGIN BATCH '
         if self.timestamp is not None:
             str += 'USING TIMESTAMP {} '.format(self.timestamp)
         str += ' '.join(self.statements)
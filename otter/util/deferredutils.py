@@ -1,6 +1,7 @@
 """
 Deferred utilities
 """
+from collections import deque
 
 from twisted.internet import defer
 
@@ -176,6 +177,117 @@ class DeferredPool(object):
         return d
 
 
+class FairLimiter(object):
+    """
+    Run functions returning deferreds with a bound on how many of them can be
+    running at a time. Each call is made on behalf of a key (like a tenant ID)
+    and waiting calls are started round-robin across keys, so that one key with
+    a lot of waiting calls does not starve others.
+
+    :ivar int limit: maximum number of calls running at a time
+    :ivar int key_limit: maximum number of calls running at a time for a single
+        key. None for no limit other than `limit`
+    :ivar int waited: number of calls that have started after waiting
+    :ivar float total_wait: total seconds waited by the calls that have started
+    :ivar float max_wait: longest time in seconds a call has waited to start
+    """
+
+    def __init__(self, limit, key_limit=None, clock=None):
+        """
+        :param clock: An instance of IReactorTime provider used to measure wait
+            time. Defaults to reactor if not provided
+        """
+        if clock is None:  # pragma: no cover
+            from twisted.internet import reactor
+            clock = reactor
+        self.limit = limit
+        self.key_limit = key_limit
+        self.clock = clock
+        self.running = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._running = {}
+        self._waiting = {}
+        self._ready = deque()
+        self._starting = False
+
+    def run(self, key, f, *args, **kwargs):
+        """
+        Call `f` with given arguments if there is capacity, otherwise after
+        calls waiting before it are started
+
+        :return: Deferred that fires with result of calling `f`
+        """
+        d = defer.Deferred()
+        self._waiting.setdefault(key, deque()).append(
+            (d, self.clock.seconds(), f, args, kwargs))
+        if key not in self._ready and self._can_run(key):
+            self._ready.append(key)
+        self._start_ready()
+        return d
+
+    def queued(self):
+        """
+        :return: number of calls waiting to start
+        """
+        return sum(len(calls) for calls in self._waiting.itervalues())
+
+    def stats(self):
+        """
+        :return: ``dict`` of number of calls running and waiting, number of keys
+            with waiting calls, and the average and maximum time calls have waited
+        """
+        return {'running': self.running,
+                'queued': self.queued(),
+                'queued_keys': len(self._waiting),
+                'avg_wait': self.total_wait / self.waited if self.waited else 0.0,
+                'max_wait': self.max_wait}
+
+    def _can_run(self, key):
+        return self.key_limit is None or self._running.get(key, 0) < self.key_limit
+
+    def _start_ready(self):
+        # calls that finish synchronously call this again from _finished: they
+        # leave the starting to the loop already running instead of recursing
+        if self._starting:
+            return
+        self._starting = True
+        try:
+            while self.running < self.limit and self._ready:
+                key = self._ready.popleft()
+                calls = self._waiting[key]
+                call = calls.popleft()
+                if not calls:
+                    del self._waiting[key]
+                self._start(key, *call)
+                if key in self._waiting and key not in self._ready and self._can_run(key):
+                    self._ready.append(key)
+        finally:
+            self._starting = False
+
+    def _start(self, key, d, queued_at, f, args, kwargs):
+        wait = self.clock.seconds() - queued_at
+        self.waited += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.running += 1
+        self._running[key] = self._running.get(key, 0) + 1
+        result = defer.maybeDeferred(f, *args, **kwargs)
+        result.addBoth(self._finished, key)
+        result.chainDeferred(d)
+
+    def _finished(self, result, key):
+        self.running -= 1
+        self._running[key] -= 1
+        if not self._running[key]:
+            del self._running[key]
+        if key in self._waiting and key not in self._ready:
+            self._ready.append(key)
+        self._start_ready()
+        return result
+
+
 def log_with_time(result, reactor, log, start, msg, time_kwarg=None):
     """
     Log `msg` with time taken
@@ -0,0 +1,232 @@
+"""
+Partitioning a set among live members with consistent hashing, as an alternative
+to kazoo's `SetPartitioner`.
+"""
+
+from bisect import bisect
+from hashlib import md5
+from socket import gethostname
+from uuid import uuid4
+
+from kazoo.exceptions import NoNodeError
+from kazoo.recipe.partitioner import PartitionState
+
+from twisted.internet import defer
+
+from otter.log import log as otter_log
+
+
+def _hash(value):
+    """
+    Return integer hash of `value` that is the same on every node
+    """
+    return int(md5(str(value)).hexdigest(), 16)
+
+
+class HashRing(object):
+    """
+    Consistent hash ring of members. Each member is placed at `replicas` points on the
+    ring and an item belongs to the member at the first point after item's hash. When
+    a member joins or leaves, only the items at its points move.
+    """
+
+    def __init__(self, members, replicas=100):
+        """
+        :param members: iterable of member names
+        :param int replicas: number of points of each member on the ring
+        """
+        points = sorted((_hash('{}-{}'.format(member, i)), member)
+                        for member in members for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, item):
+        """
+        Return member that owns `item` or None if there are no members
+        """
+        if not self._members:
+            return None
+        return self._members[bisect(self._hashes, _hash(item)) % len(self._members)]
+
+
+class ConsistentHashPartitioner(object):
+    """
+    Partitions a set among the members registered under a ZooKeeper path using a
+    :class:`HashRing`. It can be used in place of kazoo's `SetPartitioner`.
+
+    Unlike `SetPartitioner`, membership changes do not make every member release
+    its partition and wait for others: it stays acquired and only the items whose
+    owner changed move. An item that is lost is dropped at once while an item that
+    is gained is taken only after `time_boundary` seconds so that its previous owner
+    can finish working on it.
+
+    The partitioner fails if it cannot read the members or its own member node is
+    gone, i.e. its session expired. A new one should be created then. A failed
+    partitioner removes its member node, if it is still there, so that the items
+    it owned move to the live members.
+    """
+
+    def __init__(self, kz_client, path, set, time_boundary=15, replicas=100,
+                 identifier=None, clock=None, log=None):
+        """
+        :param kz_client: `TxKazooClient` instance
+        :param path: ZooKeeper path under which members are registered
+        :param set: items to partition
+        :param time_boundary: seconds to wait before taking a gained item
+        :param replicas: See :class:`HashRing`
+        :param identifier: Name of this member. Defaults to hostname and a random id
+        :param clock: IReactorTime provider. Defaults to reactor
+        """
+        self.kz_client = kz_client
+        self.members_path = path.rstrip('/') + '/members'
+        self.set = frozenset(set)
+        self.time_boundary = time_boundary
+        self.replicas = replicas
+        self.identifier = identifier or '{}-{}'.format(gethostname(), uuid4().hex)
+        self.clock = clock
+        log = log or otter_log
+        self.log = log.bind(system='otter.partitioner', partition_path=path,
+                            member=self.identifier)
+        self.state = PartitionState.ALLOCATING
+        self.owned = frozenset()
+        # items this member should own per latest membership
+        self._target = frozenset()
+        self._pending = []
+
+        d = self.kz_client.create('{}/{}'.format(self.members_path, self.identifier),
+                                  ephemeral=True, makepath=True)
+        d.addCallback(self._watch_members)
+        d.addErrback(self._failed, 'Could not join partition')
+
+    @property
+    def allocating(self):
+        """
+        Is the partitioner joining?
+        """
+        return self.state == PartitionState.ALLOCATING
+
+    @property
+    def release(self):
+        """
+        Always False since owned items move without releasing the partition
+        """
+        return self.state == PartitionState.RELEASE
+
+    @property
+    def failed(self):
+        """
+        Has the partitioner failed?
+        """
+        return self.state == PartitionState.FAILURE
+
+    @property
+    def acquired(self):
+        """
+        Does the partitioner hold its share of the set?
+        """
+        return self.state == PartitionState.ACQUIRED
+
+    def __iter__(self):
+        """
+        Iterate over owned items
+        """
+        return iter(sorted(self.owned))
+
+    def _reactor(self):
+        """
+        Return the clock to delay taking items with
+        """
+        if self.clock is None:
+            from twisted.internet import reactor
+            return reactor
+        return self.clock
+
+    def _watch_members(self, _=None):
+        """
+        Read members and watch for changes in them
+        """
+        if self.failed:
+            return
+        d = self.kz_client.get_children(self.members_path, watch=self._watch_members)
+        d.addCallback(self._members_changed)
+        d.addErrback(self._failed, 'Could not get partition members')
+        return d
+
+    def _members_changed(self, members):
+        """
+        Recompute owned items from current `members`
+        """
+        if self.failed:
+            return
+        if self.identifier not in members:
+            self.log.msg('Member node is gone')
+            self._stop()
+            return
+        ring = HashRing(members, self.replicas)
+        self._target = frozenset(item for item in self.set
+                                 if ring.owner(item) == self.identifier)
+        lost = self.owned - self._target
+        gained = self._target - self.owned
+        self.owned -= lost
+        self.state = PartitionState.ACQUIRED
+        self.log.msg('Partition members changed: {num_members} members. '
+                     'Dropped {lost}, taking {gained}',
+                     num_members=len(members), lost=sorted(lost), gained=sorted(gained))
+        if gained:
+            self._pending.append(
+                self._reactor().callLater(self.time_boundary, self._take, gained))
+
+    def _take(self, gained):
+        """
+        Take gained items that this member should still own
+        """
+        self._pending = [call for call in self._pending if call.active()]
+        self.owned |= gained & self._target
+
+    def _failed(self, failure, msg):
+        """
+        Log the failure, fail the partitioner and leave the partition. Otherwise
+        the member node would keep owning items in the other members' rings until
+        the session expires, while no one processes them.
+        """
+        self.log.err(failure, msg)
+        self._stop()
+        self._leave()
+
+    def _stop(self):
+        """
+        Drop all the items and pending takes and fail
+        """
+        for call in self._pending:
+            if call.active():
+                call.cancel()
+        self._pending = []
+        self.owned = frozenset()
+        self._target = frozenset()
+        self.state = PartitionState.FAILURE
+
+    def release_set(self):
+        """
+        Nothing to release since items move without releasing the partition
+        """
+        return defer.succeed(None)
+
+    def finish(self):
+        """
+        Leave the partition, dropping all the items
+
+        :return: Deferred that fires with None after this member is removed
+        """
+        self._stop()
+        return self._leave()
+
+    def _leave(self):
+        """
+        Delete member node of this partitioner, if it exists
+
+        :return: Deferred that fires with None after the node is deleted
+        """
+        d = self.kz_client.delete('{}/{}'.format(self.members_path, self.identifier))
+        d.addErrback(lambda f: f.trap(NoNodeError))
+        d.addErrback(self.log.err, 'Could not leave partition')
+        return d.addCallback(lambda _: None)
@@ -2,6 +2,7 @@
 Utilities for consistently handling timestamp formats in otter
 """
 
+import calendar
 from datetime import datetime
 import iso8601
 
@@ -30,3 +31,23 @@ def from_timestamp(timestamp):
     :return: a timezone-aware ``datetime`` object
     """
     return iso8601.parse_date(timestamp)
+
+
+def datetime_to_epoch(dt):
+    """
+    :param dt: a timezone-aware ``datetime`` object
+
+    :return: ``float`` number of seconds since the epoch represented by ``dt``
+    """
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+def to_epoch(timestamp):
+    """
+    :param str timestamp: a timestamp string as accepted by
+        :func:`from_timestamp`
+
+    :return: ``float`` number of seconds since the epoch represented by
+        ``timestamp``
+    """
+    return datetime_to_epoch(from_timestamp(timestamp))
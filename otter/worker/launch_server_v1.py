@@ -19,8 +19,9 @@ initiating a launch_server job.
 import json
 import itertools
 from copy import deepcopy
+from functools import partial
 
-from twisted.internet.defer import gatherResults, maybeDeferred
+from twisted.internet.defer import Deferred, gatherResults, maybeDeferred
 
 from otter.util import logging_treq as treq
 
@@ -31,7 +32,7 @@ from otter.util.http import (append_segments, headers, check_success,
 from otter.util.hashkey import generate_server_name
 from otter.util.deferredutils import retry_and_timeout
 from otter.util.retry import (retry, retry_times, repeating_interval, transient_errors_except,
-                              TransientRetryError)
+                              TransientRetryError, compose_retries)
 
 # Number of times to retry when adding/removing nodes from LB
 LB_MAX_RETRIES = 10
@@ -39,6 +40,12 @@ LB_MAX_RETRIES = 10
 # Interval between subsequent retries
 LB_RETRY_INTERVAL = 10
 
+# Number of times to retry listing servers created together before all are listed
+LIST_MAX_RETRIES = 5
+
+# Interval between subsequent retries of listing servers
+LIST_RETRY_INTERVAL = 2
+
 
 class UnexpectedServerStatus(Exception):
     """
@@ -67,6 +74,21 @@ class ServerDeleted(Exception):
         self.server_id = server_id
 
 
+class ServersNotListed(Exception):
+    """
+    An exception to be raised when fewer servers than were created together are
+    listed by their reservation ID.
+    """
+    def __init__(self, reservation_id, expected, listed):
+        super(ServersNotListed, self).__init__(
+            'Expected {expected} servers with reservation {reservation_id}, '
+            'listed {listed}'.format(reservation_id=reservation_id, expected=expected,
+                                     listed=listed))
+        self.reservation_id = reservation_id
+        self.expected = expected
+        self.listed = listed
+
+
 def server_details(server_endpoint, auth_token, server_id, log=None):
     """
     Fetch the details of a server as specified by id.
@@ -169,6 +191,106 @@ def create_server(server_endpoint, auth_token, server_config, log=None):
     return d.addCallback(treq.json_content)
 
 
+def list_reserved_servers(server_endpoint, auth_token, reservation_id, log=None):
+    """
+    List the servers created by the request that returned `reservation_id`.
+
+    :param str server_endpoint: Server endpoint URI.
+    :param str auth_token: Keystone Auth Token.
+    :param str reservation_id: Reservation ID returned by the create request.
+
+    :return: Deferred that fires with a list of server detail dicts.
+    """
+    list_path = append_segments(server_endpoint, 'servers', 'detail')
+    d = treq.get(list_path, headers=headers(auth_token),
+                 params={'reservation_id': reservation_id}, log=log)
+    d.addCallback(check_success, [200, 203])
+    d.addErrback(wrap_request_error, list_path, 'server_list')
+    d.addCallback(treq.json_content)
+    return d.addCallback(lambda body: body['servers'])
+
+
+def delete_reserved_servers(log, server_endpoint, auth_token, reservation_id,
+                            clock=None):
+    """
+    Delete all the servers created by the request that returned `reservation_id`,
+    with :func:`verified_delete`. Listing them is retried a few times.
+
+    :return: Deferred that fires with None once the servers are deleted.
+    """
+    log = log.bind(reservation_id=reservation_id)
+    d = retry(
+        partial(list_reserved_servers, server_endpoint, auth_token, reservation_id,
+                log=log),
+        can_retry=retry_times(LIST_MAX_RETRIES),
+        next_interval=repeating_interval(LIST_RETRY_INTERVAL),
+        clock=clock)
+
+    def delete(servers):
+        log.msg('Deleting {num_servers} servers of reservation', num_servers=len(servers))
+        return gatherResults(
+            [verified_delete(log, server_endpoint, auth_token, server['id'], clock=clock)
+             for server in servers], consumeErrors=True)
+
+    return d.addCallback(delete).addCallback(lambda _: None)
+
+
+def create_servers(server_endpoint, auth_token, server_config, count, log=None,
+                   clock=None, undo=None):
+    """
+    Create `count` identical servers with one request, using Nova's
+    ``min_count``/``max_count``, and then list them by the reservation ID of the
+    request. Listing is retried a few times until all the servers are listed.
+
+    :param str server_endpoint: Server endpoint URI.
+    :param str auth_token: Keystone Auth Token.
+    :param dict server_config: Nova server config.
+    :param int count: Number of servers to create.
+    :param IUndoStack undo: If given, deleting all the servers of the reservation
+        with :func:`delete_reserved_servers` is pushed onto it when they are
+        created but cannot be listed, since no one else knows their IDs then.
+
+    :return: Deferred that fires with a list of `count` dicts like the CreateServer
+        response, sorted by server name.
+    """
+    path = append_segments(server_endpoint, 'servers')
+    server_config = dict(server_config, min_count=count, max_count=count,
+                         return_reservation_id=True)
+    d = treq.post(path, headers=headers(auth_token),
+                  data=json.dumps({'server': server_config}), log=log)
+    d.addCallback(check_success, [202])
+    d.addErrback(wrap_request_error, path, 'server_create')
+    d.addCallback(treq.json_content)
+
+    def list_servers(reservation_id):
+        d = list_reserved_servers(server_endpoint, auth_token, reservation_id, log=log)
+
+        def check_listed(servers):
+            if len(servers) < count:
+                raise ServersNotListed(reservation_id, count, len(servers))
+            return [{'server': server}
+                    for server in sorted(servers, key=lambda server: server['name'])]
+
+        return d.addCallback(check_listed)
+
+    def not_listed(failure, reservation_id):
+        if undo is not None:
+            undo.push(delete_reserved_servers, log, server_endpoint,
+                      auth_token, reservation_id, clock=clock)
+        return failure
+
+    def created(body):
+        d = retry(
+            partial(list_servers, body['reservation_id']),
+            can_retry=compose_retries(retry_times(LIST_MAX_RETRIES),
+                                      lambda f: f.check(ServersNotListed)),
+            next_interval=repeating_interval(LIST_RETRY_INTERVAL),
+            clock=clock)
+        return d.addErrback(not_listed, body['reservation_id'])
+
+    return d.addCallback(created)
+
+
 def log_on_response_code(response, log, msg, code):
     """
     Log `msg` if response.code is same as code
@@ -366,7 +488,7 @@ def prepare_launch_config(scaling_group_uuid, launch_config):
 
 
 def launch_server(log, region, scaling_group, service_catalog, auth_token,
-                  launch_config, undo):
+                  launch_config, undo, launch_limiter=None):
     """
     Launch a new server given the launch config auth tokens and service catalog.
     Possibly adding the newly launched server to a load balancer.
@@ -380,6 +502,9 @@ def launch_server(log, region, scaling_group, service_catalog, auth_token,
     :param dict launch_config: A launch_config args structure as defined for
         the launch_server_v1 type.
     :param IUndoStack undo: The stack that will be rewound if undo fails.
+    :param launch_limiter: Optional :class:`otter.util.deferredutils.FairLimiter`
+        through which the server is created, keyed by tenant ID. Only the create
+        request is limited, not waiting for the server to build.
 
     :return: Deferred that fires with a 2-tuple of server details and the
         list of load balancer responses from add_to_load_balancers.
@@ -403,9 +528,128 @@ def launch_server(log, region, scaling_group, service_catalog, auth_token,
     server_config = launch_config['server']
 
     log = log.bind(server_name=server_config['name'])
-    ilog = [None]
 
-    d = create_server(server_endpoint, auth_token, server_config, log=log)
+    if launch_limiter is None:
+        d = create_server(server_endpoint, auth_token, server_config, log=log)
+    else:
+        d = launch_limiter.run(scaling_group.tenant_id, create_server, server_endpoint,
+                               auth_token, server_config, log=log)
+
+    return _setup_created_server(log, d, scaling_group, server_endpoint, lb_endpoint,
+                                 auth_token, lb_config, undo)
+
+
+def launch_servers(logs, region, scaling_group, service_catalog, auth_token,
+                   launch_config, undos, launch_limiter=None):
+    """
+    Launch many servers from the same launch config like :func:`launch_server`, but
+    create them all with a single request. Each server is then waited on, added to
+    load balancers and undone separately.
+
+    :param list logs: A bound logger for each server.
+    :param list undos: An :class:`IUndoStack` for each server, which is rewound if
+        launching that server fails.
+
+    See :func:`launch_server` for the other parameters.
+
+    :return: list of Deferreds, one for each server, each firing like the one
+        returned by :func:`launch_server`.
+    """
+    launch_config = prepare_launch_config(scaling_group.uuid, launch_config)
+
+    lb_region = config_value('regionOverrides.cloudLoadBalancers') or region
+    lb_endpoint = public_endpoint_url(service_catalog,
+                                      config_value('cloudLoadBalancers'),
+                                      lb_region)
+    server_endpoint = public_endpoint_url(service_catalog,
+                                          config_value('cloudServersOpenStack'),
+                                          region)
+    lb_config = launch_config.get('loadBalancers', [])
+    server_config = launch_config['server']
+
+    log = logs[0].bind(server_name=server_config['name'], num_servers=len(undos))
+    # if the servers cannot be listed, the first job's undo stack deletes them all
+    if launch_limiter is None:
+        d = create_servers(server_endpoint, auth_token, server_config, len(undos), log=log,
+                           undo=undos[0])
+    else:
+        d = launch_limiter.run(scaling_group.tenant_id, create_servers, server_endpoint,
+                               auth_token, server_config, len(undos), log=log,
+                               undo=undos[0])
+
+    created = [Deferred() for _ in undos]
+
+    def split(servers):
+        for server_d, server in zip(created, servers):
+            server_d.callback(server)
+
+    def fail_all(failure):
+        for server_d in created:
+            server_d.errback(failure)
+
+    d.addCallbacks(split, fail_all)
+
+    return [_setup_created_server(server_log.bind(server_name=server_config['name']),
+                                  server_d, scaling_group, server_endpoint, lb_endpoint,
+                                  auth_token, lb_config, undo)
+            for server_log, server_d, undo in zip(logs, created, undos)]
+
+
+def promote_server(log, region, scaling_group, service_catalog, auth_token,
+                   launch_config, server_id, undo):
+    """
+    Put a standby server of the warm pool, already built from the launch config
+    without load balancers, into service by adding it to the load balancers of
+    the launch config.
+
+    :param str server_id: The ID of the standby server.
+
+    See :func:`launch_server` for the other parameters.
+
+    :return: Deferred that fires like the one returned by :func:`launch_server`,
+        or fails with :class:`UnexpectedServerStatus` if the server is no
+        longer active.
+    """
+    launch_config = prepare_launch_config(scaling_group.uuid, launch_config)
+
+    lb_region = config_value('regionOverrides.cloudLoadBalancers') or region
+    lb_endpoint = public_endpoint_url(service_catalog,
+                                      config_value('cloudLoadBalancers'),
+                                      lb_region)
+    server_endpoint = public_endpoint_url(service_catalog,
+                                          config_value('cloudServersOpenStack'),
+                                          region)
+    lb_config = launch_config.get('loadBalancers', [])
+
+    log = log.bind(server_id=server_id)
+    undo.push(verified_delete, log, server_endpoint, auth_token, server_id)
+
+    def add_lb(server):
+        status = server['server']['status']
+        if status != 'ACTIVE':
+            raise UnexpectedServerStatus(server_id, status, 'ACTIVE')
+        for config in lb_config:
+            config['metadata']['rax:auto_scaling_server_name'] = server['server']['name']
+        ip_address = private_ip_addresses(server)[0]
+        lbd = add_to_load_balancers(
+            log, lb_endpoint, auth_token, lb_config, ip_address, undo)
+        lbd.addCallback(lambda lb_response: (server, lb_response))
+        return lbd
+
+    d = server_details(server_endpoint, auth_token, server_id, log=log)
+    return d.addCallback(add_lb)
+
+
+def _setup_created_server(log, d, scaling_group, server_endpoint, lb_endpoint,
+                          auth_token, lb_config, undo):
+    """
+    Wait for the server that deferred `d` fires with to be active, and add it to the
+    load balancers and to bobby.
+
+    :return: `d` that fires with a 2-tuple of server details and the list of load
+        balancer responses from add_to_load_balancers.
+    """
+    ilog = [None]
 
     def wait_for_server(server):
         server_id = server['server']['id']
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""
+Simulate how otter scales groups under a scripted or replayed stream of events,
+without Nova or Cassandra, and print a JSON report of the capacity of the groups
+over time, executions, time waited for group locks and API calls.
+
+The scenario is a JSON file like::
+
+    {
+        "duration": 3600,
+        "settings": {"build_time": 90, "failure_rate": 0.05, "launch_limit": 20},
+        "groups": {
+            "web": {
+                "config": {"name": "web", "cooldown": 60, "minEntities": 2,
+                           "maxEntities": 25, "metadata": {}},
+                "launch": {"type": "launch_server", "args": {"server": {}}},
+                "policies": {"up": {"name": "up", "change": 5, "cooldown": 300,
+                                    "type": "webhook"}}
+            }
+        },
+        "events": [
+            {"at": 60, "type": "webhook", "group": "web", "policy": "up", "count": 10}
+        ]
+    }
+
+See :class:`otter.simulator.Simulation` for the settings and the events.
+"""
+
+import argparse
+import json
+
+from otter.simulator import Simulation
+
+
+the_parser = argparse.ArgumentParser(description="Simulate scaling groups of otter")
+
+the_parser.add_argument(
+    'scenario', type=argparse.FileType('r'),
+    help='JSON file of the groups, events and settings to simulate')
+
+the_parser.add_argument(
+    '--seed', type=int, default=None,
+    help='Seed of build times and failures, to repeat a simulation')
+
+
+def run(args):
+    """
+    Run the simulation of the scenario and print its report
+    """
+    scenario = json.load(args.scenario)
+    settings = scenario.get('settings', {})
+    if args.seed is not None:
+        settings['seed'] = args.seed
+    simulation = Simulation(scenario['groups'], **settings)
+    report = simulation.run(scenario['events'], scenario['duration'])
+    print json.dumps(report, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    run(the_parser.parse_args())